@@ -0,0 +1,105 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import time
+
+# project
+from ..defaults import Defaults
+from ..logger import log
+
+
+class PemCache(object):
+    """
+        Local cache of the PEM management certificates derived from
+        publishsettings files, which saves the PKCS#12 decoding on
+        every command. A certificate is stored as file named by the
+        digest of the publishsettings file and the subscription id,
+        readable by its owner only. A certificate is valid for ttl
+        seconds after it was stored, expired files are removed
+    """
+    CACHE_DIRECTORY = 'pem'
+
+    def __init__(self, ttl, cache_directory=None):
+        self.ttl = ttl
+        self.cache_directory = cache_directory or os.path.join(
+            Defaults.cache_directory(), self.CACHE_DIRECTORY
+        )
+
+    def lookup(self, digest, subscription_id):
+        """
+            File name of the cached PEM certificate, None if it is
+            not cached or has expired
+        """
+        pem_file = self.__pem_file(digest, subscription_id)
+        if not os.path.isfile(pem_file):
+            return None
+        if self.__expired(pem_file):
+            self.__remove(pem_file)
+            return None
+        return pem_file
+
+    def add(self, digest, subscription_id, pem):
+        """
+            Store the PEM certificate and return its file name, None
+            if the cache is not writable
+        """
+        pem_file = self.__pem_file(digest, subscription_id)
+        try:
+            if not os.path.isdir(self.cache_directory):
+                os.makedirs(self.cache_directory, 0o700)
+            self.__remove_expired()
+            pem_fd = os.open(
+                pem_file + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                0o600
+            )
+            # an existing file keeps its mode on open
+            os.fchmod(pem_fd, 0o600)
+            with os.fdopen(pem_fd, 'w') as pem_cache:
+                pem_cache.write(pem)
+            os.rename(pem_file + '.tmp', pem_file)
+        except Exception as e:
+            log.warning(
+                'PEM cache %s not writable: %s',
+                self.cache_directory, format(e)
+            )
+            return None
+        return pem_file
+
+    def __remove_expired(self):
+        # certificates of replaced publishsettings files are never
+        # looked up again
+        for name in os.listdir(self.cache_directory):
+            pem_file = os.path.join(self.cache_directory, name)
+            if name.endswith('.pem') and self.__expired(pem_file):
+                self.__remove(pem_file)
+
+    def __expired(self, pem_file):
+        try:
+            return time.time() - os.path.getmtime(pem_file) >= self.ttl
+        except OSError:
+            return True
+
+    def __remove(self, pem_file):
+        try:
+            os.remove(pem_file)
+        except OSError:
+            pass
+
+    def __pem_file(self, digest, subscription_id):
+        # subscription ids are GUIDs, keep the name a plain file name
+        return os.path.join(
+            self.cache_directory, '%s-%s.pem' % (
+                digest, subscription_id.replace(os.sep, '_')
+            )
+        )
@@ -0,0 +1,86 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from xml.dom import minidom
+import hashlib
+import os
+
+# project
+from ..azurectl_exceptions import (
+    AzureSubscriptionIdNotFound,
+    AzureSubscriptionParseError
+)
+
+
+class PublishSettings(object):
+    """
+        Subscriptions of a publishsettings file, indexed by their
+        id. A file is read and parsed once per process, see load.
+        digest is the SHA-256 hex digest of the file content, which
+        identifies credentials derived from it
+    """
+    loaded = {}
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        try:
+            with open(file_name, 'rb') as settings:
+                content = settings.read()
+            xml = minidom.parseString(content)
+        except Exception as e:
+            raise AzureSubscriptionParseError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        self.digest = hashlib.sha256(content).hexdigest()
+        self.subscriptions = xml.getElementsByTagName('Subscription')
+        self.index = {}
+        for subscription in self.subscriptions:
+            if subscription.hasAttribute('Id'):
+                self.index.setdefault(
+                    subscription.attributes['Id'].value, subscription
+                )
+
+    @classmethod
+    def load(self, file_name):
+        """
+            PublishSettings of file_name, parsed on the first call
+            for the file only
+        """
+        key = os.path.abspath(file_name)
+        if key not in self.loaded:
+            self.loaded[key] = PublishSettings(file_name)
+        return self.loaded[key]
+
+    def first_subscription_id(self):
+        try:
+            return self.subscriptions[0].attributes['Id'].value
+        except Exception:
+            raise AzureSubscriptionIdNotFound(
+                'No Subscription.Id found in %s' % self.file_name
+            )
+
+    def subscription(self, subscription_id):
+        """
+            Subscription element of the given id
+        """
+        if subscription_id in self.index:
+            return self.index[subscription_id]
+        if len(self.index) < len(self.subscriptions):
+            raise AzureSubscriptionIdNotFound(
+                'No Subscription.Id found in %s' % self.file_name
+            )
+        raise AzureSubscriptionIdNotFound(
+            "Subscription_id '%s' not found in %s" % (
+                subscription_id, self.file_name
+            )
+        )
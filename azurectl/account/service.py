@@ -11,7 +11,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-from xml.dom import minidom
 from OpenSSL.crypto import (
     dump_privatekey,
     dump_certificate,
@@ -25,13 +24,15 @@ import base64
 import re
 
 # project
+from .pem_cache import PemCache
+from .publishsettings import PublishSettings
+from .storage_key_cache import StorageKeyCache
 from ..azurectl_exceptions import (
+    AzureConfigParseError,
     AzureConfigVariableNotFound,
     AzureServiceManagementError,
     AzureSubscriptionPrivateKeyDecodeError,
     AzureSubscriptionCertificateDecodeError,
-    AzureSubscriptionIdNotFound,
-    AzureSubscriptionParseError,
     AzureManagementCertificateNotFound,
     AzureServiceManagementUrlNotFound,
     AzureSubscriptionPKCS12DecodeError,
@@ -48,6 +49,10 @@ class AzureAccount(object):
         self.__service = None
         self.__cert_file = NamedTemporaryFile()
         self.__certificate_filename = None
+        self.__p12 = None
+        self.__blob_service_host_base = None
+        self.__storage_keys = {}
+        self.__storage_key_cache = None
 
     def storage_name(self):
         return self.config.get_storage_account_name()
@@ -72,7 +77,9 @@ class AzureAccount(object):
                     "Account config must define either " +
                     "management_url or publishsettings"
                 )
-            subscription = self.__get_subscription(self.subscription_id())
+            subscription = self.__get_publishsettings().subscription(
+                self.subscription_id()
+            )
             try:
                 url = subscription.attributes['ServiceManagementUrl'].value
             except Exception:
@@ -83,27 +90,57 @@ class AzureAccount(object):
         return urlparse(url).hostname
 
     def get_blob_service_host_base(self):
+        if self.__blob_service_host_base:
+            return self.__blob_service_host_base
         management_url = self.get_management_url()
         match = re.search('management\.(?P<hostbase>.*)', management_url)
         try:
-            return match.group('hostbase')
+            self.__blob_service_host_base = match.group('hostbase')
         except (IndexError, AttributeError):
             raise AzureUnrecognizedManagementUrl(
                 'No storage service host base for the management url %s' %
                 management_url
             )
+        return self.__blob_service_host_base
 
     def storage_key(self, name=None):
-        service = self.get_management_service()
+        """
+            Primary key of the storage account name. Keys are kept for
+            the lifetime of the account object and, if the account
+            config sets storage_key_cache_ttl, for that many seconds
+            in the local storage key cache
+        """
         if not name:
             name = self.storage_name()
-        try:
-            account_keys = service.get_storage_account_keys(name)
-        except Exception as e:
-            raise AzureServiceManagementError(
-                '%s: %s' % (type(e).__name__, format(e))
-            )
-        return account_keys.storage_service_keys.primary
+        if name in self.__storage_keys:
+            return self.__storage_keys[name]
+        key_cache = self.__get_storage_key_cache()
+        key = None
+        if key_cache:
+            key = key_cache.lookup(self.subscription_id(), name)
+        if not key:
+            service = self.get_management_service()
+            try:
+                account_keys = service.get_storage_account_keys(name)
+            except Exception as e:
+                raise AzureServiceManagementError(
+                    '%s: %s' % (type(e).__name__, format(e))
+                )
+            key = account_keys.storage_service_keys.primary
+            if key_cache:
+                key_cache.add(self.subscription_id(), name, key)
+        self.__storage_keys[name] = key
+        return key
+
+    def invalidate_storage_key(self, name):
+        """
+            Forget the cached key of the storage account name, e.g
+            because the key has been regenerated
+        """
+        self.__storage_keys.pop(name, None)
+        key_cache = self.__get_storage_key_cache()
+        if key_cache:
+            key_cache.remove(self.subscription_id(), name)
 
     def instance_types(self):
         service = self.get_management_service()
@@ -155,14 +192,62 @@ class AzureAccount(object):
                         "Account config must define either " +
                         "management_pem_file or publishsettings"
                     )
-                self.__build_certificate_file()
-                self.__certificate_filename = self.__cert_file.name
+                self.__certificate_filename = \
+                    self.__build_certificate_file()
         return self.__certificate_filename
 
+    def __get_storage_key_cache(self):
+        if not self.__storage_key_cache:
+            ttl = self.__get_cache_ttl(
+                'storage_key_cache_ttl', self.config.get_storage_key_cache_ttl
+            )
+            if not ttl:
+                return None
+            self.__storage_key_cache = StorageKeyCache(ttl)
+        return self.__storage_key_cache
+
+    def __get_cache_ttl(self, option, get_ttl):
+        """
+            Seconds a local cache keeps its entries, read by the
+            get_ttl method of the config, None if the account config
+            does not set the option
+        """
+        try:
+            ttl = get_ttl()
+        except AzureConfigVariableNotFound:
+            return None
+        try:
+            return int(ttl)
+        except ValueError:
+            raise AzureConfigParseError(
+                '%s %s is not a number of seconds' % (option, ttl)
+            )
+
     def __build_certificate_file(self):
-        self.__cert_file.write(self.__get_private_key())
-        self.__cert_file.write(self.__get_certificate())
+        """
+            PEM file of the management certificate in the publishsettings
+            file. If the account config sets pem_cache_ttl, the file is
+            taken from the PEM cache if the publishsettings file has
+            been decoded within that many seconds
+        """
+        ttl = self.__get_cache_ttl(
+            'pem_cache_ttl', self.config.get_pem_cache_ttl
+        )
+        if ttl:
+            digest = self.__get_publishsettings().digest
+            subscription_id = self.subscription_id()
+            pem_cache = PemCache(ttl)
+            pem_file = pem_cache.lookup(digest, subscription_id)
+            if pem_file:
+                return pem_file
+        pem = self.__get_private_key() + self.__get_certificate()
+        if ttl:
+            pem_file = pem_cache.add(digest, subscription_id, pem)
+            if pem_file:
+                return pem_file
+        self.__cert_file.write(pem)
         self.__cert_file.flush()
+        return self.__cert_file.name
 
     def get_management_service(self):
         if not self.__service:
@@ -207,43 +292,18 @@ class AzureAccount(object):
             )
 
     def __get_first_subscription_id(self):
-        xml = self.__read_xml()
-        subscriptions = xml.getElementsByTagName('Subscription')
-        try:
-            return subscriptions[0].attributes['Id'].value
-        except Exception:
-            raise AzureSubscriptionIdNotFound(
-                'No Subscription.Id found in %s' % self.settings
-            )
-
-    def __get_subscription(self, subscription_id):
-        xml = self.__read_xml()
-        subscriptions = xml.getElementsByTagName('Subscription')
-        for subscription in subscriptions:
-            try:
-                if subscription.attributes['Id'].value == subscription_id:
-                    return subscription
-            except Exception:
-                raise AzureSubscriptionIdNotFound(
-                    'No Subscription.Id found in %s' % self.settings
-                )
-        raise AzureSubscriptionIdNotFound(
-            "Subscription_id '%s' not found in %s" % (
-                subscription_id, self.settings
-            )
-        )
+        return self.__get_publishsettings().first_subscription_id()
 
-    def __read_xml(self):
-        try:
-            self.settings = self.config.get_publishsettings_file_name()
-            return minidom.parse(self.settings)
-        except Exception as e:
-            raise AzureSubscriptionParseError(
-                '%s: %s' % (type(e).__name__, format(e))
-            )
+    def __get_publishsettings(self):
+        self.settings = self.config.get_publishsettings_file_name()
+        return PublishSettings.load(self.settings)
 
     def __read_p12(self):
-        subscription = self.__get_subscription(self.subscription_id())
+        if self.__p12:
+            return self.__p12
+        subscription = self.__get_publishsettings().subscription(
+            self.subscription_id()
+        )
         try:
             cert = subscription.attributes['ManagementCertificate'].value
         except Exception:
@@ -252,8 +312,9 @@ class AzureAccount(object):
                 self.settings
             )
         try:
-            return load_pkcs12(base64.b64decode(cert), '')
+            self.__p12 = load_pkcs12(base64.b64decode(cert), '')
         except Exception as e:
             raise AzureSubscriptionPKCS12DecodeError(
                 '%s: %s' % (type(e).__name__, format(e))
             )
+        return self.__p12
@@ -0,0 +1,101 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import os
+import time
+
+# project
+from ..defaults import Defaults
+from ..logger import log
+
+
+class StorageKeyCache(object):
+    """
+        Local cache of storage account keys, which saves the
+        management request for the key of a storage account on
+        every command. A key is valid for ttl seconds after it was
+        fetched. The cache file holds secrets and is only readable
+        by its owner
+    """
+    CACHE_FILE = 'storage_key_cache.json'
+    VERSION = 1
+
+    def __init__(self, ttl, cache_file=None):
+        self.ttl = ttl
+        self.cache_file = cache_file or os.path.join(
+            Defaults.cache_directory(), self.CACHE_FILE
+        )
+        self.keys = {}
+        self.__load()
+
+    def lookup(self, subscription_id, name):
+        """
+            Key of the storage account name in the subscription, None
+            if the key is unknown or has expired
+        """
+        cached = self.keys.get(self.__account_key(subscription_id, name))
+        if not cached or time.time() - cached['fetched'] >= self.ttl:
+            return None
+        return cached['key']
+
+    def add(self, subscription_id, name, key):
+        self.keys[self.__account_key(subscription_id, name)] = {
+            'key': key,
+            'fetched': time.time()
+        }
+        self.save()
+
+    def remove(self, subscription_id, name):
+        """
+            Forget the key of the storage account name, e.g because
+            the key has been regenerated
+        """
+        if self.keys.pop(self.__account_key(subscription_id, name), None):
+            self.save()
+
+    def save(self):
+        content = {
+            'version': self.VERSION,
+            'keys': self.keys
+        }
+        try:
+            cache_directory = os.path.dirname(self.cache_file)
+            if not os.path.isdir(cache_directory):
+                os.makedirs(cache_directory, 0o700)
+            cache_fd = os.open(
+                self.cache_file + '.tmp',
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+            )
+            # an existing file keeps its mode on open
+            os.fchmod(cache_fd, 0o600)
+            with os.fdopen(cache_fd, 'w') as cache:
+                json.dump(content, cache)
+            os.rename(self.cache_file + '.tmp', self.cache_file)
+        except Exception as e:
+            log.warning(
+                'Storage key cache %s not writable: %s',
+                self.cache_file, format(e)
+            )
+
+    def __load(self):
+        try:
+            with open(self.cache_file, 'r') as cache:
+                content = json.load(cache)
+        except Exception:
+            return
+        if content.get('version') == self.VERSION:
+            self.keys = content['keys']
+
+    def __account_key(self, subscription_id, name):
+        return '%s/%s' % (subscription_id, name)
@@ -37,6 +37,10 @@ class AzureAccountLoadFailed(AzureError):
     pass
 
 
+class AzureBZip2Error(AzureError):
+    pass
+
+
 class AzureBlobServicePropertyError(AzureError):
     pass
 
@@ -185,6 +189,14 @@ class AzureFileShareListError(AzureError):
     pass
 
 
+class AzureGZError(AzureError):
+    pass
+
+
+class AzureHashManifestError(AzureError):
+    pass
+
+
 class AzureHelpNoCommandGiven(AzureError):
     pass
 
@@ -253,7 +265,7 @@ class AzurePageBlobUpdateError(AzureError):
     pass
 
 
-class AzurePageBlobZeroPageError(AzureError):
+class AzureQcow2Error(AzureError):
     pass
 
 
@@ -325,10 +337,18 @@ class AzureStorageAccountUpdateError(AzureError):
     pass
 
 
+class AzureStorageCopyError(AzureError):
+    pass
+
+
 class AzureStorageDeleteError(AzureError):
     pass
 
 
+class AzureStorageDownloadError(AzureError):
+    pass
+
+
 class AzureStorageFileNotFound(AzureError):
     pass
 
@@ -349,6 +369,10 @@ class AzureStorageUploadError(AzureError):
     pass
 
 
+class AzureStorageVerifyError(AzureError):
+    pass
+
+
 class AzureSubscriptionCertificateDecodeError(AzureError):
     pass
 
@@ -369,6 +393,10 @@ class AzureSubscriptionPrivateKeyDecodeError(AzureError):
     pass
 
 
+class AzureTarError(AzureError):
+    pass
+
+
 class AzureUnknownCommand(AzureError):
     pass
 
@@ -381,6 +409,10 @@ class AzureUnrecognizedManagementUrl(AzureError):
     pass
 
 
+class AzureVMDKError(AzureError):
+    pass
+
+
 class AzureVmCreateError(AzureError):
     pass
 
@@ -393,5 +425,9 @@ class AzureVmRebootError(AzureError):
     pass
 
 
+class AzureWorkerPoolError(AzureError):
+    pass
+
+
 class AzureXZError(AzureError):
     pass
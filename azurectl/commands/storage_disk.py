@@ -18,35 +18,108 @@ In order to make use of a disk image in Azure, a fixed-size virtual hard disk
 usage: azurectl storage disk -h | --help
        azurectl storage disk upload --source=<file>
            [--blob-name=<blobname>]
+           [--base-blob=<blobname>]
+           [--byte-size=<bytes>]
+           [--convert-raw]
+           [--member=<name>]
            [--max-chunk-size=<size>]
+           [--threads=<n>]
+           [--adaptive]
+           [--no-hash-cache]
+           [--no-range-map]
+           [--target=<target>...]
+           [--shard=<shard>]
+           [--resume [--check-page-ranges]]
+           [--quiet]
+       azurectl storage disk plan --source=<file>
+           [--member=<name>]
+           [--convert-raw]
+           [--bandwidth=<bytes>]
+       azurectl storage disk copy --source-blob=<blob>... --target=<target>...
+           [--quiet]
+       azurectl storage disk download --blob-name=<blobname>
+           [--destination=<file>]
+           [--max-chunk-size=<size>]
+           [--threads=<n>]
+           [--xz]
            [--quiet]
        azurectl storage disk sas --blob-name=<blobname>
            [--start-datetime=<start>]
            [--expiry-datetime=<expiry>]
            [--permissions=<permissions>]
        azurectl storage disk delete --blob-name=<blobname>
+       azurectl storage disk verify --blob-name=<blobname>
+           [--threads=<n>]
        azurectl storage disk help
 
 commands:
+    copy
+        server side copy of disk images to other containers or storage
+        accounts, all copies run concurrently
     delete
         delete disk image from the given container
+    download
+        download disk image from the given container to a sparse file
     help
         show manual page for disk command
+    plan
+        scan a disk image for the data and zero areas an upload transfers
+        and skips. The range map is cached, a later upload of the
+        unchanged image skips the zero areas without reading them
     sas
         generate a shared access signature URL allowing limited access to the
         specified disk image without an access key
     upload
-        upload xz compressed disk image to the given container
+        upload disk image to the given container, xz, gzip and bzip2
+        compressed images are decompressed on the fly, qcow2 and
+        sparse VMDK images are uploaded as the disk they contain
+    verify
+        check a disk image in the given container against the image
+        digest stored on upload
 
 options:
+    --adaptive
+        tune chunk size and number of parallel requests to the measured
+        upload throughput, --max-chunk-size and --threads are the limits
+    --bandwidth=<bytes>
+        upload bandwidth in bytes per second to estimate the duration of
+        the upload by on plan
+    --base-blob=<blobname>
+        previous version of the image in the container, only the ranges
+        which differ from it are uploaded
     --blob-name=<blobname>
         name of the file in the storage pool
+    --byte-size=<bytes>
+        size of the page blob, must be a multiple of 512 bytes.
+        default is the uncompressed size of the source file, which
+        bzip2 and gzip files larger than about 4MB do not record.
+        With --convert-raw the size of the raw image
+    --convert-raw
+        upload a raw disk image as fixed VHD, the image is padded to
+        the VHD alignment of 1MB and the VHD footer is appended
+    --check-page-ranges
+        on resume, check the ranges recorded in the upload journal
+        against the valid page ranges of the blob
+    --destination=<file>
+        file to download the image to, default is the blob name in
+        the current directory, with the .xz suffix for --xz
     --expiry-datetime=<expiry>
         Date (and optionally time) to cease access via a shared access
         signature. [default: 30 days from start]
         Example format: YYYY-MM-DDThh:mm:ssZ
     --max-chunk-size=<size>
-        max chunk size in bytes for upload, default 4MB
+        max chunk size in bytes for upload or download, default 4MB
+    --member=<name>
+        upload the member of this name from the tar archive given as
+        source, which may be compressed. The blob name and size
+        default to the name and size of the member
+    --no-hash-cache
+        do not look up the image in the local page hash cache and do
+        not record the uploaded blob there
+    --no-range-map
+        do not use the range map of the image from the local range
+        map cache, the image is scanned for zero pages while it is
+        uploaded
     --permissions=<permissions>
         String of permitted actions on a storage element via shared access
         signature.
@@ -56,23 +129,51 @@ options:
         l  List
         [default: rl]
     --quiet
-        suppress progress information on upload
+        suppress progress information on upload, download or copy
+    --resume
+        continue an interrupted upload, skipping the page ranges
+        recorded as committed in the upload journal of the image
+    --shard=<shard>
+        upload one shard of the image, given as <number>/<count>, to
+        a blob shared by count hosts which upload the other shards of
+        the same image. The first host creates the blob, the host
+        which completes the last shard stores the image digest
+    --source-blob=<blob>
+        disk image to copy, given as <blobname> in the given container or
+        as <account>/<container>/<blobname>. Each --source-blob is copied
+        to the --target at the same position
     --source=<file>
-        file to upload
+        file to upload, or - to read the image from stdin, which
+        requires --blob-name and --byte-size unless --member is given
     --start-datetime=<start>
         Date (and optionally time) to grant access via a shared access
         signature. [default: now]
         Example format: YYYY-MM-DDThh:mm:ssZ
+    --target=<target>
+        additional blob to upload the image to, given as
+        <account>/<container>[/<blobname>]. The image is read once and
+        sent to all targets. The blob name defaults to --blob-name.
+        On copy the blob to copy to, the blob name defaults to the one
+        of the --source-blob
+    --threads=<n>
+        number of page ranges uploaded in parallel per target, or
+        downloaded or verified in parallel, default 1
+    --xz
+        write the downloaded image as xz compressed stream
 """
 import datetime
+import os
 from pytz import utc
 from apscheduler.schedulers.background import BackgroundScheduler
 
 # project
 from base import CliTask
 from ..account.service import AzureAccount
+from ..azurectl_exceptions import AzureInvalidCommand
 from ..help import Help
 from ..logger import log
+from ..storage.page_hash_cache import PageHashCache
+from ..storage.range_map_cache import RangeMapCache
 from ..storage.storage import Storage
 from ..utils.collector import DataCollector
 from ..utils.output import DataOutput
@@ -110,9 +211,23 @@ class StorageDiskTask(CliTask):
             expiry = self.validate_date('--expiry-datetime')
 
         self.validate_sas_permissions('--permissions')
+        targets = self.validate_upload_targets('--target')
+        shard = self.validate_shard('--shard')
+        self.validate_threads('--threads')
+        copy_sources = self.validate_copy_sources(
+            '--source-blob', container_name
+        )
 
         if self.command_args['upload']:
-            self.__upload()
+            self.__upload(targets, shard)
+        elif self.command_args['plan']:
+            self.__plan()
+        elif self.command_args['copy']:
+            self.__copy(copy_sources, targets)
+        elif self.command_args['download']:
+            self.__download()
+        elif self.command_args['verify']:
+            self.__verify()
         elif self.command_args['delete']:
             self.__delete()
         elif self.command_args['sas']:
@@ -130,19 +245,94 @@ class StorageDiskTask(CliTask):
             return False
         return self.manual
 
-    def __upload(self):
+    # argument validation
+    def validate_upload_targets(self, cmd_arg='--target'):
+        targets = []
+        for target in self.command_args[cmd_arg]:
+            names = target.split('/', 2)
+            if len(names) < 2 or not all(names):
+                raise AzureInvalidCommand(
+                    '%s %s is invalid. ' % (cmd_arg, target) +
+                    'The format is <account>/<container>[/<blobname>]'
+                )
+            blob_name = names[2] if len(names) == 3 else None
+            targets.append((names[0], names[1], blob_name))
+        return targets
+
+    def validate_shard(self, cmd_arg='--shard'):
+        if not self.command_args[cmd_arg]:
+            return None
+        try:
+            number, count = [
+                int(value) for value in self.command_args[cmd_arg].split('/')
+            ]
+        except ValueError:
+            number = count = 0
+        if not 1 <= number <= count:
+            raise AzureInvalidCommand(
+                '%s %s is invalid. ' % (cmd_arg, self.command_args[cmd_arg]) +
+                'The format is <number>/<count>, e.g 1/4'
+            )
+        if self.command_args['--target'] or self.command_args['--base-blob']:
+            raise AzureInvalidCommand(
+                '%s can not be combined with --target or --base-blob' %
+                cmd_arg
+            )
+        return (number, count)
+
+    def validate_threads(self, cmd_arg='--threads'):
+        if not self.command_args[cmd_arg]:
+            return None
+        try:
+            threads = int(self.command_args[cmd_arg])
+        except ValueError:
+            threads = 0
+        if threads <= 0:
+            raise AzureInvalidCommand(
+                '%s %s is invalid. ' % (cmd_arg, self.command_args[cmd_arg]) +
+                'The number of threads is a positive number'
+            )
+        return threads
+
+    def validate_bandwidth(self, cmd_arg='--bandwidth'):
+        try:
+            bandwidth = int(self.command_args[cmd_arg])
+        except ValueError:
+            bandwidth = 0
+        if bandwidth <= 0:
+            raise AzureInvalidCommand(
+                '%s %s is invalid. ' % (cmd_arg, self.command_args[cmd_arg]) +
+                'The bandwidth is a positive number of bytes per second'
+            )
+        return bandwidth
+
+    def validate_copy_sources(self, cmd_arg, container_name):
+        sources = []
+        for source in self.command_args[cmd_arg]:
+            names = source.split('/', 2)
+            if len(names) == 1:
+                names = [self.account.storage_name(), container_name, source]
+            if len(names) != 3 or not all(names):
+                raise AzureInvalidCommand(
+                    '%s %s is invalid. ' % (cmd_arg, source) +
+                    'The format is [<account>/<container>/]<blobname>'
+                )
+            sources.append(tuple(names))
+        return sources
+
+    def __upload(self, targets, shard):
         if self.command_args['--quiet']:
-            self.__upload_no_progress()
+            self.__upload_no_progress(targets, shard)
         else:
-            self.__upload_with_progress()
+            self.__upload_with_progress(targets, shard)
 
-    def __upload_no_progress(self):
+    def __upload_no_progress(self, targets, shard):
         try:
-            self.__process_upload()
+            self.__process_upload(targets, shard)
         except (KeyboardInterrupt):
             raise SystemExit('azurectl aborted by keyboard interrupt')
 
-    def __upload_with_progress(self):
+    def __upload_with_progress(self, targets, shard):
         image = self.command_args['--source']
         progress = BackgroundScheduler(timezone=utc)
         progress.add_job(
@@ -150,7 +340,7 @@ class StorageDiskTask(CliTask):
         )
         progress.start()
         try:
-            self.__process_upload()
+            self.__process_upload(targets, shard)
             self.storage.print_upload_status()
             progress.shutdown()
         except (KeyboardInterrupt):
@@ -159,13 +349,138 @@ class StorageDiskTask(CliTask):
         print
         log.info('Uploaded %s', image)
 
-    def __process_upload(self):
+    def __process_upload(self, targets, shard):
+        hash_cache = None
+        if not self.command_args['--no-hash-cache']:
+            hash_cache = PageHashCache()
+        range_map_cache = None
+        if not self.command_args['--no-range-map']:
+            range_map_cache = RangeMapCache()
         self.storage.upload(
-
             self.command_args['--source'],
             self.command_args['--blob-name'],
-            self.command_args['--max-chunk-size']
+            self.command_args['--max-chunk-size'],
+            threads=self.command_args['--threads'],
+            resume=self.command_args['--resume'],
+            check_page_ranges=self.command_args['--check-page-ranges'],
+            byte_size=self.command_args['--byte-size'],
+            adaptive=self.command_args['--adaptive'],
+            base_blob=self.command_args['--base-blob'],
+            hash_cache=hash_cache,
+            targets=targets,
+            convert_raw=self.command_args['--convert-raw'],
+            member=self.command_args['--member'],
+            shard=shard,
+            range_map_cache=range_map_cache
+        )
+
+    def __plan(self):
+        image = self.command_args['--source']
+        range_map = self.storage.plan(
+            image,
+            member=self.command_args['--member'],
+            convert_raw=self.command_args['--convert-raw'],
+            range_map_cache=RangeMapCache()
+        )
+        plan = {
+            'byte_size': range_map.byte_size,
+            'data_bytes': range_map.data_bytes(),
+            'zero_bytes': range_map.zero_bytes(),
+            'data_ranges': len(range_map.data_ranges)
+        }
+        if self.command_args['--bandwidth']:
+            plan['duration'] = '%d seconds' % round(
+                range_map.duration(
+                    self.validate_bandwidth('--bandwidth')
+                )
+            )
+        result = DataCollector()
+        out = DataOutput(
+            result,
+            self.global_args['--output-format'],
+            self.global_args['--output-style']
+        )
+        result.add(
+            (self.command_args['--member'] or image) + ':plan', plan
+        )
+        out.display()
+
+    def __copy(self, sources, targets):
+        if len(sources) != len(targets):
+            raise AzureInvalidCommand(
+                'Each --source-blob requires one --target to copy to'
+            )
+        copies = []
+        for source, target in zip(sources, targets):
+            account_name, container, blob_name = target
+            copies.append(
+                (source, (account_name, container, blob_name or source[2]))
+            )
+        progress = None
+        if not self.command_args['--quiet']:
+            progress = BackgroundScheduler(timezone=utc)
+            progress.add_job(
+                self.storage.print_copy_status, 'interval', seconds=3
+            )
+            progress.start()
+        try:
+            poller = self.storage.copy(copies)
+        except (KeyboardInterrupt):
+            raise SystemExit(
+                'azurectl aborted by keyboard interrupt, '
+                'started copies continue server side'
+            )
+        finally:
+            if progress:
+                progress.shutdown()
+        if progress:
+            self.storage.print_copy_status()
+            print
+        for source, target in copies:
+            log.info('Copied %s to %s', '/'.join(source), '/'.join(target))
+        log.info(
+            'Copied %d bytes in %d seconds, %.1f MB/s',
+            poller.bytes_copied(), poller.elapsed(),
+            poller.throughput() / 1048576
+        )
+
+    def __download(self):
+        blob_name = self.command_args['--blob-name']
+        file_name = self.command_args['--destination']
+        if not file_name:
+            file_name = os.path.basename(blob_name)
+            if self.command_args['--xz']:
+                file_name += '.xz'
+        progress = None
+        if not self.command_args['--quiet']:
+            progress = BackgroundScheduler(timezone=utc)
+            progress.add_job(
+                self.storage.print_download_status, 'interval', seconds=3
+            )
+            progress.start()
+        try:
+            self.storage.download(
+                blob_name, file_name,
+                self.command_args['--max-chunk-size'],
+                threads=self.command_args['--threads'],
+                compress=self.command_args['--xz']
+            )
+        except (KeyboardInterrupt):
+            raise SystemExit('azurectl aborted by keyboard interrupt')
+        finally:
+            if progress:
+                progress.shutdown()
+        if progress:
+            self.storage.print_download_status()
+            print
+        log.info('Downloaded %s to %s', blob_name, file_name)
+
+    def __verify(self):
+        image = self.command_args['--blob-name']
+        digest = self.storage.verify(
+            image, threads=self.command_args['--threads']
         )
+        log.info('Verified %s, image digest %s', image, digest)
 
     def __sas(self, container_name, start, expiry, permissions):
         result = DataCollector()
@@ -106,6 +106,12 @@ class Config(object):
     def get_management_pem_filename(self):
         return self.__get_account_option('management_pem_file')
 
+    def get_storage_key_cache_ttl(self):
+        return self.__get_account_option('storage_key_cache_ttl')
+
+    def get_pem_cache_ttl(self):
+        return self.__get_account_option('pem_cache_ttl')
+
     def get_region_name(self):
         if not self.region_name:
             try:
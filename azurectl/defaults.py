@@ -11,6 +11,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import os
 from collections import namedtuple
 from pkg_resources import resource_filename
 
@@ -26,6 +27,14 @@ class Defaults(object):
     def project_file(self, filename):
         return resource_filename('azurectl', filename)
 
+    @classmethod
+    def cache_directory(self):
+        """
+            Directory for locally cached data, which can be removed
+            at any time
+        """
+        return os.path.expanduser('~/.cache/azurectl')
+
     @classmethod
     def account_type_for_docopts(self, docopts, return_default=True):
         for account_type_tuple in self.__get_account_type_tuples():
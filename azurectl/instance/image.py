@@ -32,6 +32,7 @@ from ..azurectl_exceptions import (
 )
 from ..defaults import Defaults
 from ..logger import log
+from ..storage.service_factory import StorageServiceFactory
 
 
 class Image(object):
@@ -76,10 +77,11 @@ class Image(object):
         if not label:
             label = name
         try:
-            storage = BaseBlobService(
+            storage = StorageServiceFactory.service(
+                BaseBlobService,
                 self.account.storage_name(),
                 self.account.storage_key(),
-                endpoint_suffix=self.account.get_blob_service_host_base()
+                self.account.get_blob_service_host_base()
             )
             storage.get_blob_properties(
                 container_name, blob_name
@@ -27,6 +27,7 @@ from ..azurectl_exceptions import (
     AzureStorageNotReachableByCloudServiceError,
     AzureImageNotReachableByCloudServiceError
 )
+from ..storage.service_factory import StorageServiceFactory
 
 
 class VirtualMachine(object):
@@ -138,10 +139,11 @@ class VirtualMachine(object):
                 ' '.join(message) % cloud_service_name
             )
 
-        storage = BaseBlobService(
+        storage = StorageServiceFactory.service(
+            BaseBlobService,
             self.account.storage_name(),
             self.account.storage_key(),
-            endpoint_suffix=self.account.get_blob_service_host_base()
+            self.account.get_blob_service_host_base()
         )
         media_link = storage.make_blob_url(
             self.account.storage_container(), ''.join(
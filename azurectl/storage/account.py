@@ -73,6 +73,8 @@ class StorageAccount(object):
                 self.service.regenerate_storage_account_keys(name, 'Primary')
             if regenerate_secondary_key:
                 self.service.regenerate_storage_account_keys(name, 'Secondary')
+            if regenerate_primary_key or regenerate_secondary_key:
+                self.account.invalidate_storage_key(name)
         except Exception as e:
             raise AzureStorageAccountUpdateError(
                 '%s: %s' % (type(e).__name__, format(e))
@@ -82,6 +84,7 @@ class StorageAccount(object):
     def delete(self, name):
         try:
             result = self.service.delete_storage_account(name)
+            self.account.invalidate_storage_key(name)
         except Exception as e:
             raise AzureStorageAccountDeleteError(
                 '%s: %s' % (type(e).__name__, format(e))
@@ -15,6 +15,7 @@ from azure.storage.blob.baseblobservice import BaseBlobService
 from azure.storage.sharedaccesssignature import SharedAccessSignature
 
 # project
+from .service_factory import StorageServiceFactory
 from ..azurectl_exceptions import (
     AzureCannotInit,
     AzureContainerListError,
@@ -53,11 +54,7 @@ class Container(object):
 
     def list(self):
         result = []
-        blob_service = BaseBlobService(
-            self.account_name,
-            self.account_key,
-            endpoint_suffix=self.blob_service_host_base
-        )
+        blob_service = self.__blob_service()
         try:
             for container in blob_service.list_containers():
                 result.append(format(container.name))
@@ -68,11 +65,7 @@ class Container(object):
         return result
 
     def exists(self, container):
-        blob_service = BaseBlobService(
-            self.account_name,
-            self.account_key,
-            endpoint_suffix=self.blob_service_host_base
-        )
+        blob_service = self.__blob_service()
         try:
             blob_service.get_container_properties(container)
             return True
@@ -80,11 +73,7 @@ class Container(object):
             return False
 
     def create(self, container):
-        blob_service = BaseBlobService(
-            self.account_name,
-            self.account_key,
-            endpoint_suffix=self.blob_service_host_base
-        )
+        blob_service = self.__blob_service()
         try:
             blob_service.create_container(
                 container_name=container,
@@ -97,11 +86,7 @@ class Container(object):
         return True
 
     def delete(self, container):
-        blob_service = BaseBlobService(
-            self.account_name,
-            self.account_key,
-            endpoint_suffix=self.blob_service_host_base
-        )
+        blob_service = self.__blob_service()
         try:
             blob_service.delete_container(
                 container_name=container,
@@ -115,11 +100,7 @@ class Container(object):
 
     def content(self, container):
         result = {container: []}
-        blob_service = BaseBlobService(
-            self.account_name,
-            self.account_key,
-            endpoint_suffix=self.blob_service_host_base
-        )
+        blob_service = self.__blob_service()
         try:
             for blob in blob_service.list_blobs(container):
                 result[container].append(format(blob.name))
@@ -129,6 +110,14 @@ class Container(object):
                 '%s: %s' % (type(e).__name__, format(e))
             )
 
+    def __blob_service(self):
+        return StorageServiceFactory.service(
+            BaseBlobService,
+            self.account_name,
+            self.account_key,
+            self.blob_service_host_base
+        )
+
     def sas(self, container, start, expiry, permissions):
         sas = SharedAccessSignature(
             self.account_name, self.account_key
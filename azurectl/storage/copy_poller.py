@@ -0,0 +1,154 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import time
+
+# project
+from ..logger import log
+
+
+class CopyPoller(object):
+    """
+        Tracks a set of server side blob copies in one poll loop,
+        each round fetches the copy properties of all pending copies.
+        The poll interval is the estimated time until the next copy
+        completes, based on the copy rate measured per copy, and
+        doubles while no copy makes progress. A copy whose properties
+        can't be fetched MAX_POLL_ERRORS times in a row is failed
+    """
+    MIN_POLL_INTERVAL = 1
+    MAX_POLL_INTERVAL = 60
+    MAX_POLL_ERRORS = 5
+
+    def __init__(self):
+        self.copies = []
+        self.interval = self.MIN_POLL_INTERVAL
+        self.start_time = time.time()
+
+    def add(self, name, blob_service, container, blob_name, copy):
+        """
+            Track the copy to the blob, copy are the copy properties
+            returned by the copy_blob request which started it
+        """
+        entry = {
+            'name': name,
+            'blob_service': blob_service,
+            'container': container,
+            'blob_name': blob_name,
+            'status': None,
+            'description': None,
+            'bytes_copied': 0,
+            'total_bytes': 0,
+            'poll_time': time.time(),
+            'rate': None,
+            'errors': 0
+        }
+        self.__update(entry, copy)
+        self.copies.append(entry)
+
+    def pending(self):
+        return [copy for copy in self.copies if copy['status'] == 'pending']
+
+    def failed(self):
+        return [
+            copy for copy in self.copies
+            if copy['status'] not in ('pending', 'success')
+        ]
+
+    def wait(self, progress=None):
+        """
+            Poll until no copy is pending, progress is called after
+            each poll round
+        """
+        while self.pending():
+            time.sleep(self.interval)
+            self.poll()
+            if progress:
+                progress()
+
+    def poll(self):
+        progressed = False
+        for copy in self.pending():
+            try:
+                properties = copy['blob_service'].get_blob_properties(
+                    copy['container'], copy['blob_name']
+                ).properties.copy
+            except Exception as e:
+                copy['errors'] += 1
+                log.debug(
+                    'Copy status of %s not available: %s',
+                    copy['name'], format(e)
+                )
+                if copy['errors'] >= self.MAX_POLL_ERRORS:
+                    copy['status'] = 'failed'
+                    copy['description'] = format(e)
+            else:
+                copy['errors'] = 0
+                if self.__update(copy, properties):
+                    progressed = True
+        self.interval = self.__next_interval(progressed)
+
+    def bytes_copied(self):
+        return sum(copy['bytes_copied'] for copy in self.copies)
+
+    def total_bytes(self):
+        return sum(copy['total_bytes'] for copy in self.copies)
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def throughput(self):
+        """
+            Aggregate copy rate of all copies in bytes per second
+        """
+        elapsed = self.elapsed()
+        if elapsed <= 0:
+            return 0
+        return self.bytes_copied() / elapsed
+
+    def __update(self, copy, properties):
+        """
+            Update the copy from its copy properties, returns True if
+            the copy has made progress since the last update
+        """
+        now = time.time()
+        progressed = False
+        copy['status'] = properties.status
+        copy['description'] = properties.status_description
+        if properties.progress:
+            bytes_copied, total_bytes = [
+                int(value) for value in properties.progress.split('/')
+            ]
+            if bytes_copied > copy['bytes_copied']:
+                if now > copy['poll_time']:
+                    copy['rate'] = \
+                        (bytes_copied - copy['bytes_copied']) / \
+                        (now - copy['poll_time'])
+                progressed = True
+            copy['bytes_copied'] = bytes_copied
+            copy['total_bytes'] = total_bytes
+        copy['poll_time'] = now
+        return progressed
+
+    def __next_interval(self, progressed):
+        if not progressed:
+            return min(self.interval * 2, self.MAX_POLL_INTERVAL)
+        estimates = [
+            (copy['total_bytes'] - copy['bytes_copied']) / copy['rate']
+            for copy in self.pending() if copy['rate']
+        ]
+        if not estimates:
+            return self.MIN_POLL_INTERVAL
+        return max(
+            self.MIN_POLL_INTERVAL, min(min(estimates), self.MAX_POLL_INTERVAL)
+        )
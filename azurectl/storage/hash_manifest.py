@@ -0,0 +1,150 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import hashlib
+import json
+
+# project
+from ..azurectl_exceptions import AzureHashManifestError
+
+
+class HashManifest(object):
+    """
+        MD5 digests of the consecutive range_size byte ranges of an
+        image. The manifest is stored as companion blob next to the
+        uploaded page blob and allows a later upload to send only
+        the ranges which differ from it. The image data is passed to
+        update in sequence, ranges of zeros can be passed as None
+    """
+    RANGE_SIZE = 4194304
+    SUFFIX = '.manifest'
+    VERSION = 1
+    ZERO_BLOCK_SIZE = 1048576
+
+    zero_digests = {}
+
+    def __init__(self, byte_size, range_size=None, digests=None):
+        self.byte_size = int(byte_size)
+        self.range_size = int(range_size or self.RANGE_SIZE)
+        self.digests = digests or []
+        self.position = 0
+        self.md5 = None
+        self.range_fill = 0
+
+    def update(self, length, data=None):
+        """
+            Account the next length bytes of the image, data is None
+            if they are all zero
+        """
+        offset = 0
+        while offset < length:
+            size = min(length - offset, self.range_size - self.range_fill)
+            if data is None and size == self.range_size:
+                self.digests.append(self.__zero_digest(size))
+            else:
+                if not self.md5:
+                    self.md5 = hashlib.md5()
+                if data is None:
+                    self.__update_zero(self.md5, size)
+                else:
+                    self.md5.update(data[offset:offset + size])
+                self.range_fill += size
+                if self.range_fill == self.range_size:
+                    self.__finish_range()
+            offset += size
+        self.position += length
+        if self.position >= self.byte_size and self.md5:
+            self.__finish_range()
+
+    def finish(self):
+        """
+            Complete the manifest if the image data ended before
+            byte_size, the rest of the blob is zero
+        """
+        if self.position < self.byte_size:
+            self.update(self.byte_size - self.position)
+
+    def digest(self, offset):
+        """
+            Digest of the range containing offset, None if the range
+            is not complete
+        """
+        index = offset // self.range_size
+        if index < len(self.digests):
+            return self.digests[index]
+
+    def matches(self, other, offset):
+        """
+            True if the range containing offset has the same digest
+            in both manifests
+        """
+        return self.range_size == other.range_size and \
+            self.digest(offset) is not None and \
+            self.digest(offset) == other.digest(offset)
+
+    def content_id(self):
+        """
+            Identifier of the image content described by the manifest
+        """
+        return hashlib.md5(json.dumps(
+            [self.byte_size, self.range_size, self.digests]
+        )).hexdigest()
+
+    def to_json(self):
+        return json.dumps({
+            'version': self.VERSION,
+            'byte_size': self.byte_size,
+            'range_size': self.range_size,
+            'digests': self.digests
+        })
+
+    @classmethod
+    def from_json(self, content):
+        try:
+            manifest = json.loads(content)
+            if manifest['version'] != self.VERSION:
+                raise ValueError(
+                    'Unsupported manifest version %s' % manifest['version']
+                )
+            return HashManifest(
+                manifest['byte_size'], manifest['range_size'],
+                manifest['digests']
+            )
+        except Exception as e:
+            raise AzureHashManifestError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+
+    @classmethod
+    def blob_name(self, blob_name):
+        return blob_name + self.SUFFIX
+
+    def __finish_range(self):
+        self.digests.append(self.md5.hexdigest())
+        self.md5 = None
+        self.range_fill = 0
+
+    @classmethod
+    def __zero_digest(self, size):
+        if size not in self.zero_digests:
+            md5 = hashlib.md5()
+            self.__update_zero(md5, size)
+            self.zero_digests[size] = md5.hexdigest()
+        return self.zero_digests[size]
+
+    @classmethod
+    def __update_zero(self, md5, size):
+        zero_block = bytes(bytearray(min(size, self.ZERO_BLOCK_SIZE)))
+        while size > 0:
+            md5.update(zero_block[:size])
+            size -= len(zero_block)
@@ -11,33 +11,51 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import base64
+import hashlib
+import time
+
+# project
 from ..azurectl_exceptions import (
-    AzurePageBlobZeroPageError,
     AzurePageBlobAlignmentViolation,
     AzurePageBlobSetupError,
     AzurePageBlobUpdateError
 )
+from ..utils.zero_page import ZeroPage
 
 
 class PageBlob(object):
     """
         Page blob iterator to control a stream of data to an Azure page blob
     """
-    def __init__(self, blob_service, blob_name, container, byte_size):
+    # server busy and internal errors indicate throttling
+    THROTTLING_STATUS = (500, 503)
+    THROTTLING_DELAY = 1
+
+    def __init__(
+        self, blob_service, blob_name, container, byte_size, create=True,
+        lease_id=None
+    ):
         """
             Create a new page blob of the specified byte_size with
             name blob_name in the specified container. An azure page
-            blob must be 512 byte aligned
+            blob must be 512 byte aligned. With create set to False
+            the existing blob is written to, e.g to resume an upload.
+            Pages of a leased blob are written with the lease_id
         """
         self.container = container
         self.blob_service = blob_service
         self.blob_name = blob_name
+        self.lease_id = lease_id
 
         self.__validate_page_alignment(byte_size)
 
         self.rest_bytes = byte_size
         self.page_start = 0
 
+        if not create:
+            return
+
         try:
             self.blob_service.create_blob(
                 self.container, self.blob_name, byte_size
@@ -48,6 +66,45 @@ class PageBlob(object):
             )
 
     def next(self, data_stream, max_chunk_byte_size=None, max_attempts=5):
+        for page_start, data in self.read_ranges(
+            data_stream, max_chunk_byte_size
+        ):
+            self.update_page(data, page_start, max_attempts)
+
+        return self.page_start
+
+    def read_ranges(
+        self, data_stream, max_chunk_byte_size=None, buffer=None
+    ):
+        """
+            Read the next chunk from data_stream and return the list
+            of (page_start, data) ranges from it which needs to be
+            uploaded. Zero pages are skipped, filesystem holes of a
+            data_stream providing skip_hole are not read at all.
+            If a buffer is given and data_stream provides readinto,
+            the chunk is read into the buffer and the ranges are
+            memoryview slices of it, valid until the buffer is reused.
+            A data_stream providing read_view, e.g a memory mapped
+            file, hands out views of its own data and needs no buffer
+        """
+        chunk_start = self.page_start
+        return self.data_ranges(
+            chunk_start,
+            self.read_chunk(data_stream, max_chunk_byte_size, buffer)
+        )
+
+    def read_chunk(
+        self, data_stream, max_chunk_byte_size=None, buffer=None,
+        partial_holes=True
+    ):
+        """
+            Read the next chunk from data_stream as described for
+            read_ranges and return its data. If the chunk is a skipped
+            filesystem hole None is returned, the chunk size is given
+            by the advance of page_start in any case. Without
+            partial_holes a hole is only skipped if it covers the
+            whole chunk
+        """
         if not max_chunk_byte_size:
             max_chunk_byte_size = self.blob_service.MAX_CHUNK_GET_SIZE
         max_chunk_byte_size = int(max_chunk_byte_size)
@@ -56,45 +113,134 @@ class PageBlob(object):
             self.rest_bytes, max_chunk_byte_size
         )
 
-        if requested_bytes != max_chunk_byte_size:
-            zero_page = self.__read_zero_page(requested_bytes)
+        if hasattr(data_stream, 'skip_hole'):
+            hole_bytes = data_stream.skip_hole(
+                requested_bytes, partial_holes
+            )
+            if hole_bytes:
+                self.rest_bytes -= hole_bytes
+                self.page_start += hole_bytes
+                return None
+
+        if hasattr(data_stream, 'read_view'):
+            data = data_stream.read_view(requested_bytes)
+        elif buffer is not None and hasattr(data_stream, 'readinto'):
+            view = memoryview(buffer)[:requested_bytes]
+            data = view[:data_stream.readinto(view)]
         else:
-            zero_page = self.__read_zero_page(max_chunk_byte_size)
-
-        data = data_stream.read(requested_bytes)
+            data = data_stream.read(requested_bytes)
 
         if not data:
             raise StopIteration()
 
-        length = len(data)
-        page_end = self.page_start + length - 1
-
-        if not data == zero_page:
-            upload_errors = []
-            while len(upload_errors) < max_attempts:
-                try:
-                    self.blob_service.update_page(
-                        self.container,
-                        self.blob_name,
-                        data,
-                        self.page_start,
-                        page_end
-                    )
-                    break
-                except Exception as e:
-                    upload_errors.append(
-                        '%s: %s' % (type(e).__name__, format(e))
-                    )
-
-            if len(upload_errors) == max_attempts:
-                raise AzurePageBlobUpdateError(
-                    'Page update failed with: %s' % '\n'.join(upload_errors)
-                )
+        self.rest_bytes -= len(data)
+        self.page_start += len(data)
 
-        self.rest_bytes -= length
-        self.page_start += length
+        return data
 
-        return self.page_start
+    @classmethod
+    def data_ranges(
+        self, chunk_start, data, max_range_size=None, scan_zero_pages=True
+    ):
+        """
+            List of (page_start, data) ranges of the non zero pages
+            in the chunk data starting at chunk_start, each of them
+            at most max_range_size bytes long. Without scan_zero_pages
+            the data is known to hold no zero pages and is not looked
+            at
+        """
+        if data is None:
+            return []
+        if scan_zero_pages:
+            chunk_ranges = ZeroPage.data_ranges(data)
+        else:
+            chunk_ranges = [(0, len(data))]
+        data_ranges = []
+        for offset, range_length in chunk_ranges:
+            range_end = offset + range_length
+            step = max_range_size or range_length
+            for range_offset in range(offset, range_end, step):
+                data_ranges.append((
+                    chunk_start + range_offset,
+                    data[range_offset:min(range_offset + step, range_end)]
+                ))
+        return data_ranges
+
+    @classmethod
+    def zero_ranges(self, chunk_start, chunk_end, data_ranges):
+        """
+            List of (page_start, length) ranges between chunk_start
+            and chunk_end which are not covered by data_ranges
+        """
+        zero_ranges = []
+        position = chunk_start
+        for page_start, data in data_ranges + [(chunk_end, b'')]:
+            if page_start > position:
+                zero_ranges.append((position, page_start - position))
+            position = page_start + len(data)
+        return zero_ranges
+
+    def update_page(
+        self, data, page_start, max_attempts=5, throttled=None
+    ):
+        """
+            Write data to the page range starting at page_start,
+            a failed request is retried up to max_attempts times.
+            The MD5 digest of the data is sent along, such that the
+            service rejects a range which got corrupted in transit.
+            As update_page is called by the upload worker threads,
+            the data is hashed while other ranges are transferred.
+            Requests rejected by the service due to load are retried
+            after an exponentially growing delay, the optional
+            throttled callback is called for each of them
+        """
+        if isinstance(data, memoryview):
+            # the storage api only accepts bytes as page content
+            data = data.tobytes()
+        self.__request(
+            self.blob_service.update_page, max_attempts, throttled,
+            self.container, self.blob_name, data,
+            page_start, page_start + len(data) - 1,
+            content_md5=base64.b64encode(hashlib.md5(data).digest()),
+            lease_id=self.lease_id
+        )
+
+    def clear_page(
+        self, page_start, byte_size, max_attempts=5, throttled=None
+    ):
+        """
+            Clear byte_size bytes starting at page_start, such that
+            they read as zeros. Retried like update_page
+        """
+        self.__request(
+            self.blob_service.clear_page, max_attempts, throttled,
+            self.container, self.blob_name,
+            page_start, page_start + byte_size - 1,
+            lease_id=self.lease_id
+        )
+
+    def __request(self, request, max_attempts, throttled, *args, **kwargs):
+        upload_errors = []
+        while len(upload_errors) < max_attempts:
+            try:
+                request(*args, **kwargs)
+                return
+            except Exception as e:
+                upload_errors.append(
+                    '%s: %s' % (type(e).__name__, format(e))
+                )
+                if getattr(e, 'status_code', None) in self.THROTTLING_STATUS:
+                    if throttled:
+                        throttled()
+                    if len(upload_errors) < max_attempts:
+                        time.sleep(
+                            self.THROTTLING_DELAY *
+                            2 ** (len(upload_errors) - 1)
+                        )
+
+        raise AzurePageBlobUpdateError(
+            'Page update failed with: %s' % '\n'.join(upload_errors)
+        )
 
     def __iter__(self):
         return self
@@ -105,12 +251,3 @@ class PageBlob(object):
             raise AzurePageBlobAlignmentViolation(
                 'Uncompressed size %d is not 512 byte aligned' % byte_size
             )
-
-    def __read_zero_page(self, requested_bytes):
-        try:
-            with open('/dev/zero', 'rb') as zero_stream:
-                return zero_stream.read(requested_bytes)
-        except Exception as e:
-            raise AzurePageBlobZeroPageError(
-                'Reading zero page failed with: %s' % format(e)
-            )
@@ -0,0 +1,163 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import os
+import time
+
+# project
+from ..defaults import Defaults
+from ..logger import log
+from .hash_manifest import HashManifest
+
+
+class PageHashCache(object):
+    """
+        Local content addressed cache of the hash manifests of
+        uploaded images. A source file is mapped by its path, size,
+        inode, modification and change time to the id of its content,
+        the content id to the hash manifest of the content and to the
+        blobs known to hold it. Blob locations are dicts with the
+        account, container, blob and etag keys. The cache is bounded
+        to max_ranges manifest ranges in total, the least recently
+        used contents are evicted first
+    """
+    CACHE_FILE = 'page_hash_cache.json'
+    MAX_RANGES = 262144
+    VERSION = 2
+
+    def __init__(self, cache_file=None, max_ranges=None):
+        self.cache_file = cache_file or os.path.join(
+            Defaults.cache_directory(), self.CACHE_FILE
+        )
+        self.max_ranges = max_ranges or self.MAX_RANGES
+        self.sources = {}
+        self.contents = {}
+        self.__load()
+
+    def lookup(self, image):
+        """
+            Hash manifest of the source file image, None if the file
+            is unknown or has changed since it was cached
+        """
+        content = self.contents.get(
+            self.sources.get(self.__source_key(image))
+        )
+        if not content:
+            return None
+        content['used'] = time.time()
+        return HashManifest(
+            content['byte_size'], content['range_size'], content['digests']
+        )
+
+    def locations(self, manifest):
+        """
+            List of the blob locations known to hold the content
+            described by manifest
+        """
+        content = self.contents.get(manifest.content_id())
+        if not content:
+            return []
+        return [dict(location) for location in content['blobs']]
+
+    def add(self, manifest, location, image=None):
+        """
+            Record that the blob location holds the content described
+            by manifest, which is the content of the source file image
+        """
+        content_id = manifest.content_id()
+        for content in self.contents.values():
+            # the blob has been overwritten
+            self.__remove_location(content, location)
+        content = self.contents.setdefault(content_id, {
+            'byte_size': manifest.byte_size,
+            'range_size': manifest.range_size,
+            'digests': manifest.digests,
+            'blobs': []
+        })
+        content['blobs'].append(dict(location))
+        content['used'] = time.time()
+        if image:
+            self.sources[self.__source_key(image)] = content_id
+        self.__evict()
+        self.save()
+
+    def remove(self, manifest, location):
+        """
+            Forget the blob location of the content described by
+            manifest, e.g because the blob has changed
+        """
+        content = self.contents.get(manifest.content_id())
+        if content:
+            self.__remove_location(content, location)
+            self.save()
+
+    def save(self):
+        content = {
+            'version': self.VERSION,
+            'sources': self.sources,
+            'contents': self.contents
+        }
+        try:
+            cache_directory = os.path.dirname(self.cache_file)
+            if not os.path.isdir(cache_directory):
+                os.makedirs(cache_directory)
+            with open(self.cache_file + '.tmp', 'w') as cache:
+                json.dump(content, cache)
+            os.rename(self.cache_file + '.tmp', self.cache_file)
+        except Exception as e:
+            log.warning(
+                'Page hash cache %s not writable: %s',
+                self.cache_file, format(e)
+            )
+
+    def __load(self):
+        try:
+            with open(self.cache_file, 'r') as cache:
+                content = json.load(cache)
+        except Exception:
+            return
+        if content.get('version') == self.VERSION:
+            self.sources = content['sources']
+            self.contents = content['contents']
+
+    def __evict(self):
+        cached_ranges = sum(
+            len(content['digests']) for content in self.contents.values()
+        )
+        while cached_ranges > self.max_ranges and len(self.contents) > 1:
+            content_id = min(
+                self.contents, key=lambda key: self.contents[key]['used']
+            )
+            cached_ranges -= len(self.contents.pop(content_id)['digests'])
+            for source, source_content_id in list(self.sources.items()):
+                if source_content_id == content_id:
+                    del self.sources[source]
+
+    def __remove_location(self, content, location):
+        content['blobs'] = [
+            cached for cached in content['blobs']
+            if self.__blob_key(cached) != self.__blob_key(location)
+        ]
+
+    def __blob_key(self, location):
+        return (location['account'], location['container'], location['blob'])
+
+    def __source_key(self, image):
+        image_stat = os.stat(image)
+        # full precision times and the inode, a file rewritten in
+        # the same second or replaced by another one has another key
+        return json.dumps([
+            os.path.abspath(image), image_stat.st_size,
+            image_stat.st_mtime, image_stat.st_ctime, image_stat.st_ino
+        ])
@@ -0,0 +1,181 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import bisect
+
+# project
+from ..utils.range_set import RangeSet
+from ..utils.zero_page import ZeroPage
+
+
+class RangeMap(object):
+    """
+        Map of the data and the zero areas of an image of byte_size
+        bytes. data_ranges are the sorted (start, length) ranges of
+        the pages holding data, all other pages are zero. The map
+        is computed by scanning the image once and allows a later
+        upload to skip the zero areas without looking at them
+    """
+    SCAN_CHUNK_SIZE = 4194304
+
+    def __init__(self, byte_size, data_ranges):
+        self.byte_size = int(byte_size)
+        self.data_ranges = [tuple(data_range) for data_range in data_ranges]
+        self.starts = [start for start, length in self.data_ranges]
+
+    def data_bytes(self):
+        return sum(length for start, length in self.data_ranges)
+
+    def zero_bytes(self):
+        return self.byte_size - self.data_bytes()
+
+    def duration(self, bandwidth):
+        """
+            Estimated upload time in seconds at bandwidth bytes per
+            second, only the data areas are uploaded
+        """
+        return self.data_bytes() / float(bandwidth)
+
+    def area_end(self, position):
+        """
+            End of the data or zero area containing position
+        """
+        data_end = self.__data_end(position)
+        if data_end:
+            return data_end
+        index = bisect.bisect_right(self.starts, position)
+        if index < len(self.starts):
+            return self.starts[index]
+        return max(self.byte_size, position)
+
+    def zero_size(self, position, max_size):
+        """
+            Size of the zero area at position, limited to max_size
+            bytes. Zero if position is in a data area
+        """
+        if self.__data_end(position):
+            return 0
+        return min(self.area_end(position) - position, max_size)
+
+    @classmethod
+    def scan(self, stream, byte_size=None, chunk_size=SCAN_CHUNK_SIZE):
+        """
+            Compute the range map of the first byte_size bytes of the
+            stream, without byte_size of the stream up to its end.
+            Filesystem holes of a stream providing skip_hole are not
+            read
+        """
+        data_ranges = RangeSet()
+        buffer = bytearray(chunk_size)
+        position = 0
+        while byte_size is None or position < byte_size:
+            size = chunk_size
+            if byte_size is not None:
+                size = min(chunk_size, byte_size - position)
+            if hasattr(stream, 'skip_hole'):
+                hole_size = stream.skip_hole(size)
+                if hole_size:
+                    position += hole_size
+                    continue
+            view = memoryview(buffer)[:size]
+            count = stream.readinto(view)
+            if not count:
+                break
+            for offset, length in ZeroPage.data_ranges(view[:count]):
+                data_ranges.add(position + offset, length)
+            position += count
+        if byte_size is None:
+            byte_size = position
+        return RangeMap(byte_size, data_ranges.ranges())
+
+    def __data_end(self, position):
+        # end of the data area containing position, None in zero areas
+        index = bisect.bisect_right(self.starts, position) - 1
+        if index >= 0:
+            start, length = self.data_ranges[index]
+            if position < start + length:
+                return start + length
+
+
+class RangeMapReader(object):
+    """
+        Reads a stream along the range map of its content. Zero
+        areas are skipped as holes, without reading them if the
+        stream provides skip. A read ends at the end of the data
+        area it started in, such that a chunk holds data only and
+        needs no detection of zero pages
+    """
+    SKIP_BUFFER_SIZE = 1048576
+
+    def __init__(self, stream, range_map):
+        self.stream = stream
+        self.range_map = range_map
+        self.position = 0
+
+    def read(self, size):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readinto(self, buffer):
+        view = memoryview(buffer)
+        view = view[:self.range_map.area_end(self.position) - self.position]
+        count = self.stream.readinto(view)
+        self.position += count
+        return count
+
+    def skip_hole(self, max_size, partial=True):
+        """
+            Skip over the zero area at the current position, see
+            SparseFile.skip_hole
+        """
+        hole_size = self.range_map.zero_size(self.position, max_size)
+        hole_size -= hole_size % ZeroPage.PAGE_SIZE
+        if not partial and hole_size < max_size:
+            hole_size = 0
+        if hole_size:
+            self.__skip(hole_size)
+        return hole_size
+
+    def close(self):
+        self.stream.close()
+
+    @classmethod
+    def open(self, stream, range_map):
+        if hasattr(stream, 'read_view'):
+            return MappedRangeMapReader(stream, range_map)
+        return RangeMapReader(stream, range_map)
+
+    def __skip(self, size):
+        self.position += size
+        if hasattr(self.stream, 'skip'):
+            self.stream.skip(size)
+            return
+        # sequential streams, e.g a decompressor, are read over
+        buffer = memoryview(bytearray(min(size, self.SKIP_BUFFER_SIZE)))
+        while size:
+            count = self.stream.readinto(buffer[:min(size, len(buffer))])
+            if not count:
+                return
+            size -= count
+
+
+class MappedRangeMapReader(RangeMapReader):
+    """
+        RangeMapReader handing out views of a memory mapped stream,
+        see MappedFile
+    """
+    def read_view(self, size):
+        area_size = self.range_map.area_end(self.position) - self.position
+        view = self.stream.read_view(min(size, area_size))
+        self.position += len(view)
+        return view
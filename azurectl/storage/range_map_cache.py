@@ -0,0 +1,102 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import os
+import time
+
+# project
+from ..defaults import Defaults
+from ..logger import log
+from .range_map import RangeMap
+
+
+class RangeMapCache(object):
+    """
+        Local cache of the range maps of scanned images. A map is
+        keyed by the path, size, inode, modification and change time
+        of the source file, and by the tar member and the raw
+        conversion the image is read with. The cache holds at most
+        max_maps maps, the least recently used ones are evicted first
+    """
+    CACHE_FILE = 'range_map_cache.json'
+    MAX_MAPS = 64
+    VERSION = 2
+
+    def __init__(self, cache_file=None, max_maps=None):
+        self.cache_file = cache_file or os.path.join(
+            Defaults.cache_directory(), self.CACHE_FILE
+        )
+        self.max_maps = max_maps or self.MAX_MAPS
+        self.maps = {}
+        self.__load()
+
+    def lookup(self, image, member=None, convert_raw=False):
+        """
+            Range map of the source file image, None if the file is
+            unknown or has changed since it was scanned
+        """
+        cached = self.maps.get(self.__source_key(image, member, convert_raw))
+        if not cached:
+            return None
+        cached['used'] = time.time()
+        return RangeMap(cached['byte_size'], cached['data_ranges'])
+
+    def add(self, range_map, image, member=None, convert_raw=False):
+        self.maps[self.__source_key(image, member, convert_raw)] = {
+            'byte_size': range_map.byte_size,
+            'data_ranges': range_map.data_ranges,
+            'used': time.time()
+        }
+        while len(self.maps) > self.max_maps:
+            del self.maps[
+                min(self.maps, key=lambda key: self.maps[key]['used'])
+            ]
+        self.save()
+
+    def save(self):
+        content = {
+            'version': self.VERSION,
+            'maps': self.maps
+        }
+        try:
+            cache_directory = os.path.dirname(self.cache_file)
+            if not os.path.isdir(cache_directory):
+                os.makedirs(cache_directory)
+            with open(self.cache_file + '.tmp', 'w') as cache:
+                json.dump(content, cache)
+            os.rename(self.cache_file + '.tmp', self.cache_file)
+        except Exception as e:
+            log.warning(
+                'Range map cache %s not writable: %s',
+                self.cache_file, format(e)
+            )
+
+    def __load(self):
+        try:
+            with open(self.cache_file, 'r') as cache:
+                content = json.load(cache)
+        except Exception:
+            return
+        if content.get('version') == self.VERSION:
+            self.maps = content['maps']
+
+    def __source_key(self, image, member, convert_raw):
+        image_stat = os.stat(image)
+        # full precision times and the inode, a file rewritten in
+        # the same second or replaced by another one has another key
+        return json.dumps([
+            os.path.abspath(image), image_stat.st_size,
+            image_stat.st_mtime, image_stat.st_ctime, image_stat.st_ino,
+            member, bool(convert_raw)
+        ])
@@ -0,0 +1,63 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+
+class StorageServiceFactory(object):
+    """
+        Shared storage service clients of the process. One client is
+        handed out per service class, storage account and endpoint,
+        and all clients of an account endpoint send their requests
+        through one HTTP session. The session keeps its connections
+        alive, such that subsequent requests skip the TCP and TLS
+        handshake. Its connection pool holds at least pool_size
+        connections per host, the largest concurrency any caller
+        asked for
+    """
+    POOL_SIZE = 10
+    lock = threading.Lock()
+    services = {}
+    sessions = {}
+
+    @classmethod
+    def service(
+        self, service_class, account_name, account_key,
+        endpoint_suffix, pool_size=None
+    ):
+        with self.lock:
+            session = self.__session(account_name, endpoint_suffix, pool_size)
+            key = (service_class, account_name, account_key, endpoint_suffix)
+            if key not in self.services:
+                self.services[key] = service_class(
+                    account_name,
+                    account_key,
+                    endpoint_suffix=endpoint_suffix,
+                    request_session=session
+                )
+            return self.services[key]
+
+    @classmethod
+    def __session(self, account_name, endpoint_suffix, pool_size):
+        key = (account_name, endpoint_suffix)
+        pool_size = max(int(pool_size or 0), self.POOL_SIZE)
+        session, session_pool_size = self.sessions.get(key, (None, 0))
+        if not session:
+            session = Session()
+        if pool_size > session_pool_size:
+            # requests in flight finish on the replaced pool
+            session.mount('https://', HTTPAdapter(pool_maxsize=pool_size))
+            self.sessions[key] = (session, pool_size)
+        return session
@@ -11,20 +11,49 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import datetime
 import os
+import sys
+import threading
+import time
+import uuid
+from azure.storage.blob.blockblobservice import BlockBlobService
 from azure.storage.blob.pageblobservice import PageBlobService
 from azure.storage.sharedaccesssignature import SharedAccessSignature
 
 # project
-from ..utils.xz import XZ
 from ..azurectl_exceptions import (
+    AzureStorageCopyError,
+    AzureStorageDownloadError,
     AzureStorageFileNotFound,
     AzureStorageStreamError,
     AzureStorageUploadError,
-    AzureStorageDeleteError
+    AzureStorageVerifyError,
+    AzureStorageDeleteError,
+    AzureWorkerPoolError
 )
 from ..utils.filetype import FileType
+from ..utils.buffer_pool import BufferPool
+from ..utils.mapped_file import MappedFile
+from ..utils.pipe_reader import PipeReader
+from ..utils.qcow2 import Qcow2
+from ..utils.range_set import RangeSet
+from ..utils.read_ahead import ReadAhead
+from ..utils.sparse_file import SparseFile
+from ..utils.sparse_writer import SparseWriter
+from ..utils.tar_member import TarMember
+from ..utils.vhd import VHD
+from ..utils.vmdk import VMDK
+from ..utils.worker_pool import WorkerPool
+from ..utils.xz_writer import XZWriter
+from .copy_poller import CopyPoller
+from .hash_manifest import HashManifest
 from .page_blob import PageBlob
+from .range_map import RangeMap, RangeMapReader
+from .service_factory import StorageServiceFactory
+from .upload_journal import UploadJournal
+from .upload_target import UploadTarget
+from .upload_tuner import UploadTuner
 from ..logger import log
 
 
@@ -35,6 +64,13 @@ class Storage(object):
     """
         Implements storage operations in Azure storage containers
     """
+    STDIN = '-'
+    UPLOAD_BUFFERS_PER_THREAD = 2
+    COPY_POLL_INTERVAL = 1
+    DIGEST_METADATA = 'azurectl_digest'
+    RANGE_SIZE_METADATA = 'azurectl_range_size'
+    SHARDS_METADATA = 'azurectl_shards'
+
     def __init__(self, account, container):
         self.account = account
         self.account_name = account.storage_name()
@@ -42,46 +78,439 @@ class Storage(object):
         self.blob_service_host_base = self.account.get_blob_service_host_base()
         self.container = container
         self.upload_status = {'current_bytes': 0, 'total_bytes': 0}
+        self.upload_status_lock = threading.Lock()
+        self.copy_status = {'current_bytes': 0, 'total_bytes': 0}
+        self.download_status = {'current_bytes': 0, 'total_bytes': 0}
+        self.download_status_lock = threading.Lock()
+        self.upload_targets = []
+        self.bytes_read = 0
 
-    def upload(self, image, name=None, max_chunk_size=None, max_attempts=5):
-        if not os.path.exists(image):
+    def upload(
+        self, image, name=None, max_chunk_size=None, max_attempts=5,
+        threads=None, resume=False, check_page_ranges=False,
+        byte_size=None, adaptive=False, base_blob=None, hash_cache=None,
+        targets=None, convert_raw=False, member=None, shard=None,
+        range_map_cache=None
+    ):
+        """
+            Upload image to a page blob. With image set to STDIN the
+            image data is read from stdin, which requires the blob
+            name and the byte_size of the blob to be specified. For
+            files byte_size defaults to the (uncompressed) image size,
+            it is required for formats which do not record the size.
+            In adaptive mode the chunk size and the concurrency are
+            tuned to the measured throughput, max_chunk_size and
+            threads are the upper limits then. With a base_blob the
+            blob starts as server side copy of it and only the ranges
+            which differ from the hash manifest of the base blob are
+            uploaded. A hash manifest of the image is stored next to
+            the blob in any case. With a hash_cache, a PageHashCache,
+            a source file whose content is known to exist in a blob
+            is copied server side from there without reading it, the
+            uploaded blob is recorded in the cache. The image is
+            uploaded to the additional (account_name, container,
+            blob_name) targets as well, it is read once and each
+            range is sent to all of them. If the upload to one of the
+            targets fails the others are continued. With convert_raw
+            the image is a raw disk image which is uploaded as fixed
+            VHD, padded to the VHD alignment and followed by the VHD
+            footer. byte_size is the size of the raw image then. qcow2
+            and sparse VMDK images are uploaded as their virtual disk,
+            the unallocated clusters are skipped without reading them.
+            With a member name the image is a tar archive, which may
+            be compressed, and the member is uploaded from it without
+            extracting it. The blob name and byte_size default to the
+            name and size of the member then. With a shard, a (number,
+            count) pair, the upload is one of count hosts uploading
+            the image to the same blob, each one only the page ranges
+            of its shard. Each completed shard is recorded in a
+            <blob>.shard-<number> block blob, the host completing the
+            last one stores the hash manifest. Shards are not combined with targets
+            or a base_blob. With a range_map_cache, a RangeMapCache,
+            the zero areas of a source file planned before are skipped
+            without reading them and the data areas are uploaded
+            without looking for zero pages, see plan
+        """
+        source = None
+        if image == self.STDIN:
+            if not member and not (name and byte_size):
+                raise AzureStorageStreamError(
+                    'Upload from stdin requires blob name and byte size'
+                )
+            source = PipeReader.open(sys.stdin.fileno())
+        elif not os.path.exists(image):
             raise AzureStorageFileNotFound('File %s not found' % image)
-        blob_service = PageBlobService(
-            self.account_name,
-            self.account_key,
-            endpoint_suffix=self.blob_service_host_base
-        )
 
-        image_type = FileType(image)
-        blob_name = (name or image_type.basename())
+        image_type = FileType(image, source)
+        stream = None
+        if member:
+            # the member size is only known from its header
+            stream = self.__open_stream(image, image_type, source, member)
+            blob_name = (name or os.path.basename(member))
+        else:
+            blob_name = (name or image_type.basename())
         if not name:
             log.info('blob-name: %s', blob_name)
-        image_size = self.__upload_byte_size(image, image_type)
+        if byte_size:
+            image_size = int(byte_size)
+        elif member:
+            image_size = stream.size
+        else:
+            image_size = self.__upload_byte_size(image, image_type)
+            if image_size is None:
+                raise AzureStorageStreamError(
+                    'Size of %s is unknown, a byte size is required' % image
+                )
+        if byte_size and not (source or member or image_type.decompressor()):
+            source_size = self.__upload_byte_size(image, image_type)
+            if image_size < source_size:
+                raise AzureStorageStreamError(
+                    'Byte size %d is smaller than the %d bytes of %s' %
+                    (image_size, source_size, image)
+                )
+        raw_size = image_size
+        if convert_raw:
+            image_size = VHD.fixed_size(raw_size)
+
+        # targets in one account send their ranges to the same host
+        account_names = [self.account_name] + [
+            account_name for account_name, container, target_blob_name
+            in targets or []
+        ]
+        upload_targets = [
+            self.__upload_target(
+                self.account_name, self.container, blob_name,
+                None if source else image,
+                int(threads or 1) * account_names.count(self.account_name)
+            )
+        ]
+        for account_name, container, target_blob_name in targets or []:
+            upload_targets.append(
+                self.__upload_target(
+                    account_name, container, target_blob_name or blob_name,
+                    None if source else image,
+                    int(threads or 1) * account_names.count(account_name)
+                )
+            )
 
+        self.upload_targets = []
+        for target in upload_targets:
+            target.shard = shard
+            if resume:
+                target.resumed = self.__resume_upload(
+                    target, image_size, check_page_ranges
+                )
+            if hash_cache and not (
+                source or member or target.resumed or base_blob or shard
+            ):
+                if self.__copy_cached(target, hash_cache, image, image_size):
+                    continue
+            if base_blob:
+                target.base_manifest = self.__load_manifest(target, base_blob)
+            if target.base_manifest and not target.resumed:
+                self.__copy_blob(
+                    target,
+                    None if base_blob == target.blob_name else
+                    target.blob_service.make_blob_url(
+                        target.container, base_blob
+                    ),
+                    image_size
+                )
+            self.upload_targets.append(target)
+        if not self.upload_targets:
+            self.__upload_status(image_size, image_size)
+            return
+
+        if not stream:
+            stream = self.__open_stream(image, image_type, source)
+        image_stream = stream
+        if convert_raw:
+            stream = VHD(stream, raw_size)
+        # the source must end with the image unless its size is known
+        check_stream_end = bool(
+            byte_size or image_type.decompressor() and not member
+        )
+        if range_map_cache and not (source or base_blob):
+            # a delta upload reads whole manifest ranges
+            range_map = range_map_cache.lookup(image, member, convert_raw)
+            if range_map and range_map.byte_size == image_size:
+                log.info(
+                    'Using range map, %d zero bytes skipped',
+                    range_map.zero_bytes()
+                )
+                stream = RangeMapReader.open(stream, range_map)
+                # the map was scanned to the end of the source
+                check_stream_end = False
         try:
-            stream = self.__open_upload_stream(image, image_type)
+            for target in self.upload_targets:
+                if target.shard:
+                    self.__join_shard(target, image_size)
+                target.created = not (
+                    target.resumed or target.base_manifest or target.shard
+                )
+                target.page_blob = PageBlob(
+                    target.blob_service, target.blob_name, target.container,
+                    image_size, create=target.created,
+                    lease_id=target.lease_id
+                )
+            self.__upload_status(0, image_size)
+            manifest = self.__upload_pages(
+                stream, image_size, max_chunk_size, max_attempts,
+                int(threads or 1), adaptive
+            )
+            if check_stream_end and \
+                    not any(target.error for target in self.upload_targets):
+                try:
+                    self.__check_stream_end(
+                        image_stream, 'stdin' if source else image, byte_size
+                    )
+                except AzureStorageStreamError:
+                    self.__delete_created_blobs()
+                    raise
+        except Exception as e:
+            self.__save_journals()
+            stream.close()
+            raise AzureStorageUploadError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        except KeyboardInterrupt:
+            self.__save_journals()
+            stream.close()
+            raise
+        stream.close()
+        for target in self.upload_targets:
+            if target.error:
+                target.journal.save()
+            elif target.shard and not self.__complete_shard(target):
+                # the manifest is stored by the host of the last shard
+                target.journal.delete()
+            else:
+                target.journal.delete()
+                self.__save_manifest(target, manifest)
+                if hash_cache:
+                    self.__cache_location(
+                        target, hash_cache, manifest,
+                        None if source or member else image
+                    )
+        failed = [target for target in self.upload_targets if target.error]
+        if failed:
+            raise AzureStorageUploadError('\n'.join([
+                'Upload to %s failed: %s' % (target.name(), target.error)
+                for target in failed
+            ]))
+        self.__upload_status(image_size, image_size)
+
+    def plan(
+        self, image, member=None, convert_raw=False, range_map_cache=None
+    ):
+        """
+            Scan the source file image for the data and zero areas
+            which an upload with the same member and convert_raw
+            options transfers and skips. With a range_map_cache, a
+            RangeMapCache, the range map is taken from the cache if
+            the file is unchanged since it was planned, and stored
+            there otherwise. Returns the RangeMap
+        """
+        if not os.path.exists(image):
+            raise AzureStorageFileNotFound('File %s not found' % image)
+        if range_map_cache:
+            range_map = range_map_cache.lookup(image, member, convert_raw)
+            if range_map:
+                return range_map
+        image_type = FileType(image)
+        stream = self.__open_stream(image, image_type, None, member)
+        try:
+            if member:
+                image_size = stream.size
+            else:
+                image_size = self.__upload_byte_size(image, image_type)
+            if image_size is None:
+                # the size is known once the image is read
+                range_map = RangeMap.scan(stream)
+                if convert_raw:
+                    range_map = self.__vhd_range_map(range_map)
+            else:
+                image_stream = stream
+                if convert_raw:
+                    stream = VHD(stream, image_size)
+                    image_size = VHD.fixed_size(image_size)
+                range_map = RangeMap.scan(stream, image_size)
+                if image_type.decompressor() and not member:
+                    self.__check_stream_end(image_stream, image)
         except Exception as e:
             raise AzureStorageStreamError(
                 '%s: %s' % (type(e).__name__, format(e))
             )
+        finally:
+            stream.close()
+        if range_map_cache:
+            range_map_cache.add(range_map, image, member, convert_raw)
+        return range_map
+
+    def copy(self, copies):
+        """
+            Server side copy of blobs, copies is a list of (source,
+            target) pairs of (account_name, container, blob_name)
+            tuples. All copies are started first and then tracked by
+            one CopyPoller until all of them have finished, a copy
+            which can't be started does not stop the others. Sources
+            in another storage account than their target are read by
+            a shared access signature. Returns the poller, which
+            provides the aggregate throughput of the copies
+        """
+        poller = CopyPoller()
+        failed = []
+        for source, target in copies:
+            account_name, container, blob_name = target
+            blob_service = self.__blob_service(account_name)
+            try:
+                copy = blob_service.copy_blob(
+                    container, blob_name, self.__blob_url(
+                        blob_service, account_name, *source
+                    )
+                )
+            except Exception as e:
+                failed.append('Copy to %s failed: %s: %s' % (
+                    '/'.join(target), type(e).__name__, format(e)
+                ))
+            else:
+                poller.add(
+                    '/'.join(target), blob_service, container, blob_name, copy
+                )
+        self.__copy_progress(poller)
+        poller.wait(lambda: self.__copy_progress(poller))
+        for copy in poller.failed():
+            failed.append('Copy to %s %s: %s' % (
+                copy['name'], copy['status'], copy['description']
+            ))
+        if failed:
+            raise AzureStorageCopyError('\n'.join(failed))
+        return poller
+
+    def download(
+        self, blob_name, file_name, max_chunk_size=None, threads=None,
+        compress=False
+    ):
+        """
+            Download the page blob to file_name. Only the valid page
+            ranges of the blob are fetched, by up to threads parallel
+            ranged reads of at most max_chunk_size bytes. The file is
+            written as sparse file of the blob size, areas of the blob
+            which hold no data remain holes. With compress the file is
+            written as xz stream, holes are compressed as zeros then
+        """
+        blob_service = self.__blob_service(self.account_name, threads)
+        if not max_chunk_size:
+            max_chunk_size = blob_service.MAX_CHUNK_GET_SIZE
+        max_chunk_size = int(max_chunk_size)
         try:
-            page_blob = PageBlob(
-                blob_service, blob_name, self.container, image_size
+            image_size = blob_service.get_blob_properties(
+                self.container, blob_name
+            ).properties.content_length
+            page_ranges = blob_service.get_page_ranges(
+                self.container, blob_name
             )
-            self.__upload_status(0, image_size)
-            while True:
-                bytes_transfered = page_blob.next(
-                    stream, max_chunk_size, max_attempts
+        except Exception as e:
+            raise AzureStorageDownloadError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        ranges = []
+        for page_range in page_ranges:
+            for start in range(
+                page_range.start, page_range.end + 1, max_chunk_size
+            ):
+                ranges.append(
+                    (start, min(max_chunk_size, page_range.end + 1 - start))
                 )
-                self.__upload_status(bytes_transfered, image_size)
-        except StopIteration:
-            stream.close()
-            self.__upload_status(image_size, image_size)
+        self.__download_status(0, sum(length for start, length in ranges))
+        try:
+            if compress:
+                writer = XZWriter(file_name, image_size, ranges)
+            else:
+                writer = SparseWriter(file_name, image_size)
         except Exception as e:
-            stream.close()
-            raise AzureStorageUploadError(
+            raise AzureStorageDownloadError(
                 '%s: %s' % (type(e).__name__, format(e))
             )
+        try:
+            pool = WorkerPool(int(threads or 1))
+            for start, length in ranges:
+                pool.submit(
+                    self.__download_range,
+                    blob_service, blob_name, writer, start, length
+                )
+            pool.join()
+        except Exception as e:
+            writer.abort()
+            writer.close()
+            raise AzureStorageDownloadError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        except KeyboardInterrupt:
+            writer.abort()
+            writer.close()
+            raise
+        writer.close()
+
+    def verify(self, blob_name, threads=None):
+        """
+            Check the page blob against the image digest stored in its
+            metadata on upload. The blob is hashed again range by
+            range of its hash manifest, up to threads ranges at a time.
+            Only the valid page ranges of the blob are read, areas
+            without data are hashed as zeros. If the digest differs,
+            the ranges which differ from the hash manifest stored next
+            to the blob are reported. Returns the image digest
+        """
+        blob_service = self.__blob_service(self.account_name, threads)
+        try:
+            blob = blob_service.get_blob_properties(self.container, blob_name)
+            page_ranges = blob_service.get_page_ranges(
+                self.container, blob_name
+            )
+        except Exception as e:
+            raise AzureStorageVerifyError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        expected_digest = blob.metadata.get(self.DIGEST_METADATA)
+        if not expected_digest:
+            raise AzureStorageVerifyError(
+                'Blob %s has no image digest' % blob_name
+            )
+        image_size = blob.properties.content_length
+        try:
+            range_size = int(blob.metadata[self.RANGE_SIZE_METADATA])
+        except (KeyError, ValueError):
+            range_size = 0
+        if range_size <= 0:
+            raise AzureStorageVerifyError(
+                'Blob %s has no valid range size' % blob_name
+            )
+        valid_ranges = RangeSet([
+            (page_range.start, page_range.end - page_range.start + 1)
+            for page_range in page_ranges
+        ])
+        digests = [None] * (-(-image_size // range_size))
+        try:
+            pool = WorkerPool(int(threads or 1))
+            for index in range(len(digests)):
+                pool.submit(
+                    self.__verify_range, blob_service, blob_name,
+                    valid_ranges, index, range_size, image_size, digests
+                )
+            pool.join()
+        except Exception as e:
+            raise AzureStorageVerifyError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        manifest = HashManifest(image_size, range_size, digests)
+        if manifest.content_id() != expected_digest:
+            raise AzureStorageVerifyError(
+                'Blob %s does not match its image digest%s' % (
+                    blob_name, self.__verify_report(blob_name, manifest)
+                )
+            )
+        return expected_digest
 
     def disk_image_sas(
         self,
@@ -109,17 +538,26 @@ class Storage(object):
         )
 
     def delete(self, image):
-        blob_service = PageBlobService(
-            self.account_name,
-            self.account_key,
-            endpoint_suffix=self.blob_service_host_base
-        )
+        """
+            Delete the page blob and the hash manifest stored next to
+            it on upload, if there is one
+        """
+        blob_service = self.__blob_service(self.account_name)
         try:
             blob_service.delete_blob(self.container, image)
         except Exception as e:
             raise AzureStorageDeleteError(
                 '%s: %s' % (type(e).__name__, format(e))
             )
+        try:
+            self.__manifest_service(self.account_name).delete_blob(
+                self.container, HashManifest.blob_name(image)
+            )
+        except Exception as e:
+            if getattr(e, 'status_code', None) != 404:
+                raise AzureStorageDeleteError(
+                    '%s: %s' % (type(e).__name__, format(e))
+                )
 
     def print_upload_status(self):
         log.progress(
@@ -128,16 +566,800 @@ class Storage(object):
             'Uploading'
         )
 
+    def print_download_status(self):
+        log.progress(
+            self.download_status['current_bytes'],
+            self.download_status['total_bytes'],
+            'Downloading'
+        )
+
+    def print_copy_status(self):
+        log.progress(
+            self.copy_status['current_bytes'],
+            self.copy_status['total_bytes'],
+            'Copying'
+        )
+
+    def __copy_progress(self, poller):
+        self.copy_status['current_bytes'] = poller.bytes_copied()
+        self.copy_status['total_bytes'] = poller.total_bytes()
+
+    def __download_status(self, current, total):
+        self.download_status['current_bytes'] = current
+        self.download_status['total_bytes'] = total
+
+    def __download_range(self, blob_service, blob_name, writer, start, length):
+        try:
+            data = blob_service.get_blob_to_bytes(
+                self.container, blob_name,
+                start_range=start, end_range=start + length - 1
+            ).content
+            writer.write_at(data, start)
+        except Exception:
+            # ranges waiting for this one to be written can't proceed
+            writer.abort()
+            raise
+        with self.download_status_lock:
+            self.download_status['current_bytes'] += length
+
+    def __verify_range(
+        self, blob_service, blob_name, valid_ranges, index, range_size,
+        image_size, digests
+    ):
+        start = index * range_size
+        length = min(range_size, image_size - start)
+        range_manifest = HashManifest(length, range_size)
+        position = start
+        for data_start, data_length in valid_ranges.intersection(
+            RangeSet([(start, length)])
+        ).ranges():
+            range_manifest.update(data_start - position)
+            range_manifest.update(data_length, blob_service.get_blob_to_bytes(
+                self.container, blob_name, start_range=data_start,
+                end_range=data_start + data_length - 1
+            ).content)
+            position = data_start + data_length
+        range_manifest.finish()
+        digests[index] = range_manifest.digests[0]
+
+    def __verify_report(self, blob_name, manifest):
+        try:
+            expected = HashManifest.from_json(
+                self.__manifest_service(self.account_name).get_blob_to_bytes(
+                    self.container, HashManifest.blob_name(blob_name)
+                ).content
+            )
+        except Exception as e:
+            log.debug('No hash manifest for %s: %s', blob_name, format(e))
+            return ''
+        offsets = [
+            str(offset) for offset in range(
+                0, manifest.byte_size, manifest.range_size
+            ) if not manifest.matches(expected, offset)
+        ]
+        return ', differing ranges at offsets: %s' % ' '.join(offsets)
+
     def __upload_status(self, current, total):
         self.upload_status['current_bytes'] = current
         self.upload_status['total_bytes'] = total
 
-    def __open_upload_stream(self, image, image_type):
-        if image_type.is_xz():
-            return XZ.open(image)
-        return open(image)
+    def __upload_target(
+        self, account_name, container, blob_name, image, threads
+    ):
+        """
+            Upload target for the blob, its journal is named after
+            the image and the target
+        """
+        target = UploadTarget(
+            account_name, self.__account_key(account_name), container,
+            blob_name, self.__blob_service(account_name, threads), None
+        )
+        target.journal = UploadJournal(image, target.name())
+        return target
+
+    def __blob_service(self, account_name, threads=None):
+        return StorageServiceFactory.service(
+            PageBlobService,
+            account_name,
+            self.__account_key(account_name),
+            self.blob_service_host_base,
+            threads
+        )
+
+    def __account_key(self, account_name):
+        if account_name == self.account_name:
+            return self.account_key
+        return self.account.storage_key(account_name)
+
+    def __save_journals(self):
+        for target in self.upload_targets:
+            target.journal.save()
+
+    def __resume_upload(self, target, image_size, check_page_ranges):
+        """
+            Load the upload journal and check that the blob it refers
+            to still exists with the expected size. Optionally the
+            uploaded ranges of the journal are checked against the
+            valid page ranges of the blob
+        """
+        if not target.journal.load():
+            log.warning(
+                'No upload journal for %s found, uploading from scratch',
+                target.blob_name
+            )
+            return False
+        try:
+            blob = target.blob_service.get_blob_properties(
+                target.container, target.blob_name
+            )
+        except Exception as e:
+            log.warning(
+                'Blob %s not accessible, uploading from scratch: %s',
+                target.blob_name, format(e)
+            )
+            return False
+        if blob.properties.content_length != image_size:
+            log.warning(
+                'Blob %s size mismatch, uploading from scratch',
+                target.blob_name
+            )
+            return False
+        if check_page_ranges:
+            try:
+                page_ranges = target.blob_service.get_page_ranges(
+                    target.container, target.blob_name
+                )
+            except Exception as e:
+                raise AzureStorageUploadError(
+                    '%s: %s' % (type(e).__name__, format(e))
+                )
+            target.journal.restrict_uploaded([
+                (page_range.start, page_range.end - page_range.start + 1)
+                for page_range in page_ranges
+            ])
+        log.info(
+            'Resuming upload of %s, %d bytes already committed',
+            target.blob_name, target.journal.committed_bytes()
+        )
+        return True
+
+    def __join_shard(self, target, image_size):
+        """
+            Create the blob of a sharded upload unless the host of
+            another shard did already, and lease it. All hosts of the
+            upload derive the same lease id from the blob, the image
+            size and the shard count, which lets them write to the
+            blob concurrently while other writers are kept off
+        """
+        number, count = target.shard
+        target.lease_id = str(uuid.uuid5(
+            uuid.NAMESPACE_URL,
+            '%s?size=%d&shards=%d' % (target.name(), image_size, count)
+        ))
+        blob_service = target.blob_service
+        try:
+            blob_service.create_blob(
+                target.container, target.blob_name, image_size,
+                metadata={self.SHARDS_METADATA: str(count)},
+                if_none_match='*'
+            )
+        except Exception as e:
+            if getattr(e, 'status_code', None) not in (409, 412):
+                raise
+            log.info('Joining upload to existing blob %s', target.blob_name)
+        else:
+            # records of an earlier upload to a blob of the same name
+            self.__delete_shard_records(target)
+        blob_service.acquire_blob_lease(
+            target.container, target.blob_name,
+            proposed_lease_id=target.lease_id
+        )
+        blob = blob_service.get_blob_properties(
+            target.container, target.blob_name
+        )
+        if blob.properties.content_length != image_size:
+            raise AzureStorageUploadError(
+                'Blob %s size does not match the image size' %
+                target.blob_name
+            )
+        if (blob.metadata or {}).get(self.SHARDS_METADATA) != str(count):
+            raise AzureStorageUploadError(
+                'Blob %s is not an upload of %d shards' %
+                (target.blob_name, count)
+            )
+        if number in self.__completed_shards(target):
+            log.info(
+                'Shard %d/%d of %s already completed, uploading again',
+                number, count, target.blob_name
+            )
+
+    def __complete_shard(self, target):
+        """
+            Record the shard of target as completed. Each shard has
+            its own record, a small block blob next to the blob, such
+            that the page writes of the other hosts do not interfere
+            with it. Returns True if all shards are completed, the
+            lease is released and the records are deleted then
+        """
+        number, count = target.shard
+        try:
+            self.__manifest_service(target.account_name).create_blob_from_text(
+                target.container,
+                self.__shard_record(target.blob_name, number),
+                target.lease_id
+            )
+            completed = self.__completed_shards(target)
+        except Exception as e:
+            raise AzureStorageUploadError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        if len(completed) < count:
+            log.info(
+                'Shard %d/%d of %s completed, waiting for shards %s',
+                number, count, target.blob_name, ' '.join(
+                    str(shard) for shard in range(1, count + 1)
+                    if shard not in completed
+                )
+            )
+            return False
+        try:
+            target.blob_service.release_blob_lease(
+                target.container, target.blob_name, target.lease_id
+            )
+        except Exception as e:
+            # the hosts of the last shards may complete at the same time
+            if getattr(e, 'status_code', None) != 409:
+                raise AzureStorageUploadError(
+                    '%s: %s' % (type(e).__name__, format(e))
+                )
+        try:
+            self.__delete_shard_records(target)
+        except Exception as e:
+            log.warning(
+                'Shard records of %s not deleted: %s',
+                target.blob_name, format(e)
+            )
+        return True
+
+    def __completed_shards(self, target):
+        number, count = target.shard
+        prefix = self.__shard_record(target.blob_name, '')
+        completed = set()
+        for blob in self.__manifest_service(target.account_name).list_blobs(
+            target.container, prefix=prefix
+        ):
+            shard = blob.name[len(prefix):]
+            if shard.isdigit() and 1 <= int(shard) <= count:
+                completed.add(int(shard))
+        return completed
+
+    def __delete_shard_records(self, target):
+        manifest_service = self.__manifest_service(target.account_name)
+        for shard in self.__completed_shards(target):
+            manifest_service.delete_blob(
+                target.container, self.__shard_record(target.blob_name, shard)
+            )
+
+    def __shard_record(self, blob_name, number):
+        return '%s.shard-%s' % (blob_name, number)
+
+    def __shard_range(self, shard, image_size):
+        """
+            (start, end) byte range of the shard, the image is split
+            into count parts at hash manifest range boundaries
+        """
+        number, count = shard
+        ranges = -(-image_size // HashManifest.RANGE_SIZE)
+        return tuple(
+            min(index * ranges // count * HashManifest.RANGE_SIZE, image_size)
+            for index in (number - 1, number)
+        )
+
+    def __shard_chunk_size(self, shard, image_size, chunk_start, chunk_size):
+        # chunks do not cross shard boundaries
+        for boundary in self.__shard_range(shard, image_size):
+            if boundary > chunk_start:
+                chunk_size = min(chunk_size, boundary - chunk_start)
+        return chunk_size
+
+    def __load_manifest(self, target, base_blob):
+        """
+            Hash manifest of base_blob, None if there is none usable
+            in which case the image is uploaded as a whole
+        """
+        try:
+            manifest_service = self.__manifest_service(target.account_name)
+            content = manifest_service.get_blob_to_bytes(
+                target.container, HashManifest.blob_name(base_blob)
+            ).content
+            base_manifest = HashManifest.from_json(content)
+        except Exception as e:
+            log.warning(
+                'No hash manifest for base blob %s, uploading as a whole: %s',
+                base_blob, format(e)
+            )
+            return None
+        if base_manifest.range_size != HashManifest.RANGE_SIZE:
+            log.warning(
+                'Hash manifest of base blob %s not compatible, '
+                'uploading as a whole', base_blob
+            )
+            return None
+        return base_manifest
+
+    def __save_manifest(self, target, manifest):
+        """
+            Store the hash manifest next to the blob and its content
+            id as image digest in the metadata of the blob
+        """
+        try:
+            manifest_service = self.__manifest_service(target.account_name)
+            manifest_service.create_blob_from_text(
+                target.container, HashManifest.blob_name(target.blob_name),
+                manifest.to_json()
+            )
+            target.blob_service.set_blob_metadata(
+                target.container, target.blob_name, {
+                    self.DIGEST_METADATA: manifest.content_id(),
+                    self.RANGE_SIZE_METADATA: str(manifest.range_size)
+                }
+            )
+        except Exception as e:
+            log.warning(
+                'Hash manifest for %s not stored: %s',
+                target.blob_name, format(e)
+            )
+
+    def __manifest_service(self, account_name):
+        return StorageServiceFactory.service(
+            BlockBlobService,
+            account_name,
+            self.__account_key(account_name),
+            self.blob_service_host_base
+        )
+
+    def __copy_blob(self, target, copy_source, image_size):
+        """
+            Server side copy of the blob at the copy_source url to
+            the target blob, resized to image_size if the sizes
+            differ. Without copy_source the blob is updated in place
+        """
+        blob_service = target.blob_service
+        try:
+            if copy_source:
+                self.__wait_for_copy(
+                    target, blob_service.copy_blob(
+                        target.container, target.blob_name, copy_source
+                    )
+                )
+            blob = blob_service.get_blob_properties(
+                target.container, target.blob_name
+            )
+            if blob.properties.content_length != image_size:
+                blob_service.resize_blob(
+                    target.container, target.blob_name, image_size
+                )
+        except AzureStorageUploadError:
+            raise
+        except Exception as e:
+            raise AzureStorageUploadError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+
+    def __copy_cached(self, target, hash_cache, image, image_size):
+        """
+            Copy the content of image from a blob the hash_cache knows
+            to hold it. Returns False if there is no such blob
+        """
+        manifest = hash_cache.lookup(image)
+        if not manifest or manifest.byte_size != image_size:
+            return False
+        for location in hash_cache.locations(manifest):
+            if self.__cached_location_valid(location, image_size):
+                source = (
+                    location['account'], location['container'],
+                    location['blob']
+                )
+                log.info('Copying %s from %s', image, '/'.join(source))
+                self.__copy_blob(
+                    target,
+                    None if '/'.join(source) == target.name() else
+                    self.__blob_url(
+                        target.blob_service, target.account_name,
+                        location['account'], location['container'],
+                        location['blob']
+                    ),
+                    image_size
+                )
+                self.__save_manifest(target, manifest)
+                self.__cache_location(target, hash_cache, manifest, image)
+                return True
+            else:
+                hash_cache.remove(manifest, location)
+        return False
+
+    def __cached_location_valid(self, location, image_size):
+        """
+            True if the blob of a cached location is unchanged
+        """
+        try:
+            blob = self.__blob_service(
+                location['account']
+            ).get_blob_properties(location['container'], location['blob'])
+        except Exception as e:
+            log.debug('Cached blob location not accessible: %s', format(e))
+            return False
+        return blob.properties.etag == location['etag'] and \
+            blob.properties.content_length == image_size
+
+    def __blob_url(
+        self, blob_service, target_account_name, account_name, container,
+        blob_name
+    ):
+        """
+            Copy source url of a blob for a copy to a blob of the
+            target account, blobs of another storage account are read
+            by a shared access signature
+        """
+        if account_name == target_account_name:
+            return blob_service.make_blob_url(container, blob_name)
+        start = datetime.datetime.utcnow()
+        sas = SharedAccessSignature(
+            account_name, self.__account_key(account_name)
+        )
+        signed_query = sas.generate_blob(
+            container,
+            blob_name,
+            permission='r',
+            expiry=(start + datetime.timedelta(days=1)).strftime(
+                ISO8061_FORMAT
+            ),
+            start=start.strftime(ISO8061_FORMAT)
+        )
+        return 'https://{}.blob.{}/{}/{}?{}'.format(
+            account_name,
+            self.blob_service_host_base,
+            container,
+            blob_name,
+            signed_query
+        )
+
+    def __cache_location(self, target, hash_cache, manifest, image):
+        try:
+            etag = target.blob_service.get_blob_properties(
+                target.container, target.blob_name
+            ).properties.etag
+        except Exception as e:
+            log.warning(
+                'Blob %s not added to page hash cache: %s',
+                target.blob_name, format(e)
+            )
+            return
+        hash_cache.add(manifest, {
+            'account': target.account_name,
+            'container': target.container,
+            'blob': target.blob_name,
+            'etag': etag
+        }, image)
+
+    def __wait_for_copy(self, target, copy):
+        while copy.status == 'pending':
+            time.sleep(self.COPY_POLL_INTERVAL)
+            copy = target.blob_service.get_blob_properties(
+                target.container, target.blob_name
+            ).properties.copy
+        if copy.status != 'success':
+            raise AzureStorageUploadError(
+                'Copy to %s %s: %s' % (
+                    target.blob_name, copy.status, copy.status_description
+                )
+            )
+
+    def __upload_pages(
+        self, stream, image_size, max_chunk_size, max_attempts, threads,
+        adaptive
+    ):
+        """
+            Keep up to threads page ranges per target in flight while
+            the next chunks are read ahead from the stream. Ranges
+            committed according to the journal of a target are not
+            uploaded again. The upload status of a target counts the
+            bytes read so far minus the bytes of its page ranges still
+            pending in the pool. Chunks are read into a fixed set of
+            reused buffers, a buffer returns to the pool once all page
+            ranges sliced from it are done for all targets. Returns
+            the hash manifest of the image
+        """
+        # all targets are fed from the read position of the first one
+        reader = self.upload_targets[0].page_blob
+        if not max_chunk_size:
+            max_chunk_size = reader.blob_service.MAX_CHUNK_GET_SIZE
+        manifest = HashManifest(image_size)
+        delta = any(target.base_manifest for target in self.upload_targets)
+        buffer_size = max_chunk_size
+        if delta:
+            # chunks are the manifest ranges to compare
+            buffer_size = max(buffer_size, manifest.range_size)
+        if hasattr(stream, 'read_view'):
+            # ranges are views of the mapped stream, buffers stay empty
+            # and only limit the number of chunks in flight
+            buffer_size = 0
+        for target in self.upload_targets:
+            target.tuner = UploadTuner(max_chunk_size, threads, adaptive)
+            target.pool = WorkerPool(threads)
+        buffers = BufferPool(
+            self.UPLOAD_BUFFERS_PER_THREAD * threads + 1, buffer_size
+        )
+        self.bytes_read = 0
+        try:
+            while True:
+                if all(target.error for target in self.upload_targets):
+                    # no target left to upload to, stop reading
+                    raise StopIteration()
+                buffer = buffers.get()
+                try:
+                    self.__upload_chunk(
+                        reader, stream, buffer, buffers, image_size,
+                        max_attempts, manifest, delta
+                    )
+                finally:
+                    buffers.release(buffer)
+                self.__upload_progress(self.upload_targets, image_size)
+        except StopIteration:
+            for target in self.upload_targets:
+                try:
+                    target.pool.join()
+                except AzureWorkerPoolError as e:
+                    target.error = format(e)
+        manifest.finish()
+        return manifest
+
+    def __upload_chunk(
+        self, reader, stream, buffer, buffers, image_size, max_attempts,
+        manifest, delta
+    ):
+        """
+            Read the next chunk and queue its page ranges for upload
+            to all targets which have not failed. In delta mode a
+            chunk is the rest of the current manifest range
+        """
+        active_targets = [
+            target for target in self.upload_targets if not target.error
+        ]
+        chunk_start = reader.page_start
+        if delta:
+            data = reader.read_chunk(
+                stream,
+                manifest.range_size - chunk_start % manifest.range_size,
+                buffer, partial_holes=False
+            )
+        else:
+            chunk_size = max(
+                [target.tuner.chunk_size for target in active_targets]
+            )
+            for target in active_targets:
+                if target.shard:
+                    chunk_size = self.__shard_chunk_size(
+                        target.shard, image_size, chunk_start, chunk_size
+                    )
+            data = reader.read_chunk(stream, chunk_size, buffer)
+        chunk_end = reader.page_start
+        with self.upload_status_lock:
+            self.bytes_read = chunk_end
+        manifest.update(chunk_end - chunk_start, data)
+        # a range map reader returns data areas only
+        scan_zero_pages = not isinstance(stream, RangeMapReader)
+        for target in active_targets:
+            try:
+                self.__queue_chunk(
+                    target, chunk_start, chunk_end, data, buffer, buffers,
+                    image_size, max_attempts, manifest, scan_zero_pages
+                )
+            except AzureWorkerPoolError as e:
+                target.error = format(e)
+                log.warning(
+                    'Upload to %s failed: %s', target.name(), target.error
+                )
+
+    def __queue_chunk(
+        self, target, chunk_start, chunk_end, data, buffer, buffers,
+        image_size, max_attempts, manifest, scan_zero_pages=True
+    ):
+        """
+            Queue the page ranges of the chunk for upload to target.
+            Against a base manifest a chunk is skipped as a whole if
+            unchanged, zero pages of a changed range are cleared as
+            the copied base blob may hold data there
+        """
+        journal = target.journal
+        if target.shard:
+            shard_start, shard_end = self.__shard_range(
+                target.shard, image_size
+            )
+            if not shard_start <= chunk_start < shard_end:
+                # uploaded by the host of another shard
+                journal.add_skipped([(chunk_start, chunk_end - chunk_start)])
+                return
+        if target.base_manifest and \
+                manifest.matches(target.base_manifest, chunk_start):
+            journal.add_skipped([(chunk_start, chunk_end - chunk_start)])
+            return
+        data_ranges = target.page_blob.data_ranges(
+            chunk_start, data, target.tuner.chunk_size, scan_zero_pages
+        )
+        zero_ranges = target.page_blob.zero_ranges(
+            chunk_start, chunk_end, data_ranges
+        )
+        if target.base_manifest:
+            for page_start, length in zero_ranges:
+                if not journal.is_committed(page_start, length):
+                    with self.upload_status_lock:
+                        target.pending_bytes += length
+                    target.pool.submit(
+                        self.__clear_page,
+                        target, page_start, length, max_attempts, image_size
+                    )
+        else:
+            journal.add_skipped(zero_ranges)
+        for page_start, data in data_ranges:
+            if journal.is_committed(page_start, len(data)):
+                continue
+            with self.upload_status_lock:
+                target.pending_bytes += len(data)
+            buffers.retain(buffer)
+            try:
+                target.pool.submit(
+                    self.__upload_page,
+                    target, data, page_start, max_attempts, image_size,
+                    buffers, buffer,
+                    cleanup=lambda: buffers.release(buffer)
+                )
+            except AzureWorkerPoolError:
+                buffers.release(buffer)
+                raise
+
+    def __upload_page(
+        self, target, data, page_start, max_attempts, image_size,
+        buffers, buffer
+    ):
+        target.tuner.acquire()
+        try:
+            target.page_blob.update_page(
+                data, page_start, max_attempts, target.tuner.throttled
+            )
+        finally:
+            target.tuner.release()
+            buffers.release(buffer)
+        target.tuner.completed(len(data))
+        target.journal.add_uploaded(page_start, len(data))
+        with self.upload_status_lock:
+            target.pending_bytes -= len(data)
+        self.__upload_progress([target], image_size)
+
+    def __clear_page(
+        self, target, page_start, length, max_attempts, image_size
+    ):
+        target.tuner.acquire()
+        try:
+            target.page_blob.clear_page(
+                page_start, length, max_attempts, target.tuner.throttled
+            )
+        finally:
+            target.tuner.release()
+        target.journal.add_uploaded(page_start, length)
+        with self.upload_status_lock:
+            target.pending_bytes -= length
+        self.__upload_progress([target], image_size)
+
+    def __upload_progress(self, targets, total):
+        """
+            Update the status of the given targets, the overall upload
+            status is the one of the slowest target which has not failed
+        """
+        with self.upload_status_lock:
+            for target in targets:
+                target.status['current_bytes'] = \
+                    self.bytes_read - target.pending_bytes
+                target.status['total_bytes'] = total
+            current = [
+                target.status['current_bytes']
+                for target in self.upload_targets if not target.error
+            ]
+            if current:
+                self.__upload_status(min(current), total)
+
+    def __open_stream(self, image, image_type, source, member=None):
+        try:
+            stream = self.__open_upload_stream(image, image_type, source)
+        except Exception as e:
+            raise AzureStorageStreamError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        if not member:
+            return stream
+        try:
+            return TarMember(stream, member)
+        except Exception as e:
+            stream.close()
+            raise AzureStorageStreamError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+
+    def __open_upload_stream(self, image, image_type, source):
+        if source:
+            if image_type.is_qcow2() or image_type.is_vmdk():
+                raise AzureStorageStreamError(
+                    'qcow2 and VMDK images can not be read from stdin'
+                )
+            # sequential decompression, block offsets are unknown
+            decompressor = image_type.decompressor()
+            if decompressor:
+                return ReadAhead(decompressor(source))
+            return source
+        decompressor = image_type.decompressor()
+        if decompressor:
+            return decompressor.open(image)
+        if image_type.is_qcow2():
+            return Qcow2.open(image)
+        if image_type.is_vmdk():
+            return VMDK.open(image)
+        try:
+            return MappedFile.open(image)
+        except (EnvironmentError, ValueError) as e:
+            # e.g empty files or devices can't be mapped
+            log.debug('Reading %s without mapping: %s', image, format(e))
+            return SparseFile.open(image)
+
+    def __check_stream_end(self, stream, image, byte_size=None):
+        """
+            Raise if the stream holds data behind the image size, the
+            given byte_size or the size taken from the file, e.g a
+            gzip file larger than 4GB, which records its size modulo
+            4GB only
+        """
+        if not stream.readinto(bytearray(1)):
+            return
+        if byte_size:
+            raise AzureStorageStreamError(
+                '%s holds more data than the byte size %s' %
+                (image, byte_size)
+            )
+        raise AzureStorageStreamError(
+            '%s holds more data than its recorded size, '
+            'a byte size is required' % image
+        )
+
+    def __delete_created_blobs(self):
+        """
+            Delete the blobs this upload created, they do not hold
+            the complete image
+        """
+        for target in self.upload_targets:
+            if target.created:
+                try:
+                    target.blob_service.delete_blob(
+                        target.container, target.blob_name
+                    )
+                except Exception as e:
+                    log.warning(
+                        'Blob %s not deleted: %s', target.name(), format(e)
+                    )
+
+    def __vhd_range_map(self, range_map):
+        # the raw image padded to the VHD alignment and the footer
+        byte_size = VHD.fixed_size(range_map.byte_size)
+        return RangeMap(
+            byte_size, range_map.data_ranges + [
+                (byte_size - VHD.FOOTER_SIZE, VHD.FOOTER_SIZE)
+            ]
+        )
 
     def __upload_byte_size(self, image, image_type):
-        if image_type.is_xz():
-            return XZ.uncompressed_size(image)
+        decompressor = image_type.decompressor()
+        if decompressor:
+            return decompressor.uncompressed_size(image)
+        if image_type.is_qcow2():
+            return Qcow2.virtual_size(image)
+        if image_type.is_vmdk():
+            return VMDK.virtual_size(image)
         return os.path.getsize(image)
@@ -0,0 +1,155 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import hashlib
+import json
+import os
+import threading
+import time
+
+# project
+from ..logger import log
+from ..utils.range_set import RangeSet
+
+
+class UploadJournal(object):
+    """
+        Record of the page ranges of an upload which are committed
+        to the page blob. The journal is stored next to the source
+        image and allows to resume an interrupted upload. Ranges
+        written by an update_page request are tracked separately
+        from the skipped zero ranges, such that the uploaded ones
+        can be checked against the valid page ranges of the blob.
+        For an image which is not a file, e.g read from stdin, image
+        is None and the journal is kept in memory only. The journal
+        is named after the image and the target blob, given as
+        account/container/blob, such that uploads of an image to
+        several blobs are journaled and resumed independently
+    """
+    SAVE_INTERVAL = 10
+
+    def __init__(self, image, target):
+        self.journal_file = None
+        self.key = None
+        if image:
+            self.journal_file = '%s.%s.upload-journal' % (
+                image, hashlib.md5(target).hexdigest()[:8]
+            )
+            image_stat = os.stat(image)
+            # full precision times and the inode, a file rewritten in
+            # the same second or replaced by another one has another key
+            self.key = {
+                'source': os.path.abspath(image),
+                'size': image_stat.st_size,
+                'mtime': image_stat.st_mtime,
+                'ctime': image_stat.st_ctime,
+                'inode': image_stat.st_ino,
+                'blob': target
+            }
+        self.uploaded = RangeSet()
+        self.skipped = RangeSet()
+        self.committed = RangeSet()
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.last_save = time.time()
+        self.writable = self.journal_file is not None
+
+    def load(self):
+        """
+            Read the committed ranges from the journal file. Returns
+            False if there is no journal for the source image and
+            blob, in which case the upload has to start from scratch
+        """
+        if not self.journal_file:
+            return False
+        try:
+            with open(self.journal_file, 'r') as journal:
+                content = json.load(journal)
+        except Exception:
+            return False
+        if content.get('key') != self.key:
+            return False
+        self.uploaded = RangeSet(content['uploaded'])
+        self.skipped = RangeSet(content['skipped'])
+        self.__update_committed()
+        return True
+
+    def is_committed(self, start, length):
+        with self.lock:
+            return self.committed.contains(start, length)
+
+    def add_uploaded(self, start, length):
+        with self.lock:
+            self.uploaded.add(start, length)
+            self.committed.add(start, length)
+        self.__save_if_due()
+
+    def add_skipped(self, skipped_ranges):
+        """
+            Record the given (start, length) ranges as skipped
+        """
+        with self.lock:
+            for start, length in skipped_ranges:
+                self.skipped.add(start, length)
+                self.committed.add(start, length)
+        self.__save_if_due()
+
+    def restrict_uploaded(self, page_ranges):
+        """
+            Drop uploaded ranges which are not part of the given
+            (start, length) list of valid page ranges of the blob
+        """
+        with self.lock:
+            self.uploaded = self.uploaded.intersection(
+                RangeSet(page_ranges)
+            )
+            self.__update_committed()
+
+    def committed_bytes(self):
+        with self.lock:
+            return self.committed.byte_size()
+
+    def save(self):
+        with self.save_lock:
+            if not self.writable:
+                return
+            with self.lock:
+                content = {
+                    'key': self.key,
+                    'uploaded': self.uploaded.ranges(),
+                    'skipped': self.skipped.ranges()
+                }
+                self.last_save = time.time()
+            try:
+                with open(self.journal_file + '.tmp', 'w') as journal:
+                    json.dump(content, journal)
+                os.rename(self.journal_file + '.tmp', self.journal_file)
+            except Exception as e:
+                log.warning(
+                    'Upload journal %s not writable, resume disabled: %s',
+                    self.journal_file, format(e)
+                )
+                self.writable = False
+
+    def delete(self):
+        if self.journal_file and os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+    def __update_committed(self):
+        self.committed = RangeSet(
+            self.uploaded.ranges() + self.skipped.ranges()
+        )
+
+    def __save_if_due(self):
+        if time.time() - self.last_save > self.SAVE_INTERVAL:
+            self.save()
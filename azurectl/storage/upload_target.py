@@ -0,0 +1,50 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+class UploadTarget(object):
+    """
+        Page blob an image is uploaded to, along with the state of
+        the upload to it. Each target has its own journal, worker
+        pool and tuner, such that the upload to it is retried and
+        makes progress independently of other targets. A target
+        which has failed has its error set. The target of a sharded
+        upload has its (number, count) shard and the lease_id under
+        which all hosts write to the shared blob. A target whose
+        blob is created by the upload has created set
+    """
+    def __init__(
+        self, account_name, account_key, container, blob_name,
+        blob_service, journal
+    ):
+        self.account_name = account_name
+        self.account_key = account_key
+        self.container = container
+        self.blob_name = blob_name
+        self.blob_service = blob_service
+        self.journal = journal
+        self.resumed = False
+        self.base_manifest = None
+        self.shard = None
+        self.lease_id = None
+        self.created = False
+        self.page_blob = None
+        self.pool = None
+        self.tuner = None
+        self.pending_bytes = 0
+        self.error = None
+        self.status = {'current_bytes': 0, 'total_bytes': 0}
+
+    def name(self):
+        return '/'.join([self.account_name, self.container, self.blob_name])
@@ -0,0 +1,123 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+import time
+
+# project
+from ..logger import log
+
+
+class UploadTuner(object):
+    """
+        Choice of the page range size and the number of concurrent
+        requests of a page blob upload. In adaptive mode the upload
+        throughput is measured over windows of WINDOW_REQUESTS
+        successful requests. After each window the chunk size is
+        doubled or halved within MIN_CHUNK_SIZE and max_chunk_size,
+        the direction turns when the throughput drops. A throttled
+        request halves the chunk size and the number of concurrent
+        requests, which grows again by one per window.
+        Without adaptive mode the initial values are kept
+    """
+    WINDOW_REQUESTS = 8
+    MIN_CHUNK_SIZE = 65536
+    INITIAL_CHUNK_SIZE = 1048576
+    TOLERANCE = 0.05
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, max_chunk_size, max_concurrency, adaptive=False):
+        self.max_chunk_size = int(max_chunk_size)
+        self.max_concurrency = int(max_concurrency)
+        self.adaptive = adaptive
+        self.chunk_size = self.max_chunk_size
+        if adaptive:
+            self.chunk_size = self.__limit(self.INITIAL_CHUNK_SIZE)
+        self.concurrency = self.max_concurrency
+        self.active = 0
+        self.grow = True
+        self.throughput = None
+        self.condition = threading.Condition()
+        self.__start_window()
+
+    def acquire(self):
+        """
+            Wait until one more request may be issued concurrently
+        """
+        with self.condition:
+            while self.active >= self.concurrency:
+                # wait with timeout to stay interruptible
+                self.condition.wait(self.POLL_INTERVAL)
+            self.active += 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def completed(self, byte_size):
+        """
+            Account a successful request of byte_size bytes
+        """
+        if not self.adaptive:
+            return
+        with self.condition:
+            self.window_bytes += byte_size
+            self.window_requests += 1
+            if self.window_requests < self.WINDOW_REQUESTS:
+                return
+            elapsed = max(time.time() - self.window_start, 1e-6)
+            throughput = self.window_bytes / elapsed
+            if self.throughput and \
+                    throughput < self.throughput * (1 - self.TOLERANCE):
+                self.grow = not self.grow
+            self.throughput = throughput
+            if self.grow:
+                self.chunk_size = self.__limit(self.chunk_size * 2)
+            else:
+                self.chunk_size = self.__limit(self.chunk_size // 2)
+            self.concurrency = min(self.concurrency + 1, self.max_concurrency)
+            log.debug(
+                'Upload at %.1f MB/s, chunk size %d bytes, %d concurrent',
+                throughput / 1048576, self.chunk_size, self.concurrency
+            )
+            self.__start_window()
+            self.condition.notify_all()
+
+    def throttled(self):
+        """
+            Account a request rejected by the service due to load
+        """
+        if not self.adaptive:
+            return
+        with self.condition:
+            self.chunk_size = self.__limit(self.chunk_size // 2)
+            self.concurrency = max(self.concurrency // 2, 1)
+            self.grow = False
+            self.throughput = None
+            log.debug(
+                'Upload throttled, chunk size %d bytes, %d concurrent',
+                self.chunk_size, self.concurrency
+            )
+            self.__start_window()
+
+    def __start_window(self):
+        self.window_start = time.time()
+        self.window_bytes = 0
+        self.window_requests = 0
+
+    def __limit(self, chunk_size):
+        return max(
+            min(chunk_size, self.max_chunk_size),
+            min(self.MIN_CHUNK_SIZE, self.max_chunk_size)
+        )
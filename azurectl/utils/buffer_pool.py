@@ -0,0 +1,68 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+from queue import (
+    Queue,
+    Empty
+)
+
+
+class BufferPool(object):
+    """
+        Pool of reusable bytearray buffers of buffer_size bytes.
+        At most buffer_count buffers are allocated, thus get blocks
+        until a buffer is released if all of them are in use. A buffer
+        can be shared by several users and returns to the pool when
+        the last of them has released it
+    """
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, buffer_count, buffer_size):
+        self.buffer_count = int(buffer_count)
+        self.buffer_size = int(buffer_size)
+        self.free = Queue()
+        self.allocated = 0
+        self.users = {}
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+            Take a buffer from the pool, the caller is its first user
+        """
+        with self.lock:
+            if self.free.empty() and self.allocated < self.buffer_count:
+                self.free.put(bytearray(self.buffer_size))
+                self.allocated += 1
+        while True:
+            try:
+                # get with timeout to stay interruptible
+                buffer = self.free.get(True, self.POLL_INTERVAL)
+                break
+            except Empty:
+                pass
+        with self.lock:
+            self.users[id(buffer)] = 1
+        return buffer
+
+    def retain(self, buffer):
+        with self.lock:
+            self.users[id(buffer)] += 1
+
+    def release(self, buffer):
+        with self.lock:
+            self.users[id(buffer)] -= 1
+            if self.users[id(buffer)]:
+                return
+            del self.users[id(buffer)]
+        self.free.put(buffer)
@@ -0,0 +1,318 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import binascii
+from collections import namedtuple
+import bz2
+import multiprocessing
+import os
+
+# project
+from .parallel_decompressor import ParallelDecompressor
+from .read_ahead import ReadAhead
+from ..azurectl_exceptions import AzureBZip2Error
+
+BZip2Block = namedtuple(
+    'BZip2Block', 'level start_bit end_bit'
+)
+
+BZIP2_HEADER_MAGIC = b'BZh'
+BZIP2_BLOCK_MAGIC = 0x314159265359
+BZIP2_EOS_MAGIC = 0x177245385090
+BZIP2_MAGIC_BITS = 48
+BZIP2_CRC_BITS = 32
+
+
+def decompress_block(file_name, block):
+    """
+        Decompress one block of a bzip2 file. The block is wrapped
+        into a single block bzip2 stream of its own, which allows to
+        use the standard bzip2 decoder in a worker process
+    """
+    with open(file_name, 'rb') as bzip2_file:
+        bzip2_file.seek(block.start_bit // 8)
+        block_data = bzip2_file.read(
+            (block.end_bit + 7) // 8 - block.start_bit // 8
+        )
+    return bz2.decompress(BZip2.single_block_stream(block, block_data))
+
+
+class BZip2(object):
+    """
+        Implements decompression of bzip2 compressed files, files of
+        concatenated bzip2 streams are decompressed as one stream
+    """
+    BZIP2_STREAM_BUFFER_SIZE = 1048576
+    SCAN_BUFFER_SIZE = 16777216
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, bzip2_stream, buffer_size=BZIP2_STREAM_BUFFER_SIZE):
+        self.bzip2_stream = bzip2_stream
+        self.buffer_size = int(buffer_size)
+        self.decompressor = bz2.BZ2Decompressor()
+        self.output = b''
+        self.output_offset = 0
+        self.finished = False
+
+    def read(self, size):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readinto(self, buffer):
+        """
+            Decompress into the given writable buffer, returns the
+            number of bytes unpacked which is only less than the
+            buffer size at the end of the stream
+        """
+        view = memoryview(buffer)
+        bytes_read = 0
+        while bytes_read < len(view):
+            if self.output_offset == len(self.output):
+                if not self.__decompress():
+                    break
+            count = min(
+                len(view) - bytes_read, len(self.output) - self.output_offset
+            )
+            view[bytes_read:bytes_read + count] = \
+                self.output[self.output_offset:self.output_offset + count]
+            self.output_offset += count
+            bytes_read += count
+        return bytes_read
+
+    def close(self):
+        self.bzip2_stream.close()
+
+    @classmethod
+    def open(
+        self, file_name, buffer_size=BZIP2_STREAM_BUFFER_SIZE, processes=None
+    ):
+        """
+            Open bzip2 file for reading. Files with more than one block
+            are decompressed block parallel by the given number of
+            processes, by default one per cpu. Single block files are
+            decompressed as one stream in a read ahead thread
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if processes > 1:
+            blocks = self.blocks(file_name)
+            if len(blocks) > 1:
+                return ParallelBZip2(file_name, blocks, processes)
+        return ReadAhead(BZip2(open(file_name, 'rb'), buffer_size))
+
+    @classmethod
+    def blocks(self, file_name):
+        """
+            List of BZip2Block information for all blocks in all
+            streams of the bzip2 file. bzip2 has no index, the blocks
+            are located by scanning the file for the bit aligned block
+            and end of stream magic numbers, no block is decompressed
+        """
+        try:
+            with open(file_name, 'rb') as bzip2_file:
+                return self.__read_blocks(bzip2_file)
+        except AzureBZip2Error:
+            raise
+        except Exception as e:
+            raise AzureBZip2Error(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+
+    @classmethod
+    def uncompressed_size(self, file_name):
+        """
+            bzip2 does not store the uncompressed size, thus it is
+            unknown before the file is decompressed. Returns None,
+            the size has to be given or counted while reading
+        """
+        return None
+
+    @classmethod
+    def single_block_stream(self, block, block_data):
+        """
+            Wrap the block into a valid bzip2 stream consisting of the
+            stream header, the block shifted to a byte boundary and the
+            end of stream marker. block_data are the bytes holding the
+            bits of the block. The combined CRC of a stream with one
+            block is the CRC of the block
+        """
+        bits = block.end_bit - block.start_bit
+        value = int(binascii.hexlify(block_data), 16)
+        value >>= len(block_data) * 8 - block.start_bit % 8 - bits
+        value &= (1 << bits) - 1
+        block_crc = (value >> (bits - BZIP2_MAGIC_BITS - BZIP2_CRC_BITS)) & \
+            0xffffffff
+        value = (value << BZIP2_MAGIC_BITS | BZIP2_EOS_MAGIC) << \
+            BZIP2_CRC_BITS | block_crc
+        bits += BZIP2_MAGIC_BITS + BZIP2_CRC_BITS
+        padding = -bits % 8
+        value <<= padding
+        stream_data = binascii.unhexlify(
+            ('%x' % value).zfill((bits + padding) // 4)
+        )
+        return BZIP2_HEADER_MAGIC + block.level + stream_data
+
+    @classmethod
+    def __read_blocks(self, bzip2_file):
+        file_size = os.fstat(bzip2_file.fileno()).st_size
+        magics = self.__find_magics(bzip2_file)
+        blocks = []
+        stream_start = 0
+        level = None
+        for index, (bit, magic) in enumerate(magics):
+            if level is None:
+                level = self.__stream_level(bzip2_file, stream_start)
+                if bit != (stream_start + 4) * 8:
+                    raise AzureBZip2Error(
+                        'Invalid bzip2 stream in %s' % bzip2_file.name
+                    )
+            if magic == BZIP2_BLOCK_MAGIC:
+                if index + 1 == len(magics):
+                    break
+                blocks.append(
+                    BZip2Block(
+                        level=level, start_bit=bit,
+                        end_bit=magics[index + 1][0]
+                    )
+                )
+            else:
+                # the stream ends with the byte of the combined crc
+                stream_start = (
+                    bit + BZIP2_MAGIC_BITS + BZIP2_CRC_BITS + 7
+                ) // 8
+                level = None
+        if level is not None or stream_start != file_size:
+            raise AzureBZip2Error(
+                'Truncated bzip2 stream in %s' % bzip2_file.name
+            )
+        return blocks
+
+    @classmethod
+    def __stream_level(self, bzip2_file, stream_start):
+        bzip2_file.seek(stream_start)
+        header = bzip2_file.read(4)
+        if not header.startswith(BZIP2_HEADER_MAGIC) or \
+                header[3:4] not in b'123456789':
+            raise AzureBZip2Error(
+                'No bzip2 stream header in %s' % bzip2_file.name
+            )
+        return header[3:4]
+
+    @classmethod
+    def __find_magics(self, bzip2_file):
+        """
+            Sorted list of (bit offset, magic) of the block and end of
+            stream magic numbers in the file. Each magic is searched as
+            byte pattern for each of the eight bit shifts, the matches
+            are checked against the full magic number
+        """
+        magics = set()
+        # a magic spans at most seven bytes, one which starts in the
+        # last six bytes is found with the next part of the file
+        overlap = 6
+        offset = 0
+        bzip2_file.seek(0)
+        data = bzip2_file.read(self.SCAN_BUFFER_SIZE)
+        while data:
+            for magic in (BZIP2_BLOCK_MAGIC, BZIP2_EOS_MAGIC):
+                for shift in range(8):
+                    for position in self.__matches(data, magic, shift):
+                        magics.add(((offset + position) * 8 + shift, magic))
+            more_data = bzip2_file.read(self.SCAN_BUFFER_SIZE)
+            if not more_data:
+                break
+            offset += len(data) - overlap
+            data = data[-overlap:] + more_data
+        return sorted(magics)
+
+    @classmethod
+    def __matches(self, data, magic, shift):
+        """
+            Byte positions in data of the magic starting shift bits
+            into the byte
+        """
+        window = magic << (8 - shift)
+        window_bytes = binascii.unhexlify('%014x' % window)
+        # leading and trailing bytes of the window are partial
+        first = 0 if shift == 0 else 1
+        pattern = window_bytes[first:6]
+        length = 6 if shift == 0 else 7
+        mask = ((1 << BZIP2_MAGIC_BITS) - 1) << (8 - shift)
+        position = data.find(pattern)
+        while position >= 0:
+            start = position - first
+            candidate = data[start:start + length] if start >= 0 else b''
+            if len(candidate) == length and \
+                    int(binascii.hexlify(candidate.ljust(7, b'\0')), 16) & \
+                    mask == window:
+                yield start
+            position = data.find(pattern, position + 1)
+
+    def __decompress(self):
+        """
+            Decompress the next part of the stream into the output,
+            returns False at the end of the stream
+        """
+        self.output = b''
+        self.output_offset = 0
+        while not self.output:
+            if self.finished:
+                return False
+            data = self.bzip2_stream.read(self.buffer_size)
+            if not data:
+                if not self.__stream_complete():
+                    raise AzureBZip2Error('Truncated bzip2 stream')
+                self.finished = True
+                return False
+            self.output = self.__decompress_data(data)
+        return True
+
+    def __decompress_data(self, data):
+        output = []
+        while data:
+            try:
+                output.append(self.decompressor.decompress(data))
+            except EOFError:
+                # the stream ended with the previous data, the next
+                # stream starts with this data
+                self.decompressor = bz2.BZ2Decompressor()
+                continue
+            data = self.decompressor.unused_data
+            if data:
+                # end of stream, the next stream follows
+                self.decompressor = bz2.BZ2Decompressor()
+        return b''.join(output)
+
+    def __stream_complete(self):
+        try:
+            self.decompressor.decompress(b'')
+        except EOFError:
+            return True
+        return False
+
+
+class ParallelBZip2(ParallelDecompressor):
+    """
+        Block parallel decompression of bzip2 files, see
+        ParallelDecompressor
+    """
+    def __init__(self, file_name, blocks, processes, read_ahead=None):
+        super(ParallelBZip2, self).__init__(
+            file_name, blocks, processes, decompress_block, AzureBZip2Error,
+            read_ahead
+        )
@@ -0,0 +1,126 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import io
+
+# project
+from .zero_page import ZeroPage
+
+
+class ClusterImage(object):
+    """
+        Read access to the virtual disk of an image file format which
+        allocates the disk in clusters of a fixed size, e.g qcow2 or
+        sparse VMDK. The disk is presented as raw image of size bytes,
+        unallocated clusters read as zeros and are skipped by
+        skip_hole without synthesizing their data. Subclasses look up
+        the clusters in the allocation tables of the format by
+        implementing allocated and read_cluster
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, file_name):
+        self.file = io.FileIO(file_name, 'r')
+        self.position = 0
+        self.size = 0
+        self.cluster_size = ZeroPage.PAGE_SIZE
+        self.cluster_index = None
+        self.cluster_data = None
+
+    def allocated(self, index):
+        """
+            True if the cluster with the given index holds data
+        """
+        raise NotImplementedError
+
+    def read_cluster(self, index):
+        """
+            Data of the allocated cluster with the given index
+        """
+        raise NotImplementedError
+
+    def read(self, size):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readinto(self, buffer):
+        """
+            Fill the given writable buffer from the current position,
+            returns the number of bytes read which is only less than
+            the buffer size at the end of the virtual disk
+        """
+        view = memoryview(buffer)
+        bytes_read = 0
+        while bytes_read < len(view) and self.position < self.size:
+            index, offset = divmod(self.position, self.cluster_size)
+            count = min(
+                len(view) - bytes_read,
+                self.cluster_size - offset,
+                self.size - self.position
+            )
+            data = self.__cluster(index)
+            if data is None:
+                view[bytes_read:bytes_read + count] = bytes(bytearray(count))
+            else:
+                view[bytes_read:bytes_read + count] = \
+                    data[offset:offset + count]
+            bytes_read += count
+            self.position += count
+        return bytes_read
+
+    def skip_hole(self, max_size, partial=True):
+        """
+            Skip over the unallocated clusters at the current position,
+            limited to max_size bytes and aligned to the page size.
+            Returns the number of skipped bytes, which is zero if the
+            cluster at the current position is allocated. Without
+            partial the hole is only skipped if it covers max_size
+            bytes
+        """
+        end = min(self.position + max_size, self.size)
+        hole_end = self.position
+        while hole_end < end:
+            index = hole_end // self.cluster_size
+            if self.allocated(index):
+                break
+            hole_end = (index + 1) * self.cluster_size
+        hole_size = min(hole_end, end) - self.position
+        hole_size -= hole_size % ZeroPage.PAGE_SIZE
+        if not partial and hole_size < max_size:
+            hole_size = 0
+        self.position += hole_size
+        return hole_size
+
+    def close(self):
+        self.file.close()
+
+    def read_at(self, offset, size):
+        self.file.seek(offset)
+        data = self.file.read(size)
+        if len(data) != size:
+            raise EOFError(
+                'Image ends within %d bytes at offset %d' % (size, offset)
+            )
+        return data
+
+    def __cluster(self, index):
+        if index != self.cluster_index:
+            self.cluster_data = None
+            if self.allocated(index):
+                self.cluster_data = self.read_cluster(index)
+            self.cluster_index = index
+        return self.cluster_data
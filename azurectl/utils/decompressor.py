@@ -0,0 +1,57 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# project
+from .bzip2 import (
+    BZIP2_HEADER_MAGIC,
+    BZip2
+)
+from .gz import (
+    GZIP_HEADER_MAGIC,
+    GZ
+)
+from .xz import (
+    XZ_HEADER_MAGIC,
+    XZ
+)
+
+
+class Decompressor(object):
+    """
+        Registry of the decompressors for compressed upload sources,
+        keyed by the magic bytes at the start of the file. A
+        decompressor class is constructed from a sequential stream and
+        provides the classmethods open(file_name) for parallel or read
+        ahead decompression of a file and uncompressed_size(file_name),
+        which is None for formats that do not record the size
+    """
+    formats = []
+
+    @classmethod
+    def register(self, magic, decompressor):
+        self.formats.append((magic, decompressor))
+
+    @classmethod
+    def lookup(self, magic):
+        """
+            The decompressor class for data starting with magic, or
+            None for data which is not compressed in a known format
+        """
+        for format_magic, decompressor in self.formats:
+            if magic.startswith(format_magic):
+                return decompressor
+
+
+Decompressor.register(XZ_HEADER_MAGIC, XZ)
+Decompressor.register(GZIP_HEADER_MAGIC, GZ)
+Decompressor.register(BZIP2_HEADER_MAGIC, BZip2)
@@ -13,30 +13,54 @@
 #
 import os
 import re
-import subprocess
+
+# project
+from .decompressor import Decompressor
+from .qcow2 import QCOW2_HEADER_MAGIC
+from .vmdk import VMDK_HEADER_MAGIC
+from .xz import XZ_HEADER_MAGIC
 
 
 class FileType(object):
     """
-        map file magic information to type methods
+        map file magic bytes to type methods
     """
-    def __init__(self, file_name):
+    MAGIC_SIZE = 8
+
+    def __init__(self, file_name, source=None):
+        """
+            Detect the type of file_name. For a source which can't
+            be reopened, e.g stdin, the magic bytes are peeked from
+            the given source stream instead
+        """
         self.file_name = file_name
-        file_info = subprocess.Popen(
-            ['file', file_name],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        self.filetype = file_info.communicate()[0]
+        if source:
+            self.magic = source.peek(self.MAGIC_SIZE)
+            return
+        try:
+            with open(file_name, 'rb') as source:
+                self.magic = source.read(self.MAGIC_SIZE)
+        except IOError:
+            self.magic = b''
+
+    def decompressor(self):
+        """
+            decompressor class for a compressed file, None otherwise
+        """
+        return Decompressor.lookup(self.magic)
 
     def is_xz(self):
-        if re.match('.*: XZ compressed', self.filetype):
-            return True
-        return False
+        return self.magic.startswith(XZ_HEADER_MAGIC)
+
+    def is_qcow2(self):
+        return self.magic.startswith(QCOW2_HEADER_MAGIC)
+
+    def is_vmdk(self):
+        return self.magic.startswith(VMDK_HEADER_MAGIC)
 
     def basename(self):
         name = os.path.basename(self.file_name)
-        if self.is_xz():
-            name = re.sub('\.(xz|lzma)$', '', name)
-            name = re.sub('\.(tgz|tlz)$', '.tar', name)
+        if self.decompressor():
+            name = re.sub('\.(xz|lzma|gz|bz2)$', '', name)
+            name = re.sub('\.(tgz|tlz|txz|tbz2|tbz)$', '.tar', name)
         return name
@@ -0,0 +1,265 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from collections import namedtuple
+import multiprocessing
+import os
+import struct
+import zlib
+
+# project
+from .parallel_decompressor import ParallelDecompressor
+from .read_ahead import ReadAhead
+from ..azurectl_exceptions import AzureGZError
+
+GZMember = namedtuple(
+    'GZMember', 'compressed_offset total_size uncompressed_size'
+)
+
+GZIP_HEADER_MAGIC = b'\x1f\x8b\x08'
+# gzip header and trailer around the deflate data
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+# gzip header with extra field, which holds the BGZF block size
+BGZF_HEADER_MAGIC = b'\x1f\x8b\x08\x04'
+BGZF_SUBFIELD = b'BC\x02\x00'
+BGZF_HEADER_SIZE = 18
+# gzip header and trailer of an empty member
+GZIP_MIN_SIZE = 18
+# deflate compresses at most by this ratio, a smaller gzip file
+# can't unpack to 4GB, the limit of the size in the trailer
+DEFLATE_MAX_RATIO = 1032
+
+
+def decompress_member(file_name, member):
+    """
+        Decompress one member of a gzip file in a worker process
+    """
+    with open(file_name, 'rb') as gz_file:
+        gz_file.seek(member.compressed_offset)
+        member_data = gz_file.read(member.total_size)
+    return zlib.decompress(member_data, GZIP_WBITS)
+
+
+class GZ(object):
+    """
+        Implements decompression of gzip compressed files, the members
+        of a file with more than one member are decompressed as one
+        stream
+    """
+    GZIP_STREAM_BUFFER_SIZE = 1048576
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, gzip_stream, buffer_size=GZIP_STREAM_BUFFER_SIZE):
+        self.gzip_stream = gzip_stream
+        self.buffer_size = int(buffer_size)
+        self.decompressor = zlib.decompressobj(GZIP_WBITS)
+        self.input = b''
+        self.member_start = True
+        self.finished = False
+
+    def read(self, size):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readinto(self, buffer):
+        """
+            Decompress into the given writable buffer, returns the
+            number of bytes unpacked which is only less than the
+            buffer size at the end of the stream
+        """
+        view = memoryview(buffer)
+        bytes_read = 0
+        while bytes_read < len(view) and not self.finished:
+            if not self.input:
+                self.input = self.gzip_stream.read(self.buffer_size)
+                if not self.input:
+                    if not self.__member_complete():
+                        raise AzureGZError('Truncated gzip stream')
+                    self.finished = True
+                    break
+            if self.member_start and self.input.startswith(b'\0'):
+                # zero padding after the last member, as gzip does
+                self.__skip_padding()
+                self.finished = True
+                break
+            data = self.decompressor.decompress(
+                self.input, len(view) - bytes_read
+            )
+            self.member_start = False
+            self.input = self.decompressor.unconsumed_tail
+            if self.decompressor.unused_data:
+                # end of member, the next member or padding follows
+                self.input = self.decompressor.unused_data
+                self.decompressor = zlib.decompressobj(GZIP_WBITS)
+                self.member_start = True
+            view[bytes_read:bytes_read + len(data)] = data
+            bytes_read += len(data)
+        return bytes_read
+
+    def close(self):
+        self.gzip_stream.close()
+
+    @classmethod
+    def open(
+        self, file_name, buffer_size=GZIP_STREAM_BUFFER_SIZE, processes=None
+    ):
+        """
+            Open gzip file for reading. BGZF files with more than one
+            member are decompressed member parallel by the given number
+            of processes, by default one per cpu. Other files are
+            decompressed as one stream in a read ahead thread
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if processes > 1:
+            members = self.members(file_name)
+            if len(members) > 1:
+                return ParallelGZ(file_name, members, processes)
+        return ReadAhead(GZ(open(file_name, 'rb'), buffer_size))
+
+    @classmethod
+    def members(self, file_name):
+        """
+            List of GZMember information for all members of a BGZF
+            file as written by bgzip. The size of each member is stored
+            in the extra field of its header, the uncompressed size in
+            its trailer, no member data needs to be read. The list is
+            empty for gzip files which are not BGZF files
+        """
+        try:
+            with open(file_name, 'rb') as gz_file:
+                return self.__read_members(gz_file)
+        except AzureGZError:
+            raise
+        except Exception as e:
+            raise AzureGZError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+
+    @classmethod
+    def uncompressed_size(self, file_name):
+        """
+            Uncompressed size of the gzip file. For BGZF files it is
+            the sum of the sizes in the member trailers. Other gzip
+            files store the size modulo 4GB of their last member in
+            its trailer. It is only used for files too small to unpack
+            to 4GB, for larger files the size is unknown and None is
+            returned. Files of more than one member hold more data
+            than that size, which the reader has to check. Files which
+            end with a zero byte may be padded, they are decompressed
+            once to count the size
+        """
+        members = self.members(file_name)
+        if members:
+            return sum(member.uncompressed_size for member in members)
+        if os.path.getsize(file_name) * DEFLATE_MAX_RATIO >= 1 << 32:
+            # the trailer may hold the size modulo 4GB
+            return None
+        trailer_size = self.trailer_size(file_name)
+        if trailer_size is not None:
+            return trailer_size
+        size = 0
+        buffer = bytearray(GZ.GZIP_STREAM_BUFFER_SIZE)
+        with GZ(open(file_name, 'rb')) as gz:
+            while True:
+                count = gz.readinto(buffer)
+                if not count:
+                    return size
+                size += count
+
+    @classmethod
+    def trailer_size(self, file_name):
+        """
+            Size recorded in the trailer at the end of the gzip file,
+            None if the file ends with a zero byte, which may be
+            padding behind the trailer
+        """
+        try:
+            with open(file_name, 'rb') as gz_file:
+                gz_file.seek(0, os.SEEK_END)
+                if gz_file.tell() < GZIP_MIN_SIZE:
+                    raise AzureGZError(
+                        'Truncated gzip file %s' % file_name
+                    )
+                gz_file.seek(-4, os.SEEK_END)
+                trailer = gz_file.read(4)
+        except AzureGZError:
+            raise
+        except Exception as e:
+            raise AzureGZError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        if trailer.endswith(b'\0'):
+            return None
+        return struct.unpack('<I', trailer)[0]
+
+    @classmethod
+    def __read_members(self, gz_file):
+        file_size = os.fstat(gz_file.fileno()).st_size
+        members = []
+        offset = 0
+        while offset < file_size:
+            gz_file.seek(offset)
+            header = gz_file.read(BGZF_HEADER_SIZE)
+            if not header.startswith(BGZF_HEADER_MAGIC) or \
+                    header[12:16] != BGZF_SUBFIELD:
+                return []
+            total_size = struct.unpack('<H', header[16:18])[0] + 1
+            if offset + total_size > file_size:
+                raise AzureGZError(
+                    'Truncated gzip member in %s' % gz_file.name
+                )
+            gz_file.seek(offset + total_size - 4)
+            uncompressed_size = struct.unpack('<I', gz_file.read(4))[0]
+            members.append(
+                GZMember(
+                    compressed_offset=offset,
+                    total_size=total_size,
+                    uncompressed_size=uncompressed_size
+                )
+            )
+            offset += total_size
+        return members
+
+    def __skip_padding(self):
+        while self.input:
+            if self.input.strip(b'\0'):
+                raise AzureGZError('Invalid data after gzip member')
+            self.input = self.gzip_stream.read(self.buffer_size)
+
+    def __member_complete(self):
+        # data behind the end of a member ends up as unused data,
+        # within a member it is decompressed or is invalid
+        probe = self.decompressor.copy()
+        try:
+            probe.decompress(b'\0')
+        except zlib.error:
+            return False
+        return probe.unused_data == b'\0'
+
+
+class ParallelGZ(ParallelDecompressor):
+    """
+        Member parallel decompression of BGZF files, see
+        ParallelDecompressor
+    """
+    def __init__(self, file_name, members, processes, read_ahead=None):
+        super(ParallelGZ, self).__init__(
+            file_name, members, processes, decompress_member, AzureGZError,
+            read_ahead
+        )
@@ -0,0 +1,59 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import mmap
+
+# project
+from .sparse_file import SparseFile
+
+
+class MappedFile(SparseFile):
+    """
+        Read access to a raw image file through a read only memory
+        mapping. read_view returns views into the mapping, thus page
+        ranges can be handed over to upload workers without copying
+        them. Filesystem holes are skipped as for a SparseFile
+    """
+    def __init__(self, file_name):
+        super(MappedFile, self).__init__(file_name)
+        try:
+            self.mapping = mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.file.close()
+            raise
+
+    def read_view(self, size):
+        """
+            Return a view of up to size bytes of the mapping at the
+            current position and move the position behind it
+        """
+        size = max(0, min(size, self.size - self.position))
+        view = memoryview(buffer(self.mapping, self.position, size))
+        self.position += size
+        return view
+
+    def readinto(self, target):
+        view = memoryview(target)
+        data = self.read_view(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        # the mapping is unmapped along with the last view referencing
+        # it, which might still be used by an upload worker
+        self.mapping = None
+        super(MappedFile, self).close()
+
+    @classmethod
+    def open(self, file_name):
+        return MappedFile(file_name)
@@ -0,0 +1,105 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from collections import deque
+import multiprocessing
+import signal
+
+
+def ignore_interrupt():
+    # keyboard interrupts are handled by the parent process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class ParallelDecompressor(object):
+    """
+        Block parallel decompression of compressed files which consist
+        of independently compressed blocks. Blocks are decompressed by
+        a pool of processes calling decompress(file_name, block), at
+        most read_ahead blocks are in work or waiting to be read. Data
+        is delivered in the order of the blocks in the file, a failed
+        block raises error
+    """
+    POLL_INTERVAL = 0.5
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(
+        self, file_name, blocks, processes, decompress, error,
+        read_ahead=None
+    ):
+        self.file_name = file_name
+        self.blocks = deque(blocks)
+        self.decompress = decompress
+        self.error = error
+        self.read_ahead = read_ahead or 2 * processes
+        self.pool = multiprocessing.Pool(processes, ignore_interrupt)
+        self.pending = deque()
+        self.buffer = b''
+        self.buffer_offset = 0
+        self.__queue_blocks()
+
+    def read(self, size):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readinto(self, buffer):
+        """
+            Fill the given writable buffer with the data of the next
+            blocks in file order, returns the number of bytes read
+        """
+        view = memoryview(buffer)
+        bytes_read = 0
+        while bytes_read < len(view):
+            if self.buffer_offset == len(self.buffer):
+                if not self.pending:
+                    break
+                self.buffer = memoryview(self.__wait(self.pending.popleft()))
+                self.buffer_offset = 0
+                self.__queue_blocks()
+            count = min(
+                len(view) - bytes_read, len(self.buffer) - self.buffer_offset
+            )
+            view[bytes_read:bytes_read + count] = \
+                self.buffer[self.buffer_offset:self.buffer_offset + count]
+            self.buffer_offset += count
+            bytes_read += count
+        return bytes_read
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __queue_blocks(self):
+        while self.blocks and len(self.pending) < self.read_ahead:
+            self.pending.append(
+                self.pool.apply_async(
+                    self.decompress, (self.file_name, self.blocks.popleft())
+                )
+            )
+
+    def __wait(self, result):
+        while not result.ready():
+            # wait with timeout to stay interruptible
+            result.wait(self.POLL_INTERVAL)
+        try:
+            return result.get()
+        except Exception as e:
+            raise self.error(
+                'Block decompression failed: %s: %s' %
+                (type(e).__name__, format(e))
+            )
@@ -0,0 +1,59 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import io
+
+
+class PipeReader(object):
+    """
+        Read access to a non seekable input like stdin or a pipe.
+        The first bytes can be inspected by peek before they are
+        read, e.g to detect the compression of the data
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.head = b''
+
+    def peek(self, size):
+        """
+            Return the next size bytes without consuming them, less
+            only if the input ends before
+        """
+        if len(self.head) < size:
+            self.head += self.stream.read(size - len(self.head))
+        return self.head[:size]
+
+    def read(self, size):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readinto(self, buffer):
+        view = memoryview(buffer)
+        head_size = min(len(self.head), len(view))
+        view[:head_size] = self.head[:head_size]
+        self.head = self.head[head_size:]
+        return head_size + self.stream.readinto(view[head_size:])
+
+    def close(self):
+        self.stream.close()
+
+    @classmethod
+    def open(self, fd):
+        # buffered reads block until the requested size is complete
+        return PipeReader(io.open(fd, 'rb', closefd=False))
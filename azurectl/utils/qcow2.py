@@ -0,0 +1,146 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from collections import namedtuple
+import struct
+import zlib
+
+# project
+from .cluster_image import ClusterImage
+from ..azurectl_exceptions import AzureQcow2Error
+
+Qcow2Header = namedtuple(
+    'Qcow2Header',
+    'magic version backing_file_offset backing_file_size cluster_bits '
+    'size crypt_method l1_size l1_table_offset refcount_table_offset '
+    'refcount_table_clusters nb_snapshots snapshots_offset'
+)
+
+QCOW2_HEADER_MAGIC = b'QFI\xfb'
+QCOW2_HEADER_FORMAT = '>4sIQIIQIIQQIIQ'
+
+
+class Qcow2(ClusterImage):
+    """
+        Read access to the virtual disk of a qcow2 image. The clusters
+        are looked up in the two level L1/L2 table of the image,
+        clusters without an L2 entry and clusters flagged as zero
+        are unallocated. Compressed clusters are inflated on read.
+        Images with a backing file, encryption or external data
+        are not supported
+    """
+    OFFSET_MASK = 0x00fffffffffffe00
+    COMPRESSED_FLAG = 1 << 62
+    ZERO_FLAG = 1
+    # the dirty bit only affects the refcounts, all other
+    # incompatible features change the meaning of the tables
+    SUPPORTED_INCOMPATIBLE_FEATURES = 1
+
+    def __init__(self, file_name):
+        super(Qcow2, self).__init__(file_name)
+        try:
+            self.header = self.__read_header()
+            self.cluster_size = 1 << self.header.cluster_bits
+            self.size = self.header.size
+            self.l2_entries = self.cluster_size // 8
+            self.l1_table = self.__read_table(
+                self.header.l1_table_offset, self.header.l1_size
+            )
+            self.l2_tables = {}
+        except Exception:
+            self.file.close()
+            raise
+
+    def allocated(self, index):
+        entry = self.__l2_entry(index)
+        if entry & self.COMPRESSED_FLAG:
+            return True
+        return bool(entry & self.OFFSET_MASK) and not entry & self.ZERO_FLAG
+
+    def read_cluster(self, index):
+        entry = self.__l2_entry(index)
+        if not entry & self.COMPRESSED_FLAG:
+            return self.read_at(entry & self.OFFSET_MASK, self.cluster_size)
+        # compressed cluster descriptor: host offset in the low x
+        # bits followed by the number of additional 512 byte sectors
+        x = 62 - (self.header.cluster_bits - 8)
+        offset = entry & ((1 << x) - 1)
+        sectors = ((entry >> x) & ((1 << (self.header.cluster_bits - 8)) - 1))
+        size = (sectors + 1) * 512 - (offset & 511)
+        # the sectors of the last compressed cluster may reach
+        # beyond the end of the image file
+        self.file.seek(offset)
+        data = zlib.decompressobj(-12).decompress(
+            self.file.read(size), self.cluster_size
+        )
+        if len(data) != self.cluster_size:
+            raise AzureQcow2Error(
+                'Compressed cluster %d is truncated' % index
+            )
+        return data
+
+    @classmethod
+    def open(self, file_name):
+        return Qcow2(file_name)
+
+    @classmethod
+    def virtual_size(self, file_name):
+        with Qcow2(file_name) as image:
+            return image.size
+
+    def __read_header(self):
+        header = Qcow2Header(*struct.unpack(
+            QCOW2_HEADER_FORMAT,
+            self.read_at(0, struct.calcsize(QCOW2_HEADER_FORMAT))
+        ))
+        if header.magic != QCOW2_HEADER_MAGIC:
+            raise AzureQcow2Error('Not a qcow2 image')
+        if header.version not in (2, 3):
+            raise AzureQcow2Error(
+                'Unsupported qcow2 version %d' % header.version
+            )
+        if header.backing_file_offset:
+            raise AzureQcow2Error('qcow2 images with backing file')
+        if header.crypt_method:
+            raise AzureQcow2Error('Encrypted qcow2 images')
+        if not 9 <= header.cluster_bits <= 21:
+            raise AzureQcow2Error(
+                'Invalid qcow2 cluster bits %d' % header.cluster_bits
+            )
+        if header.version == 3:
+            incompatible_features = struct.unpack('>Q', self.read_at(72, 8))[0]
+            if incompatible_features & ~self.SUPPORTED_INCOMPATIBLE_FEATURES:
+                raise AzureQcow2Error(
+                    'Unsupported qcow2 features 0x%x' % incompatible_features
+                )
+        return header
+
+    def __read_table(self, offset, entries):
+        return struct.unpack(
+            '>%dQ' % entries, self.read_at(offset, entries * 8)
+        )
+
+    def __l2_entry(self, index):
+        l1_index, l2_index = divmod(index, self.l2_entries)
+        if l1_index not in self.l2_tables:
+            l2_offset = self.l1_table[l1_index] & self.OFFSET_MASK
+            if l2_offset:
+                self.l2_tables[l1_index] = self.__read_table(
+                    l2_offset, self.l2_entries
+                )
+            else:
+                self.l2_tables[l1_index] = None
+        l2_table = self.l2_tables[l1_index]
+        if not l2_table:
+            return 0
+        return l2_table[l2_index]
@@ -0,0 +1,68 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import bisect
+
+
+class RangeSet(object):
+    """
+        Sorted set of non overlapping byte ranges. Ranges are passed
+        in and out as (start, length) tuples, overlapping and adjacent
+        ranges are merged
+    """
+    def __init__(self, ranges=None):
+        self.starts = []
+        self.ends = []
+        for start, length in ranges or []:
+            self.add(start, length)
+
+    def add(self, start, length):
+        if length <= 0:
+            return
+        end = start + length
+        low = bisect.bisect_left(self.ends, start)
+        high = bisect.bisect_right(self.starts, end)
+        if low < high:
+            start = min(start, self.starts[low])
+            end = max(end, self.ends[high - 1])
+        self.starts[low:high] = [start]
+        self.ends[low:high] = [end]
+
+    def contains(self, start, length):
+        """
+            True if the range is completely covered by the set
+        """
+        index = bisect.bisect_right(self.starts, start) - 1
+        return index >= 0 and self.ends[index] >= start + length
+
+    def intersection(self, other):
+        result = RangeSet()
+        index = other_index = 0
+        while index < len(self.starts) and other_index < len(other.starts):
+            start = max(self.starts[index], other.starts[other_index])
+            end = min(self.ends[index], other.ends[other_index])
+            if start < end:
+                result.add(start, end - start)
+            if self.ends[index] < other.ends[other_index]:
+                index += 1
+            else:
+                other_index += 1
+        return result
+
+    def ranges(self):
+        return [
+            (start, end - start) for start, end in zip(self.starts, self.ends)
+        ]
+
+    def byte_size(self):
+        return sum(self.ends) - sum(self.starts)
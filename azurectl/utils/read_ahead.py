@@ -0,0 +1,137 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from queue import (
+    Empty,
+    Full,
+    Queue
+)
+import threading
+
+# project
+from .buffer_pool import BufferPool
+
+
+class ReadAhead(object):
+    """
+        Reads a stream in a background thread, at most depth chunks
+        of chunk_size bytes ahead of the reader. Wrapped around a
+        decompressor the decompression of the next chunks overlaps
+        with the processing of the data already read, e.g its upload.
+        The chunks are read into depth + 2 buffers which are reused,
+        depth queued, one read by the reader and one being filled.
+        An error of the stream is raised to the reader with the data
+        at which it occurred
+    """
+    CHUNK_SIZE = 4194304
+    DEPTH = 2
+    POLL_INTERVAL = 0.5
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE, depth=DEPTH):
+        self.stream = stream
+        self.chunk_size = int(chunk_size)
+        self.chunks = Queue(depth)
+        self.buffers = BufferPool(depth + 2, self.chunk_size)
+        self.buffer = None
+        self.chunk = memoryview(b'')
+        self.chunk_offset = 0
+        self.finished = False
+        self.closed = False
+        self.reader = threading.Thread(target=self.__read_ahead)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def read(self, size):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readinto(self, buffer):
+        """
+            Fill the given writable buffer from the chunks read ahead,
+            returns the number of bytes read which is only less than
+            the buffer size at the end of the stream
+        """
+        view = memoryview(buffer)
+        bytes_read = 0
+        while bytes_read < len(view):
+            if self.chunk_offset == len(self.chunk):
+                if not self.__next_chunk():
+                    break
+            count = min(
+                len(view) - bytes_read, len(self.chunk) - self.chunk_offset
+            )
+            view[bytes_read:bytes_read + count] = \
+                self.chunk[self.chunk_offset:self.chunk_offset + count]
+            self.chunk_offset += count
+            bytes_read += count
+        return bytes_read
+
+    def close(self):
+        self.closed = True
+        self.reader.join()
+        self.stream.close()
+
+    def __next_chunk(self):
+        if self.finished:
+            return False
+        while True:
+            try:
+                # wait with timeout to stay interruptible
+                buffer, size, error = self.chunks.get(
+                    timeout=self.POLL_INTERVAL
+                )
+                break
+            except Empty:
+                pass
+        if self.buffer:
+            # the current chunk is consumed, its buffer can be refilled
+            self.buffers.release(self.buffer)
+        self.buffer = buffer
+        if error:
+            self.finished = True
+            raise error
+        if not size:
+            self.finished = True
+            return False
+        self.chunk = memoryview(buffer)[:size]
+        self.chunk_offset = 0
+        return True
+
+    def __read_ahead(self):
+        while not self.closed:
+            # never blocks, at most depth + 1 buffers are taken
+            buffer = self.buffers.get()
+            size = 0
+            error = None
+            try:
+                size = self.stream.readinto(memoryview(buffer))
+            except Exception as e:
+                error = e
+            if not self.__put((buffer, size, error)) or error or not size:
+                return
+
+    def __put(self, item):
+        # wait with timeout to notice a close of the reader
+        while not self.closed:
+            try:
+                self.chunks.put(item, timeout=self.POLL_INTERVAL)
+                return True
+            except Full:
+                pass
+        return False
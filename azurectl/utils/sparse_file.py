@@ -0,0 +1,105 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import errno
+import io
+import os
+
+# project
+from .zero_page import ZeroPage
+
+
+class SparseFile(object):
+    """
+        Read access to a raw image file which allows to skip over
+        filesystem holes without reading them, based on the
+        SEEK_DATA/SEEK_HOLE lseek extension
+    """
+    # linux value, not exported by the os module of python 2
+    SEEK_DATA = getattr(os, 'SEEK_DATA', 3)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, file_name):
+        self.file = io.FileIO(file_name, 'r')
+        self.fd = self.file.fileno()
+        self.size = os.fstat(self.fd).st_size
+        self.position = 0
+        self.seek_data_supported = True
+
+    def read(self, size):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readinto(self, buffer):
+        """
+            Fill the given writable buffer from the current position,
+            returns the number of bytes read which is only less than
+            the buffer size at the end of the file
+        """
+        view = memoryview(buffer)
+        bytes_read = 0
+        while bytes_read < len(view):
+            count = self.file.readinto(view[bytes_read:])
+            if not count:
+                break
+            bytes_read += count
+        self.position += bytes_read
+        return bytes_read
+
+    def skip_hole(self, max_size, partial=True):
+        """
+            Skip over the filesystem hole at the current position,
+            limited to max_size bytes and aligned to the page size.
+            Returns the number of skipped bytes, which is zero if the
+            current position is in a data area or the filesystem
+            does not support SEEK_DATA. Without partial the hole is
+            only skipped if it covers max_size bytes
+        """
+        if not self.seek_data_supported or self.position >= self.size:
+            return 0
+        try:
+            data_start = os.lseek(self.fd, self.position, self.SEEK_DATA)
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                self.seek_data_supported = False
+                os.lseek(self.fd, self.position, os.SEEK_SET)
+                return 0
+            # no more data behind the current position
+            data_start = self.size
+        hole_size = min(data_start - self.position, max_size)
+        hole_size -= hole_size % ZeroPage.PAGE_SIZE
+        if not partial and hole_size < max_size:
+            hole_size = 0
+        self.position += hole_size
+        os.lseek(self.fd, self.position, os.SEEK_SET)
+        return hole_size
+
+    def skip(self, size):
+        """
+            Move the current position size bytes forward without
+            reading the data in between
+        """
+        self.position += size
+        os.lseek(self.fd, self.position, os.SEEK_SET)
+
+    def close(self):
+        self.file.close()
+
+    @classmethod
+    def open(self, file_name):
+        return SparseFile(file_name)
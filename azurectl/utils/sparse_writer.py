@@ -0,0 +1,51 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import threading
+
+
+class SparseWriter(object):
+    """
+        Write access to a raw image file at arbitrary offsets, for
+        ranges written by parallel threads in any order. The file is
+        created with its final size up front, areas which are never
+        written remain filesystem holes
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, file_name, byte_size):
+        self.fd = os.open(
+            file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644
+        )
+        os.ftruncate(self.fd, byte_size)
+        self.lock = threading.Lock()
+
+    def write_at(self, data, offset):
+        # python 2 has no os.pwrite, the seek and the write of a
+        # range must not interleave with the ones of other threads
+        with self.lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self.fd, view):]
+
+    def abort(self):
+        pass
+
+    def close(self):
+        os.close(self.fd)
@@ -0,0 +1,191 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import posixpath
+
+# project
+from ..azurectl_exceptions import AzureTarError
+
+
+class TarMember(object):
+    """
+        Read access to one member of a tar archive which is read as
+        sequential stream, e.g from the xz decompressor. The archive
+        is read up to the header of the member, the data of the
+        members in front of it is skipped. The member size is taken
+        from the header, reads end with the member data. Long names
+        of the GNU and pax formats are supported
+    """
+    BLOCK_SIZE = 512
+    SKIP_BUFFER_SIZE = 1048576
+    REGULAR_TYPES = (b'0', b'\0', b'7')
+    GNU_LONGNAME_TYPE = b'L'
+    PAX_TYPE = b'x'
+    PAX_GLOBAL_TYPE = b'g'
+    GNU_SPARSE_TYPE = b'S'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, stream, name):
+        self.stream = stream
+        self.name = name
+        self.position = 0
+        self.size = self.__find_member(self.__normalized(name))
+
+    def read(self, size):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readinto(self, buffer):
+        """
+            Fill the given writable buffer with member data from the
+            current position, returns the number of bytes read which
+            is only less than the buffer size at the end of the member
+        """
+        view = memoryview(buffer)[:self.size - self.position]
+        bytes_read = self.__read_fully(view)
+        self.position += bytes_read
+        return bytes_read
+
+    def skip_hole(self, max_size, partial=True):
+        """
+            Skip over a filesystem hole of the archive file at the
+            current position, see SparseFile.skip_hole
+        """
+        if not hasattr(self.stream, 'skip_hole'):
+            return 0
+        rest_size = self.size - self.position
+        hole_size = self.stream.skip_hole(min(max_size, rest_size), partial)
+        if not partial and hole_size < max_size:
+            # the stream can't know about the hole beyond the member
+            hole_size = 0
+        self.position += hole_size
+        return hole_size
+
+    def close(self):
+        self.stream.close()
+
+    def __find_member(self, name):
+        # long name and size of the next member from the extended
+        # headers in front of it
+        long_name = None
+        pax_size = None
+        while True:
+            header = self.__read_block()
+            if not header or header == bytes(bytearray(self.BLOCK_SIZE)):
+                raise AzureTarError('Member %s not found' % self.name)
+            self.__check_header(header)
+            member_type = header[156:157]
+            size = self.__number(header[124:136])
+            if member_type == self.GNU_LONGNAME_TYPE:
+                long_name = self.__read_data(size).split(b'\0', 1)[0]
+            elif member_type == self.PAX_GLOBAL_TYPE:
+                self.__read_data(size)
+            elif member_type == self.PAX_TYPE:
+                records = self.__pax_records(self.__read_data(size))
+                long_name = records.get(b'path', long_name)
+                if b'size' in records:
+                    pax_size = int(records[b'size'])
+            else:
+                if pax_size is not None:
+                    size = pax_size
+                if self.__member_name(header, long_name) == name:
+                    return self.__member_size(member_type, size)
+                long_name = None
+                pax_size = None
+                self.__skip(self.__padded(size))
+
+    def __member_size(self, member_type, size):
+        if member_type == self.GNU_SPARSE_TYPE:
+            raise AzureTarError(
+                'Sparse member %s is not supported' % self.name
+            )
+        if member_type not in self.REGULAR_TYPES:
+            raise AzureTarError('Member %s is not a file' % self.name)
+        return size
+
+    def __member_name(self, header, long_name):
+        if long_name is not None:
+            return self.__normalized(long_name)
+        name = header[0:100].split(b'\0', 1)[0]
+        if header[257:262] == b'ustar':
+            prefix = header[345:500].split(b'\0', 1)[0]
+            if prefix:
+                name = prefix + b'/' + name
+        return self.__normalized(name)
+
+    def __normalized(self, name):
+        if not isinstance(name, bytes):
+            name = name.encode('utf-8')
+        return posixpath.normpath(name).lstrip(b'/')
+
+    def __check_header(self, header):
+        if len(header) != self.BLOCK_SIZE:
+            raise AzureTarError('Unexpected end of archive')
+        checksum = sum(bytearray(header[:148] + b' ' * 8 + header[156:]))
+        if self.__number(header[148:156]) != checksum:
+            raise AzureTarError('Invalid tar header checksum')
+
+    def __number(self, field):
+        field = bytearray(field)
+        if field[0] & 0x80:
+            # base-256 encoding of large sizes
+            value = field[0] & 0x7f
+            for byte in field[1:]:
+                value = value << 8 | byte
+            return value
+        digits = bytes(field).split(b'\0', 1)[0].strip()
+        return int(digits, 8) if digits else 0
+
+    def __pax_records(self, data):
+        records = {}
+        while data:
+            length = int(data.split(b' ', 1)[0])
+            key, value = data[:length].split(b' ', 1)[1].split(b'=', 1)
+            records[key] = value[:-1]
+            data = data[length:]
+        return records
+
+    def __read_block(self):
+        block = bytearray(self.BLOCK_SIZE)
+        return bytes(block[:self.__read_fully(memoryview(block))])
+
+    def __read_data(self, size):
+        data = bytearray(self.__padded(size))
+        if self.__read_fully(memoryview(data)) != len(data):
+            raise AzureTarError('Unexpected end of archive')
+        return bytes(data[:size])
+
+    def __read_fully(self, view):
+        bytes_read = 0
+        while bytes_read < len(view):
+            count = self.stream.readinto(view[bytes_read:])
+            if not count:
+                break
+            bytes_read += count
+        return bytes_read
+
+    def __skip(self, size):
+        buffer = memoryview(bytearray(min(size, self.SKIP_BUFFER_SIZE)))
+        while size:
+            count = self.__read_fully(buffer[:min(size, len(buffer))])
+            if not count:
+                raise AzureTarError('Unexpected end of archive')
+            size -= count
+
+    def __padded(self, size):
+        return -(-size // self.BLOCK_SIZE) * self.BLOCK_SIZE
@@ -0,0 +1,238 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from datetime import datetime
+from uuid import uuid4
+
+
+class VHD(object):
+    """
+        Presents a raw image stream of raw_size bytes as fixed VHD.
+        The raw data is padded with zeros to the VHD alignment and
+        followed by the VHD footer, the size of the resulting stream
+        is given by fixed_size. Filesystem holes of the raw image
+        are skipped as for the underlying stream
+    """
+    ALIGNMENT = 1048576
+    FOOTER_SIZE = 512
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, stream, raw_size):
+        self.stream = stream
+        self.raw_size = int(raw_size)
+        self.data_size = self.aligned_size(self.raw_size)
+        self.footer_data = self.footer(self.data_size)
+        self.position = 0
+
+    def read(self, size):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readinto(self, buffer):
+        """
+            Fill the given writable buffer from the current position,
+            returns the number of bytes read which is only less than
+            the buffer size at the end of the VHD
+        """
+        view = memoryview(buffer)
+        bytes_read = 0
+        while bytes_read < len(view):
+            rest = view[bytes_read:]
+            if self.position < self.raw_size:
+                count = self.stream.readinto(
+                    rest[:self.raw_size - self.position]
+                )
+                if not count:
+                    # raw data ended early, the rest reads as zeros
+                    self.raw_size = self.position
+            elif self.position < self.data_size:
+                count = min(len(rest), self.data_size - self.position)
+                rest[:count] = bytes(bytearray(count))
+            else:
+                footer = self.footer_data[self.position - self.data_size:]
+                count = min(len(rest), len(footer))
+                rest[:count] = footer[:count]
+                if not count:
+                    break
+            bytes_read += count
+            self.position += count
+        return bytes_read
+
+    def skip_hole(self, max_size, partial=True):
+        """
+            Skip over a filesystem hole of the raw image at the
+            current position, see SparseFile.skip_hole
+        """
+        if self.position >= self.raw_size or \
+                not hasattr(self.stream, 'skip_hole'):
+            return 0
+        hole_size = self.stream.skip_hole(
+            min(max_size, self.raw_size - self.position), partial
+        )
+        if not partial and hole_size < max_size:
+            # the stream can't know about the hole beyond raw_size
+            hole_size = 0
+        self.position += hole_size
+        return hole_size
+
+    def close(self):
+        self.stream.close()
+
+    @classmethod
+    def aligned_size(self, raw_size):
+        return -(-int(raw_size) // self.ALIGNMENT) * self.ALIGNMENT
+
+    @classmethod
+    def fixed_size(self, raw_size):
+        """
+            Size of the fixed VHD for a raw image of raw_size bytes
+        """
+        return self.aligned_size(raw_size) + self.FOOTER_SIZE
+
+    @classmethod
+    def geometry(self, byte_size):
+        """
+            Cylinders, heads and sectors per track of a disk of
+            byte_size bytes, as calculated in the VHD specification
+        """
+        total_sectors = min(byte_size // 512, 65535 * 16 * 255)
+        if total_sectors >= 65535 * 16 * 63:
+            sectors_per_track = 255
+            heads = 16
+            cylinder_times_heads = total_sectors // sectors_per_track
+        else:
+            sectors_per_track = 17
+            cylinder_times_heads = total_sectors // sectors_per_track
+            heads = max((cylinder_times_heads + 1023) // 1024, 4)
+            if cylinder_times_heads >= heads * 1024 or heads > 16:
+                sectors_per_track = 31
+                heads = 16
+                cylinder_times_heads = total_sectors // sectors_per_track
+            if cylinder_times_heads >= heads * 1024:
+                sectors_per_track = 63
+                heads = 16
+                cylinder_times_heads = total_sectors // sectors_per_track
+        return cylinder_times_heads // heads, heads, sectors_per_track
+
+    @classmethod
+    def footer(self, byte_size):
+        """
+        Kudos to Steven Edouard: https://gist.github.com/sedouard
+        who provided the following:
+
+        Generate the footer of a vhd fixed disk of the specified size.
+        The footer must be conform to the VHD Footer Format Specification
+        at https://technet.microsoft.com/en-us/virtualization/bb676673.aspx#E3B
+        which specifies the data structure as follows:
+        * Field         Size (bytes)
+        * Cookie        8
+        * Features      4
+        * Version       4
+        * Data Offset   4
+        * TimeStamp     4
+        * Creator App   4
+        * Creator Ver   4
+        * CreatorHostOS 4
+        * Original Size 8
+        * Current Size  8
+        * Disk Geo      4
+        * Disk Type     4
+        * Checksum      4
+        * Unique ID     16
+        * Saved State   1
+        * Reserved      427
+        """
+        # the ascii string 'conectix'
+        cookie = bytearray(
+            [0x63, 0x6f, 0x6e, 0x65, 0x63, 0x74, 0x69, 0x78]
+        )
+        # no features enabled
+        features = bytearray(
+            [0x00, 0x00, 0x00, 0x02]
+        )
+        # current file version
+        version = bytearray(
+            [0x00, 0x01, 0x00, 0x00]
+        )
+        # in the case of a fixed disk, this is set to -1
+        data_offset = bytearray(
+            [0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff]
+        )
+        # hex representation of seconds since january 1st 2000
+        timestamp = bytearray.fromhex(
+            hex(long(datetime.now().strftime('%s')) - 946684800).replace(
+                'L', ''
+            ).replace('0x', '').zfill(8))
+        # ascii code for 'wa' = windowsazure
+        creator_app = bytearray(
+            [0x77, 0x61, 0x00, 0x00]
+        )
+        # ascii code for version of creator application
+        creator_version = bytearray(
+            [0x00, 0x07, 0x00, 0x00]
+        )
+        # creator host os. windows or mac, ascii for 'wi2k'
+        creator_os = bytearray(
+            [0x57, 0x69, 0x32, 0x6b]
+        )
+        original_size = bytearray.fromhex(
+            hex(byte_size).replace('L', '').replace('0x', '').zfill(16)
+        )
+        current_size = bytearray.fromhex(
+            hex(byte_size).replace('L', '').replace('0x', '').zfill(16)
+        )
+        # cylinders (2 bytes), heads and sectors per track (1 byte each)
+        cylinders, heads, sectors_per_track = self.geometry(byte_size)
+        disk_geometry = bytearray(
+            [cylinders >> 8, cylinders & 0xff, heads, sectors_per_track]
+        )
+        # 0x2 = fixed hard disk
+        disk_type = bytearray(
+            [0x00, 0x00, 0x00, 0x02]
+        )
+        # a uuid
+        unique_id = bytearray.fromhex(uuid4().hex)
+        # saved state and reserved
+        saved_reserved = bytearray(428)
+        # Compute Checksum with Checksum = ones compliment of sum of
+        # all fields excluding the checksum field
+        to_checksum_array = \
+            cookie + features + version + data_offset + \
+            timestamp + creator_app + creator_version + \
+            creator_os + original_size + current_size + \
+            disk_geometry + disk_type + unique_id + saved_reserved
+
+        total = 0
+        for b in to_checksum_array:
+            total += b
+        total = ~total
+
+        # handle two's compliment
+        def tohex(val, nbits):
+            return hex((val + (1 << nbits)) % (1 << nbits))
+
+        checksum = bytearray.fromhex(
+            tohex(total, 32).replace('L', '').replace('0x', '').zfill(8)
+        )
+
+        return bytes(
+            cookie + features + version + data_offset +
+            timestamp + creator_app + creator_version +
+            creator_os + original_size + current_size +
+            disk_geometry + disk_type + checksum + unique_id + saved_reserved
+        )
@@ -0,0 +1,146 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from collections import namedtuple
+import os
+import struct
+import zlib
+
+# project
+from .cluster_image import ClusterImage
+from ..azurectl_exceptions import AzureVMDKError
+
+VMDKHeader = namedtuple(
+    'VMDKHeader',
+    'magic version flags capacity grain_size descriptor_offset '
+    'descriptor_size gtes_per_gt rgd_offset gd_offset overhead '
+    'unclean_shutdown newline_chars compress_algorithm'
+)
+
+VMDK_HEADER_MAGIC = b'KDMV'
+VMDK_HEADER_FORMAT = '<4sIIQQQQIQQQB4sH'
+
+
+class VMDK(ClusterImage):
+    """
+        Read access to the virtual disk of a sparse VMDK extent, as
+        used by monolithicSparse and streamOptimized images. The
+        grains are looked up in the grain directory and grain tables
+        of the extent, grains without grain table entry and zeroed
+        grains are unallocated. Compressed grains of streamOptimized
+        images are inflated on read
+    """
+    SECTOR_SIZE = 512
+    GD_AT_END = 0xffffffffffffffff
+    ZEROED_GRAIN_FLAG = 1 << 2
+    COMPRESSED_FLAG = 1 << 16
+    COMPRESSION_DEFLATE = 1
+    # lba and size of the grain marker preceding compressed grains
+    GRAIN_MARKER_FORMAT = '<QI'
+
+    def __init__(self, file_name):
+        super(VMDK, self).__init__(file_name)
+        try:
+            self.header = self.__read_header(0)
+            if self.header.gd_offset == self.GD_AT_END:
+                # streamOptimized, the footer holds the grain directory
+                self.header = self.__read_header(
+                    os.fstat(self.file.fileno()).st_size - 2 * self.SECTOR_SIZE
+                )
+            self.cluster_size = self.header.grain_size * self.SECTOR_SIZE
+            self.size = self.header.capacity * self.SECTOR_SIZE
+            self.compressed = bool(self.header.flags & self.COMPRESSED_FLAG)
+            self.zeroed_grains = bool(
+                self.header.flags & self.ZEROED_GRAIN_FLAG
+            )
+            grain_tables = -(
+                -self.header.capacity //
+                (self.header.grain_size * self.header.gtes_per_gt)
+            )
+            self.grain_directory = self.__read_table(
+                self.header.gd_offset, grain_tables
+            )
+            self.grain_tables = {}
+        except Exception:
+            self.file.close()
+            raise
+
+    def allocated(self, index):
+        entry = self.__grain_entry(index)
+        return entry > 1 or (entry == 1 and not self.zeroed_grains)
+
+    def read_cluster(self, index):
+        offset = self.__grain_entry(index) * self.SECTOR_SIZE
+        if not self.compressed:
+            return self.read_at(offset, self.cluster_size)
+        marker_size = struct.calcsize(self.GRAIN_MARKER_FORMAT)
+        size = struct.unpack(
+            self.GRAIN_MARKER_FORMAT, self.read_at(offset, marker_size)
+        )[1]
+        data = zlib.decompress(self.read_at(offset + marker_size, size))
+        if len(data) > self.cluster_size:
+            raise AzureVMDKError(
+                'Compressed grain %d exceeds the grain size' % index
+            )
+        # the last grain of the disk may be stored shorter
+        return data + bytes(bytearray(self.cluster_size - len(data)))
+
+    @classmethod
+    def open(self, file_name):
+        return VMDK(file_name)
+
+    @classmethod
+    def virtual_size(self, file_name):
+        with VMDK(file_name) as image:
+            return image.size
+
+    def __read_header(self, offset):
+        header = VMDKHeader(*struct.unpack(
+            VMDK_HEADER_FORMAT,
+            self.read_at(offset, struct.calcsize(VMDK_HEADER_FORMAT))
+        ))
+        if header.magic != VMDK_HEADER_MAGIC:
+            raise AzureVMDKError('Not a sparse VMDK extent')
+        if header.version not in (1, 2, 3):
+            raise AzureVMDKError(
+                'Unsupported VMDK version %d' % header.version
+            )
+        if not header.grain_size or not header.gtes_per_gt:
+            raise AzureVMDKError('Invalid VMDK grain table layout')
+        if header.flags & self.COMPRESSED_FLAG and \
+                header.compress_algorithm != self.COMPRESSION_DEFLATE:
+            raise AzureVMDKError(
+                'Unsupported VMDK compression %d' % header.compress_algorithm
+            )
+        return header
+
+    def __read_table(self, sector, entries):
+        return struct.unpack(
+            '<%dI' % entries,
+            self.read_at(sector * self.SECTOR_SIZE, entries * 4)
+        )
+
+    def __grain_entry(self, index):
+        gd_index, gt_index = divmod(index, self.header.gtes_per_gt)
+        if gd_index not in self.grain_tables:
+            gt_sector = self.grain_directory[gd_index]
+            if gt_sector:
+                self.grain_tables[gd_index] = self.__read_table(
+                    gt_sector, self.header.gtes_per_gt
+                )
+            else:
+                self.grain_tables[gd_index] = None
+        grain_table = self.grain_tables[gd_index]
+        if not grain_table:
+            return 0
+        return grain_table[gt_index]
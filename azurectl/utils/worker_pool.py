@@ -0,0 +1,109 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+from queue import (
+    Queue,
+    Full
+)
+
+# project
+from ..azurectl_exceptions import AzureWorkerPoolError
+
+
+class WorkerPool(object):
+    """
+        Bounded pool of worker threads processing queued jobs.
+        The job queue holds at most queue_size pending jobs, thus
+        a producer calling submit is blocked until a worker is
+        ready to take over, which limits the read ahead
+    """
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, threads, queue_size=None):
+        self.threads = int(threads)
+        if self.threads < 1:
+            raise AzureWorkerPoolError(
+                'At least one worker thread is required, got %d' %
+                self.threads
+            )
+        if not queue_size:
+            queue_size = 2 * self.threads
+        self.jobs = Queue(queue_size)
+        self.errors = []
+        self.lock = threading.Lock()
+        self.workers = []
+        for count in range(self.threads):
+            worker = threading.Thread(target=self.__run)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, job, *args, **kwargs):
+        """
+            Queue job(*args) for processing by the next free worker.
+            If a previous job has failed its error is raised here so
+            the producer stops feeding the pool. The remaining jobs
+            of a failed pool are dropped, for a dropped job the
+            callable given as cleanup keyword is called instead, e.g
+            to release resources the job would have released
+        """
+        self.__raise_on_error()
+        self.__put((job, args, kwargs.get('cleanup')))
+
+    def join(self):
+        """
+            Wait for all queued jobs to complete, stop the workers
+            and raise if any of the jobs has failed
+        """
+        for worker in self.workers:
+            self.__put(None)
+        for worker in self.workers:
+            while worker.is_alive():
+                # join with timeout to stay interruptible
+                worker.join(self.POLL_INTERVAL)
+        self.__raise_on_error()
+
+    def __put(self, item):
+        while True:
+            try:
+                # put with timeout to stay interruptible
+                self.jobs.put(item, True, self.POLL_INTERVAL)
+                return
+            except Full:
+                pass
+
+    def __run(self):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                return
+            job, args, cleanup = item
+            if self.errors:
+                # pool has failed, drain remaining jobs
+                if not cleanup:
+                    continue
+                job, args = cleanup, ()
+            try:
+                job(*args)
+            except Exception as e:
+                with self.lock:
+                    self.errors.append(
+                        '%s: %s' % (type(e).__name__, format(e))
+                    )
+
+    def __raise_on_error(self):
+        if self.errors:
+            raise AzureWorkerPoolError(
+                'Worker job failed with: %s' % '\n'.join(self.errors)
+            )
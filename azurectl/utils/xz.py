@@ -11,18 +11,46 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import subprocess
+from collections import namedtuple
+import multiprocessing
+import os
+import struct
 import lzma
+import zlib
 
 # project
+from .parallel_decompressor import ParallelDecompressor
+from .read_ahead import ReadAhead
 from ..azurectl_exceptions import AzureXZError
 
+XZBlock = namedtuple(
+    'XZBlock',
+    'compressed_offset total_size unpadded_size uncompressed_size check_id'
+)
+
+XZ_HEADER_MAGIC = b'\xfd7zXZ\x00'
+XZ_FOOTER_MAGIC = b'YZ'
+XZ_STREAM_HEADER_SIZE = 12
+XZ_STREAM_PADDING = b'\x00\x00\x00\x00'
+
+
+def decompress_block(file_name, block):
+    """
+        Decompress one block of an xz file. The block is wrapped into
+        a single block xz stream of its own, which allows to use the
+        standard xz stream decoder in a worker process
+    """
+    with open(file_name, 'rb') as xz_file:
+        xz_file.seek(block.compressed_offset)
+        block_data = xz_file.read(block.total_size)
+    return lzma.decompress(XZ.single_block_stream(block, block_data))
+
 
 class XZ(object):
     """
         Implements decompression of lzma compressed files
     """
-    LZMA_STREAM_BUFFER_SIZE = 8192
+    LZMA_STREAM_BUFFER_SIZE = 1048576
 
     def __enter__(self):
         return self
@@ -40,53 +68,214 @@ class XZ(object):
         if self.finished:
             # lzma stream end already reached
             return None
-        chunks = self.lzma.decompress(
-            self.lzma.unconsumed_tail, size
-        )
-        bytes_unpacked = len(chunks)
-        if bytes_unpacked == size:
-            # first decompression already completed the requested size
-            return chunks
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readinto(self, buffer):
+        """
+            Decompress into the given writable buffer, returns the
+            number of bytes unpacked which is only less than the
+            buffer size at the end of the stream
+        """
+        if self.finished:
+            return 0
+        view = memoryview(buffer)
+        bytes_unpacked = 0
+        lzma_chunk = b''
         while True:
+            chunk = self.lzma.decompress(
+                self.lzma.unconsumed_tail + lzma_chunk,
+                len(view) - bytes_unpacked
+            )
+            view[bytes_unpacked:bytes_unpacked + len(chunk)] = chunk
+            bytes_unpacked += len(chunk)
+            if bytes_unpacked == len(view):
+                # requested size unpacked
+                return bytes_unpacked
             lzma_chunk = self.lzma_stream.read(self.buffer_size)
             if not lzma_chunk:
                 if self.lzma.flush():
                     # must have zero data, otherwise raise
                     raise AssertionError
-                # there is one superfluous newline with the last chunk
-                chunks = chunks[:-1]
                 self.finished = True
-                break
-            else:
-                chunk = self.lzma.decompress(
-                    self.lzma.unconsumed_tail + lzma_chunk,
-                    size - bytes_unpacked
-                )
-                chunks += chunk
-                bytes_unpacked += len(chunk)
-                if bytes_unpacked == size:
-                    # requested size unpacked
-                    break
-        return chunks
+                return bytes_unpacked
 
-    @classmethod
     def close(self):
         self.lzma_stream.close()
 
     @classmethod
-    def open(self, file_name, buffer_size=LZMA_STREAM_BUFFER_SIZE):
+    def open(
+        self, file_name, buffer_size=LZMA_STREAM_BUFFER_SIZE, processes=None
+    ):
+        """
+            Open xz file for reading. Files with more than one block
+            are decompressed block parallel by the given number of
+            processes, by default one per cpu. Single block files are
+            decompressed as one stream in a read ahead thread
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if processes > 1:
+            blocks = self.blocks(file_name)
+            if len(blocks) > 1:
+                return ParallelXZ(file_name, blocks, processes)
         self.lzma_stream = open(file_name, 'rb')
-        return XZ(self.lzma_stream, buffer_size)
+        return ReadAhead(XZ(self.lzma_stream, buffer_size))
+
+    @classmethod
+    def blocks(self, file_name):
+        """
+            List of XZBlock information for all blocks in all streams
+            of the xz file. The information is read from the stream
+            footer and index of each stream, starting at the end of
+            the file, no block data needs to be read
+        """
+        try:
+            with open(file_name, 'rb') as xz_file:
+                return self.__read_blocks(xz_file)
+        except AzureXZError:
+            raise
+        except Exception as e:
+            raise AzureXZError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
 
     @classmethod
     def uncompressed_size(self, file_name):
-        xz_info = subprocess.Popen(
-            ['xz', '--robot', '--list', file_name],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+        return sum(
+            block.uncompressed_size for block in self.blocks(file_name)
+        )
+
+    @classmethod
+    def single_block_stream(self, block, block_data):
+        """
+            Wrap the block data into a valid xz stream consisting of
+            stream header, the block, an index with one record and
+            the stream footer
+        """
+        stream_flags = struct.pack('<BB', 0, block.check_id)
+        header = XZ_HEADER_MAGIC + stream_flags + self.__crc32(stream_flags)
+
+        index = b'\x00' + self.__encode_varint(1) + \
+            self.__encode_varint(block.unpadded_size) + \
+            self.__encode_varint(block.uncompressed_size)
+        index += b'\x00' * (-len(index) % 4)
+        index += self.__crc32(index)
+
+        backward_size = struct.pack('<I', len(index) // 4 - 1)
+        footer = self.__crc32(backward_size + stream_flags) + \
+            backward_size + stream_flags + XZ_FOOTER_MAGIC
+
+        return header + block_data + index + footer
+
+    @classmethod
+    def __crc32(self, data):
+        return struct.pack('<I', zlib.crc32(data) & 0xffffffff)
+
+    @classmethod
+    def __encode_varint(self, value):
+        encoded = bytearray()
+        while value >= 0x80:
+            encoded.append((value & 0x7f) | 0x80)
+            value >>= 7
+        encoded.append(value)
+        return bytes(encoded)
+
+    @classmethod
+    def __read_blocks(self, xz_file):
+        xz_file.seek(0, os.SEEK_END)
+        stream_end = xz_file.tell()
+        blocks = []
+        while stream_end > 0:
+            xz_file.seek(stream_end - 4)
+            if xz_file.read(4) == XZ_STREAM_PADDING:
+                stream_end -= 4
+            else:
+                stream_blocks, stream_end = self.__read_stream_blocks(
+                    xz_file, stream_end
+                )
+                blocks = stream_blocks + blocks
+        return blocks
+
+    @classmethod
+    def __read_stream_blocks(self, xz_file, stream_end):
+        """
+            Read the blocks of the stream ending at stream_end from
+            its footer and index, returns the blocks and the start
+            offset of the stream
+        """
+        if stream_end < 2 * XZ_STREAM_HEADER_SIZE:
+            raise AzureXZError('Truncated xz stream in %s' % xz_file.name)
+
+        xz_file.seek(stream_end - XZ_STREAM_HEADER_SIZE)
+        footer = xz_file.read(XZ_STREAM_HEADER_SIZE)
+        if footer[10:] != XZ_FOOTER_MAGIC or \
+                footer[:4] != self.__crc32(footer[4:10]):
+            raise AzureXZError('No xz stream footer in %s' % xz_file.name)
+        backward_size, check_id = struct.unpack('<IxB', footer[4:10])
+        check_id &= 0x0f
+
+        index_size = (backward_size + 1) * 4
+        index_start = stream_end - XZ_STREAM_HEADER_SIZE - index_size
+        xz_file.seek(index_start)
+        index = bytearray(xz_file.read(index_size))
+        if index[0] != 0 or \
+                bytes(index[-4:]) != self.__crc32(bytes(index[:-4])):
+            raise AzureXZError('Invalid xz index in %s' % xz_file.name)
+
+        record_count, position = self.__decode_varint(index, 1)
+        records = []
+        for record in range(record_count):
+            unpadded_size, position = self.__decode_varint(index, position)
+            uncompressed_size, position = self.__decode_varint(index, position)
+            records.append((unpadded_size, uncompressed_size))
+
+        stream_start = index_start - XZ_STREAM_HEADER_SIZE - sum(
+            self.__padded(unpadded_size) for unpadded_size, size in records
+        )
+        xz_file.seek(stream_start)
+        if xz_file.read(len(XZ_HEADER_MAGIC)) != XZ_HEADER_MAGIC:
+            raise AzureXZError('No xz stream header in %s' % xz_file.name)
+
+        blocks = []
+        offset = stream_start + XZ_STREAM_HEADER_SIZE
+        for unpadded_size, uncompressed_size in records:
+            blocks.append(
+                XZBlock(
+                    compressed_offset=offset,
+                    total_size=self.__padded(unpadded_size),
+                    unpadded_size=unpadded_size,
+                    uncompressed_size=uncompressed_size,
+                    check_id=check_id
+                )
+            )
+            offset += self.__padded(unpadded_size)
+        return blocks, stream_start
+
+    @classmethod
+    def __decode_varint(self, data, position):
+        value = 0
+        shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return value, position
+
+    @classmethod
+    def __padded(self, size):
+        return size + (-size % 4)
+
+
+class ParallelXZ(ParallelDecompressor):
+    """
+        Block parallel decompression of multi block xz files, see
+        ParallelDecompressor
+    """
+    def __init__(self, file_name, blocks, processes, read_ahead=None):
+        super(ParallelXZ, self).__init__(
+            file_name, blocks, processes, decompress_block, AzureXZError,
+            read_ahead
         )
-        output, error = xz_info.communicate()
-        if xz_info.returncode != 0:
-            raise AzureXZError('%s' % error)
-        total = output.strip().split('\n').pop()
-        return int(total.split()[4])
@@ -0,0 +1,85 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from collections import deque
+import lzma
+import threading
+
+# project
+from ..azurectl_exceptions import AzureXZError
+
+
+class XZWriter(object):
+    """
+        Write an image of byte_size bytes as xz compressed stream,
+        from ranges written by parallel threads. The ranges to be
+        written are passed in as sorted list of (start, length)
+        tuples. As the stream is sequential, write_at blocks until
+        all ranges before the given one are written. The gaps between
+        the ranges are compressed as zeros
+    """
+    POLL_INTERVAL = 0.5
+    ZERO_BLOCK_SIZE = 1048576
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, file_name, byte_size, ranges):
+        self.file = open(file_name, 'wb')
+        self.byte_size = byte_size
+        self.starts = deque([start for start, length in ranges])
+        self.lzma = lzma.LZMACompressor()
+        self.position = 0
+        self.aborted = False
+        self.condition = threading.Condition()
+
+    def write_at(self, data, offset):
+        with self.condition:
+            while not self.aborted and self.starts[0] != offset:
+                # wait with timeout to stay interruptible
+                self.condition.wait(self.POLL_INTERVAL)
+            if self.aborted:
+                raise AzureXZError(
+                    'Compressed stream aborted at offset %d' % self.position
+                )
+            self.__write_zeros(offset - self.position)
+            self.file.write(self.lzma.compress(bytes(data)))
+            self.position = offset + len(data)
+            self.starts.popleft()
+            self.condition.notify_all()
+
+    def abort(self):
+        """
+            Wake up and fail all pending writes, e.g because a range
+            before them can't be written
+        """
+        with self.condition:
+            self.aborted = True
+            self.condition.notify_all()
+
+    def close(self):
+        if not self.aborted:
+            self.__write_zeros(self.byte_size - self.position)
+            self.file.write(self.lzma.flush())
+        self.file.close()
+
+    def __write_zeros(self, byte_size):
+        zero_block = bytes(bytearray(min(byte_size, self.ZERO_BLOCK_SIZE)))
+        while byte_size > 0:
+            self.file.write(
+                self.lzma.compress(zero_block[:min(byte_size, len(zero_block))])
+            )
+            byte_size -= len(zero_block)
@@ -0,0 +1,69 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+class ZeroPage(object):
+    """
+        Detection of zero filled pages in a data buffer. Buffers are
+        compared against cached zero buffers, first as a whole, then
+        in blocks of SCAN_BLOCK_SIZE and only for blocks containing
+        data at PAGE_SIZE granularity
+    """
+    PAGE_SIZE = 512
+    SCAN_BLOCK_SIZE = 65536
+
+    zero_buffers = {}
+
+    @classmethod
+    def data_ranges(self, data, page_size=PAGE_SIZE):
+        """
+            Return the list of (offset, length) tuples of the areas
+            in data which are not zero filled. Adjacent data pages are
+            merged into one range
+        """
+        view = memoryview(data)
+        length = len(view)
+        if view == self.__zero_buffer(length):
+            return []
+        ranges = []
+        range_start = None
+        block_size = max(self.SCAN_BLOCK_SIZE, page_size)
+        for block_start in range(0, length, block_size):
+            block_end = min(block_start + block_size, length)
+            block = view[block_start:block_end]
+            if block == self.__zero_buffer(block_end - block_start):
+                if range_start is not None:
+                    ranges.append((range_start, block_start - range_start))
+                    range_start = None
+            else:
+                for page_start in range(block_start, block_end, page_size):
+                    page_end = min(page_start + page_size, block_end)
+                    page = view[page_start:page_end]
+                    if page == self.__zero_buffer(page_end - page_start):
+                        if range_start is not None:
+                            ranges.append(
+                                (range_start, page_start - range_start)
+                            )
+                            range_start = None
+                    elif range_start is None:
+                        range_start = page_start
+        if range_start is not None:
+            ranges.append((range_start, length - range_start))
+        return ranges
+
+    @classmethod
+    def __zero_buffer(self, size):
+        if size not in self.zero_buffers:
+            self.zero_buffers[size] = bytes(bytearray(size))
+        return self.zero_buffers[size]
@@ -60,7 +60,7 @@ function _azurectl {
                 return 0
                 ;;
             "disk")
-                __comp_reply "sas delete help --help upload"
+                __comp_reply "help verify upload sas plan download copy --help delete"
                 return 0
                 ;;
             "disassociate")
@@ -71,6 +71,10 @@ function _azurectl {
                 __comp_reply "--disk-name attached --name --cloud-service-name --instance-name"
                 return 0
                 ;;
+            "download")
+                __comp_reply "--threads --quiet --blob-name --xz --max-chunk-size --destination"
+                return 0
+                ;;
             "sas")
                 __comp_reply "--blob-name --start-datetime --expiry-datetime --permissions --name"
                 return 0
@@ -79,6 +83,14 @@ function _azurectl {
                 __comp_reply "--name"
                 return 0
                 ;;
+            "copy")
+                __comp_reply "--quiet --target --source-blob"
+                return 0
+                ;;
+            "verify")
+                __comp_reply "--threads --blob-name"
+                return 0
+                ;;
             "create")
                 __comp_reply "--label --disk-basename --size --name --blob-name --wait --password --ssh-private-key-file --cloud-service-name --fingerprint --reserved-ip-name --user --instance-name --instance-type --image-name --custom-data --ssh-port --instance-port --port --idle-timeout --udp --locally-redundant --read-access-geo-redundant --description --geo-redundant --zone-redundant"
                 return 0
@@ -115,6 +127,10 @@ function _azurectl {
                 __comp_reply "--eula --description --image-family --privacy-uri --icon-uri --name --small-icon-uri --label --language --published-date --new-secondary-key --locally-redundant --read-access-geo-redundant --wait --geo-redundant --zone-redundant --new-primary-key"
                 return 0
                 ;;
+            "plan")
+                __comp_reply "--member --source --bandwidth --convert-raw"
+                return 0
+                ;;
             "detach")
                 __comp_reply "--cloud-service-name --lun --instance-name --wait"
                 return 0
@@ -140,7 +156,7 @@ function _azurectl {
                 return 0
                 ;;
             "upload")
-                __comp_reply "--source --blob-name --max-chunk-size --quiet"
+                __comp_reply "--member --threads --blob-name --quiet --byte-size --shard --resume --adaptive --target --base-blob --no-hash-cache --no-range-map --max-chunk-size --source --convert-raw"
                 return 0
                 ;;
             "remove")
@@ -159,6 +175,10 @@ function _azurectl {
                 __comp_reply "--container-name --name --region --storage-account-name"
                 return 0
                 ;;
+            "--resume")
+                __comp_reply "--check-page-ranges"
+                return 0
+                ;;
             "attached")
                 __comp_reply "--cloud-service-name --lun --instance-name"
                 return 0
@@ -0,0 +1,244 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from BaseHTTPServer import (
+    BaseHTTPRequestHandler,
+    HTTPServer
+)
+from SocketServer import ThreadingMixIn
+from email.utils import formatdate
+from urlparse import (
+    urlparse,
+    parse_qs
+)
+import base64
+import hashlib
+import json
+import multiprocessing
+import re
+import threading
+import time
+import urllib2
+
+from azurectl.utils.range_set import RangeSet
+
+
+class BlobStore(object):
+    """
+        Page blob bookkeeping of the stand-in. Only the valid page
+        ranges of a blob are kept, the page data is discarded
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.blobs = {}
+            self.requests = {}
+            self.bytes_received = 0
+
+    def count(self, operation, byte_size=0):
+        with self.lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+            self.bytes_received += byte_size
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'bytes_received': self.bytes_received
+            }
+
+
+class BlobRequestHandler(BaseHTTPRequestHandler):
+    """
+        Emulation of the page blob requests used by azurectl:
+        create blob, put page, get page ranges and get properties.
+        Authentication is not checked. Each request is delayed by
+        the configured latency plus the time the request body takes
+        to transfer at the configured bandwidth
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_PUT(self):
+        body = self.__read_body()
+        path, query = self.__parse_path()
+        if path == '/__reset':
+            self.server.store.reset()
+            return self.__respond(200)
+        self.__delay(len(body))
+        if query.get('comp') == ['page']:
+            return self.__put_page(path, body)
+        if query.get('comp') == ['metadata']:
+            # image digest, accepted but not stored
+            self.server.store.count('set_blob_metadata')
+            return self.__respond(200)
+        if self.headers.get('x-ms-blob-type') == 'PageBlob':
+            return self.__create_blob(path)
+        if self.headers.get('x-ms-blob-type') == 'BlockBlob':
+            # hash manifest, accepted but not stored
+            self.server.store.count('put_block_blob', len(body))
+            return self.__respond(201)
+        self.__respond(400)
+
+    def do_GET(self):
+        path, query = self.__parse_path()
+        if path == '/__stats':
+            return self.__respond(
+                200, body=json.dumps(self.server.store.stats())
+            )
+        self.__delay(0)
+        if query.get('comp') == ['pagelist']:
+            return self.__get_page_ranges(path)
+        self.__respond(400)
+
+    def do_HEAD(self):
+        path, query = self.__parse_path()
+        self.__delay(0)
+        store = self.server.store
+        store.count('get_blob_properties')
+        with store.lock:
+            blob = store.blobs.get(path)
+        if not blob:
+            return self.__respond(404)
+        self.__respond(200, headers={
+            'x-ms-blob-type': 'PageBlob',
+            'x-ms-blob-content-length': str(blob['size'])
+        }, content_length=blob['size'])
+
+    def log_message(self, format, *args):
+        pass
+
+    def __create_blob(self, path):
+        store = self.server.store
+        store.count('create_blob')
+        with store.lock:
+            store.blobs[path] = {
+                'size': int(self.headers.get('x-ms-blob-content-length')),
+                'pages': RangeSet()
+            }
+        self.__respond(201)
+
+    def __put_page(self, path, body):
+        store = self.server.store
+        store.count('update_page', len(body))
+        content_md5 = self.headers.get('Content-MD5')
+        if content_md5 and content_md5 != base64.b64encode(
+            hashlib.md5(body).digest()
+        ):
+            return self.__respond(400)
+        start, end = [
+            int(value) for value in re.match(
+                'bytes=(\d+)-(\d+)', self.headers.get('x-ms-range')
+            ).groups()
+        ]
+        with store.lock:
+            blob = store.blobs.get(path)
+            if blob:
+                blob['pages'].add(start, end - start + 1)
+        if not blob:
+            return self.__respond(404)
+        self.__respond(201, headers={'x-ms-blob-sequence-number': '0'})
+
+    def __get_page_ranges(self, path):
+        store = self.server.store
+        store.count('get_page_ranges')
+        with store.lock:
+            blob = store.blobs.get(path)
+            ranges = blob['pages'].ranges() if blob else None
+        if ranges is None:
+            return self.__respond(404)
+        body = '<?xml version="1.0" encoding="utf-8"?><PageList>'
+        for start, length in ranges:
+            body += '<PageRange><Start>%d</Start><End>%d</End></PageRange>' % (
+                start, start + length - 1
+            )
+        body += '</PageList>'
+        self.__respond(200, body=body)
+
+    def __parse_path(self):
+        url = urlparse(self.path)
+        return url.path, parse_qs(url.query)
+
+    def __read_body(self):
+        return self.rfile.read(int(self.headers.get('content-length', 0)))
+
+    def __delay(self, byte_size):
+        delay = self.server.latency
+        if self.server.bandwidth:
+            delay += float(byte_size) / self.server.bandwidth
+        if delay:
+            time.sleep(delay)
+
+    def __respond(self, status, headers=None, body='', content_length=None):
+        self.send_response(status)
+        self.send_header('ETag', '"0x8D0000000000000"')
+        self.send_header('Last-Modified', formatdate(usegmt=True))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if content_length is None:
+            content_length = len(body)
+        self.send_header('Content-Length', str(content_length))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+
+class ThreadingBlobServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency, bandwidth):
+        HTTPServer.__init__(self, address, BlobRequestHandler)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.store = BlobStore()
+
+
+class BlobServer(object):
+    """
+        Local stand-in for the page blob service, running in a
+        process of its own such that it does not add to the CPU time
+        and memory usage measured for the upload. latency is given
+        in seconds per request, bandwidth in bytes per second and
+        connection, zero means unlimited
+    """
+    def __init__(self, latency=0, bandwidth=0):
+        self.server = ThreadingBlobServer(
+            ('127.0.0.1', 0), latency, bandwidth
+        )
+        self.address = '%s:%d' % self.server.server_address
+        self.process = multiprocessing.Process(
+            target=self.server.serve_forever
+        )
+        # bypass any proxy configured in the environment
+        self.opener = urllib2.build_opener(urllib2.ProxyHandler({}))
+
+    def __enter__(self):
+        self.process.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.process.terminate()
+        self.process.join()
+        self.server.server_close()
+
+    def reset(self):
+        request = urllib2.Request('http://%s/__reset' % self.address, '')
+        request.get_method = lambda: 'PUT'
+        self.opener.open(request).read()
+
+    def stats(self):
+        return json.loads(
+            self.opener.open('http://%s/__stats' % self.address).read()
+        )
@@ -0,0 +1,279 @@
+# Copyright (c) 2016 SUSE.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Upload throughput benchmark of azurectl storage disk upload against a
+local page blob stand-in, run from the top level directory by:
+python -m test.benchmark.upload_benchmark
+
+usage: upload_benchmark.py [--size=<mb>] [--latency=<ms>]
+           [--bandwidth=<mbit>] [--threads=<n>] [--max-chunk-size=<size>]
+           [--adaptive] [--scenario=<name>...] [--timeout=<seconds>]
+           [--json]
+       upload_benchmark.py -h | --help
+
+options:
+    --adaptive
+        upload with adaptive chunk size
+    --bandwidth=<mbit>
+        emulated bandwidth per connection in MBit/s, 0 is unlimited
+        [default: 0]
+    --json
+        print the results as json document
+    --latency=<ms>
+        emulated latency per request in milliseconds [default: 0]
+    --max-chunk-size=<size>
+        max chunk size in bytes for upload, default 4MB
+    --scenario=<name>
+        one of raw, sparse, xz or xz-blocks, all if not specified
+    --size=<mb>
+        size of the synthetic images in MB [default: 64]
+    --threads=<n>
+        number of page ranges uploaded in parallel [default: 4]
+    --timeout=<seconds>
+        time after which the upload of a scenario is aborted and
+        reported as failed [default: 600]
+"""
+from docopt import docopt
+import json
+import lzma
+import multiprocessing
+import os
+from queue import Empty
+import requests
+import resource
+import shutil
+import tempfile
+import time
+from azure.storage.blob.blockblobservice import BlockBlobService
+from azure.storage.blob.pageblobservice import PageBlobService
+
+import azurectl.logger
+azurectl.logger.init()
+
+import azurectl.storage.storage
+from azurectl.storage.storage import Storage
+
+from .blob_server import BlobServer
+
+MB = 1048576
+POLL_INTERVAL = 1
+XZ_BLOCK_SIZE = 4 * MB
+SCENARIOS = ['raw', 'sparse', 'xz', 'xz-blocks']
+
+
+class BenchmarkAccount(object):
+    def storage_name(self):
+        return 'benchmark'
+
+    def storage_key(self):
+        # base64 encoding of 'benchmark-key'
+        return 'YmVuY2htYXJrLWtleQ=='
+
+    def get_blob_service_host_base(self):
+        return 'core.windows.net'
+
+
+def image_data(offset):
+    """
+        One MB of image data: a quarter random, a quarter text
+        and half zero pages
+    """
+    text = b'azurectl upload benchmark %d\n' % offset
+    return os.urandom(MB // 4) + \
+        (text * (MB // 4 // len(text) + 1))[:MB // 4] + \
+        bytes(bytearray(MB // 2))
+
+
+def create_raw_image(file_name, byte_size):
+    with open(file_name, 'wb') as image:
+        for offset in range(0, byte_size, MB):
+            image.write(image_data(offset))
+
+
+def create_sparse_image(file_name, byte_size):
+    # one MB of data every 16MB, the rest are holes
+    with open(file_name, 'wb') as image:
+        for offset in range(0, byte_size, 16 * MB):
+            image.seek(offset)
+            image.write(image_data(offset))
+        image.truncate(byte_size)
+
+
+def create_xz_image(file_name, byte_size, block_size=None):
+    # blocks are written as concatenated single block streams
+    with open(file_name, 'wb') as image:
+        compressor = lzma.LZMACompressor()
+        for offset in range(0, byte_size, MB):
+            if block_size and offset and not offset % block_size:
+                image.write(compressor.flush())
+                compressor = lzma.LZMACompressor()
+            image.write(compressor.compress(image_data(offset)))
+        image.write(compressor.flush())
+
+
+def create_image(scenario, directory, byte_size):
+    file_name = os.path.join(directory, scenario + '.image')
+    if scenario == 'raw':
+        create_raw_image(file_name, byte_size)
+    elif scenario == 'sparse':
+        create_sparse_image(file_name, byte_size)
+    elif scenario == 'xz':
+        create_xz_image(file_name, byte_size)
+    else:
+        create_xz_image(file_name, byte_size, XZ_BLOCK_SIZE)
+    return file_name
+
+
+def upload(image, address, arguments, results):
+    """
+        Upload image to the stand-in, runs in a process of its own
+        to measure CPU time and peak memory of the upload only
+    """
+    def stand_in(service_class):
+        def blob_service(
+            account_name, account_key, endpoint_suffix=None,
+            request_session=None
+        ):
+            # keep the pooled session of the service factory, which
+            # only configures its connection pool for https
+            session = request_session or requests.Session()
+            session.trust_env = False
+            session.mount('http://', session.get_adapter('https://'))
+            return service_class(
+                account_name, account_key, protocol='http',
+                custom_domain=address, request_session=session
+            )
+        return blob_service
+
+    azurectl.storage.storage.PageBlobService = stand_in(PageBlobService)
+    azurectl.storage.storage.BlockBlobService = stand_in(BlockBlobService)
+    storage = Storage(BenchmarkAccount(), 'benchmark')
+    start_time = time.time()
+    storage.upload(
+        image, os.path.basename(image),
+        arguments['--max-chunk-size'],
+        threads=arguments['--threads'],
+        adaptive=arguments['--adaptive']
+    )
+    elapsed = time.time() - start_time
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    results.put({
+        'seconds': elapsed,
+        'image_bytes': storage.upload_status['total_bytes'],
+        'cpu_seconds':
+            usage.ru_utime + usage.ru_stime +
+            children.ru_utime + children.ru_stime,
+        'peak_rss_bytes': max(usage.ru_maxrss, children.ru_maxrss) * 1024
+    })
+
+
+def run_scenario(scenario, image, server, arguments):
+    server.reset()
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=upload, args=(image, server.address, arguments, results)
+    )
+    process.start()
+    result = wait_for_result(process, results, float(arguments['--timeout']))
+    if not result and process.is_alive():
+        process.terminate()
+        process.join()
+        return {'scenario': scenario, 'failed': 'timeout'}
+    process.join()
+    if not result or process.exitcode:
+        return {
+            'scenario': scenario,
+            'failed': 'exit code %d' % process.exitcode
+        }
+    stats = server.stats()
+    result['scenario'] = scenario
+    result['requests'] = stats['requests']
+    result['bytes_sent'] = stats['bytes_received']
+    result['bytes_skipped'] = result['image_bytes'] - stats['bytes_received']
+    result['mb_per_second'] = result['image_bytes'] / MB / result['seconds']
+    return result
+
+
+def wait_for_result(process, results, timeout):
+    """
+        Result of the upload process, None if the process ended
+        without a result or did not deliver it within timeout seconds
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        # a result put before the process ended is in the queue
+        alive = process.is_alive()
+        try:
+            return results.get(timeout=POLL_INTERVAL)
+        except Empty:
+            if not alive:
+                return None
+    return None
+
+
+def print_report(results):
+    row = '%-10s %8s %8s %8s %8s %9s %10s %7s %9s'
+    print row % (
+        'scenario', 'image MB', 'seconds', 'MB/s', 'sent MB',
+        'requests', 'skipped MB', 'cpu s', 'peak RSS'
+    )
+    for result in results:
+        if 'failed' in result:
+            print '%-10s failed: %s' % (result['scenario'], result['failed'])
+            continue
+        print row % (
+            result['scenario'],
+            result['image_bytes'] // MB,
+            '%.2f' % result['seconds'],
+            '%.1f' % result['mb_per_second'],
+            '%.1f' % (float(result['bytes_sent']) / MB),
+            sum(result['requests'].values()),
+            '%.1f' % (float(result['bytes_skipped']) / MB),
+            '%.2f' % result['cpu_seconds'],
+            '%dMB' % (result['peak_rss_bytes'] // MB)
+        )
+
+
+def main():
+    arguments = docopt(__doc__)
+    scenarios = arguments['--scenario'] or SCENARIOS
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            raise SystemExit('Unknown scenario: %s' % scenario)
+    byte_size = int(arguments['--size']) * MB
+    latency = float(arguments['--latency']) / 1000
+    bandwidth = float(arguments['--bandwidth']) * MB / 8
+    directory = tempfile.mkdtemp(prefix='azurectl-benchmark.')
+    results = []
+    try:
+        with BlobServer(latency, bandwidth) as server:
+            for scenario in scenarios:
+                image = create_image(scenario, directory, byte_size)
+                results.append(
+                    run_scenario(scenario, image, server, arguments)
+                )
+                os.remove(image)
+    finally:
+        shutil.rmtree(directory)
+    if arguments['--json']:
+        print json.dumps(results, indent=4, sort_keys=True)
+    else:
+        print_report(results)
+    if any('failed' in result for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
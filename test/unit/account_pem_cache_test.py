@@ -0,0 +1,84 @@
+import os
+import stat
+from mock import patch
+from tempfile import mkdtemp
+import shutil
+import time
+
+from test_helper import *
+
+from azurectl.account.pem_cache import PemCache
+
+
+class TestPemCache:
+    def setup(self):
+        self.cache_directory = mkdtemp()
+        self.cache = PemCache(
+            3600, os.path.join(self.cache_directory, 'pem')
+        )
+
+    def teardown(self):
+        shutil.rmtree(self.cache_directory)
+
+    @patch('azurectl.account.pem_cache.Defaults.cache_directory')
+    def test_default_cache_directory(self, mock_cache_directory):
+        mock_cache_directory.return_value = self.cache_directory
+        assert PemCache(3600).cache_directory == os.path.join(
+            self.cache_directory, 'pem'
+        )
+
+    def test_lookup_unknown(self):
+        assert self.cache.lookup('digest', '4711') is None
+
+    def test_add_and_lookup(self):
+        pem_file = self.cache.add('digest', '4711', 'pem')
+        assert pem_file == os.path.join(
+            self.cache_directory, 'pem', 'digest-4711.pem'
+        )
+        assert self.cache.lookup('digest', '4711') == pem_file
+        assert self.cache.lookup('other', '4711') is None
+        with open(pem_file) as pem:
+            assert pem.read() == 'pem'
+
+    def test_lookup_expired(self):
+        pem_file = self.cache.add('digest', '4711', 'pem')
+        expired = time.time() - 3600
+        os.utime(pem_file, (expired, expired))
+        assert self.cache.lookup('digest', '4711') is None
+        assert not os.path.exists(pem_file)
+
+    def test_add_removes_expired(self):
+        old_pem_file = self.cache.add('old', '4711', 'pem')
+        expired = time.time() - 3600
+        os.utime(old_pem_file, (expired, expired))
+        pem_file = self.cache.add('digest', '4711', 'pem')
+        assert not os.path.exists(old_pem_file)
+        assert os.listdir(self.cache.cache_directory) == [
+            os.path.basename(pem_file)
+        ]
+
+    @patch('azurectl.account.pem_cache.os.remove')
+    @patch('azurectl.account.pem_cache.os.path.getmtime')
+    def test_lookup_expired_not_removable(self, mock_getmtime, mock_remove):
+        self.cache.add('digest', '4711', 'pem')
+        mock_getmtime.side_effect = OSError
+        mock_remove.side_effect = OSError
+        assert self.cache.lookup('digest', '4711') is None
+
+    def test_owner_only(self):
+        pem_file = self.cache.add('digest', '4711', 'pem')
+        assert stat.S_IMODE(os.stat(pem_file).st_mode) == 0o600
+        assert stat.S_IMODE(
+            os.stat(self.cache.cache_directory).st_mode
+        ) == 0o700
+
+    def test_subscription_id_with_separator(self):
+        assert self.cache.add('digest', '../4711', 'pem') == os.path.join(
+            self.cache_directory, 'pem', 'digest-.._4711.pem'
+        )
+
+    @patch('azurectl.account.pem_cache.log.warning')
+    def test_add_not_writable(self, mock_warning):
+        cache = PemCache(3600, '/proc/azurectl/pem')
+        assert cache.add('digest', '4711', 'pem') is None
+        assert mock_warning.called
@@ -0,0 +1,48 @@
+import hashlib
+
+from test_helper import *
+
+from azurectl.azurectl_exceptions import *
+from azurectl.account.publishsettings import PublishSettings
+
+
+class TestPublishSettings:
+    def setup(self):
+        self.settings = PublishSettings(
+            '../data/publishsettings.multiple_subscriptions'
+        )
+
+    def test_digest(self):
+        with open('../data/publishsettings.multiple_subscriptions') as data:
+            assert self.settings.digest == \
+                hashlib.sha256(data.read()).hexdigest()
+
+    def test_subscription(self):
+        subscription = self.settings.subscription('second')
+        assert subscription.attributes['Name'].value == 'second sub'
+        assert self.settings.first_subscription_id() == 'first'
+
+    @raises(AzureSubscriptionIdNotFound)
+    def test_subscription_not_found(self):
+        self.settings.subscription('fourth')
+
+    @raises(AzureSubscriptionIdNotFound)
+    def test_subscription_without_id(self):
+        PublishSettings('../data/publishsettings.missing_id').subscription(
+            'first'
+        )
+
+    @raises(AzureSubscriptionIdNotFound)
+    def test_first_subscription_without_id(self):
+        PublishSettings(
+            '../data/publishsettings.missing_id'
+        ).first_subscription_id()
+
+    @raises(AzureSubscriptionParseError)
+    def test_no_such_file(self):
+        PublishSettings('../data/no-such-publishsettings')
+
+    def test_load_once(self):
+        settings = PublishSettings.load('../data/publishsettings')
+        assert PublishSettings.load('../data/../data/publishsettings') == \
+            settings
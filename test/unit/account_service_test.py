@@ -1,5 +1,8 @@
 import mock
 from mock import patch
+from tempfile import mkdtemp
+import os
+import shutil
 
 
 from test_helper import *
@@ -22,6 +25,16 @@ class TestAzureAccount:
             )
         )
         azurectl.account.service.load_pkcs12 = mock.Mock()
+        self.cache_directory = mkdtemp()
+        self.cache_directory_patch = patch(
+            'azurectl.account.pem_cache.Defaults.cache_directory',
+            return_value=self.cache_directory
+        )
+        self.cache_directory_patch.start()
+
+    def teardown(self):
+        self.cache_directory_patch.stop()
+        shutil.rmtree(self.cache_directory)
 
     def __mock_management_service(self, endpoint, service_response=None, side_effect=None):
         mock_service_function = mock.Mock()
@@ -122,6 +135,13 @@ class TestAzureAccount:
         mock_mgmt_url.return_value = 'invalid.test.url'
         host_base = self.account.get_blob_service_host_base()
 
+    @patch('azurectl.account.service.AzureAccount.get_management_url')
+    def test_get_blob_service_host_base_cached(self, mock_mgmt_url):
+        mock_mgmt_url.return_value = 'management.test.url'
+        self.account.get_blob_service_host_base()
+        assert self.account.get_blob_service_host_base() == 'test.url'
+        assert mock_mgmt_url.call_count == 1
+
     @raises(AzureSubscriptionPKCS12DecodeError)
     def test_subscription_pkcs12_error(self):
         account_invalid = AzureAccount(
@@ -216,6 +236,65 @@ class TestAzureAccount:
         )
         account_invalid.get_management_url()
 
+    @patch('azurectl.account.service.dump_privatekey')
+    @patch('azurectl.account.service.dump_certificate')
+    def test_certificate_filename_cached(
+        self, mock_dump_certificate, mock_dump_pkey
+    ):
+        mock_dump_pkey.return_value = 'key\n'
+        mock_dump_certificate.return_value = 'cert\n'
+        self.account.config.get_pem_cache_ttl = mock.Mock(
+            return_value='3600'
+        )
+        pem_file = self.account.certificate_filename()
+        assert pem_file.startswith(self.cache_directory)
+        with open(pem_file) as pem:
+            assert pem.read() == 'key\ncert\n'
+        assert azurectl.account.service.load_pkcs12.call_count == 1
+        account = AzureAccount(
+            Config(region_name='East US 2', filename='../data/config')
+        )
+        account.config.get_pem_cache_ttl = mock.Mock(
+            return_value='3600'
+        )
+        assert account.certificate_filename() == pem_file
+        assert mock_dump_pkey.call_count == 1
+
+    @patch('azurectl.account.service.PemCache')
+    @patch('azurectl.account.service.dump_privatekey')
+    @patch('azurectl.account.service.dump_certificate')
+    def test_certificate_filename_cache_disabled(
+        self, mock_dump_certificate, mock_dump_pkey, mock_pem_cache
+    ):
+        mock_dump_pkey.return_value = 'key\n'
+        mock_dump_certificate.return_value = 'cert\n'
+        # storage key caching does not enable the PEM cache
+        self.account.config.get_storage_key_cache_ttl = mock.Mock(
+            return_value='3600'
+        )
+        pem_file = self.account.certificate_filename()
+        assert not mock_pem_cache.called
+        assert not pem_file.startswith(self.cache_directory)
+        with open(pem_file) as pem:
+            assert pem.read() == 'key\ncert\n'
+
+    @patch('azurectl.account.service.PemCache.add')
+    @patch('azurectl.account.service.dump_privatekey')
+    @patch('azurectl.account.service.dump_certificate')
+    def test_certificate_filename_not_cached(
+        self, mock_dump_certificate, mock_dump_pkey, mock_add
+    ):
+        mock_dump_pkey.return_value = 'key\n'
+        mock_dump_certificate.return_value = 'cert\n'
+        mock_add.return_value = None
+        self.account.config.get_pem_cache_ttl = mock.Mock(
+            return_value='3600'
+        )
+        pem_file = self.account.certificate_filename()
+        assert not pem_file.startswith(self.cache_directory)
+        with open(pem_file) as pem:
+            assert pem.read() == 'key\ncert\n'
+
     def test_config_without_publishsettings(self):
         account = AzureAccount(
             Config(
@@ -258,6 +337,56 @@ class TestAzureAccount:
                                        )
         assert self.account.storage_key() == 'foo'
 
+    def test_storage_key_cached(self):
+        self.__mock_management_service(
+            'get_storage_account_keys',
+            mock.Mock(storage_service_keys=mock.Mock(primary='foo'))
+        )
+        service = self.account.get_management_service()
+        assert self.account.storage_key() == 'foo'
+        assert self.account.storage_key('bob') == 'foo'
+        service.get_storage_account_keys.assert_called_once_with('bob')
+        self.account.invalidate_storage_key('bob')
+        assert self.account.storage_key() == 'foo'
+        assert service.get_storage_account_keys.call_count == 2
+
+    @patch('azurectl.account.service.StorageKeyCache')
+    def test_storage_key_disk_cache(self, mock_key_cache):
+        self.__mock_management_service(
+            'get_storage_account_keys',
+            mock.Mock(storage_service_keys=mock.Mock(primary='foo'))
+        )
+        service = self.account.get_management_service()
+        self.account.subscription_id = mock.Mock(return_value='4711')
+        self.account.config.get_storage_key_cache_ttl = mock.Mock(
+            return_value='3600'
+        )
+        key_cache = mock_key_cache.return_value
+        key_cache.lookup.return_value = None
+        assert self.account.storage_key() == 'foo'
+        mock_key_cache.assert_called_once_with(3600)
+        key_cache.lookup.assert_called_once_with('4711', 'bob')
+        key_cache.add.assert_called_once_with('4711', 'bob', 'foo')
+        self.account.invalidate_storage_key('bob')
+        key_cache.remove.assert_called_once_with('4711', 'bob')
+        key_cache.lookup.return_value = 'bar'
+        assert self.account.storage_key() == 'bar'
+        assert service.get_storage_account_keys.call_count == 1
+
+    @raises(AzureConfigParseError)
+    def test_pem_cache_invalid_ttl(self):
+        self.account.config.get_pem_cache_ttl = mock.Mock(
+            return_value='one hour'
+        )
+        self.account.certificate_filename()
+
+    @raises(AzureConfigParseError)
+    def test_storage_key_cache_invalid_ttl(self):
+        self.account.config.get_storage_key_cache_ttl = mock.Mock(
+            return_value='one hour'
+        )
+        self.account.storage_key()
+
     @raises(AzureServiceManagementError)
     def test_storage_key_error(self):
         self.__mock_management_service('get_storage_account_keys', None, side_effect=Exception)
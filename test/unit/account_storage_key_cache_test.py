@@ -0,0 +1,77 @@
+import json
+import os
+import stat
+import mock
+from mock import patch
+from tempfile import mkdtemp
+import shutil
+
+from test_helper import *
+
+from azurectl.account.storage_key_cache import StorageKeyCache
+
+
+class TestStorageKeyCache:
+    def setup(self):
+        self.cache_directory = mkdtemp()
+        self.cache_file = os.path.join(
+            self.cache_directory, 'cache', 'storage_key_cache.json'
+        )
+        self.cache = StorageKeyCache(3600, self.cache_file)
+
+    def teardown(self):
+        shutil.rmtree(self.cache_directory)
+
+    @patch('azurectl.account.storage_key_cache.Defaults.cache_directory')
+    def test_default_cache_file(self, mock_cache_directory):
+        mock_cache_directory.return_value = self.cache_directory
+        cache = StorageKeyCache(60)
+        assert cache.cache_file == os.path.join(
+            self.cache_directory, 'storage_key_cache.json'
+        )
+        assert cache.ttl == 60
+
+    def test_lookup_unknown(self):
+        assert self.cache.lookup('4711', 'bob') is None
+
+    def test_add_and_lookup(self):
+        self.cache.add('4711', 'bob', 'key')
+        cache = StorageKeyCache(3600, self.cache_file)
+        assert cache.lookup('4711', 'bob') == 'key'
+        assert cache.lookup('4712', 'bob') is None
+
+    def test_owner_only(self):
+        self.cache.add('4711', 'bob', 'key')
+        assert stat.S_IMODE(os.stat(self.cache_file).st_mode) == 0o600
+        assert stat.S_IMODE(
+            os.stat(os.path.dirname(self.cache_file)).st_mode
+        ) == 0o700
+
+    @patch('time.time')
+    def test_lookup_expired(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.add('4711', 'bob', 'key')
+        mock_time.return_value = 4599
+        assert self.cache.lookup('4711', 'bob') == 'key'
+        mock_time.return_value = 4600
+        assert self.cache.lookup('4711', 'bob') is None
+
+    def test_remove(self):
+        self.cache.add('4711', 'bob', 'key')
+        self.cache.remove('4711', 'bob')
+        self.cache.remove('4711', 'joe')
+        assert StorageKeyCache(3600, self.cache_file).lookup(
+            '4711', 'bob'
+        ) is None
+
+    def test_load_other_version(self):
+        os.makedirs(os.path.dirname(self.cache_file))
+        with open(self.cache_file, 'w') as cache:
+            json.dump({'version': 0}, cache)
+        assert StorageKeyCache(3600, self.cache_file).keys == {}
+
+    @patch('azurectl.account.storage_key_cache.log.warning')
+    def test_save_not_writable(self, mock_warning):
+        cache = StorageKeyCache(3600, '/proc/azurectl/storage_key_cache.json')
+        cache.save()
+        assert mock_warning.called
@@ -8,6 +8,7 @@ from mock import patch
 from test_helper import *
 from azurectl.azurectl_exceptions import *
 from azurectl.commands.storage_disk import StorageDiskTask
+from azurectl.storage.range_map import RangeMap
 
 
 class TestStorageDiskTask:
@@ -23,6 +24,11 @@ class TestStorageDiskTask:
         )
         self.storage = mock.Mock()
         self.storage.upload = mock.Mock()
+        self.storage.copy.return_value = mock.Mock(
+            bytes_copied=mock.Mock(return_value=1048576),
+            elapsed=mock.Mock(return_value=2),
+            throughput=mock.Mock(return_value=524288)
+        )
         azurectl.commands.storage_disk.Storage = mock.Mock(
             return_value=self.storage
         )
@@ -37,10 +43,30 @@ class TestStorageDiskTask:
         self.task.command_args['disk'] = False
         self.task.command_args['delete'] = False
         self.task.command_args['upload'] = False
+        self.task.command_args['plan'] = False
+        self.task.command_args['copy'] = False
+        self.task.command_args['download'] = False
+        self.task.command_args['verify'] = False
         self.task.command_args['sas'] = False
         self.task.command_args['--color'] = False
         self.task.command_args['--source'] = 'some-file'
         self.task.command_args['--max-chunk-size'] = 1024
+        self.task.command_args['--threads'] = 4
+        self.task.command_args['--resume'] = True
+        self.task.command_args['--check-page-ranges'] = False
+        self.task.command_args['--byte-size'] = None
+        self.task.command_args['--convert-raw'] = False
+        self.task.command_args['--member'] = None
+        self.task.command_args['--adaptive'] = False
+        self.task.command_args['--base-blob'] = None
+        self.task.command_args['--no-hash-cache'] = False
+        self.task.command_args['--no-range-map'] = False
+        self.task.command_args['--target'] = []
+        self.task.command_args['--shard'] = None
+        self.task.command_args['--bandwidth'] = None
+        self.task.command_args['--source-blob'] = []
+        self.task.command_args['--destination'] = None
+        self.task.command_args['--xz'] = False
         self.task.command_args['--quiet'] = False
         self.task.command_args['--blob-name'] = 'some-name'
         self.task.command_args['--start-datetime'] = '2015-01-01'
@@ -48,15 +74,151 @@ class TestStorageDiskTask:
         self.task.command_args['--permissions'] = 'rl'
         self.task.command_args['help'] = False
 
+    @patch('azurectl.commands.storage_disk.RangeMapCache')
+    @patch('azurectl.commands.storage_disk.PageHashCache')
     @patch('azurectl.commands.storage_disk.BackgroundScheduler')
-    def test_process_storage_disk_upload(self, mock_job):
+    def test_process_storage_disk_upload(
+        self, mock_job, mock_hash_cache, mock_range_map_cache
+    ):
         self.__init_command_args()
         self.task.command_args['disk'] = True
         self.task.command_args['upload'] = True
         self.task.process()
         self.task.storage.upload.assert_called_once_with(
-            'some-file', self.task.command_args['--blob-name'], 1024
+            'some-file', self.task.command_args['--blob-name'], 1024,
+            threads=4, resume=True, check_page_ranges=False, byte_size=None,
+            adaptive=False, base_blob=None,
+            hash_cache=mock_hash_cache.return_value, targets=[],
+            convert_raw=False, member=None, shard=None,
+            range_map_cache=mock_range_map_cache.return_value
+        )
+
+    @patch('azurectl.commands.storage_disk.DataOutput')
+    @patch('azurectl.commands.storage_disk.RangeMapCache')
+    def test_process_storage_disk_plan(self, mock_range_map_cache, mock_out):
+        self.__init_command_args()
+        self.task.command_args['plan'] = True
+        self.task.command_args['--member'] = 'disk.raw'
+        self.task.command_args['--bandwidth'] = '1024'
+        self.storage.plan.return_value = RangeMap(8192, [(4096, 2048)])
+        self.task.process()
+        self.task.storage.plan.assert_called_once_with(
+            'some-file', member='disk.raw', convert_raw=False,
+            range_map_cache=mock_range_map_cache.return_value
         )
+        assert mock_out.call_args[0][0].get() == {
+            'disk.raw:plan': {
+                'byte_size': 8192,
+                'data_bytes': 2048,
+                'zero_bytes': 6144,
+                'data_ranges': 1,
+                'duration': '2 seconds'
+            }
+        }
+        mock_out.return_value.display.assert_called_once_with()
+
+    @raises(AzureInvalidCommand)
+    @patch('azurectl.commands.storage_disk.RangeMapCache')
+    def test_plan_bandwidth_validation(self, mock_range_map_cache):
+        self.__init_command_args()
+        self.task.command_args['plan'] = True
+        self.task.command_args['--bandwidth'] = 'fast'
+        self.storage.plan.return_value = RangeMap(8192, [])
+        self.task.process()
+
+    @patch('azurectl.commands.storage_disk.PageHashCache')
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_upload_targets(
+        self, mock_job, mock_hash_cache
+    ):
+        self.__init_command_args()
+        self.task.command_args['disk'] = True
+        self.task.command_args['upload'] = True
+        self.task.command_args['--target'] = [
+            'account/container', 'other/container/path/to/blob'
+        ]
+        self.task.process()
+        assert self.task.storage.upload.call_args[1]['targets'] == [
+            ('account', 'container', None),
+            ('other', 'container', 'path/to/blob')
+        ]
+
+    @raises(AzureInvalidCommand)
+    def test_upload_target_validation(self):
+        self.__init_command_args()
+        self.task.command_args['--target'] = ['account/']
+        self.task.process()
+
+    @patch('azurectl.commands.storage_disk.PageHashCache')
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_upload_shard(
+        self, mock_job, mock_hash_cache
+    ):
+        self.__init_command_args()
+        self.task.command_args['disk'] = True
+        self.task.command_args['upload'] = True
+        self.task.command_args['--shard'] = '2/4'
+        self.task.process()
+        assert self.task.storage.upload.call_args[1]['shard'] == (2, 4)
+
+    @raises(AzureInvalidCommand)
+    def test_upload_shard_validation(self):
+        self.__init_command_args()
+        self.task.command_args['--shard'] = '5/4'
+        self.task.process()
+
+    @raises(AzureInvalidCommand)
+    def test_upload_shard_format_validation(self):
+        self.__init_command_args()
+        self.task.command_args['--shard'] = '1-4'
+        self.task.process()
+
+    @raises(AzureInvalidCommand)
+    def test_upload_shard_with_target(self):
+        self.__init_command_args()
+        self.task.command_args['--shard'] = '1/4'
+        self.task.command_args['--target'] = ['account/container']
+        self.task.process()
+
+    def test_threads_default(self):
+        self.__init_command_args()
+        self.task.command_args['--threads'] = None
+        assert self.task.validate_threads('--threads') is None
+
+    @raises(AzureInvalidCommand)
+    def test_threads_validation(self):
+        self.__init_command_args()
+        self.task.command_args['--threads'] = '0'
+        self.task.process()
+
+    @raises(AzureInvalidCommand)
+    def test_threads_format_validation(self):
+        self.__init_command_args()
+        self.task.command_args['--threads'] = 'many'
+        self.task.process()
+
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_upload_no_hash_cache(self, mock_job):
+        self.__init_command_args()
+        self.task.command_args['disk'] = True
+        self.task.command_args['upload'] = True
+        self.task.command_args['--no-hash-cache'] = True
+        self.task.process()
+        assert self.task.storage.upload.call_args[1]['hash_cache'] is None
+
+    @patch('azurectl.commands.storage_disk.PageHashCache')
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_upload_no_range_map(
+        self, mock_job, mock_hash_cache
+    ):
+        self.__init_command_args()
+        self.task.command_args['disk'] = True
+        self.task.command_args['upload'] = True
+        self.task.command_args['--no-range-map'] = True
+        self.task.process()
+        assert self.task.storage.upload.call_args[1][
+            'range_map_cache'
+        ] is None
 
     @raises(SystemExit)
     @patch('azurectl.commands.storage_disk.BackgroundScheduler')
@@ -77,6 +239,125 @@ class TestStorageDiskTask:
         self.storage.upload.side_effect = KeyboardInterrupt
         self.task.process()
 
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_copy(self, mock_job):
+        self.__init_command_args()
+        self.task.command_args['disk'] = True
+        self.task.command_args['copy'] = True
+        self.task.command_args['--source-blob'] = [
+            'blob', 'other/container/path/to/blob'
+        ]
+        self.task.command_args['--target'] = [
+            'account/container', 'account/container/copy'
+        ]
+        self.task.process()
+        self.task.storage.copy.assert_called_once_with([
+            (('bob', 'foo', 'blob'), ('account', 'container', 'blob')),
+            (
+                ('other', 'container', 'path/to/blob'),
+                ('account', 'container', 'copy')
+            )
+        ])
+        mock_job.return_value.add_job.assert_called_once_with(
+            self.task.storage.print_copy_status, 'interval', seconds=3
+        )
+        mock_job.return_value.shutdown.assert_called_once_with()
+        self.task.storage.print_copy_status.assert_called_once_with()
+
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_copy_quiet(self, mock_job):
+        self.__init_command_args()
+        self.task.command_args['disk'] = True
+        self.task.command_args['copy'] = True
+        self.task.command_args['--quiet'] = True
+        self.task.command_args['--source-blob'] = ['blob']
+        self.task.command_args['--target'] = ['account/container']
+        self.task.process()
+        assert not mock_job.called
+        assert not self.task.storage.print_copy_status.called
+
+    @raises(SystemExit)
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_copy_interrupted(self, mock_job):
+        self.__init_command_args()
+        self.task.command_args['disk'] = True
+        self.task.command_args['copy'] = True
+        self.task.command_args['--source-blob'] = ['blob']
+        self.task.command_args['--target'] = ['account/container']
+        self.storage.copy.side_effect = KeyboardInterrupt
+        try:
+            self.task.process()
+        finally:
+            mock_job.return_value.shutdown.assert_called_once_with()
+
+    @raises(AzureInvalidCommand)
+    def test_copy_targets_validation(self):
+        self.__init_command_args()
+        self.task.command_args['copy'] = True
+        self.task.command_args['--source-blob'] = ['blob', 'other']
+        self.task.command_args['--target'] = ['account/container']
+        self.task.process()
+
+    @raises(AzureInvalidCommand)
+    def test_copy_source_validation(self):
+        self.__init_command_args()
+        self.task.command_args['--source-blob'] = ['account/container']
+        self.task.process()
+
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_download(self, mock_job):
+        self.__init_command_args()
+        self.task.command_args['download'] = True
+        self.task.command_args['--blob-name'] = 'path/to/blob'
+        self.task.process()
+        self.task.storage.download.assert_called_once_with(
+            'path/to/blob', 'blob', 1024, threads=4, compress=False
+        )
+        mock_job.return_value.add_job.assert_called_once_with(
+            self.task.storage.print_download_status, 'interval', seconds=3
+        )
+        mock_job.return_value.shutdown.assert_called_once_with()
+        self.task.storage.print_download_status.assert_called_once_with()
+
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_download_xz(self, mock_job):
+        self.__init_command_args()
+        self.task.command_args['download'] = True
+        self.task.command_args['--xz'] = True
+        self.task.command_args['--quiet'] = True
+        self.task.process()
+        self.task.storage.download.assert_called_once_with(
+            'some-name', 'some-name.xz', 1024, threads=4, compress=True
+        )
+        assert not mock_job.called
+
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_download_destination(self, mock_job):
+        self.__init_command_args()
+        self.task.command_args['download'] = True
+        self.task.command_args['--destination'] = 'image.raw'
+        self.task.process()
+        assert self.task.storage.download.call_args[0][1] == 'image.raw'
+
+    @raises(SystemExit)
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_download_interrupted(self, mock_job):
+        self.__init_command_args()
+        self.task.command_args['download'] = True
+        self.storage.download.side_effect = KeyboardInterrupt
+        try:
+            self.task.process()
+        finally:
+            mock_job.return_value.shutdown.assert_called_once_with()
+
+    def test_process_storage_disk_verify(self):
+        self.__init_command_args()
+        self.task.command_args['verify'] = True
+        self.task.process()
+        self.task.storage.verify.assert_called_once_with(
+            'some-name', threads=4
+        )
+
     def test_process_storage_disk_delete(self):
         self.__init_command_args()
         self.task.command_args['disk'] = True
@@ -116,6 +116,14 @@ class TestConfig:
         )
         config.get_storage_account_name()
 
+    @raises(AzureConfigVariableNotFound)
+    def test_get_storage_key_cache_ttl_missing(self):
+        self.config.get_storage_key_cache_ttl()
+
+    @raises(AzureConfigVariableNotFound)
+    def test_get_pem_cache_ttl_missing(self):
+        self.config.get_pem_cache_ttl()
+
     def test_get_publishsettings_file_name(self):
         assert self.config.get_publishsettings_file_name() == \
             '../data/publishsettings'
@@ -27,6 +27,12 @@ class TestDefaults:
             docopts[selection] = True
         return docopts
 
+    @patch('os.path.expanduser')
+    def test_cache_directory(self, mock_expanduser):
+        mock_expanduser.return_value = '/home/user/.cache/azurectl'
+        assert Defaults.cache_directory() == '/home/user/.cache/azurectl'
+        mock_expanduser.assert_called_once_with('~/.cache/azurectl')
+
     def test_set_attribute(self):
         class X:
             def __init__(self):
@@ -181,11 +181,6 @@ class TestDataDisk:
         # given
         self.service.add_disk.return_value = self.my_request
         mock_datetime.isoformat.return_value = '0'
-        time_now = mock.Mock()
-        time_now.strftime.return_value = 1471858765
-        mock_datetime.now = mock.Mock(
-            return_value=time_now
-        )
         # when
         result = self.data_disk.create(
             identifier=self.instance_name,
@@ -28,6 +28,8 @@ class TestStorageAccount:
             return_value='.blob.test.url'
         )
         account.storage_key = mock.Mock()
+        account.invalidate_storage_key = mock.Mock()
+        self.account = account
 
         self.containers_list = ['container_a', 'container_b']
         self.mock_storage_service = mock.Mock(
@@ -236,6 +238,9 @@ class TestStorageAccount:
             'mockstorageservice',
             'Primary'
         )
+        self.account.invalidate_storage_key.assert_called_once_with(
+            'mockstorageservice'
+        )
 
         # secondary key
         result = self.storage_account.update(
@@ -254,6 +259,9 @@ class TestStorageAccount:
         self.service.delete_storage_account.return_value = self.my_request
         result = self.storage_account.delete('mockstorageservice')
         assert result == self.my_request.request_id
+        self.account.invalidate_storage_key.assert_called_once_with(
+            'mockstorageservice'
+        )
 
     @raises(AzureStorageAccountDeleteError)
     def test_delete_error(self):
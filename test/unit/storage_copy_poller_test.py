@@ -0,0 +1,129 @@
+import mock
+from mock import patch
+
+from test_helper import *
+
+from azurectl.storage.copy_poller import CopyPoller
+
+
+class TestCopyPoller:
+    def setup(self):
+        self.now = [100.0]
+        self.time_patch = patch('azurectl.storage.copy_poller.time')
+        self.time = self.time_patch.start()
+        self.time.time.side_effect = lambda: self.now[0]
+        self.time.sleep.side_effect = self.__sleep
+        self.poller = CopyPoller()
+        self.blob_service = mock.Mock()
+
+    def teardown(self):
+        self.time_patch.stop()
+
+    def __sleep(self, seconds):
+        self.now[0] += seconds
+
+    def __copy(self, status, progress, description=None):
+        return mock.Mock(
+            status=status, progress=progress, status_description=description
+        )
+
+    def __blob_properties(self, *copies):
+        results = []
+        for copy in copies:
+            if isinstance(copy, Exception):
+                results.append(copy)
+            else:
+                results.append(mock.Mock(properties=mock.Mock(copy=copy)))
+        self.blob_service.get_blob_properties.side_effect = results
+
+    def test_add(self):
+        self.poller.add(
+            'account/container/blob', self.blob_service, 'container', 'blob',
+            self.__copy('pending', '512/1024')
+        )
+        assert len(self.poller.pending()) == 1
+        assert self.poller.failed() == []
+        assert self.poller.bytes_copied() == 512
+        assert self.poller.total_bytes() == 1024
+
+    def test_wait(self):
+        self.poller.add(
+            'account/container/blob', self.blob_service, 'container', 'blob',
+            self.__copy('pending', '0/4096')
+        )
+        self.__blob_properties(
+            self.__copy('pending', '0/4096'),
+            self.__copy('pending', '1024/4096'),
+            self.__copy('success', '4096/4096')
+        )
+        progress = mock.Mock()
+
+        self.poller.wait(progress)
+
+        # no progress doubles the interval, the measured rate of 512
+        # bytes per second predicts the end of the copy in 6 seconds
+        assert self.time.sleep.call_args_list == [
+            mock.call(1), mock.call(2), mock.call(6.0)
+        ]
+        assert progress.call_count == 3
+        self.blob_service.get_blob_properties.assert_called_with(
+            'container', 'blob'
+        )
+        assert self.poller.pending() == []
+        assert self.poller.failed() == []
+        assert self.poller.bytes_copied() == 4096
+        assert self.poller.elapsed() == 9
+        assert self.poller.throughput() == 4096 / 9.0
+
+    def test_poll_interval_limits(self):
+        self.poller.add(
+            'blob', self.blob_service, 'container', 'blob',
+            self.__copy('pending', '0/1048576')
+        )
+        self.poller.interval = 32
+        self.__blob_properties(
+            self.__copy('pending', '0/1048576'),
+            self.__copy('pending', '512/1048576'),
+            self.__copy('pending', '1048064/1048576')
+        )
+        self.poller.poll()
+        assert self.poller.interval == CopyPoller.MAX_POLL_INTERVAL
+        self.now[0] += 1
+        self.poller.poll()
+        assert self.poller.interval == CopyPoller.MAX_POLL_INTERVAL
+        self.now[0] += 1
+        self.poller.poll()
+        assert self.poller.interval == CopyPoller.MIN_POLL_INTERVAL
+
+    def test_poll_progress_of_finished_copy(self):
+        self.poller.add(
+            'blob', self.blob_service, 'container', 'blob',
+            self.__copy('pending', None)
+        )
+        self.poller.interval = 8
+        self.__blob_properties(self.__copy('success', '1024/1024'))
+        self.poller.poll()
+        # copy finished within the same second, no rate measured
+        assert self.poller.interval == CopyPoller.MIN_POLL_INTERVAL
+        assert self.poller.copies[0]['rate'] is None
+
+    def test_poll_errors(self):
+        self.poller.add(
+            'blob', self.blob_service, 'container', 'blob',
+            self.__copy('pending', '0/1024')
+        )
+        self.__blob_properties(
+            Exception('timeout'),
+            self.__copy('pending', '0/1024'),
+            *[Exception('not found')] * CopyPoller.MAX_POLL_ERRORS
+        )
+        self.poller.wait()
+        assert self.blob_service.get_blob_properties.call_count == \
+            CopyPoller.MAX_POLL_ERRORS + 2
+        failed = self.poller.failed()
+        assert len(failed) == 1
+        assert failed[0]['status'] == 'failed'
+        assert failed[0]['description'] == 'not found'
+
+    def test_throughput_without_elapsed_time(self):
+        assert self.poller.throughput() == 0
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import mock
+from mock import patch
+
+from test_helper import *
+
+from azurectl.azurectl_exceptions import *
+from azurectl.storage.hash_manifest import HashManifest
+
+
+class TestHashManifest:
+    def setup(self):
+        self.manifest = HashManifest(2560, 1024)
+
+    def __md5(self, data):
+        return hashlib.md5(data).hexdigest()
+
+    def test_default_range_size(self):
+        assert HashManifest(1024).range_size == HashManifest.RANGE_SIZE
+
+    def test_update(self):
+        self.manifest.update(512, 'x' * 512)
+        self.manifest.update(1024, 'y' * 1024)
+        assert self.manifest.digests == [
+            self.__md5('x' * 512 + 'y' * 512)
+        ]
+        self.manifest.update(1024, None)
+        assert self.manifest.digests == [
+            self.__md5('x' * 512 + 'y' * 512),
+            self.__md5('y' * 512 + bytes(bytearray(512))),
+            self.__md5(bytes(bytearray(512)))
+        ]
+
+    def test_update_zero_ranges(self):
+        self.manifest.update(2560, None)
+        assert self.manifest.digests == [
+            self.__md5(bytes(bytearray(1024))),
+            self.__md5(bytes(bytearray(1024))),
+            self.__md5(bytes(bytearray(512)))
+        ]
+
+    def test_update_from_view(self):
+        self.manifest.update(1024, memoryview('x' * 1024))
+        assert self.manifest.digest(0) == self.__md5('x' * 1024)
+
+    def test_finish(self):
+        self.manifest.update(512, 'x' * 512)
+        self.manifest.finish()
+        assert self.manifest.digests == [
+            self.__md5('x' * 512 + bytes(bytearray(512))),
+            self.__md5(bytes(bytearray(1024))),
+            self.__md5(bytes(bytearray(512)))
+        ]
+        self.manifest.finish()
+        assert len(self.manifest.digests) == 3
+
+    def test_digest_incomplete(self):
+        self.manifest.update(512, 'x' * 512)
+        assert self.manifest.digest(0) is None
+
+    def test_matches(self):
+        self.manifest.update(1024, 'x' * 1024)
+        other = HashManifest(2560, 1024)
+        other.update(2048, 'x' * 1024 + 'y' * 1024)
+        assert self.manifest.matches(other, 512) is True
+        assert self.manifest.matches(other, 1024) is False
+        assert HashManifest(2560, 512).matches(other, 0) is False
+
+    def test_json(self):
+        self.manifest.update(2560, None)
+        manifest = HashManifest.from_json(self.manifest.to_json())
+        assert manifest.byte_size == 2560
+        assert manifest.range_size == 1024
+        assert manifest.digests == self.manifest.digests
+
+    @raises(AzureHashManifestError)
+    def test_from_json_invalid(self):
+        HashManifest.from_json('foo')
+
+    @raises(AzureHashManifestError)
+    def test_from_json_version(self):
+        HashManifest.from_json(json.dumps({'version': 42}))
+
+    def test_blob_name(self):
+        assert HashManifest.blob_name('blob') == 'blob.manifest'
+
+    def test_content_id(self):
+        other = HashManifest(2560, 1024)
+        self.manifest.update(2560, None)
+        other.update(2560, bytes(bytearray(2560)))
+        assert self.manifest.content_id() == other.content_id()
+        assert HashManifest(1024).content_id() != other.content_id()
@@ -8,24 +8,18 @@ from test_helper import *
 
 from azurectl.azurectl_exceptions import *
 from azurectl.storage.page_blob import PageBlob
+from azure.common import AzureHttpError
 
 import azurectl
 
 
 class TestPageBlob:
     def setup(self):
-        self.data_stream = mock.MagicMock()
+        self.data_stream = mock.Mock(spec=['read'])
+        self.data_stream.read.return_value = 'some-data'
         self.blob_service = mock.Mock()
         self.blob_service.MAX_CHUNK_GET_SIZE = 4096
 
-        self.context_manager_mock = mock.Mock()
-        self.file_mock = mock.Mock()
-        self.enter_mock = mock.Mock()
-        self.exit_mock = mock.Mock()
-        self.enter_mock.return_value = self.file_mock
-        setattr(self.context_manager_mock, '__enter__', self.enter_mock)
-        setattr(self.context_manager_mock, '__exit__', self.exit_mock)
-
         self.page_blob = PageBlob(
             self.blob_service, 'blob-name', 'container-name', 1024
         )
@@ -42,37 +36,23 @@ class TestPageBlob:
         self.blob_service.create_blob.side_effect = Exception
         PageBlob(self.blob_service, 'blob-name', 'container-name', 1024)
 
+    def test_existing_blob(self):
+        blob_service = mock.Mock()
+        PageBlob(
+            blob_service, 'blob-name', 'container-name', 1024, create=False
+        )
+        assert not blob_service.create_blob.called
+
     @raises(AzurePageBlobAlignmentViolation)
     def test_page_alignment_invalid(self):
         PageBlob(self.blob_service, 'blob-name', 'container-name', 12)
 
-    @raises(AzurePageBlobZeroPageError)
-    @patch('__builtin__.open')
-    def test_zero_page_read_failed(self, mock_open):
-        mock_open.side_effect = Exception
-        self.page_blob.next(self.data_stream)
-
-    @patch('__builtin__.open')
-    def test_zero_page_for_max_chunk_size(self, mock_open):
-        self.page_blob.rest_bytes = self.blob_service.MAX_CHUNK_GET_SIZE
-        mock_open.return_value = self.context_manager_mock
-        self.page_blob.next(self.data_stream)
-        self.file_mock.read.assert_called_once_with(
-            self.blob_service.MAX_CHUNK_GET_SIZE
-        )
-
-    @patch('__builtin__.open')
-    def test_zero_page_for_chunk(self, mock_open):
-        self.page_blob.rest_bytes = 42
-        mock_open.return_value = self.context_manager_mock
-        self.page_blob.next(self.data_stream)
-        self.file_mock.read.assert_called_once_with(42)
-
     def test_update_page(self):
         self.data_stream.read.return_value = 'some-data'
         self.page_blob.next(self.data_stream)
         self.blob_service.update_page.assert_called_once_with(
-            'container-name', 'blob-name', 'some-data', 0, 8
+            'container-name', 'blob-name', 'some-data', 0, 8,
+            content_md5='MVaNlMH/BQXRc8prXMPPSQ==', lease_id=None
         )
 
     @raises(AzurePageBlobUpdateError)
@@ -83,7 +63,7 @@ class TestPageBlob:
     def test_update_page_retried_two_times(self):
         retries = [True, False, False]
 
-        def side_effect(container, blob, data, start, end):
+        def side_effect(container, blob, data, start, end, content_md5, lease_id):
             if not retries.pop():
                 raise Exception
 
@@ -91,7 +71,182 @@ class TestPageBlob:
         self.page_blob.next(self.data_stream)
         assert len(self.blob_service.update_page.call_args_list) == 3
 
+    def test_read_ranges(self):
+        self.data_stream.read.return_value = 'data'
+        assert self.page_blob.read_ranges(self.data_stream) == [
+            (0, 'data')
+        ]
+        assert self.page_blob.page_start == 4
+        assert self.page_blob.rest_bytes == 1020
+
+    def test_read_ranges_zero_page(self):
+        self.data_stream.read.return_value = bytes(bytearray(1024))
+        assert self.page_blob.read_ranges(self.data_stream) == []
+        assert self.page_blob.page_start == 1024
+        assert self.page_blob.rest_bytes == 0
+
+    def test_read_ranges_skips_zero_pages(self):
+        page = 'x' * 512
+        zero_page = bytes(bytearray(512))
+        self.data_stream.read.return_value = page + zero_page
+        self.page_blob.page_start = 512
+        assert self.page_blob.read_ranges(self.data_stream) == [
+            (512, page)
+        ]
+
+    def test_read_ranges_skips_hole(self):
+        self.data_stream.skip_hole = mock.Mock(return_value=512)
+        assert self.page_blob.read_ranges(self.data_stream) == []
+        self.data_stream.skip_hole.assert_called_once_with(1024, True)
+        assert not self.data_stream.read.called
+        assert self.page_blob.page_start == 512
+        assert self.page_blob.rest_bytes == 512
+
+    def test_read_ranges_no_hole(self):
+        self.data_stream.skip_hole = mock.Mock(return_value=0)
+        self.data_stream.read.return_value = 'data'
+        assert self.page_blob.read_ranges(self.data_stream) == [
+            (0, 'data')
+        ]
+
+    def test_read_ranges_chunk_size(self):
+        self.page_blob.rest_bytes = 8192
+        self.data_stream.read.return_value = 'data'
+        self.page_blob.read_ranges(self.data_stream)
+        self.data_stream.read.assert_called_once_with(
+            self.blob_service.MAX_CHUNK_GET_SIZE
+        )
+
+    def test_update_page_at_offset(self):
+        self.page_blob.update_page('some-data', 512)
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', 'some-data', 512, 520,
+            content_md5='MVaNlMH/BQXRc8prXMPPSQ==', lease_id=None
+        )
+
     @raises(StopIteration)
     def test_next_page_update_no_data(self):
         self.data_stream.read.return_value = None
         self.page_blob.next(self.data_stream)
+
+    def test_read_ranges_into_buffer(self):
+        buffer = bytearray(4096)
+
+        def readinto(view):
+            view[:4] = 'data'
+            return 512
+
+        self.data_stream = mock.Mock(spec=['read', 'readinto'])
+        self.data_stream.readinto.side_effect = readinto
+        data_ranges = self.page_blob.read_ranges(
+            self.data_stream, buffer=buffer
+        )
+        assert len(data_ranges) == 1
+        page_start, data = data_ranges[0]
+        assert page_start == 0
+        assert isinstance(data, memoryview)
+        assert data.tobytes() == 'data' + bytes(bytearray(508))
+        assert len(self.data_stream.readinto.call_args[0][0]) == 1024
+        assert not self.data_stream.read.called
+        assert self.page_blob.page_start == 512
+
+    def test_update_page_from_buffer(self):
+        buffer = bytearray('some-data')
+        self.page_blob.update_page(memoryview(buffer)[5:], 512)
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', 'data', 512, 515,
+            content_md5='jXd/OF09/siBXSD3SWAm3A==', lease_id=None
+        )
+
+    def test_read_ranges_from_view(self):
+        self.data_stream = mock.Mock(spec=['read', 'read_view'])
+        self.data_stream.read_view.return_value = memoryview('data')
+        data_ranges = self.page_blob.read_ranges(
+            self.data_stream, buffer=bytearray(4096)
+        )
+        self.data_stream.read_view.assert_called_once_with(1024)
+        assert [
+            (page_start, data.tobytes()) for page_start, data in data_ranges
+        ] == [(0, 'data')]
+        assert not self.data_stream.read.called
+
+    @patch('time.sleep')
+    def test_update_page_throttled(self, mock_sleep):
+        throttled = mock.Mock()
+        busy = AzureHttpError('Server Busy', 503)
+        self.blob_service.update_page.side_effect = [busy, busy, None]
+        self.page_blob.update_page('some-data', 0, throttled=throttled)
+        assert throttled.call_count == 2
+        assert mock_sleep.call_args_list == [call(1), call(2)]
+
+    @raises(AzurePageBlobUpdateError)
+    @patch('time.sleep')
+    def test_update_page_throttled_max_attempts(self, mock_sleep):
+        self.blob_service.update_page.side_effect = AzureHttpError(
+            'Internal Error', 500
+        )
+        try:
+            self.page_blob.update_page('some-data', 0, max_attempts=2)
+        finally:
+            assert mock_sleep.call_args_list == [call(1)]
+
+    def test_read_chunk(self):
+        self.data_stream.read.return_value = 'data'
+        assert self.page_blob.read_chunk(self.data_stream, 512) == 'data'
+        self.data_stream.read.assert_called_once_with(512)
+        assert self.page_blob.page_start == 4
+
+    def test_read_chunk_hole(self):
+        self.data_stream.skip_hole = mock.Mock(return_value=1024)
+        assert self.page_blob.read_chunk(
+            self.data_stream, partial_holes=False
+        ) is None
+        self.data_stream.skip_hole.assert_called_once_with(1024, False)
+        assert self.page_blob.page_start == 1024
+
+    def test_data_ranges_split(self):
+        data = 'x' * 1024 + bytes(bytearray(512)) + 'y' * 512
+        assert PageBlob.data_ranges(512, data, 768) == [
+            (512, 'x' * 768), (1280, 'x' * 256), (2048, 'y' * 512)
+        ]
+
+    def test_data_ranges_no_scan(self):
+        data = 'x' * 512 + bytes(bytearray(512))
+        assert PageBlob.data_ranges(512, data, 768, False) == [
+            (512, data[:768]), (1280, data[768:])
+        ]
+
+    def test_data_ranges_hole(self):
+        assert PageBlob.data_ranges(512, None) == []
+
+    def test_zero_ranges(self):
+        assert PageBlob.zero_ranges(
+            0, 4096, [(512, 'x' * 512), (1024, 'y' * 512)]
+        ) == [(0, 512), (1536, 2560)]
+        assert PageBlob.zero_ranges(0, 512, [(0, 'x' * 512)]) == []
+
+    def test_clear_page(self):
+        self.page_blob.clear_page(512, 1024)
+        self.blob_service.clear_page.assert_called_once_with(
+            'container-name', 'blob-name', 512, 1535, lease_id=None
+        )
+
+    def test_update_page_leased(self):
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 1024,
+            create=False, lease_id='lease'
+        )
+        page_blob.update_page('some-data', 512)
+        page_blob.clear_page(0, 512)
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', 'some-data', 512, 520,
+            content_md5='MVaNlMH/BQXRc8prXMPPSQ==', lease_id='lease'
+        )
+        self.blob_service.clear_page.assert_called_once_with(
+            'container-name', 'blob-name', 0, 511, lease_id='lease'
+        )
+
+    @raises(AzurePageBlobUpdateError)
+    def test_clear_page_max_retries_reached(self):
+        self.blob_service.clear_page.side_effect = Exception
+        self.page_blob.clear_page(0, 512, max_attempts=2)
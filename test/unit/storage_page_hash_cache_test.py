@@ -0,0 +1,127 @@
+import json
+import os
+import mock
+from mock import patch
+from tempfile import (
+    NamedTemporaryFile,
+    mkdtemp
+)
+import shutil
+
+from test_helper import *
+
+from azurectl.storage.hash_manifest import HashManifest
+from azurectl.storage.page_hash_cache import PageHashCache
+
+
+class TestPageHashCache:
+    def setup(self):
+        self.cache_directory = mkdtemp()
+        self.cache_file = os.path.join(
+            self.cache_directory, 'cache', 'page_hash_cache.json'
+        )
+        self.image = NamedTemporaryFile()
+        self.image.write('x' * 1024)
+        self.image.flush()
+        self.manifest = self.__manifest('x')
+        self.location = {
+            'account': 'account', 'container': 'container',
+            'blob': 'blob', 'etag': 'etag'
+        }
+        self.cache = PageHashCache(self.cache_file)
+
+    def teardown(self):
+        shutil.rmtree(self.cache_directory)
+
+    def __manifest(self, data):
+        manifest = HashManifest(1024, 512)
+        manifest.update(1024, data * 1024)
+        return manifest
+
+    @patch('azurectl.storage.page_hash_cache.Defaults.cache_directory')
+    def test_default_cache_file(self, mock_cache_directory):
+        mock_cache_directory.return_value = self.cache_directory
+        cache = PageHashCache()
+        assert cache.cache_file == os.path.join(
+            self.cache_directory, 'page_hash_cache.json'
+        )
+        assert cache.max_ranges == PageHashCache.MAX_RANGES
+
+    def test_lookup_unknown(self):
+        assert self.cache.lookup(self.image.name) is None
+        assert self.cache.locations(self.manifest) == []
+
+    def test_add_and_lookup(self):
+        self.cache.add(self.manifest, self.location, self.image.name)
+        cache = PageHashCache(self.cache_file)
+        manifest = cache.lookup(self.image.name)
+        assert manifest.digests == self.manifest.digests
+        assert manifest.range_size == 512
+        assert cache.locations(manifest) == [self.location]
+
+    def test_lookup_changed_source(self):
+        self.cache.add(self.manifest, self.location, self.image.name)
+        self.image.write('y' * 512)
+        self.image.flush()
+        assert self.cache.lookup(self.image.name) is None
+
+    def test_lookup_rewritten_in_same_second(self):
+        os.utime(self.image.name, (1000000000, 1000000000.25))
+        self.cache.add(self.manifest, self.location, self.image.name)
+        os.utime(self.image.name, (1000000000, 1000000000.5))
+        assert self.cache.lookup(self.image.name) is None
+
+    def test_lookup_replaced_source(self):
+        self.cache.add(self.manifest, self.location, self.image.name)
+        image_stat = os.stat(self.image.name)
+        other = NamedTemporaryFile(
+            dir=os.path.dirname(self.image.name), delete=False
+        )
+        other.write('y' * 1024)
+        other.close()
+        os.utime(other.name, (image_stat.st_atime, image_stat.st_mtime))
+        os.rename(other.name, self.image.name)
+        assert self.cache.lookup(self.image.name) is None
+
+    def test_add_overwritten_blob(self):
+        self.cache.add(self.manifest, self.location, self.image.name)
+        other = self.__manifest('y')
+        self.cache.add(other, dict(self.location, etag='new-etag'))
+        assert self.cache.locations(self.manifest) == []
+        assert self.cache.locations(other) == [
+            dict(self.location, etag='new-etag')
+        ]
+
+    def test_remove(self):
+        self.cache.add(self.manifest, self.location)
+        self.cache.remove(self.manifest, self.location)
+        self.cache.remove(self.__manifest('y'), self.location)
+        assert PageHashCache(self.cache_file).locations(self.manifest) == []
+
+    @patch('time.time')
+    def test_evict_least_recently_used(self, mock_time):
+        cache = PageHashCache(self.cache_file, max_ranges=4)
+        mock_time.return_value = 1
+        cache.add(self.manifest, self.location, self.image.name)
+        mock_time.return_value = 2
+        other = self.__manifest('y')
+        cache.add(other, dict(self.location, blob='other'), self.cache_file)
+        mock_time.return_value = 3
+        cache.lookup(self.image.name)
+        cache.add(self.__manifest('z'), dict(self.location, blob='z'))
+        assert cache.lookup(self.image.name) is not None
+        assert cache.locations(other) == []
+        assert cache.lookup(self.cache_file) is None
+        assert len(cache.contents) == 2
+
+    def test_load_other_version(self):
+        os.makedirs(os.path.dirname(self.cache_file))
+        with open(self.cache_file, 'w') as cache:
+            json.dump({'version': 0}, cache)
+        assert PageHashCache(self.cache_file).contents == {}
+
+    @patch('azurectl.storage.page_hash_cache.log.warning')
+    def test_save_not_writable(self, mock_warning):
+        cache = PageHashCache('/proc/azurectl/page_hash_cache.json')
+        cache.save()
+        assert mock_warning.called
@@ -0,0 +1,104 @@
+import json
+import os
+import mock
+from mock import patch
+from tempfile import (
+    NamedTemporaryFile,
+    mkdtemp
+)
+import shutil
+
+from test_helper import *
+
+from azurectl.storage.range_map import RangeMap
+from azurectl.storage.range_map_cache import RangeMapCache
+
+
+class TestRangeMapCache:
+    def setup(self):
+        self.cache_directory = mkdtemp()
+        self.cache_file = os.path.join(
+            self.cache_directory, 'cache', 'range_map_cache.json'
+        )
+        self.image = NamedTemporaryFile()
+        self.image.write('x' * 1024)
+        self.image.flush()
+        self.range_map = RangeMap(2048, [(0, 1024)])
+        self.cache = RangeMapCache(self.cache_file)
+
+    def teardown(self):
+        self.image.close()
+        shutil.rmtree(self.cache_directory)
+
+    @patch('azurectl.storage.range_map_cache.Defaults.cache_directory')
+    def test_default_cache_file(self, mock_cache_directory):
+        mock_cache_directory.return_value = self.cache_directory
+        cache = RangeMapCache()
+        assert cache.cache_file == os.path.join(
+            self.cache_directory, 'range_map_cache.json'
+        )
+        assert cache.max_maps == RangeMapCache.MAX_MAPS
+
+    def test_lookup_unknown(self):
+        assert self.cache.lookup(self.image.name) is None
+
+    def test_add_and_lookup(self):
+        self.cache.add(self.range_map, self.image.name)
+        range_map = RangeMapCache(self.cache_file).lookup(self.image.name)
+        assert range_map.byte_size == 2048
+        assert range_map.data_ranges == [(0, 1024)]
+
+    def test_lookup_other_options(self):
+        self.cache.add(self.range_map, self.image.name, 'disk.raw', True)
+        assert self.cache.lookup(self.image.name) is None
+        assert self.cache.lookup(self.image.name, 'disk.raw', True)
+
+    def test_lookup_changed_source(self):
+        self.cache.add(self.range_map, self.image.name)
+        self.image.write('y' * 512)
+        self.image.flush()
+        assert self.cache.lookup(self.image.name) is None
+
+    def test_lookup_rewritten_in_same_second(self):
+        os.utime(self.image.name, (1000000000, 1000000000.25))
+        self.cache.add(self.range_map, self.image.name)
+        os.utime(self.image.name, (1000000000, 1000000000.5))
+        assert self.cache.lookup(self.image.name) is None
+
+    def test_lookup_replaced_source(self):
+        self.cache.add(self.range_map, self.image.name)
+        image_stat = os.stat(self.image.name)
+        other = NamedTemporaryFile(
+            dir=os.path.dirname(self.image.name), delete=False
+        )
+        other.write('y' * 1024)
+        other.close()
+        os.utime(other.name, (image_stat.st_atime, image_stat.st_mtime))
+        os.rename(other.name, self.image.name)
+        assert self.cache.lookup(self.image.name) is None
+
+    @patch('time.time')
+    def test_evict_least_recently_used(self, mock_time):
+        cache = RangeMapCache(self.cache_file, max_maps=2)
+        mock_time.return_value = 1
+        cache.add(self.range_map, self.image.name)
+        mock_time.return_value = 2
+        cache.add(self.range_map, self.image.name, 'disk.raw')
+        mock_time.return_value = 3
+        cache.lookup(self.image.name)
+        cache.add(self.range_map, self.image.name, convert_raw=True)
+        assert cache.lookup(self.image.name) is not None
+        assert cache.lookup(self.image.name, 'disk.raw') is None
+        assert len(cache.maps) == 2
+
+    def test_load_other_version(self):
+        os.makedirs(os.path.dirname(self.cache_file))
+        with open(self.cache_file, 'w') as cache:
+            json.dump({'version': 0}, cache)
+        assert RangeMapCache(self.cache_file).maps == {}
+
+    @patch('azurectl.storage.range_map_cache.log.warning')
+    def test_save_not_writable(self, mock_warning):
+        cache = RangeMapCache('/proc/azurectl/range_map_cache.json')
+        cache.save()
+        assert mock_warning.called
@@ -0,0 +1,156 @@
+import mock
+from tempfile import NamedTemporaryFile
+
+from test_helper import *
+
+from azurectl.storage.range_map import (
+    MappedRangeMapReader,
+    RangeMap,
+    RangeMapReader
+)
+from azurectl.utils.mapped_file import MappedFile
+from azurectl.utils.sparse_file import SparseFile
+
+
+class Stream(object):
+    """
+        Sequential stream without skip and read_view
+    """
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+        self.close = mock.Mock()
+
+    def readinto(self, buffer):
+        data = self.data[self.position:self.position + len(buffer)]
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+class TestRangeMap:
+    def setup(self):
+        self.data = bytes(bytearray(4096)) + 'x' * 1024 + \
+            bytes(bytearray(2048)) + 'y' * 1024
+        self.range_map = RangeMap(8192, [(4096, 1024), [7168, 1024]])
+
+    def test_totals(self):
+        assert self.range_map.data_ranges == [(4096, 1024), (7168, 1024)]
+        assert self.range_map.data_bytes() == 2048
+        assert self.range_map.zero_bytes() == 6144
+        assert self.range_map.duration(1024) == 2.0
+
+    def test_area_end(self):
+        assert self.range_map.area_end(0) == 4096
+        assert self.range_map.area_end(4096) == 5120
+        assert self.range_map.area_end(5120) == 7168
+        assert self.range_map.area_end(7680) == 8192
+        assert self.range_map.area_end(8192) == 8192
+        assert RangeMap(1024, []).area_end(512) == 1024
+
+    def test_zero_size(self):
+        assert self.range_map.zero_size(0, 8192) == 4096
+        assert self.range_map.zero_size(512, 1024) == 1024
+        assert self.range_map.zero_size(4608, 8192) == 0
+
+    def test_scan(self):
+        range_map = RangeMap.scan(Stream(self.data), 8192, chunk_size=4608)
+        assert range_map.byte_size == 8192
+        assert range_map.data_ranges == [(4096, 1024), (7168, 1024)]
+
+    def test_scan_short_stream(self):
+        range_map = RangeMap.scan(Stream(self.data[:5120]), 8192)
+        assert range_map.byte_size == 8192
+        assert range_map.data_ranges == [(4096, 1024)]
+
+    def test_scan_to_stream_end(self):
+        range_map = RangeMap.scan(Stream(self.data[:5120]), chunk_size=4608)
+        assert range_map.byte_size == 5120
+        assert range_map.data_ranges == [(4096, 1024)]
+
+    def test_scan_holes(self):
+        stream = Stream(self.data)
+
+        def skip_hole(max_size):
+            hole_size = min(max(4096 - stream.position, 0), max_size)
+            stream.position += hole_size
+            return hole_size
+
+        stream.skip_hole = mock.Mock(side_effect=skip_hole)
+        range_map = RangeMap.scan(stream, 8192, chunk_size=2048)
+        assert stream.skip_hole.call_args_list == [
+            mock.call(2048), mock.call(2048), mock.call(2048),
+            mock.call(2048)
+        ]
+        assert range_map.data_ranges == [(4096, 1024), (7168, 1024)]
+
+
+class TestRangeMapReader:
+    def setup(self):
+        self.data = bytes(bytearray(4096)) + 'x' * 1024 + \
+            bytes(bytearray(2048)) + 'y' * 1024
+        self.range_map = RangeMap(8192, [(4096, 1024), (7168, 1024)])
+        self.image = NamedTemporaryFile()
+        self.image.write(self.data)
+        self.image.flush()
+
+    def teardown(self):
+        self.image.close()
+
+    def test_open(self):
+        stream = Stream(self.data)
+        reader = RangeMapReader.open(stream, self.range_map)
+        assert type(reader) == RangeMapReader
+        reader.close()
+        stream.close.assert_called_once_with()
+        with MappedFile(self.image.name) as mapped_file:
+            assert isinstance(
+                RangeMapReader.open(mapped_file, self.range_map),
+                MappedRangeMapReader
+            )
+
+    def test_read(self):
+        reader = RangeMapReader(Stream(self.data), self.range_map)
+        assert reader.read(8192) == bytes(bytearray(4096))
+        assert reader.read(8192) == 'x' * 1024
+        assert reader.position == 5120
+
+    def test_skip_hole(self):
+        reader = RangeMapReader(Stream(self.data), self.range_map)
+        assert reader.skip_hole(8192) == 4096
+        assert reader.skip_hole(8192) == 0
+        assert reader.read(512) == 'x' * 512
+        assert reader.read(8192) == 'x' * 512
+        assert reader.skip_hole(1024, partial=False) == 1024
+        assert reader.skip_hole(2048, partial=False) == 0
+        assert reader.skip_hole(2048) == 1024
+        assert reader.read(8192) == 'y' * 1024
+        assert reader.read(8192) == ''
+
+    def test_skip_hole_page_aligned(self):
+        range_map = RangeMap(8192, [(1000, 1024)])
+        reader = RangeMapReader(Stream(self.data), range_map)
+        assert reader.skip_hole(8192) == 512
+        assert reader.position == 512
+
+    def test_skip_hole_short_stream(self):
+        reader = RangeMapReader(Stream(self.data[:1024]), self.range_map)
+        assert reader.skip_hole(8192) == 4096
+        assert reader.position == 4096
+
+    def test_skip_hole_seekable(self):
+        with SparseFile(self.image.name) as stream:
+            stream.readinto = mock.Mock()
+            reader = RangeMapReader(stream, self.range_map)
+            assert reader.skip_hole(8192) == 4096
+            assert stream.position == 4096
+            assert not stream.readinto.called
+
+    def test_read_view(self):
+        with MappedFile(self.image.name) as mapped_file:
+            reader = RangeMapReader.open(mapped_file, self.range_map)
+            assert reader.skip_hole(8192) == 4096
+            assert reader.read_view(8192).tobytes() == 'x' * 1024
+            assert reader.read_view(1024).tobytes() == \
+                bytes(bytearray(1024))
+            assert reader.position == 6144
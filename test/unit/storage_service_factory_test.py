@@ -0,0 +1,66 @@
+import mock
+from mock import patch
+
+from test_helper import *
+
+from azurectl.storage.service_factory import StorageServiceFactory
+
+
+class TestStorageServiceFactory:
+    def setup(self):
+        self.service_class = mock.Mock(side_effect=lambda *args, **kw: (
+            mock.Mock()
+        ))
+
+    def teardown(self):
+        StorageServiceFactory.services.clear()
+        StorageServiceFactory.sessions.clear()
+
+    def test_service(self):
+        service = StorageServiceFactory.service(
+            self.service_class, 'account', 'key', 'core.windows.net'
+        )
+        self.service_class.assert_called_once_with(
+            'account', 'key', endpoint_suffix='core.windows.net',
+            request_session=mock.ANY
+        )
+        session = self.service_class.call_args[1]['request_session']
+        assert session.get_adapter('https://account.blob').poolmanager.\
+            connection_pool_kw['maxsize'] == StorageServiceFactory.POOL_SIZE
+        assert StorageServiceFactory.service(
+            self.service_class, 'account', 'key', 'core.windows.net'
+        ) == service
+        assert self.service_class.call_count == 1
+
+    def test_service_per_account(self):
+        service = StorageServiceFactory.service(
+            self.service_class, 'account', 'key', 'core.windows.net'
+        )
+        other_service = StorageServiceFactory.service(
+            self.service_class, 'other', 'other-key', 'core.windows.net'
+        )
+        assert other_service != service
+        assert self.service_class.call_args_list[0][1]['request_session'] \
+            != self.service_class.call_args_list[1][1]['request_session']
+
+    def test_shared_session(self):
+        other_class = mock.Mock()
+        StorageServiceFactory.service(
+            self.service_class, 'account', 'key', 'core.windows.net'
+        )
+        StorageServiceFactory.service(
+            other_class, 'account', 'key', 'core.windows.net'
+        )
+        assert other_class.call_args[1]['request_session'] == \
+            self.service_class.call_args[1]['request_session']
+
+    def test_pool_size(self):
+        StorageServiceFactory.service(
+            self.service_class, 'account', 'key', 'core.windows.net', '16'
+        )
+        StorageServiceFactory.service(
+            self.service_class, 'account', 'key', 'core.windows.net', 4
+        )
+        session = self.service_class.call_args[1]['request_session']
+        assert session.get_adapter('https://account.blob').poolmanager.\
+            connection_pool_kw['maxsize'] == 16
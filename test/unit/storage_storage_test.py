@@ -1,14 +1,29 @@
 import datetime
+import io
 import sys
+import time
 import mock
 from mock import patch
 from mock import call
+from tempfile import NamedTemporaryFile
 from urlparse import urlparse
 
+from azure.common import AzureHttpError
+
 from test_helper import *
 
 from azurectl.azurectl_exceptions import *
+from azurectl.storage.hash_manifest import HashManifest
+from azurectl.storage.page_blob import PageBlob
+from azurectl.storage.range_map import (
+    MappedRangeMapReader,
+    RangeMap,
+    RangeMapReader
+)
 from azurectl.storage.storage import Storage
+from azurectl.utils.gz import GZ
+from azurectl.utils.read_ahead import ReadAhead
+from azurectl.utils.xz import XZ
 
 import azurectl
 
@@ -40,6 +55,14 @@ class TestStorage:
             )
         )
         self.storage = Storage(account, 'some-container')
+        self.block_blob_service_patch = patch(
+            'azurectl.storage.storage.BlockBlobService'
+        )
+        self.block_blob_service = \
+            self.block_blob_service_patch.start().return_value
+
+    def teardown(self):
+        self.block_blob_service_patch.stop()
 
     @raises(AzureStorageFileNotFound)
     @patch('os.path.exists')
@@ -48,89 +71,1891 @@ class TestStorage:
         self.storage.upload('some-blob', None)
 
     @raises(AzureStorageStreamError)
-    @patch('azurectl.storage.storage.XZ.open')
+    @patch('azurectl.utils.xz.XZ.open')
     def test_upload_error_put_blob(self, mock_xz_open):
         mock_xz_open.side_effect = Exception
         self.storage.upload('../data/blob.xz')
 
     @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.UploadJournal')
     @patch('azurectl.storage.storage.PageBlob')
-    @patch('azurectl.storage.storage.XZ.open')
-    def test_upload_raises(self, mock_xz_open, mock_page_blob):
-        stream = mock.Mock
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_raises(self, mock_xz_open, mock_page_blob, mock_journal):
+        stream = mock.Mock()
         stream.close = mock.Mock()
         mock_xz_open.return_value = stream
         mock_page_blob.side_effect = Exception
         self.storage.upload('../data/blob.xz')
         stream.close.assert_called_once_with()
+        mock_journal.return_value.save.assert_called_once_with()
 
+    @raises(KeyboardInterrupt)
+    @patch('azurectl.storage.storage.UploadJournal')
     @patch('azurectl.storage.storage.PageBlob')
-    @patch('azurectl.storage.storage.XZ.uncompressed_size')
-    @patch('azurectl.storage.storage.XZ.open')
-    def test_upload(self, mock_xz_open, mock_uncompressed_size, mock_page_blob):
-        stream = mock.Mock
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_interrupted(
+        self, mock_xz_open, mock_page_blob, mock_journal
+    ):
+        stream = mock.Mock()
         stream.close = mock.Mock()
         mock_xz_open.return_value = stream
+        mock_page_blob.side_effect = KeyboardInterrupt
+        try:
+            self.storage.upload('../data/blob.xz')
+        finally:
+            stream.close.assert_called_once_with()
+            mock_journal.return_value.save.assert_called_once_with()
+
+    def __page_blob(self, chunks):
         page_blob = mock.Mock()
-        next_results = [3, 2, 1]
+        page_blob.page_start = 0
+        page_blob.blob_service.MAX_CHUNK_GET_SIZE = 4096
 
-        def side_effect(stream, max_chunk_size, max_attempts):
-            try:
-                return next_results.pop()
-            except:
+        def side_effect(stream, max_chunk_size, buffer, partial_holes=True):
+            if not chunks:
                 raise StopIteration
+            data = chunks.pop()
+            page_blob.page_start += len(data) if data else 512
+            return data
+
+        page_blob.read_chunk.side_effect = side_effect
+        page_blob.data_ranges.side_effect = PageBlob.data_ranges
+        page_blob.zero_ranges.side_effect = PageBlob.zero_ranges
+        return page_blob
 
-        page_blob.next.side_effect = side_effect
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal
+    ):
+        stream = mock.Mock(spec=['readinto', 'close'])
+        stream.close = mock.Mock()
+        mock_xz_open.return_value = stream
+        stream.readinto.return_value = 0
+        page_blob = self.__page_blob(['data' + bytes(bytearray(1020))])
         mock_page_blob.return_value = page_blob
         mock_uncompressed_size.return_value = 1024
+        journal = mock_journal.return_value
+        journal.is_committed.return_value = False
 
         self.storage.upload('../data/blob.xz')
 
-        assert page_blob.next.call_args_list == [
-            call(stream, None, 5),
-            call(stream, None, 5),
-            call(stream, None, 5),
-            call(stream, None, 5)
+        mock_journal.assert_called_once_with(
+            '../data/blob.xz', 'mock-storage-name/some-container/blob'
+        )
+        mock_page_blob.assert_called_once_with(
+            mock.ANY, 'blob', 'some-container', 1024, create=True,
+            lease_id=None
+        )
+        assert page_blob.read_chunk.call_args_list == [
+            call(stream, 4096, bytearray(4096)),
+            call(stream, 4096, bytearray(4096))
         ]
+        assert page_blob.update_page.call_args_list == [
+            call('data' + bytes(bytearray(508)), 0, 5, mock.ANY)
+        ]
+        journal.add_skipped.assert_called_once_with([(512, 512)])
+        assert journal.add_uploaded.call_args_list == [call(0, 512)]
+        journal.delete.assert_called_once_with()
+        assert not journal.load.called
         stream.close.assert_called_once_with()
 
+    @patch('azurectl.storage.storage.UploadJournal')
     @patch('azurectl.storage.storage.PageBlob')
-    @patch('__builtin__.open')
+    @patch('azurectl.storage.storage.MappedFile.open')
     @patch('os.path.getsize')
     def test_upload_uncompressed(
-        self, mock_uncompressed_size, mock_open, mock_page_blob
+        self, mock_uncompressed_size, mock_open, mock_page_blob, mock_journal
     ):
-        stream = mock.Mock
+        stream = mock.Mock(spec=['read_view', 'close'])
         stream.close = mock.Mock()
         mock_open.return_value = stream
-        page_blob = mock.Mock()
-        next_results = [3, 2, 1]
+        page_blob = self.__page_blob([None, 'x' * 512])
+        mock_page_blob.return_value = page_blob
+        mock_uncompressed_size.return_value = 1024
+        mock_journal.return_value.is_committed.return_value = False
 
-        def side_effect(stream, max_chunk_size, max_attempts):
-            try:
-                return next_results.pop()
-            except:
-                raise StopIteration
+        self.storage.upload('../data/blob.raw')
+
+        mock_open.assert_called_once_with('../data/blob.raw')
+        assert page_blob.read_chunk.call_args_list[0] == \
+            call(stream, 4096, bytearray(0))
+        assert page_blob.update_page.call_args_list == [
+            call('x' * 512, 0, 5, mock.ANY)
+        ]
+        stream.close.assert_called_once_with()
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.SparseFile.open')
+    @patch('azurectl.storage.storage.MappedFile.open')
+    @patch('os.path.getsize')
+    def test_upload_uncompressed_not_mappable(
+        self, mock_uncompressed_size, mock_mapped_open, mock_open,
+        mock_page_blob, mock_journal
+    ):
+        mock_mapped_open.side_effect = ValueError('cannot mmap an empty file')
+        stream = mock.Mock()
+        stream.close = mock.Mock()
+        mock_open.return_value = stream
+        mock_page_blob.return_value = self.__page_blob([])
+        mock_uncompressed_size.return_value = 0
+
+        self.storage.upload('../data/blob.raw')
 
-        page_blob.next.side_effect = side_effect
+        mock_open.assert_called_once_with('../data/blob.raw')
+        stream.close.assert_called_once_with()
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.VHD')
+    @patch('azurectl.storage.storage.MappedFile.open')
+    @patch('os.path.getsize')
+    def test_upload_convert_raw(
+        self, mock_uncompressed_size, mock_open, mock_vhd, mock_page_blob,
+        mock_journal
+    ):
+        stream = mock.Mock(spec=['read_view', 'close'])
+        mock_open.return_value = stream
+        vhd = mock_vhd.return_value
+        mock_vhd.fixed_size.return_value = 1049088
+        mock_page_blob.return_value = self.__page_blob([])
+        mock_uncompressed_size.return_value = 1000
+
+        self.storage.upload('../data/blob.raw', convert_raw=True)
+
+        mock_vhd.fixed_size.assert_called_once_with(1000)
+        mock_vhd.assert_called_once_with(stream, 1000)
+        mock_page_blob.assert_called_once_with(
+            mock.ANY, 'blob.raw', 'some-container', 1049088, create=True,
+            lease_id=None
+        )
+        vhd.close.assert_called_once_with()
+
+    @raises(AzureStorageStreamError)
+    @patch('azurectl.storage.storage.PipeReader.open')
+    @patch('sys.stdin')
+    def test_upload_stdin_qcow2(self, mock_stdin, mock_open):
+        source = mock.Mock(spec=['peek', 'readinto', 'close'])
+        source.peek.return_value = b'QFI\xfb'
+        mock_open.return_value = source
+        self.storage.upload('-', 'blob', byte_size='1024')
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.Qcow2')
+    @patch('azurectl.storage.storage.FileType')
+    def test_upload_qcow2(
+        self, mock_filetype, mock_qcow2, mock_page_blob, mock_journal
+    ):
+        mock_filetype.return_value.decompressor.return_value = None
+        mock_filetype.return_value.is_qcow2.return_value = True
+        mock_filetype.return_value.basename.return_value = 'blob.qcow2'
+        image = mock_qcow2.open.return_value
+        mock_qcow2.virtual_size.return_value = 1048576
+        mock_page_blob.return_value = self.__page_blob([])
+
+        self.storage.upload('../data/blob.raw')
+
+        mock_qcow2.virtual_size.assert_called_once_with('../data/blob.raw')
+        mock_qcow2.open.assert_called_once_with('../data/blob.raw')
+        mock_page_blob.assert_called_once_with(
+            mock.ANY, 'blob.qcow2', 'some-container', 1048576, create=True,
+            lease_id=None
+        )
+        image.close.assert_called_once_with()
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.VMDK')
+    @patch('azurectl.storage.storage.FileType')
+    def test_upload_vmdk(
+        self, mock_filetype, mock_vmdk, mock_page_blob, mock_journal
+    ):
+        mock_filetype.return_value.decompressor.return_value = None
+        mock_filetype.return_value.is_qcow2.return_value = False
+        mock_filetype.return_value.is_vmdk.return_value = True
+        mock_filetype.return_value.basename.return_value = 'blob.vmdk'
+        image = mock_vmdk.open.return_value
+        mock_vmdk.virtual_size.return_value = 1048576
+        mock_page_blob.return_value = self.__page_blob([])
+
+        self.storage.upload('../data/blob.raw')
+
+        mock_vmdk.virtual_size.assert_called_once_with('../data/blob.raw')
+        mock_vmdk.open.assert_called_once_with('../data/blob.raw')
+        mock_page_blob.assert_called_once_with(
+            mock.ANY, 'blob.vmdk', 'some-container', 1048576, create=True,
+            lease_id=None
+        )
+        image.close.assert_called_once_with()
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.FileType')
+    def test_upload_compressed(
+        self, mock_filetype, mock_page_blob, mock_journal
+    ):
+        decompressor = mock.Mock()
+        mock_filetype.return_value.decompressor.return_value = decompressor
+        mock_filetype.return_value.basename.return_value = 'blob.raw'
+        decompressor.uncompressed_size.return_value = 1048576
+        decompressor.open.return_value.readinto.return_value = 0
+        mock_page_blob.return_value = self.__page_blob([])
+
+        self.storage.upload('../data/blob.raw')
+
+        decompressor.uncompressed_size.assert_called_once_with(
+            '../data/blob.raw'
+        )
+        decompressor.open.assert_called_once_with('../data/blob.raw')
+        mock_page_blob.assert_called_once_with(
+            mock.ANY, 'blob.raw', 'some-container', 1048576, create=True,
+            lease_id=None
+        )
+        decompressor.open.return_value.close.assert_called_once_with()
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.PipeReader.open')
+    @patch('sys.stdin')
+    def test_upload_stdin_compressed(
+        self, mock_stdin, mock_open, mock_page_blob, mock_journal
+    ):
+        source = mock.Mock(spec=['peek', 'read', 'close'])
+        source.close = mock.Mock()
+        # an empty gzip member
+        source.read = io.BytesIO(
+            b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\x03\x03\x00' +
+            bytes(bytearray(8))
+        ).read
+        source.peek.return_value = b'\x1f\x8b\x08\x00\x00\x00\x00\x00'
+        mock_open.return_value = source
+        page_blob = self.__page_blob([])
         mock_page_blob.return_value = page_blob
-        mock_uncompressed_size.return_value = 1024
 
+        self.storage.upload('-', 'blob', byte_size=512)
+
+        stream = page_blob.read_chunk.call_args[0][0]
+        assert isinstance(stream, ReadAhead)
+        assert isinstance(stream.stream, GZ)
+        assert stream.stream.gzip_stream == source
+        source.close.assert_called_once_with()
+
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.TarMember')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_member(
+        self, mock_xz_open, mock_member, mock_page_blob, mock_journal,
+        mock_page_blob_service
+    ):
+        stream = mock_xz_open.return_value
+        member = mock_member.return_value
+        member.size = 4096
+        mock_page_blob.return_value = self.__page_blob([])
+        hash_cache = mock.Mock()
+
+        self.storage.upload(
+            '../data/blob.xz', member='bundle/disk.vhd', hash_cache=hash_cache
+        )
+
+        mock_member.assert_called_once_with(stream, 'bundle/disk.vhd')
+        mock_page_blob.assert_called_once_with(
+            mock.ANY, 'disk.vhd', 'some-container', 4096, create=True,
+            lease_id=None
+        )
+        assert not hash_cache.lookup.called
+        hash_cache.add.assert_called_once_with(
+            mock.ANY, mock.ANY, None
+        )
+        member.close.assert_called_once_with()
+
+    @raises(AzureStorageStreamError)
+    @patch('azurectl.storage.storage.TarMember')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_member_not_found(self, mock_xz_open, mock_member):
+        mock_member.side_effect = AzureTarError('Member disk.vhd not found')
+        try:
+            self.storage.upload('../data/blob.xz', member='disk.vhd')
+        finally:
+            mock_xz_open.return_value.close.assert_called_once_with()
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_range_map(self, mock_page_blob, mock_journal):
+        data = 'x' * 512 + bytes(bytearray(512))
+        page_blob = self.__page_blob([data])
+        mock_page_blob.return_value = page_blob
+        mock_journal.return_value.is_committed.return_value = False
+        range_map_cache = mock.Mock()
+        range_map_cache.lookup.return_value = RangeMap(1024, [(0, 1024)])
+
+        # the source is not probed behind the byte size, the map
+        # was scanned to its end
+        self.storage.upload(
+            '../data/blob.raw', byte_size=1024,
+            range_map_cache=range_map_cache
+        )
+
+        range_map_cache.lookup.assert_called_once_with(
+            '../data/blob.raw', None, False
+        )
+        stream = page_blob.read_chunk.call_args[0][0]
+        assert isinstance(stream, MappedRangeMapReader)
+        assert page_blob.update_page.call_args_list == [
+            call(data, 0, 5, mock.ANY)
+        ]
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_range_map_size_mismatch(
+        self, mock_page_blob, mock_journal
+    ):
+        page_blob = self.__page_blob([])
+        mock_page_blob.return_value = page_blob
+        range_map_cache = mock.Mock()
+        range_map_cache.lookup.return_value = RangeMap(2048, [])
+
+        self.storage.upload(
+            '../data/blob.raw', range_map_cache=range_map_cache
+        )
+
+        stream = page_blob.read_chunk.call_args[0][0]
+        assert not isinstance(stream, RangeMapReader)
+
+    @raises(AzureStorageFileNotFound)
+    def test_plan_file_not_found(self):
+        self.storage.plan('../data/no-such-file')
+
+    def test_plan(self):
+        range_map_cache = mock.Mock()
+        range_map_cache.lookup.return_value = None
+
+        range_map = self.storage.plan(
+            '../data/blob.raw', range_map_cache=range_map_cache
+        )
+
+        assert range_map.byte_size == 1024
+        assert range_map.data_ranges == [(0, 1024)]
+        range_map_cache.add.assert_called_once_with(
+            range_map, '../data/blob.raw', None, False
+        )
+
+    def test_plan_cached(self):
+        range_map_cache = mock.Mock()
+
+        assert self.storage.plan(
+            '../data/blob.raw', 'disk.raw', True, range_map_cache
+        ) == range_map_cache.lookup.return_value
+
+        range_map_cache.lookup.assert_called_once_with(
+            '../data/blob.raw', 'disk.raw', True
+        )
+
+    @patch('azurectl.storage.storage.TarMember')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_plan_member_convert_raw(self, mock_xz_open, mock_member):
+        member = mock.Mock(spec=['readinto', 'close'])
+        member.size = 1024
+        member.readinto.side_effect = [1024, 0]
+        mock_member.return_value = member
+
+        range_map = self.storage.plan(
+            '../data/blob.xz', member='disk.raw', convert_raw=True
+        )
+
+        mock_member.assert_called_once_with(
+            mock_xz_open.return_value, 'disk.raw'
+        )
+        # the zero filled member and the VHD footer
+        assert range_map.byte_size == 1049088
+        assert range_map.data_ranges == [(1048576, 512)]
+        member.close.assert_called_once_with()
+
+    @raises(AzureStorageStreamError)
+    @patch('azurectl.storage.storage.RangeMap.scan')
+    @patch('azurectl.storage.storage.MappedFile.open')
+    def test_plan_scan_failed(self, mock_open, mock_scan):
+        mock_scan.side_effect = IOError('read error')
+        try:
+            self.storage.plan('../data/blob.raw')
+        finally:
+            mock_open.return_value.close.assert_called_once_with()
+
+    @patch('azurectl.storage.storage.FileType')
+    def test_plan_size_unknown(self, mock_filetype):
+        decompressor = mock_filetype.return_value.decompressor.return_value
+        decompressor.uncompressed_size.return_value = None
+        decompressor.open.return_value = io.BytesIO(b'x' * 1000)
+
+        range_map = self.storage.plan('../data/blob.raw')
+
+        assert range_map.byte_size == 1000
+        assert range_map.data_ranges == [(0, 1000)]
+
+    @patch('azurectl.storage.storage.FileType')
+    def test_plan_size_unknown_convert_raw(self, mock_filetype):
+        decompressor = mock_filetype.return_value.decompressor.return_value
+        decompressor.uncompressed_size.return_value = None
+        decompressor.open.return_value = io.BytesIO(b'x' * 1024)
+
+        range_map = self.storage.plan('../data/blob.raw', convert_raw=True)
+
+        # the data, zero padding to 1MB and the VHD footer
+        assert range_map.byte_size == 1049088
+        assert range_map.data_ranges == [(0, 1024), (1048576, 512)]
+
+    @raises(AzureStorageStreamError)
+    @patch('azurectl.storage.storage.FileType')
+    def test_plan_more_data_than_recorded(self, mock_filetype):
+        decompressor = mock_filetype.return_value.decompressor.return_value
+        decompressor.uncompressed_size.return_value = 512
+        decompressor.open.return_value = io.BytesIO(b'x' * 1024)
+        self.storage.plan('../data/blob.raw')
+
+    @raises(AzureStorageStreamError)
+    @patch('azurectl.storage.storage.FileType')
+    def test_upload_size_unknown(self, mock_filetype):
+        decompressor = mock_filetype.return_value.decompressor.return_value
+        decompressor.uncompressed_size.return_value = None
         self.storage.upload('../data/blob.raw')
 
-        assert page_blob.next.call_args_list == [
-            call(stream, None, 5),
-            call(stream, None, 5),
-            call(stream, None, 5),
-            call(stream, None, 5)
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.FileType')
+    def test_upload_more_data_than_recorded(
+        self, mock_filetype, mock_page_blob, mock_journal, mock_blob_service
+    ):
+        decompressor = mock_filetype.return_value.decompressor.return_value
+        decompressor.uncompressed_size.return_value = 512
+        decompressor.open.return_value.readinto.return_value = 1
+        mock_page_blob.return_value = self.__page_blob(['x' * 512])
+        mock_journal.return_value.is_committed.return_value = False
+        try:
+            self.storage.upload('../data/blob.raw', 'blob')
+        finally:
+            mock_journal.return_value.save.assert_called_once_with()
+            mock_blob_service.return_value.delete_blob.\
+                assert_called_once_with('some-container', 'blob')
+
+    @raises(AzureStorageStreamError)
+    def test_upload_stdin_without_byte_size(self):
+        self.storage.upload('-', 'blob')
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.PipeReader.open')
+    @patch('sys.stdin')
+    def test_upload_stdin(
+        self, mock_stdin, mock_open, mock_page_blob, mock_journal
+    ):
+        source = mock.Mock(spec=['peek', 'readinto', 'close'])
+        source.close = mock.Mock()
+        source.peek.return_value = b'\xebc\x90'
+        source.readinto.return_value = 0
+        mock_open.return_value = source
+        page_blob = self.__page_blob(['x' * 512])
+        mock_page_blob.return_value = page_blob
+        mock_journal.return_value.is_committed.return_value = False
+
+        self.storage.upload('-', 'blob', byte_size='1024')
+
+        mock_open.assert_called_once_with(mock_stdin.fileno.return_value)
+        mock_journal.assert_called_once_with(
+            None, 'mock-storage-name/some-container/blob'
+        )
+        mock_page_blob.assert_called_once_with(
+            mock.ANY, 'blob', 'some-container', 1024, create=True,
+            lease_id=None
+        )
+        assert page_blob.read_chunk.call_args_list[0] == \
+            call(source, 4096, bytearray(4096))
+        source.close.assert_called_once_with()
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.PipeReader.open')
+    @patch('sys.stdin')
+    def test_upload_stdin_more_data_than_byte_size(
+        self, mock_stdin, mock_open, mock_page_blob, mock_journal,
+        mock_blob_service
+    ):
+        source = mock.Mock(spec=['peek', 'readinto', 'close'])
+        source.peek.return_value = b'\xebc\x90'
+        source.readinto.return_value = 1
+        mock_open.return_value = source
+        mock_page_blob.return_value = self.__page_blob(['x' * 512])
+        mock_journal.return_value.is_committed.return_value = False
+        try:
+            self.storage.upload('-', 'blob', byte_size='512')
+        finally:
+            mock_blob_service.return_value.delete_blob.\
+                assert_called_once_with('some-container', 'blob')
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.log.warning')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.TarMember')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_member_more_data_than_byte_size(
+        self, mock_xz_open, mock_member, mock_page_blob, mock_journal,
+        mock_blob_service, mock_warning
+    ):
+        member = mock_member.return_value
+        member.size = 1024
+        member.readinto.return_value = 1
+        mock_page_blob.return_value = self.__page_blob(['x' * 512])
+        mock_journal.return_value.is_committed.return_value = False
+        mock_blob_service.return_value.delete_blob.side_effect = \
+            AzureHttpError('denied', 403)
+        try:
+            self.storage.upload(
+                '../data/blob.xz', member='disk.vhd', byte_size=512
+            )
+        finally:
+            mock_warning.assert_called_once_with(
+                'Blob %s not deleted: %s',
+                'mock-storage-name/some-container/disk.vhd', mock.ANY
+            )
+
+    @raises(AzureStorageStreamError)
+    def test_upload_byte_size_smaller_than_file(self):
+        self.storage.upload('../data/blob.raw', byte_size=512)
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.PipeReader.open')
+    @patch('sys.stdin')
+    def test_upload_stdin_xz(
+        self, mock_stdin, mock_open, mock_page_blob, mock_journal
+    ):
+        source = mock.Mock(spec=['peek', 'read', 'close'])
+        source.close = mock.Mock()
+        source.read.return_value = b''
+        source.peek.return_value = b'\xfd7zXZ\x00\x00\x04'
+        mock_open.return_value = source
+        page_blob = self.__page_blob([])
+        mock_page_blob.return_value = page_blob
+
+        self.storage.upload('-', 'blob', byte_size=512)
+
+        stream = page_blob.read_chunk.call_args[0][0]
+        assert isinstance(stream, ReadAhead)
+        assert isinstance(stream.stream, XZ)
+        assert stream.stream.lzma_stream == source
+        source.close.assert_called_once_with()
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_concurrent(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal
+    ):
+        stream = mock.Mock()
+        stream.close = mock.Mock()
+        mock_xz_open.return_value = stream
+        stream.readinto.return_value = 0
+        page_blob = self.__page_blob(['x' * 512, None, 'y' * 1024])
+        mock_page_blob.return_value = page_blob
+        mock_uncompressed_size.return_value = 2048
+        mock_journal.return_value.is_committed.return_value = False
+
+        self.storage.upload('../data/blob.xz', threads=4)
+
+        assert sorted(page_blob.update_page.call_args_list) == [
+            call('x' * 512, 1536, 5, mock.ANY),
+            call('y' * 1024, 0, 5, mock.ANY)
         ]
+        assert self.storage.upload_targets[0].pending_bytes == 0
+        assert self.storage.upload_status == \
+            {'current_bytes': 2048, 'total_bytes': 2048}
         stream.close.assert_called_once_with()
 
+    @patch('azurectl.storage.storage.UploadTuner')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_adaptive(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal, mock_tuner
+    ):
+        stream = mock.Mock(spec=['readinto', 'close'])
+        stream.close = mock.Mock()
+        mock_xz_open.return_value = stream
+        stream.readinto.return_value = 0
+        page_blob = self.__page_blob(['x' * 512])
+        mock_page_blob.return_value = page_blob
+        mock_uncompressed_size.return_value = 512
+        mock_journal.return_value.is_committed.return_value = False
+        tuner = mock_tuner.return_value
+        tuner.chunk_size = 1024
+
+        self.storage.upload(
+            '../data/blob.xz', max_chunk_size=2048, threads=2, adaptive=True
+        )
+
+        mock_tuner.assert_called_once_with(2048, 2, True)
+        assert page_blob.read_chunk.call_args_list[0] == \
+            call(stream, 1024, bytearray(2048))
+        page_blob.update_page.assert_called_once_with(
+            'x' * 512, 0, 5, tuner.throttled
+        )
+        tuner.acquire.assert_called_once_with()
+        tuner.release.assert_called_once_with()
+        tuner.completed.assert_called_once_with(512)
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_concurrent_page_update_failed(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal
+    ):
+        page_blob = self.__page_blob(['x' * 512])
+        page_blob.update_page.side_effect = AzurePageBlobUpdateError
+        mock_page_blob.return_value = page_blob
+        mock_uncompressed_size.return_value = 512
+        mock_journal.return_value.is_committed.return_value = False
+        self.storage.upload('../data/blob.xz', threads=2)
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_slow_page_update_failed(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal
+    ):
+        # more chunks than buffers, which are only returned to the
+        # buffer pool if the failed worker pool drops the queued jobs
+        page_blob = self.__page_blob(['x' * 512] * 16)
+
+        def update_page(data, page_start, max_attempts, throttled):
+            time.sleep(0.01)
+            raise AzurePageBlobUpdateError('update failed')
+
+        page_blob.update_page.side_effect = update_page
+        mock_page_blob.return_value = page_blob
+        mock_uncompressed_size.return_value = 8192
+        mock_journal.return_value.is_committed.return_value = False
+        self.storage.upload('../data/blob.xz', threads=1)
+
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_resume(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal, mock_blob_service
+    ):
+        mock_xz_open.return_value.readinto.return_value = 0
+        blob_service = mock_blob_service.return_value
+        blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(content_length=1024)
+        )
+        blob_service.get_page_ranges.return_value = [
+            mock.Mock(start=0, end=511)
+        ]
+        page_blob = self.__page_blob(['y' * 512, 'x' * 512])
+        mock_page_blob.return_value = page_blob
+        mock_uncompressed_size.return_value = 1024
+        journal = mock_journal.return_value
+        journal.load.return_value = True
+        journal.is_committed.side_effect = lambda start, length: start == 0
+
+        self.storage.upload(
+            '../data/blob.xz', resume=True, check_page_ranges=True
+        )
+
+        blob_service.get_blob_properties.assert_called_once_with(
+            'some-container', 'blob'
+        )
+        journal.restrict_uploaded.assert_called_once_with([(0, 512)])
+        mock_page_blob.assert_called_once_with(
+            blob_service, 'blob', 'some-container', 1024, create=False,
+            lease_id=None
+        )
+        assert page_blob.update_page.call_args_list == [
+            call('y' * 512, 512, 5, mock.ANY)
+        ]
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    def test_upload_resume_page_ranges_failed(
+        self, mock_uncompressed_size, mock_journal, mock_blob_service
+    ):
+        blob_service = mock_blob_service.return_value
+        blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(content_length=1024)
+        )
+        blob_service.get_page_ranges.side_effect = Exception
+        mock_uncompressed_size.return_value = 1024
+        mock_journal.return_value.load.return_value = True
+        self.storage.upload(
+            '../data/blob.xz', resume=True, check_page_ranges=True
+        )
+
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_resume_not_possible(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal, mock_blob_service
+    ):
+        mock_xz_open.return_value.readinto.return_value = 0
+        blob_service = mock_blob_service.return_value
+        mock_page_blob.return_value = self.__page_blob([])
+        mock_uncompressed_size.return_value = 1024
+        journal = mock_journal.return_value
+
+        # no journal
+        journal.load.return_value = False
+        self.storage.upload('../data/blob.xz', resume=True)
+        mock_page_blob.assert_called_with(
+            blob_service, 'blob', 'some-container', 1024, create=True,
+            lease_id=None
+        )
+
+        # blob does not exist
+        journal.load.return_value = True
+        blob_service.get_blob_properties.side_effect = Exception
+        self.storage.upload('../data/blob.xz', resume=True)
+        mock_page_blob.assert_called_with(
+            blob_service, 'blob', 'some-container', 1024, create=True,
+            lease_id=None
+        )
+
+        # blob size mismatch
+        blob_service.get_blob_properties.side_effect = None
+        blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(content_length=42)
+        )
+        self.storage.upload('../data/blob.xz', resume=True)
+        mock_page_blob.assert_called_with(
+            blob_service, 'blob', 'some-container', 1024, create=True,
+            lease_id=None
+        )
+
+    def __base_manifest(self, *ranges):
+        manifest = HashManifest(1024 * len(ranges))
+        for data in ranges:
+            manifest.update(len(data), data)
+        return manifest
+
+    def __shard_blob_service(self, mock_blob_service, shards):
+        blob_service = mock_blob_service.return_value
+        blob_service.MAX_CHUNK_GET_SIZE = 1536
+        blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(content_length=4096, etag='etag'),
+            metadata={'azurectl_shards': shards}
+        )
+        self.block_blob_service.list_blobs.return_value = []
+        return blob_service
+
+    def __shard_records(self, *listings):
+        blob = namedtuple('blob', ['name'])
+        self.block_blob_service.list_blobs.side_effect = [
+            [blob('blob.shard-%s' % shard) for shard in completed]
+            for completed in listings
+        ]
+
+    def __shard_image(self):
+        image = NamedTemporaryFile()
+        image.write(b'x' * 4096)
+        image.flush()
+        return image
+
+    @patch.object(HashManifest, 'RANGE_SIZE', 1024)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    def test_upload_shard(self, mock_journal, mock_blob_service):
+        blob_service = self.__shard_blob_service(mock_blob_service, '2')
+        # stale record of an earlier upload, none on join, own on complete
+        self.__shard_records([2], [], [1, 'x', 3])
+        journal = mock_journal.return_value
+        journal.is_committed.return_value = False
+        hash_cache = mock.Mock()
+
+        with self.__shard_image() as image:
+            self.storage.upload(
+                image.name, 'blob', shard=(1, 2), hash_cache=hash_cache
+            )
+
+        lease_id = 'e5391acd-7904-557c-a74d-fb79b16c56b7'
+        blob_service.create_blob.assert_called_once_with(
+            'some-container', 'blob', 4096,
+            metadata={'azurectl_shards': '2'}, if_none_match='*'
+        )
+        self.block_blob_service.delete_blob.assert_called_once_with(
+            'some-container', 'blob.shard-2'
+        )
+        blob_service.acquire_blob_lease.assert_called_once_with(
+            'some-container', 'blob', proposed_lease_id=lease_id
+        )
+        # the chunk crossing the shard boundary is cut at it
+        assert blob_service.update_page.call_args_list == [
+            call(
+                'some-container', 'blob', b'x' * 1536, 0, 1535,
+                content_md5=mock.ANY, lease_id=lease_id
+            ),
+            call(
+                'some-container', 'blob', b'x' * 512, 1536, 2047,
+                content_md5=mock.ANY, lease_id=lease_id
+            )
+        ]
+        assert journal.add_skipped.call_args_list == [
+            call([]), call([]), call([(2048, 1536)]), call([(3584, 512)])
+        ]
+        self.block_blob_service.create_blob_from_text.assert_called_once_with(
+            'some-container', 'blob.shard-1', lease_id
+        )
+        self.block_blob_service.list_blobs.assert_called_with(
+            'some-container', prefix='blob.shard-'
+        )
+        assert not blob_service.set_blob_metadata.called
+        journal.delete.assert_called_once_with()
+        assert not blob_service.release_blob_lease.called
+        assert not hash_cache.lookup.called
+        assert not hash_cache.add.called
+
+    @patch.object(HashManifest, 'RANGE_SIZE', 1024)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    def test_upload_last_shard(self, mock_journal, mock_blob_service):
+        blob_service = self.__shard_blob_service(mock_blob_service, '2')
+        blob_service.create_blob.side_effect = AzureHttpError('exists', 409)
+        # records on join, on complete and on delete
+        self.__shard_records([1], [1, 2], [1, 2])
+        journal = mock_journal.return_value
+        journal.is_committed.return_value = False
+
+        with self.__shard_image() as image:
+            self.storage.upload(image.name, 'blob', shard=(2, 2))
+
+        lease_id = 'e5391acd-7904-557c-a74d-fb79b16c56b7'
+        assert [
+            page_call[0][3] for page_call in
+            blob_service.update_page.call_args_list
+        ] == [2048, 3584]
+        blob_service.release_blob_lease.assert_called_once_with(
+            'some-container', 'blob', lease_id
+        )
+        assert self.block_blob_service.delete_blob.call_args_list == [
+            call('some-container', 'blob.shard-1'),
+            call('some-container', 'blob.shard-2')
+        ]
+        assert self.block_blob_service.create_blob_from_text.call_args_list[
+            1
+        ][0][1] == 'blob.manifest'
+        assert 'azurectl_digest' in \
+            blob_service.set_blob_metadata.call_args[0][2]
+
+    @patch.object(HashManifest, 'RANGE_SIZE', 1024)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    def test_upload_last_shards_completed_together(
+        self, mock_journal, mock_blob_service
+    ):
+        blob_service = self.__shard_blob_service(mock_blob_service, '2')
+        blob_service.create_blob.side_effect = AzureHttpError('exists', 409)
+        blob_service.release_blob_lease.side_effect = \
+            AzureHttpError('lease released', 409)
+        self.__shard_records([], [1, 2])
+        mock_journal.return_value.is_committed.return_value = False
+
+        with self.__shard_image() as image:
+            self.storage.upload(image.name, 'blob', shard=(2, 2))
+
+        # records already deleted by the other host
+        assert not self.block_blob_service.delete_blob.called
+        assert 'azurectl_digest' in \
+            blob_service.set_blob_metadata.call_args[0][2]
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    def test_upload_last_shard_release_failed(
+        self, mock_journal, mock_blob_service
+    ):
+        blob_service = self.__shard_blob_service(mock_blob_service, '2')
+        blob_service.create_blob.side_effect = AzureHttpError('exists', 409)
+        blob_service.release_blob_lease.side_effect = \
+            AzureHttpError('denied', 403)
+        self.__shard_records([], [1, 2])
+        mock_journal.return_value.is_committed.return_value = False
+        with self.__shard_image() as image:
+            self.storage.upload(image.name, 'blob', shard=(2, 2))
+
+    @patch('azurectl.storage.storage.log.warning')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    def test_upload_last_shard_records_not_deleted(
+        self, mock_journal, mock_blob_service, mock_warning
+    ):
+        blob_service = self.__shard_blob_service(mock_blob_service, '2')
+        blob_service.create_blob.side_effect = AzureHttpError('exists', 409)
+        self.__shard_records([], [1, 2], [1, 2])
+        self.block_blob_service.delete_blob.side_effect = \
+            AzureHttpError('denied', 403)
+        mock_journal.return_value.is_committed.return_value = False
+        with self.__shard_image() as image:
+            self.storage.upload(image.name, 'blob', shard=(2, 2))
+        mock_warning.assert_called_once_with(
+            'Shard records of %s not deleted: %s', 'blob', mock.ANY
+        )
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    def test_upload_shard_create_failed(self, mock_journal, mock_blob_service):
+        blob_service = self.__shard_blob_service(mock_blob_service, '2')
+        blob_service.create_blob.side_effect = AzureHttpError('denied', 403)
+        with self.__shard_image() as image:
+            self.storage.upload(image.name, 'blob', shard=(1, 2))
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    def test_upload_shard_size_mismatch(self, mock_journal, mock_blob_service):
+        blob_service = self.__shard_blob_service(mock_blob_service, '2')
+        blob_service.get_blob_properties.return_value.properties.\
+            content_length = 8192
+        with self.__shard_image() as image:
+            self.storage.upload(image.name, 'blob', shard=(1, 2))
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    def test_upload_shard_count_mismatch(
+        self, mock_journal, mock_blob_service
+    ):
+        self.__shard_blob_service(mock_blob_service, '3')
+        with self.__shard_image() as image:
+            self.storage.upload(image.name, 'blob', shard=(1, 2))
+
+    @patch('azurectl.storage.storage.log.info')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    def test_upload_shard_completed_before(
+        self, mock_journal, mock_blob_service, mock_info
+    ):
+        blob_service = self.__shard_blob_service(mock_blob_service, '2')
+        blob_service.create_blob.side_effect = AzureHttpError('exists', 409)
+        self.__shard_records([1], [1])
+        mock_journal.return_value.is_committed.return_value = False
+        with self.__shard_image() as image:
+            self.storage.upload(image.name, 'blob', shard=(1, 2))
+        mock_info.assert_any_call(
+            'Shard %d/%d of %s already completed, uploading again',
+            1, 2, 'blob'
+        )
+        self.block_blob_service.create_blob_from_text.assert_called_once_with(
+            'some-container', 'blob.shard-1', mock.ANY
+        )
+        assert not blob_service.release_blob_lease.called
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    def test_upload_shard_record_failed(self, mock_journal, mock_blob_service):
+        self.__shard_blob_service(mock_blob_service, '2')
+        self.block_blob_service.create_blob_from_text.side_effect = \
+            AzureHttpError('denied', 403)
+        mock_journal.return_value.is_committed.return_value = False
+        try:
+            with self.__shard_image() as image:
+                self.storage.upload(image.name, 'blob', shard=(1, 2))
+        finally:
+            assert not mock_journal.return_value.delete.called
+
+    @patch('time.sleep')
+    @patch.object(HashManifest, 'RANGE_SIZE', 1024)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_base_blob(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal, mock_blob_service, mock_sleep
+    ):
+        zero = bytes(bytearray(512))
+        self.block_blob_service.get_blob_to_bytes.return_value = mock.Mock(
+            content=self.__base_manifest('x' * 1024, 'y' * 512 + 'z' * 512)
+            .to_json()
+        )
+        blob_service = mock_blob_service.return_value
+        blob_service.copy_blob.return_value = mock.Mock(status='pending')
+        blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(
+                content_length=2048, copy=mock.Mock(status='success')
+            )
+        )
+        stream = mock.Mock(spec=['readinto', 'close'])
+        stream.close = mock.Mock()
+        mock_xz_open.return_value = stream
+        stream.readinto.return_value = 0
+        page_blob = self.__page_blob(['y' * 512 + zero, 'x' * 1024])
+        mock_page_blob.return_value = page_blob
+        mock_uncompressed_size.return_value = 2048
+        journal = mock_journal.return_value
+        journal.is_committed.return_value = False
+
+        self.storage.upload('../data/blob.xz', 'blob', base_blob='base')
+
+        self.block_blob_service.get_blob_to_bytes.assert_called_once_with(
+            'some-container', 'base.manifest'
+        )
+        blob_service.copy_blob.assert_called_once_with(
+            'some-container', 'blob', blob_service.make_blob_url.return_value
+        )
+        blob_service.make_blob_url.assert_called_once_with(
+            'some-container', 'base'
+        )
+        mock_sleep.assert_called_once_with(1)
+        assert not blob_service.resize_blob.called
+        mock_page_blob.assert_called_once_with(
+            blob_service, 'blob', 'some-container', 2048, create=False,
+            lease_id=None
+        )
+        assert page_blob.read_chunk.call_args_list[0] == call(
+            stream, 1024, bytearray(4096), partial_holes=False
+        )
+        journal.add_skipped.assert_called_once_with([(0, 1024)])
+        page_blob.update_page.assert_called_once_with(
+            'y' * 512, 1024, 5, mock.ANY
+        )
+        page_blob.clear_page.assert_called_once_with(1536, 512, 5, mock.ANY)
+        assert sorted(journal.add_uploaded.call_args_list) == [
+            call(1024, 512), call(1536, 512)
+        ]
+        manifest = self.__base_manifest('x' * 1024, 'y' * 512 + zero)
+        self.block_blob_service.create_blob_from_text.assert_called_once_with(
+            'some-container', 'blob.manifest', manifest.to_json()
+        )
+        blob_service.set_blob_metadata.assert_called_once_with(
+            'some-container', 'blob', {
+                'azurectl_digest': manifest.content_id(),
+                'azurectl_range_size': '1024'
+            }
+        )
+
+    @patch.object(HashManifest, 'RANGE_SIZE', 1024)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_base_blob_in_place(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal, mock_blob_service
+    ):
+        mock_xz_open.return_value.readinto.return_value = 0
+        self.block_blob_service.get_blob_to_bytes.return_value = mock.Mock(
+            content=self.__base_manifest('x' * 1024).to_json()
+        )
+        blob_service = mock_blob_service.return_value
+        blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(content_length=1024)
+        )
+        mock_page_blob.return_value = self.__page_blob([])
+        mock_uncompressed_size.return_value = 2048
+        journal = mock_journal.return_value
+
+        self.storage.upload('../data/blob.xz', 'blob', base_blob='blob')
+
+        assert not blob_service.copy_blob.called
+        blob_service.resize_blob.assert_called_once_with(
+            'some-container', 'blob', 2048
+        )
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    def test_upload_base_blob_copy_failed(
+        self, mock_uncompressed_size, mock_journal, mock_blob_service
+    ):
+        self.block_blob_service.get_blob_to_bytes.return_value = mock.Mock(
+            content=self.__base_manifest().to_json()
+        )
+        mock_blob_service.return_value.copy_blob.return_value = mock.Mock(
+            status='failed'
+        )
+        mock_uncompressed_size.return_value = 1024
+        self.storage.upload('../data/blob.xz', 'blob', base_blob='base')
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    def test_upload_base_blob_copy_raises(
+        self, mock_uncompressed_size, mock_journal, mock_blob_service
+    ):
+        self.block_blob_service.get_blob_to_bytes.return_value = mock.Mock(
+            content=self.__base_manifest().to_json()
+        )
+        mock_blob_service.return_value.copy_blob.side_effect = Exception
+        mock_uncompressed_size.return_value = 1024
+        self.storage.upload('../data/blob.xz', 'blob', base_blob='base')
+
+    @patch('azurectl.storage.storage.log.warning')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_base_blob_without_manifest(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal, mock_blob_service, mock_warning
+    ):
+        mock_xz_open.return_value.readinto.return_value = 0
+        blob_service = mock_blob_service.return_value
+        mock_page_blob.return_value = self.__page_blob([])
+        mock_uncompressed_size.return_value = 1024
+
+        # no manifest
+        self.block_blob_service.get_blob_to_bytes.side_effect = Exception
+        self.storage.upload('../data/blob.xz', 'blob', base_blob='base')
+        mock_page_blob.assert_called_with(
+            blob_service, 'blob', 'some-container', 1024, create=True,
+            lease_id=None
+        )
+
+        # manifest of other range size
+        self.block_blob_service.get_blob_to_bytes.side_effect = None
+        self.block_blob_service.get_blob_to_bytes.return_value = mock.Mock(
+            content=HashManifest(1024, 512).to_json()
+        )
+        self.storage.upload('../data/blob.xz', 'blob', base_blob='base')
+        mock_page_blob.assert_called_with(
+            blob_service, 'blob', 'some-container', 1024, create=True,
+            lease_id=None
+        )
+        assert not blob_service.copy_blob.called
+        assert mock_warning.call_count == 2
+
+    @patch('azurectl.storage.storage.log.warning')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_manifest_not_stored(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal, mock_warning
+    ):
+        mock_xz_open.return_value.readinto.return_value = 0
+        mock_page_blob.return_value = self.__page_blob([])
+        mock_uncompressed_size.return_value = 1024
+        self.block_blob_service.create_blob_from_text.side_effect = Exception
+        self.storage.upload('../data/blob.xz')
+        assert mock_warning.called
+
+    def __blob_properties(self, etags):
+        def side_effect(container, blob):
+            if (container, blob) not in etags:
+                raise Exception('not found')
+            return mock.Mock(properties=mock.Mock(
+                etag=etags[(container, blob)], content_length=1024,
+                copy=mock.Mock(status='success')
+            ))
+        return side_effect
+
+    def __location(self, account, container, blob='blob', etag='etag'):
+        return {
+            'account': account, 'container': container,
+            'blob': blob, 'etag': etag
+        }
+
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_hash_cache_copy(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal, mock_blob_service
+    ):
+        manifest = HashManifest(1024)
+        hash_cache = mock.Mock()
+        hash_cache.lookup.return_value = manifest
+        stale = self.__location('mock-storage-name', 'stale-container')
+        changed = self.__location('other-account', 'other-container')
+        valid = self.__location('mock-storage-name', 'other-container')
+        hash_cache.locations.return_value = [stale, changed, valid]
+        blob_service = mock_blob_service.return_value
+        blob_service.get_blob_properties.side_effect = \
+            self.__blob_properties({
+                ('other-container', 'blob'): 'etag',
+                ('some-container', 'blob'): 'new-etag'
+            })
+        changed_blob_service = mock.Mock()
+        changed_blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(etag='other-etag', content_length=1024)
+        )
+        mock_blob_service.side_effect = lambda account, key, **kwargs: \
+            changed_blob_service if account == 'other-account' \
+            else blob_service
+        blob_service.copy_blob.return_value = mock.Mock(status='success')
+        mock_uncompressed_size.return_value = 1024
+
+        self.storage.upload(
+            '../data/blob.xz', 'blob', hash_cache=hash_cache
+        )
+
+        hash_cache.lookup.assert_called_once_with('../data/blob.xz')
+        assert hash_cache.remove.call_args_list == [
+            call(manifest, stale), call(manifest, changed)
+        ]
+        blob_service.make_blob_url.assert_called_once_with(
+            'other-container', 'blob'
+        )
+        blob_service.copy_blob.assert_called_once_with(
+            'some-container', 'blob', blob_service.make_blob_url.return_value
+        )
+        assert not mock_xz_open.called
+        assert not mock_page_blob.called
+        self.block_blob_service.create_blob_from_text.assert_called_once_with(
+            'some-container', 'blob.manifest', manifest.to_json()
+        )
+        hash_cache.add.assert_called_once_with(
+            manifest,
+            self.__location(
+                'mock-storage-name', 'some-container', etag='new-etag'
+            ),
+            '../data/blob.xz'
+        )
+        assert self.storage.upload_status == \
+            {'current_bytes': 1024, 'total_bytes': 1024}
+
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    def test_upload_hash_cache_copy_other_account(
+        self, mock_uncompressed_size, mock_journal, mock_blob_service
+    ):
+        hash_cache = mock.Mock()
+        hash_cache.lookup.return_value = HashManifest(1024)
+        hash_cache.locations.return_value = [
+            self.__location('other-account', 'other-container')
+        ]
+        blob_service = mock_blob_service.return_value
+        blob_service.get_blob_properties.side_effect = \
+            self.__blob_properties({
+                ('other-container', 'blob'): 'etag',
+                ('some-container', 'blob'): 'new-etag'
+            })
+        blob_service.copy_blob.return_value = mock.Mock(status='success')
+        mock_uncompressed_size.return_value = 1024
+
+        self.storage.upload(
+            '../data/blob.xz', 'blob', hash_cache=hash_cache
+        )
+
+        self.storage.account.storage_key.assert_called_with('other-account')
+        copy_source = blob_service.copy_blob.call_args[0][2]
+        assert copy_source.startswith(
+            'https://other-account.blob.core.windows.net/other-container/blob?'
+        )
+        assert 'sp=r' in copy_source
+
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    def test_upload_hash_cache_blob_exists(
+        self, mock_uncompressed_size, mock_journal, mock_blob_service
+    ):
+        hash_cache = mock.Mock()
+        hash_cache.lookup.return_value = HashManifest(1024)
+        hash_cache.locations.return_value = [
+            self.__location('mock-storage-name', 'some-container')
+        ]
+        blob_service = mock_blob_service.return_value
+        blob_service.get_blob_properties.side_effect = \
+            self.__blob_properties({('some-container', 'blob'): 'etag'})
+        mock_uncompressed_size.return_value = 1024
+
+        self.storage.upload(
+            '../data/blob.xz', 'blob', hash_cache=hash_cache
+        )
+
+        assert not blob_service.copy_blob.called
+        assert hash_cache.add.called
+
+    @patch('azurectl.storage.storage.log.warning')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_hash_cache_miss(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal, mock_blob_service, mock_warning
+    ):
+        mock_xz_open.return_value.readinto.return_value = 0
+        hash_cache = mock.Mock()
+        mock_page_blob.return_value = self.__page_blob([])
+        mock_uncompressed_size.return_value = 1024
+        blob_service = mock_blob_service.return_value
+        blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(etag='etag')
+        )
+
+        # unknown source
+        hash_cache.lookup.return_value = None
+        self.storage.upload('../data/blob.xz', hash_cache=hash_cache)
+        manifest = hash_cache.add.call_args[0][0]
+        assert manifest.byte_size == 1024
+        assert hash_cache.add.call_args == call(
+            manifest,
+            self.__location('mock-storage-name', 'some-container'),
+            '../data/blob.xz'
+        )
+
+        # cached content of other size, blob properties not accessible
+        hash_cache.lookup.return_value = HashManifest(2048)
+        blob_service.get_blob_properties.side_effect = Exception
+        self.storage.upload('../data/blob.xz', hash_cache=hash_cache)
+        assert not hash_cache.locations.called
+        assert hash_cache.add.call_count == 1
+        assert mock_warning.called
+
+        # no cached location left
+        hash_cache.lookup.return_value = HashManifest(1024)
+        hash_cache.locations.return_value = []
+        self.storage.upload('../data/blob.xz', hash_cache=hash_cache)
+        assert mock_page_blob.call_count == 3
+
+    def __target_page_blob(self):
+        page_blob = mock.Mock()
+        page_blob.data_ranges.side_effect = PageBlob.data_ranges
+        page_blob.zero_ranges.side_effect = PageBlob.zero_ranges
+        return page_blob
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_targets(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_blob_service, mock_journal
+    ):
+        stream = mock.Mock(spec=['readinto', 'close'])
+        stream.close = mock.Mock()
+        mock_xz_open.return_value = stream
+        stream.readinto.return_value = 0
+        reader = self.__page_blob([None, 'x' * 512])
+        page_blobs = [
+            reader, self.__target_page_blob(), self.__target_page_blob()
+        ]
+        mock_page_blob.side_effect = list(page_blobs)
+        journals = []
+
+        def journal(*args):
+            journals.append(mock.Mock())
+            journals[-1].is_committed.return_value = False
+            return journals[-1]
+
+        mock_journal.side_effect = journal
+        mock_uncompressed_size.return_value = 1024
+        self.storage.account.storage_key.return_value = 'b3RoZXIta2V5'
+
+        self.storage.upload(
+            '../data/blob.xz', 'blob', threads=2, targets=[
+                ('other-account', 'other-container', 'other-blob'),
+                ('mock-storage-name', 'second-container', None)
+            ]
+        )
+
+        self.storage.account.storage_key.assert_called_with('other-account')
+        # targets in one account share the service client
+        assert mock_blob_service.call_args_list[:2] == [
+            call(
+                'mock-storage-name', 'bW9jay1zdG9yYWdlLWtleQ==',
+                endpoint_suffix='core.windows.net',
+                request_session=mock.ANY
+            ),
+            call(
+                'other-account', 'b3RoZXIta2V5',
+                endpoint_suffix='core.windows.net',
+                request_session=mock.ANY
+            )
+        ]
+        assert mock_journal.call_args_list == [
+            call('../data/blob.xz', 'mock-storage-name/some-container/blob'),
+            call('../data/blob.xz', 'other-account/other-container/other-blob'),
+            call('../data/blob.xz', 'mock-storage-name/second-container/blob')
+        ]
+        assert mock_page_blob.call_args_list == [
+            call(
+                mock.ANY, 'blob', 'some-container', 1024, create=True,
+                lease_id=None
+            ),
+            call(
+                mock.ANY, 'other-blob', 'other-container', 1024, create=True,
+                lease_id=None
+            ),
+            call(
+                mock.ANY, 'blob', 'second-container', 1024, create=True,
+                lease_id=None
+            )
+        ]
+        assert reader.read_chunk.call_count == 3
+        for page_blob in page_blobs:
+            page_blob.update_page.assert_called_once_with(
+                'x' * 512, 0, 5, mock.ANY
+            )
+        for journal in journals:
+            journal.add_skipped.assert_called_with([(512, 512)])
+            journal.delete.assert_called_once_with()
+        assert [
+            target.status for target in self.storage.upload_targets
+        ] == [{'current_bytes': 1024, 'total_bytes': 1024}] * 3
+        assert self.block_blob_service.create_blob_from_text.call_count == 3
+
+    @patch('azurectl.storage.storage.WorkerPool')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_targets_one_failed(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_blob_service, mock_journal, mock_pool
+    ):
+        reader = self.__page_blob(['y' * 512, 'x' * 512])
+        failing = self.__target_page_blob()
+        mock_page_blob.side_effect = [reader, failing]
+        journals = [mock.Mock(), mock.Mock()]
+        for journal in journals:
+            journal.is_committed.return_value = False
+        mock_journal.side_effect = list(journals)
+        failed_pool = mock.Mock()
+        failed_pool.submit.side_effect = AzureWorkerPoolError('failed')
+        failed_pool.join.side_effect = AzureWorkerPoolError('failed')
+        pool = mock.Mock()
+        pool.submit.side_effect = lambda job, *args, **kwargs: job(*args)
+        mock_pool.side_effect = [pool, failed_pool]
+        mock_uncompressed_size.return_value = 1024
+
+        error = None
+        try:
+            self.storage.upload(
+                '../data/blob.xz', 'blob',
+                targets=[('mock-storage-name', 'other-container', None)]
+            )
+        except AzureStorageUploadError as e:
+            error = format(e)
+
+        assert 'Upload to mock-storage-name/other-container/blob failed' in \
+            error
+
+        assert reader.update_page.call_args_list == [
+            call('x' * 512, 0, 5, mock.ANY),
+            call('y' * 512, 512, 5, mock.ANY)
+        ]
+        assert failed_pool.submit.call_count == 1
+        journals[0].delete.assert_called_once_with()
+        journals[1].save.assert_called_once_with()
+        assert self.storage.upload_status == \
+            {'current_bytes': 1024, 'total_bytes': 1024}
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_targets_one_slow_failed(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_blob_service, mock_journal
+    ):
+        reader = self.__page_blob(['x' * 512] * 16)
+        failing = self.__target_page_blob()
+
+        def update_page(data, page_start, max_attempts, throttled):
+            time.sleep(0.01)
+            raise AzurePageBlobUpdateError('update failed')
+
+        failing.update_page.side_effect = update_page
+        mock_page_blob.side_effect = [reader, failing]
+        mock_journal.return_value.is_committed.return_value = False
+        mock_uncompressed_size.return_value = 8192
+
+        error = None
+        try:
+            self.storage.upload(
+                '../data/blob.xz', 'blob', threads=1,
+                targets=[('mock-storage-name', 'other-container', None)]
+            )
+        except AzureStorageUploadError as e:
+            error = format(e)
+
+        assert 'Upload to mock-storage-name/other-container/blob failed' in \
+            error
+        assert reader.update_page.call_count == 16
+
+    @raises(AzureStorageUploadError)
+    @patch('azurectl.storage.storage.WorkerPool')
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.utils.xz.XZ.uncompressed_size')
+    @patch('azurectl.utils.xz.XZ.open')
+    def test_upload_all_targets_failed(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal, mock_pool
+    ):
+        reader = self.__page_blob(['y' * 512, 'x' * 512])
+        mock_page_blob.return_value = reader
+        mock_journal.return_value.is_committed.return_value = False
+        mock_pool.return_value.submit.side_effect = AzureWorkerPoolError(
+            'failed'
+        )
+        mock_uncompressed_size.return_value = 1024
+        try:
+            self.storage.upload('../data/blob.xz')
+        finally:
+            assert reader.read_chunk.call_count == 1
+
+    def __copy_properties(self, status, progress, description=None):
+        return mock.Mock(
+            status=status, progress=progress, status_description=description
+        )
+
+    @patch('azurectl.storage.copy_poller.time.sleep')
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_copy(self, mock_blob_service, mock_sleep):
+        blob_service = mock_blob_service.return_value
+        blob_service.make_blob_url.return_value = 'blob-url'
+        blob_service.copy_blob.return_value = \
+            self.__copy_properties('pending', '0/1024')
+        blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(
+                copy=self.__copy_properties('success', '1024/1024')
+            )
+        )
+
+        poller = self.storage.copy([
+            (
+                ('mock-storage-name', 'some-container', 'blob'),
+                ('mock-storage-name', 'other-container', 'blob')
+            ),
+            (
+                ('other-account', 'container', 'blob'),
+                ('mock-storage-name', 'some-container', 'copy')
+            )
+        ])
+
+        assert blob_service.copy_blob.call_args_list[0] == call(
+            'other-container', 'blob', 'blob-url'
+        )
+        copy_source = blob_service.copy_blob.call_args_list[1][0][2]
+        assert copy_source.startswith(
+            'https://other-account.blob.core.windows.net/container/blob?'
+        )
+        assert 'sp=r' in copy_source
+        self.storage.account.storage_key.assert_called_with('other-account')
+        assert mock_sleep.call_count == 1
+        assert poller.bytes_copied() == 2048
+        assert self.storage.copy_status == \
+            {'current_bytes': 2048, 'total_bytes': 2048}
+
+    @patch('azurectl.storage.copy_poller.time.sleep')
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_copy_failed(self, mock_blob_service, mock_sleep):
+        blob_service = mock_blob_service.return_value
+        blob_service.copy_blob.side_effect = [
+            Exception('not found'),
+            self.__copy_properties('pending', '0/1024')
+        ]
+        blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(
+                copy=self.__copy_properties('failed', '512/1024', 'error')
+            )
+        )
+        try:
+            self.storage.copy([
+                (
+                    ('mock-storage-name', 'some-container', 'blob'),
+                    ('mock-storage-name', 'some-container', 'copy')
+                ),
+                (
+                    ('mock-storage-name', 'some-container', 'blob'),
+                    ('mock-storage-name', 'other-container', 'blob')
+                )
+            ])
+            assert False
+        except AzureStorageCopyError as e:
+            assert format(e).split('\\n') == [
+                "'Copy to mock-storage-name/some-container/copy failed: "
+                "Exception: not found",
+                "Copy to mock-storage-name/other-container/blob failed: "
+                "error'"
+            ]
+
+    def test_print_copy_status(self):
+        self.storage.print_copy_status()
+        assert self.storage.copy_status == \
+            {'current_bytes': 0, 'total_bytes': 0}
+
+    def __download_service(self, mock_blob_service, page_ranges):
+        blob_service = mock_blob_service.return_value
+        blob_service.MAX_CHUNK_GET_SIZE = 1024
+        blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(content_length=8192)
+        )
+        blob_service.get_page_ranges.return_value = [
+            mock.Mock(start=start, end=end) for start, end in page_ranges
+        ]
+        blob_service.get_blob_to_bytes.side_effect = \
+            lambda container, blob, start_range, end_range: mock.Mock(
+                content=b'x' * (end_range - start_range + 1)
+            )
+        return blob_service
+
+    @patch('azurectl.storage.storage.SparseWriter')
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_download(self, mock_blob_service, mock_writer):
+        blob_service = self.__download_service(
+            mock_blob_service, [(0, 1535), (4096, 4607)]
+        )
+        writer = mock_writer.return_value
+        # created up front, the worker threads would race for it
+        writer.write_at = mock.Mock()
+        self.storage.download('blob', 'file', threads=2)
+        mock_writer.assert_called_once_with('file', 8192)
+        assert sorted(
+            (kwargs['start_range'], kwargs['end_range'])
+            for args, kwargs in blob_service.get_blob_to_bytes.call_args_list
+        ) == [(0, 1023), (1024, 1535), (4096, 4607)]
+        assert sorted(
+            (len(data), offset)
+            for (data, offset), kwargs in writer.write_at.call_args_list
+        ) == [(512, 1024), (512, 4096), (1024, 0)]
+        writer.close.assert_called_once_with()
+        assert self.storage.download_status == \
+            {'current_bytes': 2048, 'total_bytes': 2048}
+
+    @patch('azurectl.storage.storage.XZWriter')
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_download_compressed(self, mock_blob_service, mock_writer):
+        self.__download_service(mock_blob_service, [(512, 1023)])
+        self.storage.download('blob', 'file.xz', 4096, compress=True)
+        mock_writer.assert_called_once_with('file.xz', 8192, [(512, 512)])
+        mock_writer.return_value.write_at.assert_called_once_with(
+            b'x' * 512, 512
+        )
+
+    @raises(AzureStorageDownloadError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_download_blob_not_found(self, mock_blob_service):
+        mock_blob_service.return_value.get_page_ranges.side_effect = \
+            Exception('not found')
+        self.storage.download('blob', 'file')
+
+    @raises(AzureStorageDownloadError)
+    @patch('azurectl.storage.storage.SparseWriter')
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_download_file_not_writable(self, mock_blob_service, mock_writer):
+        self.__download_service(mock_blob_service, [])
+        mock_writer.side_effect = IOError('permission denied')
+        self.storage.download('blob', 'file')
+
+    @raises(AzureStorageDownloadError)
+    @patch('azurectl.storage.storage.SparseWriter')
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_download_range_failed(self, mock_blob_service, mock_writer):
+        blob_service = self.__download_service(mock_blob_service, [(0, 511)])
+        blob_service.get_blob_to_bytes.side_effect = Exception('timeout')
+        writer = mock_writer.return_value
+        try:
+            self.storage.download('blob', 'file')
+        finally:
+            assert writer.abort.call_count == 2
+            writer.close.assert_called_once_with()
+
+    @raises(KeyboardInterrupt)
+    @patch('azurectl.storage.storage.WorkerPool')
+    @patch('azurectl.storage.storage.SparseWriter')
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_download_interrupted(
+        self, mock_blob_service, mock_writer, mock_pool
+    ):
+        self.__download_service(mock_blob_service, [(0, 511)])
+        mock_pool.return_value.join.side_effect = KeyboardInterrupt
+        writer = mock_writer.return_value
+        try:
+            self.storage.download('blob', 'file')
+        finally:
+            writer.abort.assert_called_once_with()
+            writer.close.assert_called_once_with()
+
+    def test_print_download_status(self):
+        self.storage.print_download_status()
+        assert self.storage.download_status == \
+            {'current_bytes': 0, 'total_bytes': 0}
+
+    def __verify_service(self, mock_blob_service, metadata):
+        blob_service = mock_blob_service.return_value
+        blob_service.get_blob_properties.return_value = mock.Mock(
+            properties=mock.Mock(content_length=2560), metadata=metadata
+        )
+        blob_service.get_page_ranges.return_value = [
+            mock.Mock(start=512, end=1535)
+        ]
+        blob_service.get_blob_to_bytes.side_effect = \
+            lambda container, blob, start_range, end_range: mock.Mock(
+                content=b'x' * (end_range - start_range + 1)
+            )
+        return blob_service
+
+    def __verify_manifest(self, data=b'x' * 1024):
+        manifest = HashManifest(2560, 1024)
+        manifest.update(512)
+        manifest.update(len(data), data)
+        manifest.finish()
+        return manifest
+
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_verify(self, mock_blob_service):
+        digest = self.__verify_manifest().content_id()
+        blob_service = self.__verify_service(mock_blob_service, {
+            'azurectl_digest': digest, 'azurectl_range_size': '1024'
+        })
+        assert self.storage.verify('blob', threads=2) == digest
+        assert sorted(
+            (kwargs['start_range'], kwargs['end_range'])
+            for args, kwargs in blob_service.get_blob_to_bytes.call_args_list
+        ) == [(512, 1023), (1024, 1535)]
+
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_verify_mismatch(self, mock_blob_service):
+        self.__verify_service(mock_blob_service, {
+            'azurectl_digest': self.__verify_manifest(b'y' * 1024)
+            .content_id(),
+            'azurectl_range_size': '1024'
+        })
+        self.block_blob_service.get_blob_to_bytes.return_value = mock.Mock(
+            content=self.__verify_manifest(b'x' * 512 + b'y' * 512).to_json()
+        )
+        try:
+            self.storage.verify('blob')
+            assert False
+        except AzureStorageVerifyError as e:
+            assert 'differing ranges at offsets: 1024' in format(e)
+        self.block_blob_service.get_blob_to_bytes.assert_called_once_with(
+            'some-container', 'blob.manifest'
+        )
+
+    @raises(AzureStorageVerifyError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_verify_mismatch_without_manifest(self, mock_blob_service):
+        self.__verify_service(mock_blob_service, {
+            'azurectl_digest': 'digest', 'azurectl_range_size': '1024'
+        })
+        self.block_blob_service.get_blob_to_bytes.side_effect = Exception
+        self.storage.verify('blob')
+
+    @raises(AzureStorageVerifyError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_verify_without_digest(self, mock_blob_service):
+        self.__verify_service(mock_blob_service, {})
+        self.storage.verify('blob')
+
+    @raises(AzureStorageVerifyError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_verify_blob_not_found(self, mock_blob_service):
+        mock_blob_service.return_value.get_blob_properties.side_effect = \
+            Exception('not found')
+        self.storage.verify('blob')
+
+    @raises(AzureStorageVerifyError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_verify_no_range_size(self, mock_blob_service):
+        self.__verify_service(mock_blob_service, {
+            'azurectl_digest': 'digest'
+        })
+        self.storage.verify('blob')
+
+    @raises(AzureStorageVerifyError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_verify_invalid_range_size(self, mock_blob_service):
+        self.__verify_service(mock_blob_service, {
+            'azurectl_digest': 'digest', 'azurectl_range_size': '4M'
+        })
+        self.storage.verify('blob')
+
+    @raises(AzureStorageVerifyError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_verify_zero_range_size(self, mock_blob_service):
+        self.__verify_service(mock_blob_service, {
+            'azurectl_digest': 'digest', 'azurectl_range_size': '0'
+        })
+        self.storage.verify('blob')
+
+    @raises(AzureStorageVerifyError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_verify_range_failed(self, mock_blob_service):
+        blob_service = self.__verify_service(mock_blob_service, {
+            'azurectl_digest': 'digest', 'azurectl_range_size': '1024'
+        })
+        blob_service.get_blob_to_bytes.side_effect = Exception('timeout')
+        self.storage.verify('blob')
+
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_delete(self, mock_blob_service):
+        self.storage.delete('some-blob')
+        mock_blob_service.return_value.delete_blob.assert_called_once_with(
+            'some-container', 'some-blob'
+        )
+        self.block_blob_service.delete_blob.assert_called_once_with(
+            'some-container', 'some-blob.manifest'
+        )
+
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_delete_without_manifest(self, mock_blob_service):
+        self.block_blob_service.delete_blob.side_effect = \
+            AzureHttpError('not found', 404)
+        self.storage.delete('some-blob')
+        assert mock_blob_service.return_value.delete_blob.called
+
+    @raises(AzureStorageDeleteError)
+    @patch('azurectl.storage.storage.PageBlobService')
+    def test_delete_manifest_failed(self, mock_blob_service):
+        self.block_blob_service.delete_blob.side_effect = \
+            AzureHttpError('denied', 403)
+        self.storage.delete('some-blob')
+
     @patch('azurectl.storage.storage.PageBlobService.delete_blob')
     @raises(AzureStorageDeleteError)
-    def test_delete(self, mock_delete_blob):
+    def test_delete_failed(self, mock_delete_blob):
         mock_delete_blob.side_effect = Exception
-        self.storage.delete('some-blob')
+        try:
+            self.storage.delete('some-blob')
+        finally:
+            assert not self.block_blob_service.delete_blob.called
 
     def test_print_upload_status(self):
         self.storage.print_upload_status()
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import time
+import mock
+from mock import patch
+from tempfile import NamedTemporaryFile
+
+from test_helper import *
+
+from azurectl.storage.upload_journal import UploadJournal
+
+
+class TestUploadJournal:
+    def setup(self):
+        self.image = NamedTemporaryFile()
+        self.image.write('x' * 1024)
+        self.image.flush()
+        self.journal = UploadJournal(self.image.name, 'account/container/blob')
+
+    def teardown(self):
+        self.journal.delete()
+
+    def test_key(self):
+        assert self.journal.journal_file == '%s.%s.upload-journal' % (
+            self.image.name,
+            hashlib.md5('account/container/blob').hexdigest()[:8]
+        )
+        assert self.journal.key['source'] == self.image.name
+        assert self.journal.key['size'] == 1024
+        assert self.journal.key['inode'] == os.stat(self.image.name).st_ino
+        assert self.journal.key['blob'] == 'account/container/blob'
+
+    def test_load_rewritten_in_same_second(self):
+        mtime = int(time.time()) + 0.25
+        os.utime(self.image.name, (mtime, mtime))
+        journal = UploadJournal(self.image.name, 'account/container/blob')
+        journal.add_uploaded(0, 512)
+        journal.save()
+        os.utime(self.image.name, (mtime + 0.5, mtime + 0.5))
+        journal = UploadJournal(self.image.name, 'account/container/blob')
+        assert journal.load() is False
+
+    def test_save_and_load(self):
+        self.journal.add_uploaded(0, 512)
+        self.journal.add_skipped([(512, 512), (1536, 512)])
+        self.journal.save()
+        journal = UploadJournal(self.image.name, 'account/container/blob')
+        assert journal.load() is True
+        assert journal.uploaded.ranges() == [(0, 512)]
+        assert journal.skipped.ranges() == [(512, 512), (1536, 512)]
+        assert journal.is_committed(0, 1024) is True
+        assert journal.is_committed(1024, 512) is False
+        assert journal.committed_bytes() == 1536
+
+    def test_load_no_journal(self):
+        assert self.journal.load() is False
+
+    def test_load_other_blob(self):
+        self.journal.save()
+        journal = UploadJournal(self.image.name, 'account/other/blob')
+        assert journal.journal_file != self.journal.journal_file
+        # the blob of another container does not match the key either
+        journal.journal_file = self.journal.journal_file
+        assert journal.load() is False
+
+    def test_restrict_uploaded(self):
+        self.journal.add_uploaded(0, 2048)
+        self.journal.restrict_uploaded([(512, 512)])
+        assert self.journal.uploaded.ranges() == [(512, 512)]
+
+    def test_save_due(self):
+        self.journal.last_save = 0
+        self.journal.add_uploaded(0, 512)
+        with open(self.journal.journal_file) as journal:
+            assert json.load(journal)['uploaded'] == [[0, 512]]
+
+    @patch('azurectl.storage.upload_journal.log.warning')
+    @patch('json.dump')
+    def test_save_failed(self, mock_dump, mock_warning):
+        mock_dump.side_effect = IOError
+        self.journal.save()
+        assert self.journal.writable is False
+        assert mock_warning.called
+        self.journal.save()
+        mock_dump.assert_called_once_with(mock.ANY, mock.ANY)
+
+    def test_delete(self):
+        self.journal.save()
+        self.journal.delete()
+        assert not os.path.exists(self.journal.journal_file)
+
+    def test_in_memory(self):
+        journal = UploadJournal(None, 'account/container/blob')
+        assert journal.journal_file is None
+        assert journal.load() is False
+        journal.add_uploaded(0, 512)
+        assert journal.is_committed(0, 512) is True
+        journal.save()
+        journal.delete()
+
+    def test_target(self):
+        journal = UploadJournal(self.image.name, 'account/container/other')
+        assert journal.journal_file.startswith(self.image.name + '.')
+        assert journal.journal_file.endswith('.upload-journal')
+        assert journal.journal_file != self.journal.journal_file
+        assert journal.key['blob'] == 'account/container/other'
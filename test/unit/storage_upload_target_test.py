@@ -0,0 +1,24 @@
+import mock
+
+from test_helper import *
+
+from azurectl.storage.upload_target import UploadTarget
+
+
+class TestUploadTarget:
+    def setup(self):
+        self.journal = mock.Mock()
+        self.target = UploadTarget(
+            'account', 'key', 'container', 'path/to/blob', mock.Mock(),
+            self.journal
+        )
+
+    def test_name(self):
+        assert self.target.name() == 'account/container/path/to/blob'
+
+    def test_initial_state(self):
+        assert self.target.journal == self.journal
+        assert self.target.resumed is False
+        assert self.target.error is None
+        assert self.target.pending_bytes == 0
+        assert self.target.status == {'current_bytes': 0, 'total_bytes': 0}
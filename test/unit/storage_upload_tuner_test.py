@@ -0,0 +1,73 @@
+import mock
+from mock import patch
+
+from test_helper import *
+
+from azurectl.storage.upload_tuner import UploadTuner
+
+
+class TestUploadTuner:
+    def setup(self):
+        self.tuner = UploadTuner(4194304, 4, adaptive=True)
+
+    def __window(self, seconds, mock_time):
+        mock_time.return_value = self.tuner.window_start + seconds
+        for request in range(UploadTuner.WINDOW_REQUESTS):
+            self.tuner.completed(1048576)
+
+    def test_static(self):
+        tuner = UploadTuner(4096, 2)
+        assert tuner.chunk_size == 4096
+        tuner.completed(4096)
+        tuner.throttled()
+        assert tuner.chunk_size == 4096
+        assert tuner.concurrency == 2
+        assert tuner.window_requests == 0
+
+    def test_initial_chunk_size(self):
+        assert self.tuner.chunk_size == 1048576
+        assert UploadTuner(524288, 1, adaptive=True).chunk_size == 524288
+        assert UploadTuner(4096, 1, adaptive=True).chunk_size == 4096
+
+    @patch('time.time')
+    def test_grow_while_throughput_improves(self, mock_time):
+        mock_time.return_value = self.tuner.window_start
+        self.__window(8, mock_time)
+        assert self.tuner.chunk_size == 2097152
+        assert self.tuner.throughput == 1048576
+        self.__window(4, mock_time)
+        assert self.tuner.chunk_size == 4194304
+        self.__window(2, mock_time)
+        assert self.tuner.chunk_size == 4194304
+
+    @patch('time.time')
+    def test_shrink_on_throughput_drop(self, mock_time):
+        self.__window(4, mock_time)
+        assert self.tuner.chunk_size == 2097152
+        self.__window(8, mock_time)
+        assert self.tuner.grow is False
+        assert self.tuner.chunk_size == 1048576
+        self.__window(4, mock_time)
+        assert self.tuner.chunk_size == 524288
+
+    @patch('time.time')
+    def test_throttled(self, mock_time):
+        self.tuner.throttled()
+        assert self.tuner.chunk_size == 524288
+        assert self.tuner.concurrency == 2
+        self.tuner.throttled()
+        self.tuner.throttled()
+        assert self.tuner.concurrency == 1
+        self.__window(8, mock_time)
+        assert self.tuner.concurrency == 2
+        assert self.tuner.chunk_size == UploadTuner.MIN_CHUNK_SIZE
+
+    def test_acquire_release(self):
+        tuner = UploadTuner(4096, 1)
+        tuner.acquire()
+        assert tuner.active == 1
+        with patch.object(tuner.condition, 'wait') as mock_wait:
+            mock_wait.side_effect = lambda timeout: tuner.release()
+            tuner.acquire()
+            mock_wait.assert_called_once_with(UploadTuner.POLL_INTERVAL)
+        assert tuner.active == 1
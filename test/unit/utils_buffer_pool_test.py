@@ -0,0 +1,55 @@
+import mock
+from mock import patch
+from queue import Empty
+
+from test_helper import *
+
+from azurectl.utils.buffer_pool import BufferPool
+
+
+class TestBufferPool:
+    def setup(self):
+        self.pool = BufferPool(2, 512)
+
+    def test_get(self):
+        buffer = self.pool.get()
+        assert buffer == bytearray(512)
+        assert self.pool.allocated == 1
+        assert self.pool.users == {id(buffer): 1}
+
+    def test_get_reuses_released_buffer(self):
+        buffer = self.pool.get()
+        self.pool.release(buffer)
+        assert self.pool.get() is buffer
+        assert self.pool.allocated == 1
+
+    def test_get_allocates_up_to_buffer_count(self):
+        first = self.pool.get()
+        second = self.pool.get()
+        assert first is not second
+        assert self.pool.allocated == 2
+
+    def test_get_waits_for_release(self):
+        first = self.pool.get()
+        self.pool.get()
+        free_get = self.pool.free.get
+
+        def side_effect(block, timeout):
+            if not mock_get.call_count > 1:
+                self.pool.release(first)
+                raise Empty
+            return free_get(block, timeout)
+
+        with patch.object(self.pool.free, 'get') as mock_get:
+            mock_get.side_effect = side_effect
+            assert self.pool.get() is first
+        assert self.pool.allocated == 2
+
+    def test_release_shared_buffer(self):
+        buffer = self.pool.get()
+        self.pool.retain(buffer)
+        self.pool.release(buffer)
+        assert self.pool.free.empty()
+        self.pool.release(buffer)
+        assert self.pool.free.get() is buffer
+        assert self.pool.users == {}
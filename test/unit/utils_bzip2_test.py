@@ -0,0 +1,147 @@
+from mock import patch
+import binascii
+import bz2
+import io
+import random
+from tempfile import NamedTemporaryFile
+
+from test_helper import *
+import mock
+
+from azurectl.azurectl_exceptions import *
+from azurectl.utils.bzip2 import (
+    BZip2,
+    BZip2Block,
+    ParallelBZip2,
+    decompress_block
+)
+from azurectl.utils.read_ahead import ReadAhead
+
+# random data does not compress, with compression level 1 bzip2
+# starts a new block after 100k
+generator = random.Random(42)
+DATA = bytes(bytearray(generator.randint(0, 255) for i in range(250000)))
+
+
+class TestBZip2:
+    def setup(self):
+        self.data = DATA
+        self.image = NamedTemporaryFile()
+
+    def teardown(self):
+        self.image.close()
+
+    def __write_image(self, data):
+        self.image.write(data)
+        self.image.flush()
+        return self.image.name
+
+    def test_read(self):
+        self.__write_image(bz2.compress(b'Some data so that we can read it'))
+        with BZip2(open(self.image.name, 'rb'), buffer_size=8) as bzip2:
+            assert bzip2.read(8) == b'Some dat'
+            assert bzip2.read(64) == b'a so that we can read it'
+            assert bzip2.read(8) == b''
+            assert bzip2.read(8) == b''
+
+    def test_readinto_concatenated(self):
+        self.__write_image(bz2.compress(b'Some data') + bz2.compress(b' more'))
+        buffer = bytearray(18)
+        with BZip2(open(self.image.name, 'rb')) as bzip2:
+            assert bzip2.readinto(memoryview(buffer)[2:]) == 14
+            assert bzip2.readinto(buffer) == 0
+        assert buffer == bytearray(2) + b'Some data more' + bytearray(2)
+
+    def test_read_concatenated_at_buffer_boundary(self):
+        first = bz2.compress(b'Some data')
+        with BZip2(
+            io.BytesIO(first + bz2.compress(b' more')),
+            buffer_size=len(first)
+        ) as bzip2:
+            assert bzip2.read(64) == b'Some data more'
+            assert bzip2.read(64) == b''
+
+    @raises(AzureBZip2Error)
+    def test_read_truncated(self):
+        self.__write_image(bz2.compress(b'Some data')[:-4])
+        with BZip2(open(self.image.name, 'rb')) as bzip2:
+            bzip2.read(64)
+
+    def test_blocks(self):
+        self.__write_image(
+            bz2.compress(self.data, 1) + bz2.compress(b'Some data', 9)
+        )
+        blocks = BZip2.blocks(self.image.name)
+        assert len(blocks) == 4
+        assert blocks[0].level == b'1'
+        assert blocks[0].start_bit == 32
+        assert blocks[1].start_bit == blocks[0].end_bit
+        assert blocks[3].level == b'9'
+        assert blocks[3].start_bit > blocks[2].end_bit
+        assert b''.join(
+            decompress_block(self.image.name, block) for block in blocks
+        ) == self.data + b'Some data'
+
+    def test_blocks_scanned_in_parts(self):
+        self.__write_image(bz2.compress(self.data, 1))
+        blocks = BZip2.blocks(self.image.name)
+        with patch.object(BZip2, 'SCAN_BUFFER_SIZE', 7):
+            assert BZip2.blocks(self.image.name) == blocks
+
+    @raises(AzureBZip2Error)
+    def test_blocks_truncated(self):
+        self.__write_image(bz2.compress(self.data, 1)[:-8])
+        BZip2.blocks(self.image.name)
+
+    @raises(AzureBZip2Error)
+    def test_blocks_invalid_header(self):
+        self.__write_image(b'BZh0' + bz2.compress(b'Some data')[4:])
+        BZip2.blocks(self.image.name)
+
+    @raises(AzureBZip2Error)
+    def test_blocks_invalid_stream(self):
+        self.__write_image(b'BZh9\0' + bz2.compress(b'Some data')[4:])
+        BZip2.blocks(self.image.name)
+
+    @raises(AzureBZip2Error)
+    def test_blocks_no_such_file(self):
+        BZip2.blocks('../data/no-such-file.bz2')
+
+    def test_single_block_stream(self):
+        # block magic, crc and four more bits, four bits into the data
+        block = BZip2Block(level=b'9', start_bit=36, end_bit=36 + 84)
+        block_data = binascii.unhexlify('0314159265359aabbccddf')
+        assert BZip2.single_block_stream(block, block_data) == \
+            b'BZh9' + binascii.unhexlify(
+                '314159265359aabbccddf' + '177245385090aabbccdd' + '0'
+            )
+
+    def test_uncompressed_size(self):
+        self.__write_image(bz2.compress(self.data, 1))
+        assert BZip2.uncompressed_size(self.image.name) is None
+
+    def test_open_parallel(self):
+        self.__write_image(bz2.compress(self.data, 1))
+        with BZip2.open(self.image.name, processes=2) as bzip2:
+            assert isinstance(bzip2, ParallelBZip2)
+            assert bzip2.read(300000) == self.data
+
+    @patch('azurectl.utils.bzip2.multiprocessing.cpu_count')
+    def test_open_single_block(self, mock_cpu_count):
+        mock_cpu_count.return_value = 4
+        self.__write_image(bz2.compress(b'Some data'))
+        with BZip2.open(self.image.name) as bzip2:
+            assert isinstance(bzip2, ReadAhead)
+            assert isinstance(bzip2.stream, BZip2)
+            assert bzip2.read(64) == b'Some data'
+
+    @raises(AzureBZip2Error)
+    def test_parallel_block_failed(self):
+        self.__write_image(bz2.compress(self.data, 1))
+        blocks = BZip2.blocks(self.image.name)
+        with ParallelBZip2(self.image.name, blocks, 2) as bzip2:
+            result = mock.Mock()
+            result.ready.return_value = True
+            result.get.side_effect = IOError
+            bzip2.pending.appendleft(result)
+            bzip2.read(8)
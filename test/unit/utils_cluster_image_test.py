@@ -0,0 +1,74 @@
+from tempfile import NamedTemporaryFile
+
+from test_helper import *
+
+from azurectl.utils.cluster_image import ClusterImage
+
+
+class Image(ClusterImage):
+    def __init__(self, file_name, size, clusters):
+        super(Image, self).__init__(file_name)
+        self.size = size
+        self.cluster_size = 1024
+        self.clusters = clusters
+        self.reads = []
+
+    def allocated(self, index):
+        return index in self.clusters
+
+    def read_cluster(self, index):
+        self.reads.append(index)
+        return self.clusters[index]
+
+
+class TestClusterImage:
+    def setup(self):
+        self.file = NamedTemporaryFile()
+        self.file.write(b'x' * 1024)
+        self.file.flush()
+        self.image = Image(
+            self.file.name, 2560, {0: b'a' * 1024, 2: b'b' * 1024}
+        )
+
+    def teardown(self):
+        self.image.close()
+
+    def test_readinto(self):
+        buffer = bytearray(512)
+        assert self.image.readinto(buffer) == 512
+        assert buffer == b'a' * 512
+        assert self.image.read(1024) == b'a' * 512 + bytes(bytearray(512))
+        # the virtual disk ends within the last cluster
+        assert self.image.read(4096) == bytes(bytearray(512)) + b'b' * 512
+        assert self.image.read(512) == b''
+        # each cluster is read once
+        assert self.image.reads == [0, 2]
+
+    def test_skip_hole(self):
+        assert self.image.skip_hole(4096) == 0
+        self.image.read(512)
+        # the hole starts within the allocated cluster
+        assert self.image.skip_hole(4096) == 0
+        self.image.read(512)
+        assert self.image.skip_hole(4096) == 1024
+        assert self.image.position == 2048
+
+    def test_skip_hole_at_end(self):
+        image = Image(self.file.name, 1536, {})
+        assert image.skip_hole(4096) == 1536
+        assert image.skip_hole(4096) == 0
+
+    def test_read_at(self):
+        assert self.image.read_at(512, 512) == b'x' * 512
+
+    @raises(EOFError)
+    def test_read_at_end_of_file(self):
+        self.image.read_at(512, 1024)
+
+    @raises(NotImplementedError)
+    def test_allocated(self):
+        ClusterImage(self.file.name).allocated(0)
+
+    @raises(NotImplementedError)
+    def test_read_cluster(self):
+        ClusterImage(self.file.name).read_cluster(0)
@@ -0,0 +1,25 @@
+from test_helper import *
+
+from azurectl.utils.bzip2 import BZip2
+from azurectl.utils.decompressor import Decompressor
+from azurectl.utils.gz import GZ
+from azurectl.utils.xz import XZ
+
+
+class TestDecompressor:
+    def test_lookup(self):
+        assert Decompressor.lookup(b'\xfd7zXZ\x00\x00\x04') == XZ
+        assert Decompressor.lookup(b'\x1f\x8b\x08\x04\x00\x00\x00\x00') == GZ
+        assert Decompressor.lookup(b'BZh91AY&') == BZip2
+
+    def test_lookup_not_compressed(self):
+        assert Decompressor.lookup(b'\x1f\x8b\x07') is None
+        assert Decompressor.lookup(b'') is None
+
+    def test_register(self):
+        formats = list(Decompressor.formats)
+        try:
+            Decompressor.register(b'QFI\xfb', GZ)
+            assert Decompressor.lookup(b'QFI\xfb\x00\x00\x00\x03') == GZ
+        finally:
+            Decompressor.formats[:] = formats
@@ -1,6 +1,7 @@
-
+import mock
 
 from azurectl.utils.filetype import FileType
+from azurectl.utils.xz import XZ
 
 from azurectl.azurectl_exceptions import *
 
@@ -19,3 +20,45 @@ class TestFileType:
     def test_basename(self):
         assert self.filetype_xz.basename() == 'blob'
         assert self.filetype_not_xz.basename() == 'id_test'
+
+    def test_not_readable(self):
+        filetype = FileType('../data/no-such-file.xz')
+        assert filetype.is_xz() is False
+        assert filetype.basename() == 'no-such-file.xz'
+
+    def test_source(self):
+        source = mock.Mock()
+        source.peek.return_value = b'\xfd7zXZ\x00\x00\x04'
+        filetype = FileType('-', source)
+        source.peek.assert_called_once_with(8)
+        assert filetype.is_xz() is True
+
+    def test_is_qcow2(self):
+        source = mock.Mock()
+        source.peek.return_value = b'QFI\xfb\x00\x00\x00\x03'
+        filetype = FileType('-', source)
+        assert filetype.is_qcow2() is True
+        assert filetype.is_vmdk() is False
+        assert filetype.is_xz() is False
+
+    def test_is_vmdk(self):
+        source = mock.Mock()
+        source.peek.return_value = b'KDMV\x01\x00\x00\x00'
+        filetype = FileType('-', source)
+        assert filetype.is_vmdk() is True
+        assert filetype.is_qcow2() is False
+
+    def test_decompressor(self):
+        assert self.filetype_xz.decompressor() == XZ
+        assert self.filetype_not_xz.decompressor() is None
+
+    def test_basename_compressed(self):
+        source = mock.Mock()
+        source.peek.return_value = b'\x1f\x8b\x08\x00\x00\x00\x00\x00'
+        assert FileType('disk.raw.gz', source).basename() == 'disk.raw'
+        assert FileType('disk.tgz', source).basename() == 'disk.tar'
+        source.peek.return_value = b'BZh91AY&'
+        assert FileType('disk.raw.bz2', source).basename() == 'disk.raw'
+        assert FileType('disk.tbz2', source).basename() == 'disk.tar'
+        source.peek.return_value = b'\xebc\x90'
+        assert FileType('disk.raw.gz', source).basename() == 'disk.raw.gz'
@@ -0,0 +1,189 @@
+from mock import patch
+import struct
+import zlib
+from tempfile import NamedTemporaryFile
+
+from test_helper import *
+import mock
+
+from azurectl.azurectl_exceptions import *
+from azurectl.utils.gz import (
+    GZ,
+    GZMember,
+    ParallelGZ,
+    decompress_member
+)
+from azurectl.utils.read_ahead import ReadAhead
+
+
+class TestGZ:
+    def setup(self):
+        self.data = [
+            b'Some data so that we',
+            b' can read it from mu',
+            b'ltiple members\n'
+        ]
+        self.image = NamedTemporaryFile()
+
+    def teardown(self):
+        self.image.close()
+
+    def __gzip(self, data):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+
+    def __bgzf(self, data):
+        """
+            BGZF member, a gzip member with the BC extra subfield
+            holding the member size
+        """
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        deflate_data = compressor.compress(data) + compressor.flush()
+        return struct.pack(
+            '<4sIBBH4sH', b'\x1f\x8b\x08\x04', 0, 0, 255, 6, b'BC\x02\x00',
+            18 + len(deflate_data) + 8 - 1
+        ) + deflate_data + struct.pack(
+            '<II', zlib.crc32(data) & 0xffffffff, len(data)
+        )
+
+    def __write_image(self, data):
+        self.image.write(data)
+        self.image.flush()
+        return self.image.name
+
+    def test_read(self):
+        self.__write_image(self.__gzip(b''.join(self.data)))
+        with GZ(open(self.image.name, 'rb'), buffer_size=8) as gz:
+            assert gz.read(8) == b'Some dat'
+            assert gz.read(64) == \
+                b'a so that we can read it from multiple members\n'
+            assert gz.read(8) == b''
+
+    def test_readinto_multiple_members(self):
+        self.__write_image(b''.join(self.__gzip(data) for data in self.data))
+        buffer = bytearray(64)
+        with GZ(open(self.image.name, 'rb')) as gz:
+            assert gz.readinto(memoryview(buffer)[2:]) == 55
+            assert gz.readinto(buffer) == 0
+        assert buffer == bytearray(2) + b''.join(self.data) + bytearray(7)
+
+    @raises(AzureGZError)
+    def test_read_truncated(self):
+        self.__write_image(self.__gzip(b''.join(self.data))[:-4])
+        with GZ(open(self.image.name, 'rb')) as gz:
+            gz.read(64)
+
+    @raises(AzureGZError)
+    def test_read_truncated_member_header(self):
+        self.__write_image(self.__gzip(b''.join(self.data)) + b'\x1f')
+        with GZ(open(self.image.name, 'rb')) as gz:
+            gz.read(64)
+
+    @raises(AzureGZError)
+    def test_read_invalid_data(self):
+        self.__write_image(self.__gzip(b''.join(self.data)) + b'\0\0X')
+        with GZ(open(self.image.name, 'rb')) as gz:
+            gz.read(64)
+
+    def test_read_zero_padding(self):
+        self.__write_image(
+            b''.join(self.__gzip(data) for data in self.data) +
+            bytes(bytearray(1024))
+        )
+        with GZ(open(self.image.name, 'rb'), buffer_size=256) as gz:
+            assert gz.read(64) == b''.join(self.data)
+            assert gz.read(8) == b''
+
+    def test_members(self):
+        self.__write_image(b''.join(self.__bgzf(data) for data in self.data))
+        assert GZ.members(self.image.name) == [
+            GZMember(compressed_offset=0, total_size=48, uncompressed_size=20),
+            GZMember(
+                compressed_offset=48, total_size=48, uncompressed_size=20
+            ),
+            GZMember(
+                compressed_offset=96, total_size=43, uncompressed_size=15
+            )
+        ]
+
+    def test_members_no_bgzf(self):
+        self.__write_image(self.__gzip(b''.join(self.data)))
+        assert GZ.members(self.image.name) == []
+
+    @raises(AzureGZError)
+    def test_members_truncated(self):
+        self.__write_image(self.__bgzf(self.data[0])[:-1])
+        GZ.members(self.image.name)
+
+    @raises(AzureGZError)
+    def test_members_no_such_file(self):
+        GZ.members('../data/no-such-file.gz')
+
+    def test_decompress_member(self):
+        self.__write_image(b''.join(self.__bgzf(data) for data in self.data))
+        members = GZ.members(self.image.name)
+        assert decompress_member(self.image.name, members[1]) == self.data[1]
+
+    def test_uncompressed_size_bgzf(self):
+        self.__write_image(b''.join(self.__bgzf(data) for data in self.data))
+        with patch('azurectl.utils.gz.GZ.readinto') as mock_readinto:
+            assert GZ.uncompressed_size(self.image.name) == 55
+            assert not mock_readinto.called
+
+    def test_uncompressed_size(self):
+        # the trailer size 55 ends with a zero byte, like padding
+        self.__write_image(self.__gzip(b''.join(self.data)))
+        assert GZ.uncompressed_size(self.image.name) == 55
+
+    def test_uncompressed_size_from_trailer(self):
+        self.__write_image(
+            self.__gzip(b''.join(self.data))[:-4] +
+            struct.pack('<I', 0x12345678)
+        )
+        with patch('azurectl.utils.gz.GZ.readinto') as mock_readinto:
+            assert GZ.uncompressed_size(self.image.name) == 0x12345678
+            assert not mock_readinto.called
+
+    @patch('azurectl.utils.gz.os.path.getsize')
+    def test_uncompressed_size_unknown(self, mock_getsize):
+        self.__write_image(self.__gzip(b''.join(self.data)))
+        # large enough to unpack to more than 4GB
+        mock_getsize.return_value = 4161791
+        assert GZ.uncompressed_size(self.image.name) is None
+        mock_getsize.return_value = 4161790
+        assert GZ.uncompressed_size(self.image.name) == 55
+
+    @raises(AzureGZError)
+    def test_trailer_size_truncated(self):
+        self.__write_image(b'\x1f\x8b\x08')
+        GZ.trailer_size(self.image.name)
+
+    @raises(AzureGZError)
+    def test_trailer_size_no_such_file(self):
+        GZ.trailer_size('../data/no-such-file.gz')
+
+    def test_open_parallel(self):
+        self.__write_image(b''.join(self.__bgzf(data) for data in self.data))
+        with GZ.open(self.image.name, processes=2) as gz:
+            assert isinstance(gz, ParallelGZ)
+            assert gz.read(64) == b''.join(self.data)
+
+    @patch('azurectl.utils.gz.multiprocessing.cpu_count')
+    def test_open_single_member(self, mock_cpu_count):
+        mock_cpu_count.return_value = 4
+        self.__write_image(self.__gzip(b''.join(self.data)))
+        with GZ.open(self.image.name) as gz:
+            assert isinstance(gz, ReadAhead)
+            assert isinstance(gz.stream, GZ)
+            assert gz.read(64) == b''.join(self.data)
+
+    @raises(AzureGZError)
+    def test_parallel_member_failed(self):
+        self.__write_image(b''.join(self.__bgzf(data) for data in self.data))
+        members = GZ.members(self.image.name)
+        with ParallelGZ(self.image.name, members, 2) as gz:
+            result = mock.Mock()
+            result.ready.return_value = True
+            result.get.side_effect = zlib.error
+            gz.pending.appendleft(result)
+            gz.read(8)
@@ -0,0 +1,57 @@
+import mock
+from mock import patch
+from tempfile import NamedTemporaryFile
+
+from test_helper import *
+
+from azurectl.utils.mapped_file import MappedFile
+
+
+class TestMappedFile:
+    def setup(self):
+        self.image = NamedTemporaryFile()
+        self.image.truncate(1048576)
+        self.image.seek(524288)
+        self.image.write('x' * 4096)
+        self.image.flush()
+        self.mapped_file = MappedFile.open(self.image.name)
+
+    def teardown(self):
+        self.mapped_file.close()
+
+    def test_read_view(self):
+        self.mapped_file.position = 520192
+        view = self.mapped_file.read_view(8192)
+        assert isinstance(view, memoryview)
+        assert view.tobytes() == bytes(bytearray(4096)) + 'x' * 4096
+        assert self.mapped_file.position == 528384
+
+    def test_read_view_end_of_file(self):
+        self.mapped_file.position = 1048064
+        assert len(self.mapped_file.read_view(4096)) == 512
+        assert len(self.mapped_file.read_view(4096)) == 0
+        assert self.mapped_file.position == 1048576
+
+    def test_readinto(self):
+        buffer = bytearray(8)
+        self.mapped_file.position = 528380
+        assert self.mapped_file.readinto(memoryview(buffer)[:6]) == 6
+        assert buffer == 'xxxx' + bytearray(4)
+        self.mapped_file.position = 1048574
+        assert self.mapped_file.readinto(buffer) == 2
+
+    def test_read(self):
+        self.mapped_file.position = 528380
+        assert self.mapped_file.read(6) == 'xxxx\x00\x00'
+
+    def test_view_valid_after_close(self):
+        with MappedFile(self.image.name) as mapped_file:
+            mapped_file.position = 524288
+            view = mapped_file.read_view(4)
+        assert mapped_file.mapping is None
+        assert view.tobytes() == 'xxxx'
+
+    @raises(ValueError)
+    def test_empty_file(self):
+        with NamedTemporaryFile() as empty:
+            MappedFile(empty.name)
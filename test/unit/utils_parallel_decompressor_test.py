@@ -0,0 +1,61 @@
+from mock import patch
+import signal
+
+from test_helper import *
+import mock
+
+from azurectl.utils.parallel_decompressor import (
+    ParallelDecompressor,
+    ignore_interrupt
+)
+from azurectl.azurectl_exceptions import *
+
+
+def decompress(file_name, block):
+    return file_name + block
+
+
+class TestParallelDecompressor:
+    def setup(self):
+        self.decompressor = ParallelDecompressor(
+            'data-', ['foo', 'bar', 'baz'], 2, decompress, AzureXZError
+        )
+
+    def teardown(self):
+        self.decompressor.close()
+
+    def test_read(self):
+        assert self.decompressor.read(8) == 'data-foo'
+        assert self.decompressor.read(12) == 'data-bardata'
+        assert self.decompressor.read(12) == '-baz'
+        assert self.decompressor.read(12) == ''
+
+    def test_read_ahead(self):
+        assert self.decompressor.read_ahead == 4
+        assert len(self.decompressor.pending) == 3
+        with ParallelDecompressor(
+            'data-', ['foo', 'bar', 'baz'], 2, decompress, AzureXZError,
+            read_ahead=1
+        ) as decompressor:
+            assert len(decompressor.pending) == 1
+            assert decompressor.read(10) == 'data-fooda'
+            assert len(decompressor.pending) == 1
+            assert len(decompressor.blocks) == 0
+
+    @raises(AzureGZError)
+    def test_block_failed(self):
+        with ParallelDecompressor(
+            'data-', ['foo'], 2, decompress, AzureGZError
+        ) as decompressor:
+            result = mock.Mock()
+            result.ready.side_effect = [False, True]
+            result.get.side_effect = Exception
+            decompressor.pending.appendleft(result)
+            decompressor.read(8)
+
+    @patch('signal.signal')
+    def test_ignore_interrupt(self, mock_signal):
+        ignore_interrupt()
+        mock_signal.assert_called_once_with(
+            signal.SIGINT, signal.SIG_IGN
+        )
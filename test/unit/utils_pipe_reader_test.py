@@ -0,0 +1,39 @@
+import io
+import mock
+from mock import patch
+
+from test_helper import *
+
+from azurectl.utils.pipe_reader import PipeReader
+
+
+class TestPipeReader:
+    def setup(self):
+        self.pipe_reader = PipeReader(io.BytesIO(b'\xfd7zXZ\x00some-data'))
+
+    def test_peek(self):
+        assert self.pipe_reader.peek(6) == b'\xfd7zXZ\x00'
+        assert self.pipe_reader.peek(4) == b'\xfd7zX'
+        assert self.pipe_reader.read(8) == b'\xfd7zXZ\x00so'
+
+    def test_readinto(self):
+        self.pipe_reader.peek(8)
+        buffer = bytearray(4)
+        assert self.pipe_reader.readinto(buffer) == 4
+        assert buffer == b'\xfd7zX'
+        buffer = bytearray(16)
+        assert self.pipe_reader.readinto(buffer) == 11
+        assert buffer[:11] == b'Z\x00some-data'
+
+    def test_read_end_of_input(self):
+        assert self.pipe_reader.peek(32) == b'\xfd7zXZ\x00some-data'
+        assert self.pipe_reader.read(32) == b'\xfd7zXZ\x00some-data'
+        assert self.pipe_reader.read(32) == b''
+
+    @patch('io.open')
+    def test_open(self, mock_open):
+        mock_open.return_value.close = mock.Mock()
+        with PipeReader.open(0) as pipe_reader:
+            assert pipe_reader.stream == mock_open.return_value
+        mock_open.assert_called_once_with(0, 'rb', closefd=False)
+        mock_open.return_value.close.assert_called_once_with()
@@ -0,0 +1,177 @@
+import os
+import struct
+import zlib
+from tempfile import NamedTemporaryFile
+
+from test_helper import *
+
+from azurectl.azurectl_exceptions import *
+from azurectl.utils.qcow2 import Qcow2
+
+
+class TestQcow2:
+    def setup(self):
+        self.image = NamedTemporaryFile()
+
+    def __write_image(
+        self, size, clusters, version=3, cluster_bits=9, features=0,
+        backing_file_offset=0, crypt_method=0, compressed=None
+    ):
+        """
+            Write a qcow2 image with the given clusters of data at
+            the given cluster index, the image layout is header, L1
+            table, L2 tables and data clusters, each one cluster in size
+        """
+        cluster_size = 1 << cluster_bits
+        l2_entries = cluster_size // 8
+        l1_size = -(-size // (cluster_size * l2_entries))
+        compressed = compressed or {}
+        l2_tables = {}
+        for index in list(clusters) + list(compressed):
+            l2_tables.setdefault(index // l2_entries, [0] * l2_entries)
+        data_offset = (2 + len(l2_tables)) * cluster_size
+        data = bytearray()
+        l1_table = [0] * l1_size
+        for position, l1_index in enumerate(sorted(l2_tables)):
+            l1_table[l1_index] = (2 + position) * cluster_size | 1 << 63
+        for index, cluster in sorted(clusters.items()):
+            table = l2_tables[index // l2_entries]
+            if cluster is None:
+                # zero flag
+                table[index % l2_entries] = 1
+            else:
+                table[index % l2_entries] = \
+                    (data_offset + len(data)) | 1 << 63
+                data += cluster
+        for index, cluster in sorted(compressed.items()):
+            deflate = zlib.compressobj(9, zlib.DEFLATED, -12)
+            cluster_data = deflate.compress(cluster) + deflate.flush()
+            # compressed data is not cluster aligned
+            data += bytearray(16)
+            offset = data_offset + len(data)
+            sectors = (16 + len(cluster_data) - 1) // 512
+            x = 62 - (cluster_bits - 8)
+            l2_tables[index // l2_entries][index % l2_entries] = \
+                1 << 62 | sectors << x | offset
+            data += cluster_data
+            data += bytearray(-len(data) % cluster_size)
+        header = struct.pack(
+            '>4sIQIIQIIQQIIQ', b'QFI\xfb', version, backing_file_offset, 0,
+            cluster_bits, size, crypt_method, l1_size, cluster_size, 0, 0, 0,
+            0
+        )
+        if version == 3:
+            header += struct.pack('>QQQII', features, 0, 0, 4, 104)
+        image = bytearray(header)
+        image += bytearray(cluster_size - len(image))
+        image += struct.pack('>%dQ' % l1_size, *l1_table)
+        image += bytearray(2 * cluster_size - len(image))
+        for l1_index, l2_table in sorted(l2_tables.items()):
+            image += struct.pack('>%dQ' % l2_entries, *l2_table)
+        image += data
+        self.image.seek(0)
+        self.image.write(image)
+        self.image.flush()
+
+    def test_read(self):
+        self.__write_image(
+            4096, {1: b'a' * 512, 3: None, 7: b'b' * 512}, version=2
+        )
+        with Qcow2.open(self.image.name) as image:
+            assert image.size == 4096
+            assert image.cluster_size == 512
+            data = image.read(8192)
+        assert data == \
+            bytes(bytearray(512)) + b'a' * 512 + bytes(bytearray(2560)) + \
+            b'b' * 512
+
+    def test_read_across_l2_tables(self):
+        self.__write_image(131072, {63: b'a' * 512, 64: b'b' * 512})
+        with Qcow2.open(self.image.name) as image:
+            image.read(63 * 512)
+            assert image.read(1024) == b'a' * 512 + b'b' * 512
+            assert image.read(1024) == bytes(bytearray(1024))
+            # the L1 entries of the second half have no L2 table
+            assert image.skip_hole(131072) == 131072 - 67 * 512
+
+    def test_read_compressed(self):
+        self.__write_image(
+            4096, {0: b'a' * 512}, compressed={2: b'c' * 256 + b'd' * 256}
+        )
+        with Qcow2.open(self.image.name) as image:
+            data = image.read(4096)
+        assert data[:512] == b'a' * 512
+        assert data[1024:1536] == b'c' * 256 + b'd' * 256
+
+    @raises(AzureQcow2Error)
+    def test_read_compressed_truncated(self):
+        self.__write_image(4096, {}, compressed={0: b'c' * 512})
+        with open(self.image.name, 'r+b') as image_file:
+            image_file.truncate(os.path.getsize(self.image.name) - 512)
+        with Qcow2.open(self.image.name) as image:
+            image.read(512)
+
+    def test_skip_hole(self):
+        self.__write_image(
+            16384, {3: b'a' * 512, 4: None, 5: b'b' * 512}
+        )
+        with Qcow2.open(self.image.name) as image:
+            assert image.skip_hole(1024) == 1024
+            assert image.skip_hole(4096) == 512
+            assert image.skip_hole(4096) == 0
+            assert image.read(512) == b'a' * 512
+            # zero flagged clusters are holes
+            assert image.skip_hole(512) == 512
+            assert image.skip_hole(4096, partial=False) == 0
+            image.read(512)
+            assert image.skip_hole(4096, partial=False) == 4096
+            assert image.skip_hole(65536) == 16384 - 3072 - 4096
+            assert image.skip_hole(4096) == 0
+            assert image.read(512) == b''
+
+    def test_virtual_size(self):
+        self.__write_image(1048576, {})
+        assert Qcow2.virtual_size(self.image.name) == 1048576
+
+    @raises(AzureQcow2Error)
+    def test_not_qcow2(self):
+        self.image.write(b'x' * 1024)
+        self.image.flush()
+        Qcow2(self.image.name)
+
+    @raises(AzureQcow2Error)
+    def test_unsupported_version(self):
+        self.__write_image(4096, {}, version=1)
+        Qcow2(self.image.name)
+
+    @raises(AzureQcow2Error)
+    def test_backing_file(self):
+        self.__write_image(4096, {}, backing_file_offset=512)
+        Qcow2(self.image.name)
+
+    @raises(AzureQcow2Error)
+    def test_encrypted(self):
+        self.__write_image(4096, {}, crypt_method=1)
+        Qcow2(self.image.name)
+
+    @raises(AzureQcow2Error)
+    def test_invalid_cluster_bits(self):
+        self.__write_image(4096, {}, cluster_bits=8)
+        Qcow2(self.image.name)
+
+    @raises(AzureQcow2Error)
+    def test_unsupported_features(self):
+        # external data file
+        self.__write_image(4096, {}, features=4)
+        Qcow2(self.image.name)
+
+    def test_dirty(self):
+        self.__write_image(4096, {0: b'a' * 512}, features=1)
+        with Qcow2(self.image.name) as image:
+            assert image.read(512) == b'a' * 512
+
+    @raises(EOFError)
+    def test_truncated(self):
+        self.image.write(b'QFI\xfb')
+        self.image.flush()
+        Qcow2(self.image.name)
@@ -0,0 +1,45 @@
+from test_helper import *
+
+from azurectl.utils.range_set import RangeSet
+
+
+class TestRangeSet:
+    def setup(self):
+        self.range_set = RangeSet([(0, 512), (1024, 512), (4096, 1024)])
+
+    def test_ranges(self):
+        assert self.range_set.ranges() == [(0, 512), (1024, 512), (4096, 1024)]
+
+    def test_add_merges_adjacent(self):
+        self.range_set.add(512, 512)
+        assert self.range_set.ranges() == [(0, 1536), (4096, 1024)]
+
+    def test_add_merges_overlapping(self):
+        self.range_set.add(256, 4096)
+        assert self.range_set.ranges() == [(0, 5120)]
+
+    def test_add_between(self):
+        self.range_set.add(2048, 512)
+        assert self.range_set.ranges() == [
+            (0, 512), (1024, 512), (2048, 512), (4096, 1024)
+        ]
+
+    def test_add_empty(self):
+        self.range_set.add(2048, 0)
+        assert self.range_set.ranges() == [(0, 512), (1024, 512), (4096, 1024)]
+
+    def test_contains(self):
+        assert self.range_set.contains(0, 512) is True
+        assert self.range_set.contains(4608, 512) is True
+        assert self.range_set.contains(0, 1024) is False
+        assert self.range_set.contains(2048, 512) is False
+        assert RangeSet().contains(0, 512) is False
+
+    def test_intersection(self):
+        other = RangeSet([(256, 1024), (4608, 4096)])
+        assert self.range_set.intersection(other).ranges() == [
+            (256, 256), (1024, 256), (4608, 512)
+        ]
+
+    def test_byte_size(self):
+        assert self.range_set.byte_size() == 2048
@@ -0,0 +1,81 @@
+from mock import patch
+import io
+import time
+
+from test_helper import *
+import mock
+
+from azurectl.utils.read_ahead import ReadAhead
+
+
+class SlowStream(object):
+    def __init__(self, data, delay):
+        self.stream = io.BytesIO(data)
+        self.delay = delay
+
+    def readinto(self, buffer):
+        time.sleep(self.delay)
+        return self.stream.readinto(buffer)
+
+    def close(self):
+        pass
+
+
+class TestReadAhead:
+    def setup(self):
+        self.stream = io.BytesIO(b'Some data read ahead in chunks')
+        self.read_ahead = ReadAhead(self.stream, chunk_size=8)
+
+    def teardown(self):
+        self.read_ahead.close()
+
+    def test_read(self):
+        assert self.read_ahead.read(4) == b'Some'
+        assert self.read_ahead.read(12) == b' data read a'
+        assert self.read_ahead.read(64) == b'head in chunks'
+        assert self.read_ahead.read(64) == b''
+
+    def test_readinto(self):
+        buffer = bytearray(34)
+        assert self.read_ahead.readinto(memoryview(buffer)[2:]) == 30
+        assert buffer == \
+            bytearray(2) + b'Some data read ahead in chunks' + bytearray(2)
+        assert self.read_ahead.readinto(buffer) == 0
+
+    def test_buffers_reused(self):
+        data = b''.join(
+            self.read_ahead.read(4) for count in range(8)
+        )
+        assert data == b'Some data read ahead in chunks'
+        assert self.read_ahead.buffers.allocated <= ReadAhead.DEPTH + 2
+
+    def test_close(self):
+        self.read_ahead.close()
+        assert self.stream.closed
+
+    @raises(ValueError)
+    def test_read_error(self):
+        stream = mock.Mock()
+        stream.readinto.side_effect = ValueError('bad data')
+        with ReadAhead(stream) as read_ahead:
+            try:
+                read_ahead.read(8)
+            finally:
+                assert read_ahead.read(8) == b''
+
+    @patch.object(ReadAhead, 'POLL_INTERVAL', 0.01)
+    def test_read_waits_for_chunk(self):
+        with ReadAhead(SlowStream(b'data', 0.05)) as read_ahead:
+            assert read_ahead.read(8) == b'data'
+
+    @patch.object(ReadAhead, 'POLL_INTERVAL', 0.01)
+    def test_close_with_chunks_queued(self):
+        stream = mock.Mock()
+        stream.readinto.return_value = 1
+        read_ahead = ReadAhead(stream, chunk_size=1, depth=1)
+        while not read_ahead.chunks.full():
+            time.sleep(0.01)
+        time.sleep(0.05)
+        read_ahead.close()
+        assert not read_ahead.reader.is_alive()
+        stream.close.assert_called_once_with()
@@ -0,0 +1,115 @@
+import errno
+import os
+import mock
+from mock import patch
+from tempfile import NamedTemporaryFile
+
+from test_helper import *
+
+from azurectl.utils.sparse_file import SparseFile
+
+
+class TestSparseFile:
+    def setup(self):
+        self.image = NamedTemporaryFile()
+        self.image.truncate(1048576)
+        self.image.seek(524288)
+        self.image.write('x' * 4096)
+        self.image.flush()
+        self.sparse_file = SparseFile.open(self.image.name)
+
+    def teardown(self):
+        self.sparse_file.close()
+
+    def test_context_manager(self):
+        with SparseFile(self.image.name) as sparse_file:
+            assert sparse_file.size == 1048576
+
+    def test_read(self):
+        self.sparse_file.position = 524288
+        os.lseek(self.sparse_file.fd, 524288, os.SEEK_SET)
+        assert self.sparse_file.read(8192) == \
+            'x' * 4096 + bytes(bytearray(4096))
+        assert self.sparse_file.position == 532480
+
+    def test_read_end_of_file(self):
+        self.sparse_file.position = 1048064
+        os.lseek(self.sparse_file.fd, 1048064, os.SEEK_SET)
+        assert len(self.sparse_file.read(4096)) == 512
+        assert self.sparse_file.read(4096) == ''
+
+    def test_skip(self):
+        self.sparse_file.skip(524288)
+        assert self.sparse_file.position == 524288
+        assert self.sparse_file.read(4096) == 'x' * 4096
+
+    @patch('os.lseek')
+    def test_skip_hole(self, mock_lseek):
+        mock_lseek.return_value = 524288
+        assert self.sparse_file.skip_hole(4194304) == 524288
+        assert mock_lseek.call_args_list == [
+            mock.call(self.sparse_file.fd, 0, SparseFile.SEEK_DATA),
+            mock.call(self.sparse_file.fd, 524288, os.SEEK_SET)
+        ]
+        assert self.sparse_file.position == 524288
+
+    @patch('os.lseek')
+    def test_skip_hole_limited(self, mock_lseek):
+        mock_lseek.return_value = 524288
+        assert self.sparse_file.skip_hole(4096) == 4096
+
+    @patch('os.lseek')
+    def test_skip_hole_page_aligned(self, mock_lseek):
+        mock_lseek.return_value = 1000
+        assert self.sparse_file.skip_hole(4096) == 512
+
+    @patch('os.lseek')
+    def test_skip_hole_not_partial(self, mock_lseek):
+        mock_lseek.return_value = 524288
+        assert self.sparse_file.skip_hole(1048576, partial=False) == 0
+        assert self.sparse_file.position == 0
+        assert self.sparse_file.skip_hole(524288, partial=False) == 524288
+
+    @patch('os.lseek')
+    def test_skip_hole_at_data(self, mock_lseek):
+        mock_lseek.return_value = 0
+        assert self.sparse_file.skip_hole(4096) == 0
+
+    @patch('os.lseek')
+    def test_skip_hole_up_to_end_of_file(self, mock_lseek):
+        self.sparse_file.position = 528384
+
+        def side_effect(fd, position, whence):
+            if whence == SparseFile.SEEK_DATA:
+                raise OSError(errno.ENXIO, 'No such device or address')
+            return position
+
+        mock_lseek.side_effect = side_effect
+        assert self.sparse_file.skip_hole(4194304) == 520192
+        assert self.sparse_file.position == 1048576
+
+    def test_skip_hole_end_of_file(self):
+        self.sparse_file.position = 1048576
+        assert self.sparse_file.skip_hole(4096) == 0
+
+    @patch('os.lseek')
+    def test_skip_hole_not_supported(self, mock_lseek):
+        def side_effect(fd, position, whence):
+            if whence == SparseFile.SEEK_DATA:
+                raise OSError(errno.EINVAL, 'Invalid argument')
+            return position
+
+        mock_lseek.side_effect = side_effect
+        assert self.sparse_file.skip_hole(4096) == 0
+        assert self.sparse_file.seek_data_supported is False
+        assert self.sparse_file.skip_hole(4096) == 0
+        assert len(mock_lseek.call_args_list) == 2
+
+    def test_readinto(self):
+        buffer = bytearray(8192)
+        self.sparse_file.position = 520192
+        os.lseek(self.sparse_file.fd, 520192, os.SEEK_SET)
+        assert self.sparse_file.readinto(memoryview(buffer)[:6144]) == 6144
+        assert buffer == bytes(bytearray(4096)) + 'x' * 2048 + \
+            bytes(bytearray(2048))
+        assert self.sparse_file.position == 526336
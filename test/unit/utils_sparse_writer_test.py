@@ -0,0 +1,29 @@
+import os
+from tempfile import NamedTemporaryFile
+
+from test_helper import *
+
+from azurectl.utils.sparse_writer import SparseWriter
+
+
+class TestSparseWriter:
+    def setup(self):
+        self.image = NamedTemporaryFile()
+
+    def test_write_at(self):
+        with SparseWriter(self.image.name, 1048576) as writer:
+            writer.write_at(b'y' * 512, 4096)
+            writer.write_at(bytearray(b'x' * 4096), 0)
+            writer.abort()
+        with open(self.image.name, 'rb') as image:
+            data = image.read()
+        assert len(data) == 1048576
+        assert data[:4608] == b'x' * 4096 + b'y' * 512
+        assert data[4608:] == bytes(bytearray(1048576 - 4608))
+
+    def test_holes(self):
+        writer = SparseWriter(self.image.name, 64 * 1048576)
+        writer.write_at(b'x' * 4096, 32 * 1048576)
+        writer.close()
+        # only the written range is allocated on disk
+        assert os.stat(self.image.name).st_blocks * 512 < 1048576
@@ -0,0 +1,166 @@
+import io
+import lzma
+import mock
+import tarfile
+
+from test_helper import *
+
+from azurectl.azurectl_exceptions import *
+from azurectl.utils.tar_member import TarMember
+from azurectl.utils.xz import XZ
+
+
+class TestTarMember:
+    def __archive(self, members, format=tarfile.GNU_FORMAT):
+        archive = io.BytesIO()
+        tar = tarfile.open(fileobj=archive, mode='w', format=format)
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            if data is None:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            else:
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        tar.close()
+        return archive.getvalue()
+
+    def __member(self, archive, name):
+        return TarMember(io.BytesIO(archive), name)
+
+    def test_read(self):
+        archive = self.__archive([
+            ('bundle', None),
+            ('bundle/metadata.json', b'{}' * 1000),
+            ('bundle/disk.vhd', b'x' * 1500),
+            ('bundle/manifest', b'y' * 10)
+        ])
+        with self.__member(archive, './bundle/disk.vhd') as member:
+            assert member.size == 1500
+            buffer = bytearray(1024)
+            assert member.readinto(buffer) == 1024
+            assert member.read(1024) == b'x' * 476
+            assert member.read(1024) == b''
+
+    def test_long_name_gnu(self):
+        name = 'bundle/' + 'd' * 120 + '/disk.vhd'
+        archive = self.__archive([('other', b'z' * 600), (name, b'x' * 512)])
+        assert self.__member(archive, name).read(1024) == b'x' * 512
+
+    def test_long_name_ustar_prefix(self):
+        name = 'd' * 120 + '/disk.vhd'
+        archive = self.__archive([(name, b'x' * 512)], tarfile.USTAR_FORMAT)
+        assert self.__member(archive, name).read(1024) == b'x' * 512
+
+    def test_pax(self):
+        name = 'bundle/' + 'd' * 120 + '/disk.vhd'
+        archive = self.__archive(
+            [('other', b'z' * 600), (name, b'x' * 512)], tarfile.PAX_FORMAT
+        )
+        assert self.__member(archive, name).size == 512
+        assert self.__member(archive, 'other').size == 600
+
+    def test_pax_size_and_global_header(self):
+        archive = io.BytesIO()
+        tar = tarfile.open(
+            fileobj=archive, mode='w', format=tarfile.PAX_FORMAT,
+            pax_headers={u'comment': u'bundle'}
+        )
+        info = tarfile.TarInfo('other')
+        info.size = 600
+        info.pax_headers = {u'size': u'600'}
+        tar.addfile(info, io.BytesIO(b'z' * 600))
+        info = tarfile.TarInfo('disk.vhd')
+        info.size = 512
+        info.pax_headers = {u'size': u'512'}
+        tar.addfile(info, io.BytesIO(b'x' * 512))
+        tar.close()
+        member = self.__member(archive.getvalue(), u'disk.vhd')
+        assert member.size == 512
+        assert member.read(1024) == b'x' * 512
+
+    def test_xz_compressed(self):
+        archive = self.__archive([
+            ('metadata.json', b'{}' * 1000), ('disk.vhd', b'x' * 4096)
+        ])
+        compressor = lzma.LZMACompressor()
+        xz_data = compressor.compress(archive) + compressor.flush()
+        member = TarMember(XZ(io.BytesIO(xz_data)), 'disk.vhd')
+        assert member.read(8192) == b'x' * 4096
+
+    def test_base256_size(self):
+        archive = bytearray(self.__archive([('disk.vhd', b'x' * 512)]))
+        # encoding of sizes beyond the octal field
+        archive[124:136] = b'\x80' + bytes(bytearray(9)) + b'\x02\x00'
+        member = self.__member(self.__checksummed(archive), 'disk.vhd')
+        assert member.size == 512
+
+    @raises(AzureTarError)
+    def test_not_found(self):
+        archive = self.__archive([('disk.vhd', b'x' * 512)])
+        self.__member(archive, 'disk.raw')
+
+    @raises(AzureTarError)
+    def test_not_found_end_of_stream(self):
+        self.__member(b'', 'disk.raw')
+
+    @raises(AzureTarError)
+    def test_not_a_file(self):
+        archive = self.__archive([('bundle', None)])
+        self.__member(archive, 'bundle')
+
+    @raises(AzureTarError)
+    def test_sparse_member(self):
+        archive = bytearray(self.__archive([('disk.vhd', b'x' * 512)]))
+        archive[156:157] = b'S'
+        self.__member(self.__checksummed(archive), 'disk.vhd')
+
+    @raises(AzureTarError)
+    def test_invalid_checksum(self):
+        archive = bytearray(self.__archive([('disk.vhd', b'x' * 512)]))
+        archive[0:1] = b'D'
+        self.__member(bytes(archive), 'disk.vhd')
+
+    @raises(AzureTarError)
+    def test_truncated_header(self):
+        archive = self.__archive([('disk.vhd', b'x' * 512)])
+        self.__member(archive[:100], 'disk.vhd')
+
+    @raises(AzureTarError)
+    def test_truncated_member_data(self):
+        archive = self.__archive([('other', b'z' * 600)])
+        self.__member(archive[:1024], 'disk.vhd')
+
+    @raises(AzureTarError)
+    def test_truncated_long_name(self):
+        name = 'd' * 120 + '/disk.vhd'
+        archive = self.__archive([(name, b'x' * 512)])
+        self.__member(archive[:600], name)
+
+    def test_skip_hole(self):
+        stream = mock.Mock()
+        stream.readinto.side_effect = self.__reader(
+            self.__archive([('disk.vhd', b'x' * 8192)])
+        )
+        stream.skip_hole.return_value = 4096
+        member = TarMember(stream, 'disk.vhd')
+        assert member.skip_hole(1048576) == 4096
+        stream.skip_hole.assert_called_once_with(8192, True)
+        assert member.position == 4096
+        stream.skip_hole.return_value = 4096
+        # the hole ends with the member data
+        assert member.skip_hole(1048576, partial=False) == 0
+
+    def test_skip_hole_not_supported(self):
+        archive = self.__archive([('disk.vhd', b'x' * 512)])
+        assert self.__member(archive, 'disk.vhd').skip_hole(512) == 0
+
+    def __checksummed(self, header_data):
+        header_data[148:156] = b' ' * 8
+        checksum = sum(header_data[:512])
+        header_data[148:156] = (b'%06o\0 ' % checksum)
+        return bytes(header_data)
+
+    def __reader(self, data):
+        stream = io.BytesIO(data)
+        return lambda buffer: stream.readinto(buffer)
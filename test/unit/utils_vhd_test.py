@@ -0,0 +1,88 @@
+import io
+import mock
+import struct
+
+from test_helper import *
+
+from azurectl.utils.vhd import VHD
+
+
+class TestVHD:
+    def setup(self):
+        self.raw_data = b'x' * 1000
+        self.vhd = VHD(io.BytesIO(self.raw_data), 1000)
+
+    def __checksum(self, footer):
+        total = sum(bytearray(footer[:64] + footer[68:]))
+        return ~total & 0xffffffff
+
+    def test_readinto(self):
+        buffer = bytearray(4096)
+        data = bytearray()
+        while True:
+            count = self.vhd.readinto(buffer)
+            data += buffer[:count]
+            if count < len(buffer):
+                break
+        assert len(data) == VHD.fixed_size(1000) == 1049088
+        assert data[:1000] == self.raw_data
+        assert data[1000:1048576] == bytearray(1048576 - 1000)
+        assert data[1048576:] == self.vhd.footer_data
+        assert self.vhd.readinto(buffer) == 0
+
+    def test_read(self):
+        assert self.vhd.read(1024) == self.raw_data + bytes(bytearray(24))
+
+    def test_raw_data_ends_early(self):
+        vhd = VHD(io.BytesIO(b'x' * 512), 1000)
+        data = vhd.read(1048576)
+        assert vhd.raw_size == 512
+        assert data == b'x' * 512 + bytes(bytearray(1048576 - 512))
+        assert vhd.read(1024) == vhd.footer_data
+
+    def test_skip_hole(self):
+        stream = mock.Mock()
+        stream.skip_hole.return_value = 4096
+        vhd = VHD(stream, 8192)
+        assert vhd.skip_hole(1048576) == 4096
+        stream.skip_hole.assert_called_once_with(8192, True)
+        assert vhd.position == 4096
+
+    def test_skip_hole_not_partial(self):
+        stream = mock.Mock()
+        stream.skip_hole.return_value = 8192
+        vhd = VHD(stream, 8192)
+        # the hole ends with the raw data, the padding is not a hole
+        assert vhd.skip_hole(1048576, partial=False) == 0
+        assert vhd.position == 0
+
+    def test_skip_hole_beyond_raw_data(self):
+        assert self.vhd.skip_hole(4096) == 0
+        self.vhd.read(1000)
+        assert self.vhd.skip_hole(4096) == 0
+
+    def test_close(self):
+        stream = mock.Mock()
+        with VHD(stream, 1024):
+            pass
+        stream.close.assert_called_once_with()
+
+    def test_footer(self):
+        footer = VHD.footer(30 * 1073741824)
+        assert len(footer) == VHD.FOOTER_SIZE
+        assert footer[:8] == b'conectix'
+        (original_size, current_size, cylinders, heads, sectors,
+            disk_type, checksum) = struct.unpack('>QQHBBII', footer[40:68])
+        assert original_size == current_size == 30 * 1073741824
+        assert (cylinders, heads, sectors) == (62415, 16, 63)
+        assert disk_type == 2
+        assert checksum == self.__checksum(footer)
+
+    def test_geometry(self):
+        # sizes of the different branches of the VHD specification
+        assert VHD.geometry(1048576) == (30, 4, 17)
+        assert VHD.geometry(100 * 1048576) == (1003, 12, 17)
+        assert VHD.geometry(200 * 1048576) == (825, 16, 31)
+        assert VHD.geometry(300 * 1048576) == (609, 16, 63)
+        assert VHD.geometry(200 * 1073741824) == (65535, 16, 255)
+        assert VHD.geometry(4096 * 1073741824) == (65535, 16, 255)
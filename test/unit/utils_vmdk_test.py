@@ -0,0 +1,154 @@
+import struct
+import zlib
+from tempfile import NamedTemporaryFile
+
+from test_helper import *
+
+from azurectl.azurectl_exceptions import *
+from azurectl.utils.vmdk import VMDK
+
+
+class TestVMDK:
+    def setup(self):
+        self.image = NamedTemporaryFile()
+
+    def __header(
+        self, capacity, gd_offset, flags=0x7, version=1, grain_size=2,
+        gtes_per_gt=4, compress_algorithm=0, magic=b'KDMV'
+    ):
+        header = struct.pack(
+            '<4sIIQQQQIQQQB4sH', magic, version, flags, capacity,
+            grain_size, 0, 0, gtes_per_gt, 0, gd_offset, 0, 0, b'\n \r\n',
+            compress_algorithm
+        )
+        return header + bytes(bytearray(512 - len(header)))
+
+    def __write_image(
+        self, capacity, grains, flags=0x7, compressed=False, **header_args
+    ):
+        """
+            Write a sparse extent of capacity sectors with the given
+            grains of data at the given grain index. The grain size is
+            two sectors, a grain table holds four entries. Grains are
+            compressed in the streamOptimized layout with the grain
+            directory in the footer
+        """
+        grain_tables = -(-capacity // 8)
+        # header, grain directory, grain tables
+        data_sector = 2 + grain_tables
+        gd = [0] * grain_tables
+        gts = {}
+        for index in grains:
+            gts.setdefault(index // 4, [0] * 4)
+        for position, gd_index in enumerate(sorted(gts)):
+            gd[gd_index] = 2 + position
+        data = bytearray()
+        for index, grain in sorted(grains.items()):
+            table = gts[index // 4]
+            if grain is None:
+                table[index % 4] = 1
+                continue
+            table[index % 4] = data_sector + len(data) // 512
+            if compressed:
+                grain_data = zlib.compress(grain)
+                data += struct.pack('<QI', index * 2, len(grain_data))
+                data += grain_data
+            else:
+                data += grain
+            data += bytearray(-len(data) % 512)
+        tables = bytearray(struct.pack('<%dI' % grain_tables, *gd))
+        tables += bytearray(-len(tables) % 512)
+        for gd_index in sorted(gts):
+            tables += struct.pack('<4I', *gts[gd_index])
+            tables += bytearray(496)
+        tables += bytearray((grain_tables - len(gts)) * 512)
+        if compressed:
+            flags |= 0x30000
+            header_args.setdefault('compress_algorithm', 1)
+            image = self.__header(
+                capacity, 0xffffffffffffffff, flags, **header_args
+            )
+            image += tables + data
+            # footer marker, footer and end of stream marker
+            image += bytearray(512)
+            image += self.__header(capacity, 1, flags, **header_args)
+            image += bytearray(512)
+        else:
+            image = self.__header(capacity, 1, flags, **header_args)
+            image += tables + data
+        self.image.seek(0)
+        self.image.write(image)
+        self.image.flush()
+
+    def test_read(self):
+        self.__write_image(32, {1: b'a' * 1024, 5: b'b' * 1024})
+        with VMDK.open(self.image.name) as image:
+            assert image.size == 16384
+            assert image.cluster_size == 1024
+            data = image.read(32768)
+        assert data == \
+            bytes(bytearray(1024)) + b'a' * 1024 + bytes(bytearray(3072)) + \
+            b'b' * 1024 + bytes(bytearray(10240))
+
+    def test_read_compressed(self):
+        self.__write_image(
+            32, {0: b'a' * 1024, 6: b'c' * 512}, compressed=True
+        )
+        with VMDK.open(self.image.name) as image:
+            assert image.read(1024) == b'a' * 1024
+            image.read(5 * 1024)
+            # short last grain of the stream is zero padded
+            assert image.read(1024) == b'c' * 512 + bytes(bytearray(512))
+
+    @raises(AzureVMDKError)
+    def test_read_compressed_grain_too_large(self):
+        self.__write_image(32, {0: b'a' * 2048}, compressed=True)
+        with VMDK.open(self.image.name) as image:
+            image.read(1024)
+
+    def test_skip_hole(self):
+        self.__write_image(32, {3: b'a' * 1024, 4: None, 9: b'b' * 1024})
+        with VMDK.open(self.image.name) as image:
+            assert image.skip_hole(65536) == 3072
+            assert image.skip_hole(1024) == 0
+            assert image.read(1024) == b'a' * 1024
+            # zeroed grain followed by unallocated grains
+            assert image.skip_hole(65536) == 5120
+            assert image.read(1024) == b'b' * 1024
+
+    def test_zeroed_grain_not_supported(self):
+        self.__write_image(32, {4: None}, flags=0x1)
+        with VMDK.open(self.image.name) as image:
+            assert image.allocated(4) is True
+
+    def test_virtual_size(self):
+        self.__write_image(2048, {})
+        assert VMDK.virtual_size(self.image.name) == 1048576
+
+    @raises(AzureVMDKError)
+    def test_not_vmdk(self):
+        self.image.write(self.__header(32, 1, magic=b'COWD'))
+        self.image.flush()
+        VMDK(self.image.name)
+
+    @raises(AzureVMDKError)
+    def test_unsupported_version(self):
+        self.__write_image(32, {}, version=4)
+        VMDK(self.image.name)
+
+    @raises(AzureVMDKError)
+    def test_invalid_grain_size(self):
+        self.image.write(self.__header(32, 1, grain_size=0))
+        self.image.flush()
+        VMDK(self.image.name)
+
+    @raises(AzureVMDKError)
+    def test_unsupported_compression(self):
+        self.__write_image(32, {}, compressed=True, compress_algorithm=2)
+        VMDK(self.image.name)
+
+    @raises(EOFError)
+    def test_truncated(self):
+        self.image.write(b'KDMV')
+        self.image.flush()
+        VMDK(self.image.name)
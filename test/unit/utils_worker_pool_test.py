@@ -0,0 +1,81 @@
+import mock
+from mock import patch
+
+from test_helper import *
+
+from azurectl.azurectl_exceptions import *
+from azurectl.utils.worker_pool import WorkerPool
+from queue import Full
+
+
+class TestWorkerPool:
+    def setup(self):
+        self.pool = WorkerPool(4)
+
+    def test_jobs_processed(self):
+        job = mock.Mock()
+        for count in range(10):
+            self.pool.submit(job, count)
+        self.pool.join()
+        assert job.call_count == 10
+        assert sorted(job.call_args_list) == [
+            mock.call(count) for count in range(10)
+        ]
+
+    def test_default_queue_size(self):
+        assert self.pool.jobs.maxsize == 8
+        self.pool.join()
+
+    @raises(AzureWorkerPoolError)
+    def test_no_threads(self):
+        WorkerPool(0)
+
+    @raises(AzureWorkerPoolError)
+    def test_job_failed_raises_on_join(self):
+        job = mock.Mock(side_effect=Exception('upload failed'))
+        self.pool.submit(job)
+        self.pool.join()
+
+    @raises(AzureWorkerPoolError)
+    def test_job_failed_raises_on_submit(self):
+        self.pool.errors.append('Exception: upload failed')
+        self.pool.submit(mock.Mock())
+
+    def test_failed_pool_drains_jobs(self):
+        pool = WorkerPool(1)
+        pool.errors.append('Exception: upload failed')
+        job = mock.Mock()
+        pool.jobs.put((job, (), None))
+        try:
+            pool.join()
+        except AzureWorkerPoolError:
+            pass
+        assert not job.called
+
+    def test_failed_pool_cleans_up_drained_jobs(self):
+        pool = WorkerPool(1)
+        pool.errors.append('Exception: upload failed')
+        job = mock.Mock()
+        cleanup = mock.Mock()
+        pool.jobs.put((job, (), cleanup))
+        try:
+            pool.join()
+        except AzureWorkerPoolError:
+            pass
+        assert not job.called
+        cleanup.assert_called_once_with()
+
+    def test_submit_with_cleanup(self):
+        job = mock.Mock()
+        cleanup = mock.Mock()
+        self.pool.submit(job, 'data', cleanup=cleanup)
+        self.pool.join()
+        job.assert_called_once_with('data')
+        assert not cleanup.called
+
+    def test_submit_waits_for_queue(self):
+        pool = WorkerPool(1, queue_size=1)
+        with patch.object(pool.jobs, 'put') as mock_put:
+            mock_put.side_effect = [Full, None]
+            pool.submit(mock.Mock())
+            assert len(mock_put.call_args_list) == 2
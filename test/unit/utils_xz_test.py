@@ -1,27 +1,39 @@
 
 from mock import patch
+import io
 
 from test_helper import *
 import mock
 
-from azurectl.utils.xz import XZ
+from azurectl.utils.xz import (
+    XZ,
+    XZBlock,
+    ParallelXZ,
+    decompress_block
+)
+from azurectl.utils.read_ahead import ReadAhead
 from azurectl.azurectl_exceptions import *
 
 
 class TestXZ:
     def setup(self):
-        self.xz = XZ.open('../data/blob.xz')
+        self.xz = XZ(open('../data/blob.xz', 'rb'))
 
     def teardown(self):
         self.xz.close()
 
     def test_read(self):
-        assert self.xz.read(128) == 'foo'
+        assert self.xz.read(128) == 'foo\n'
 
     def test_read_already_finished(self):
         self.xz.finished = True
         assert self.xz.read(128) is None
 
+    def test_context_manager(self):
+        with XZ(open('../data/blob.xz', 'rb')) as xz:
+            assert xz.read(128) == 'foo\n'
+        assert xz.lzma_stream.closed
+
     def test_read_chunks(self):
         with XZ.open('../data/blob.more.xz') as xz:
             chunk = xz.read(8)
@@ -37,25 +49,162 @@ class TestXZ:
             chunk = xz.read(8)
             assert chunk == 'iple chu'
             chunk = xz.read(8)
-            assert chunk == 'nks'
+            assert chunk == 'nks\n'
 
     def test_uncompressed_size(self):
         assert XZ.uncompressed_size('../data/blob.xz') == 4
 
-    @raises(AzureXZError)
-    @patch('subprocess.Popen')
-    def test_uncompressed_size_raise(self, mock_popen):
-        mock_xz = mock.Mock()
-        mock_xz.communicate = mock.Mock(
-            return_value=['data', 'error']
-        )
-        mock_popen.returncode = 1
-        mock_popen.return_value = mock_xz
-        XZ.uncompressed_size('../data/blob.xz')
+    def test_uncompressed_size_concatenated(self):
+        assert XZ.uncompressed_size('../data/blob.concat.xz') == 58
 
     @raises(AssertionError)
     @patch('lzma.LZMADecompressor')
     def test_read_raise(self, mock_xz):
-        mock_xz.flush = 'data-which-should-never-be-there'
+        mock_xz.return_value.unconsumed_tail = b''
+        mock_xz.return_value.decompress.return_value = b''
+        mock_xz.return_value.flush.return_value = \
+            'data-which-should-never-be-there'
         with XZ.open('../data/blob.more.xz') as xz:
             chunk = xz.read(8)
+
+    def test_blocks(self):
+        assert XZ.blocks('../data/blob.multi.xz') == [
+            XZBlock(
+                compressed_offset=12, total_size=44, unpadded_size=44,
+                uncompressed_size=20, check_id=4
+            ),
+            XZBlock(
+                compressed_offset=56, total_size=44, unpadded_size=44,
+                uncompressed_size=20, check_id=4
+            ),
+            XZBlock(
+                compressed_offset=100, total_size=40, unpadded_size=38,
+                uncompressed_size=14, check_id=4
+            )
+        ]
+
+    def test_blocks_concatenated(self):
+        blocks = XZ.blocks('../data/blob.concat.xz')
+        assert len(blocks) == 4
+        assert blocks[0].compressed_offset == 12
+        assert blocks[1].compressed_offset == 60 + 4 + 12
+        assert decompress_block('../data/blob.concat.xz', blocks[0]) == \
+            'foo\n'
+        assert decompress_block('../data/blob.concat.xz', blocks[3]) == \
+            'ltiple blocks\n'
+
+    @raises(AzureXZError)
+    def test_blocks_no_such_file(self):
+        XZ.blocks('../data/no-such-file.xz')
+
+    @raises(AzureXZError)
+    def test_blocks_truncated(self):
+        self.__blocks_of_data(b'\xfd7zXZ\x00\x00\x04')
+
+    @raises(AzureXZError)
+    def test_blocks_invalid_footer(self):
+        self.__blocks_of_data(self.__xz_data()[:-1] + b'X')
+
+    @raises(AzureXZError)
+    def test_blocks_invalid_index(self):
+        data = self.__xz_data()
+        self.__blocks_of_data(data[:44] + b'\x01' + data[45:])
+
+    @raises(AzureXZError)
+    def test_blocks_invalid_header(self):
+        self.__blocks_of_data(b'X' + self.__xz_data()[1:])
+
+    def test_decompress_block(self):
+        blocks = XZ.blocks('../data/blob.multi.xz')
+        assert decompress_block('../data/blob.multi.xz', blocks[0]) == \
+            'Some data so that we'
+        assert decompress_block('../data/blob.multi.xz', blocks[2]) == \
+            'ltiple blocks\n'
+
+    @patch('azurectl.utils.xz.multiprocessing.cpu_count')
+    def test_open_single_block(self, mock_cpu_count):
+        mock_cpu_count.return_value = 4
+        with XZ.open('../data/blob.more.xz') as xz:
+            assert isinstance(xz, ReadAhead)
+            assert isinstance(xz.stream, XZ)
+
+    def test_open_parallel(self):
+        with XZ.open('../data/blob.multi.xz', processes=2) as xz:
+            assert isinstance(xz, ParallelXZ)
+            assert xz.read(8) == 'Some dat'
+            assert xz.read(16) == 'a so that we can'
+            assert xz.read(64) == \
+                ' read it from multiple blocks\n'
+            assert xz.read(8) == ''
+
+    def test_readinto(self):
+        buffer = bytearray(8)
+        assert self.xz.readinto(memoryview(buffer)[2:]) == 4
+        assert buffer == bytearray(2) + 'foo\n' + bytearray(2)
+        assert self.xz.readinto(buffer) == 0
+
+    def test_parallel_readinto(self):
+        blocks = XZ.blocks('../data/blob.multi.xz')
+        buffer = bytearray(64)
+        with ParallelXZ('../data/blob.multi.xz', blocks, 2) as xz:
+            assert xz.readinto(memoryview(buffer)[:30]) == 30
+            assert xz.readinto(memoryview(buffer)[30:]) == 24
+        assert buffer == \
+            'Some data so that we can read it from multiple blocks\n' + \
+            bytearray(10)
+
+    def test_sequential_and_parallel_read_equal(self):
+        with XZ.open('../data/blob.multi.xz', processes=1) as xz:
+            sequential = xz.read(128)
+        with XZ.open('../data/blob.multi.xz', processes=2) as xz:
+            parallel = xz.read(128)
+        assert sequential == parallel
+        assert len(sequential) == \
+            XZ.uncompressed_size('../data/blob.multi.xz')
+
+    def test_parallel_read_ahead(self):
+        blocks = XZ.blocks('../data/blob.multi.xz')
+        with ParallelXZ('../data/blob.multi.xz', blocks, 2) as xz:
+            assert xz.read_ahead == 4
+            assert len(xz.pending) == 3
+        with ParallelXZ(
+            '../data/blob.multi.xz', blocks, 2, read_ahead=1
+        ) as xz:
+            assert len(xz.pending) == 1
+            assert xz.read(24) == 'Some data so that we can'
+            assert len(xz.pending) == 1
+            assert len(xz.blocks) == 0
+
+    @raises(AzureXZError)
+    def test_parallel_block_failed(self):
+        blocks = XZ.blocks('../data/blob.multi.xz')
+        with ParallelXZ('../data/blob.multi.xz', blocks, 2) as xz:
+            result = mock.Mock()
+            result.ready.side_effect = [False, True]
+            result.get.side_effect = Exception
+            xz.pending.appendleft(result)
+            xz.read(8)
+
+    def test_single_block_stream(self):
+        block = XZBlock(
+            compressed_offset=12, total_size=4, unpadded_size=300,
+            uncompressed_size=20, check_id=1
+        )
+        stream = XZ.single_block_stream(block, 'data')
+        assert stream[:8] == '\xfd7zXZ\x00\x00\x01'
+        assert stream[12:16] == 'data'
+        # index indicator, one record, varint sizes 300 and 20
+        assert stream[16:21] == '\x00\x01\xac\x02\x14'
+        assert stream[-4:] == '\x00\x01YZ'
+
+    def __xz_data(self):
+        with open('../data/blob.xz', 'rb') as xz_file:
+            return xz_file.read()
+
+    def __blocks_of_data(self, data):
+        xz_file = io.BytesIO(data)
+        xz_file.name = 'blob.xz'
+        with patch('azurectl.utils.xz.open', create=True) as mock_open:
+            mock_open.return_value = mock.MagicMock(spec=file)
+            mock_open.return_value.__enter__.return_value = xz_file
+            return XZ.blocks('blob.xz')
@@ -0,0 +1,53 @@
+import lzma
+import threading
+from tempfile import NamedTemporaryFile
+
+from test_helper import *
+
+from azurectl.azurectl_exceptions import *
+from azurectl.utils.xz_writer import XZWriter
+
+
+class TestXZWriter:
+    def setup(self):
+        self.image = NamedTemporaryFile()
+        XZWriter.ZERO_BLOCK_SIZE = 1024
+
+    def teardown(self):
+        XZWriter.ZERO_BLOCK_SIZE = 1048576
+
+    def __content(self):
+        with open(self.image.name, 'rb') as image:
+            return lzma.decompress(image.read())
+
+    def test_write_at(self):
+        ranges = [(512, 512), (4096, 1024), (6144, 512)]
+        with XZWriter(self.image.name, 8192, ranges) as writer:
+            threads = [
+                threading.Thread(
+                    target=writer.write_at, args=(b'x' * length, start)
+                ) for start, length in reversed(ranges)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert self.__content() == \
+            bytes(bytearray(512)) + b'x' * 512 + \
+            bytes(bytearray(3072)) + b'x' * 1024 + \
+            bytes(bytearray(1024)) + b'x' * 512 + bytes(bytearray(1536))
+
+    def test_write_without_ranges(self):
+        XZWriter(self.image.name, 2048, []).close()
+        assert self.__content() == bytes(bytearray(2048))
+
+    @raises(AzureXZError)
+    def test_write_at_aborted(self):
+        writer = XZWriter(self.image.name, 1024, [(0, 512), (512, 512)])
+        writer.abort()
+        try:
+            writer.write_at(b'x' * 512, 512)
+        finally:
+            writer.close()
+            with open(self.image.name, 'rb') as image:
+                assert image.read() == b''
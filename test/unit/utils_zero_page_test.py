@@ -0,0 +1,49 @@
+from test_helper import *
+
+from azurectl.utils.zero_page import ZeroPage
+
+
+class TestZeroPage:
+    def setup(self):
+        self.zero_page = bytes(bytearray(512))
+        self.data_page = 'x' * 512
+
+    def test_data_ranges_zero(self):
+        assert ZeroPage.data_ranges(self.zero_page * 4) == []
+
+    def test_data_ranges_data(self):
+        assert ZeroPage.data_ranges(self.data_page * 4) == [(0, 2048)]
+
+    def test_data_ranges_mixed(self):
+        data = \
+            self.zero_page + self.data_page * 2 + \
+            self.zero_page * 2 + self.data_page
+        assert ZeroPage.data_ranges(data) == [(512, 1024), (2560, 512)]
+
+    def test_data_ranges_zero_scan_block(self):
+        data = \
+            self.data_page + bytes(bytearray(ZeroPage.SCAN_BLOCK_SIZE)) + \
+            self.data_page
+        assert ZeroPage.data_ranges(bytearray(data)) == [
+            (0, 512), (ZeroPage.SCAN_BLOCK_SIZE + 512, 512)
+        ]
+
+    def test_data_ranges_across_scan_blocks(self):
+        data = \
+            bytes(bytearray(ZeroPage.SCAN_BLOCK_SIZE - 512)) + \
+            self.data_page * 2
+        assert ZeroPage.data_ranges(data) == [
+            (ZeroPage.SCAN_BLOCK_SIZE - 512, 1024)
+        ]
+
+    def test_data_ranges_ends_with_scan_block(self):
+        block_size = ZeroPage.SCAN_BLOCK_SIZE
+        data = \
+            bytes(bytearray(block_size - 512)) + self.data_page + \
+            bytes(bytearray(block_size)) + self.data_page
+        assert ZeroPage.data_ranges(data) == [
+            (block_size - 512, 512), (2 * block_size, 512)
+        ]
+
+    def test_data_ranges_partial_page(self):
+        assert ZeroPage.data_ranges(self.zero_page + 'data') == [(512, 4)]